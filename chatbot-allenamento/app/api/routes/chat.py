@@ -42,20 +42,15 @@ async def send_message(
             # Formatta la scheda per la visualizzazione
             formatted_workout = workout_service.format_workout_for_display(workout_plan)
             
-            # Crea un messaggio di risposta con la scheda
-            chat, user_message, assistant_message = await chat_service.send_message(
+            # Registra richiesta e scheda nella chat senza una seconda generazione
+            chat, user_message, assistant_message = await chat_service.send_workout_message(
                 message_content=request.message,
-                chat_id=request.chat_id
+                workout_content=formatted_workout,
+                chat_id=request.chat_id,
+                sources=workout_plan.sources,
+                workout_id=workout_plan.id
             )
             
-            # Sovrascrivi il contenuto con la scheda formattata
-            assistant_message.content = formatted_workout
-            assistant_message.type = "workout"
-            
-            # Aggiorna la chat con il messaggio modificato
-            chat.messages[-1] = assistant_message
-            await chat_service.save_chat(chat)
-            
         else:
             # Gestione normale della chat
             chat, user_message, assistant_message = await chat_service.send_message(
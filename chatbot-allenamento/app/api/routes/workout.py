@@ -4,78 +4,394 @@ Route API per gestione schede allenamento
 
 import logging
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from app.schemas.workout import (
     WorkoutGenerationRequest, WorkoutGenerationResponse, 
-    WorkoutPlanResponse, WorkoutListResponse, WorkoutDeleteResponse
+    WorkoutPlanResponse, WorkoutListResponse, WorkoutDeleteResponse,
+    BatchWorkoutRequest, BatchJobResponse, WorkoutJobResponse
 )
-from app.dependencies import get_workout_service
+from app.dependencies import get_workout_service, get_batch_service, get_workout_job_service
 from app.services.workout_service import WorkoutService
+from app.services.batch_service import BatchWorkoutService
+from app.services.workout_job_service import WorkoutJobService
+from app.models.job import BatchJob, WorkoutJob
+from app.models.workout import WorkoutPlan
+from app.utils.workout_formatter import WorkoutFormatter
 from app.core.error_handler import ChatbotException
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _workout_plan_response(workout_plan: WorkoutPlan) -> WorkoutPlanResponse:
+    """Converte una scheda nello schema di risposta"""
+    return WorkoutPlanResponse(
+        id=workout_plan.id,
+        title=workout_plan.title,
+        workout_days=[
+            {
+                "day": day.day,
+                "focus": day.focus,
+                "warm_up": day.warm_up,
+                "exercises": [
+                    {
+                        "name": ex.name,
+                        "sets": ex.sets,
+                        "reps": ex.reps,
+                        "rest": ex.rest,
+                        "weight": ex.weight,
+                        "notes": ex.notes,
+                        "muscle_groups": ex.muscle_groups
+                    }
+                    for ex in day.exercises
+                ],
+                "cool_down": day.cool_down,
+                "duration_minutes": day.duration_minutes
+            }
+            for day in workout_plan.workout_days
+        ],
+        nutrition={
+            "calories_estimate": workout_plan.nutrition.calories_estimate if workout_plan.nutrition else None,
+            "protein_grams": workout_plan.nutrition.protein_grams if workout_plan.nutrition else None,
+            "meal_timing": workout_plan.nutrition.meal_timing if workout_plan.nutrition else [],
+            "hydration": workout_plan.nutrition.hydration if workout_plan.nutrition else None,
+            "supplements": workout_plan.nutrition.supplements if workout_plan.nutrition else []
+        } if workout_plan.nutrition else None,
+        progression={
+            "week_1_2": workout_plan.progression.week_1_2 if workout_plan.progression else "",
+            "week_3_4": workout_plan.progression.week_3_4 if workout_plan.progression else "",
+            "week_5_6": workout_plan.progression.week_5_6 if workout_plan.progression else None,
+            "deload_week": workout_plan.progression.deload_week if workout_plan.progression else None,
+            "progression_notes": workout_plan.progression.progression_notes if workout_plan.progression else []
+        } if workout_plan.progression else None,
+        general_notes=workout_plan.general_notes,
+        sources=workout_plan.sources,
+        created_at=workout_plan.created_at
+    )
+
 @router.post("/workout/generate", response_model=WorkoutGenerationResponse)
 async def generate_workout(
     request: WorkoutGenerationRequest,
-    workout_service: WorkoutService = Depends(get_workout_service)
+    response: Response,
+    background: bool = Query(False, description="Restituisce subito un job da interrogare invece di attendere la scheda"),
+    workout_service: WorkoutService = Depends(get_workout_service),
+    job_service: WorkoutJobService = Depends(get_workout_job_service)
 ):
     """
     Genera una nuova scheda di allenamento personalizzata
+    
+    Con `background=true` la generazione viene accodata: la risposta (202) contiene
+    il `job_id` da interrogare su `/workout/jobs/{job_id}` o da seguire via SSE su
+    `/workout/jobs/{job_id}/events`.
     """
     try:
+        if background:
+            job = job_service.submit(
+                user_input=request.user_input,
+                chat_id=request.chat_id,
+                generation_mode=request.generation_mode
+            )
+            response.status_code = 202
+            return WorkoutGenerationResponse(
+                success=True,
+                workout_plan=None,
+                message="Generazione della scheda avviata",
+                chat_id=request.chat_id,
+                job_id=job.id
+            )
+            
         workout_plan = await workout_service.generate_workout_plan(
             user_input=request.user_input,
-            chat_id=request.chat_id
+            chat_id=request.chat_id,
+            generation_mode=request.generation_mode
         )
         
         # Converti in response schema
-        workout_response = WorkoutPlanResponse(
-            id=workout_plan.id,
-            title=workout_plan.title,
-            workout_days=[
+        workout_response = _workout_plan_response(workout_plan)
+        
+        return WorkoutGenerationResponse(
+            success=True,
+            workout_plan=workout_response,
+            message="Scheda di allenamento generata con successo!",
+            chat_id=request.chat_id
+        )
+        
+    except ChatbotException as e:
+        logger.error(f"Chatbot error in generate_workout: {e}")
+        return WorkoutGenerationResponse(
+            success=False,
+            workout_plan=None,
+            message=f"Errore nella generazione della scheda: {str(e)}",
+            chat_id=request.chat_id
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error in generate_workout: {e}")
+        return WorkoutGenerationResponse(
+            success=False,
+            workout_plan=None,
+            message="Errore interno nella generazione della scheda",
+            chat_id=request.chat_id
+        )
+
+def _sse(event: str, data: dict) -> str:
+    """Formatta un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@router.post("/workout/generate/stream")
+async def stream_workout_generation(
+    request: WorkoutGenerationRequest,
+    workout_service: WorkoutService = Depends(get_workout_service)
+):
+    """
+    Genera una scheda inviando i giorni man mano che sono pronti (Server-Sent Events)
+    
+    Eventi:
+    - `progress`: fase iniziata (`stage` e dettagli)
+    - `outline`: titolo, giorni previsti e HTML di apertura della scheda
+    - `day`: giorno completato, con il suo HTML da aggiungere alla scheda
+    - `completed`: scheda completa e HTML di chiusura (nutrizione, progressione, note)
+    - `error`: generazione fallita
+    
+    In modalità multi_stage i giorni arrivano uno alla volta; con template, libreria
+    o single_shot la scheda è pronta tutta insieme e gli eventi arrivano in sequenza.
+    """
+    async def event_stream():
+        outline_sent = False
+        days_sent = 0
+        
+        async for stage, details in workout_service.stream_workout_plan(
+            user_input=request.user_input,
+            chat_id=request.chat_id,
+            generation_mode=request.generation_mode
+        ):
+            if stage == "outline":
+                outline_sent = True
+                yield _sse("outline", {
+                    "title": details["title"],
+                    "days": details["days"],
+                    "html": WorkoutFormatter.format_plan_header(details["title"], details["user_profile"])
+                })
+            elif stage == "day_ready" and outline_sent:
+                # Una richiesta accodata a una generazione già avviata riceve i giorni mancanti al termine
+                workout_day = details["workout_day"]
+                days_sent += 1
+                yield _sse("day", {
+                    "index": details["index"],
+                    "total": details["total"],
+                    "day": workout_day.model_dump(mode="json"),
+                    "html": WorkoutFormatter.format_day(workout_day)
+                })
+            elif stage == "completed":
+                workout_plan = details["workout_plan"]
+                total = len(workout_plan.workout_days)
+                
+                # Parti non ancora inviate (scheda generata in un solo passaggio)
+                if not outline_sent:
+                    yield _sse("outline", {
+                        "title": workout_plan.title,
+                        "days": [{"day": day.day, "focus": day.focus} for day in workout_plan.workout_days],
+                        "html": WorkoutFormatter.format_plan_header(workout_plan.title, workout_plan.user_profile)
+                    })
+                for index, workout_day in enumerate(workout_plan.workout_days[days_sent:], start=days_sent + 1):
+                    yield _sse("day", {
+                        "index": index,
+                        "total": total,
+                        "day": workout_day.model_dump(mode="json"),
+                        "html": WorkoutFormatter.format_day(workout_day)
+                    })
+                    
+                yield _sse("completed", {
+                    "workout_plan": _workout_plan_response(workout_plan).model_dump(mode="json"),
+                    "html": WorkoutFormatter.format_plan_footer(workout_plan),
+                    "chat_id": request.chat_id
+                })
+            elif stage == "failed":
+                logger.error(f"Error in stream_workout_generation: {details['error']}")
+                yield _sse("error", {"message": "Errore nella generazione della scheda"})
+            elif stage != "day_ready":
+                yield _sse("progress", {"stage": stage, **details})
+                
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/workout/generation/stats", response_model=dict)
+async def get_generation_stats(
+    workout_service: WorkoutService = Depends(get_workout_service)
+):
+    """
+    Statistiche sulle richieste identiche contemporanee eseguite una sola volta
+    
+    `coalesced` conta le richieste che hanno atteso una generazione (o una chiamata
+    al modello) identica già in corso invece di ripeterla.
+    """
+    return {
+        "workout_generations": workout_service.get_coalescing_stats(),
+        "llm_calls": workout_service.llm_manager.get_coalescing_stats()
+    }
+
+def _batch_job_response(job: BatchJob) -> BatchJobResponse:
+    """Converte un job batch nello schema di risposta"""
+    return BatchJobResponse(
+        job_id=job.id,
+        status=job.status.value,
+        progress=job.get_progress(),
+        unique_requests=job.unique_requests,
+        items=[
+            {
+                "index": item.index,
+                "member_id": item.member_id,
+                "status": item.status.value,
+                "workout_id": item.workout_id,
+                "title": item.title,
+                "error": item.error,
+                "duplicate_of": item.duplicate_of
+            }
+            for item in job.items
+        ],
+        created_at=job.created_at,
+        completed_at=job.completed_at
+    )
+
+@router.post("/workout/batch", response_model=BatchJobResponse, status_code=202)
+async def generate_workout_batch(
+    request: BatchWorkoutRequest,
+    batch_service: BatchWorkoutService = Depends(get_batch_service)
+):
+    """
+    Accoda la generazione di più schede e restituisce il job da interrogare
+    """
+    try:
+        job = batch_service.submit_batch([item.model_dump() for item in request.items])
+        return _batch_job_response(job)
+        
+    except ChatbotException as e:
+        logger.error(f"Chatbot error in generate_workout_batch: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in generate_workout_batch: {e}")
+        raise HTTPException(status_code=500, detail="Errore interno del server")
+
+@router.get("/workout/batch/{job_id}", response_model=BatchJobResponse)
+async def get_workout_batch(
+    job_id: str,
+    batch_service: BatchWorkoutService = Depends(get_batch_service)
+):
+    """
+    Stato e avanzamento di un job batch
+    """
+    job = batch_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job batch non trovato")
+    return _batch_job_response(job)
+
+def _workout_job_response(job: WorkoutJob) -> WorkoutJobResponse:
+    """Converte un job di generazione nello schema di risposta"""
+    return WorkoutJobResponse(
+        job_id=job.id,
+        status=job.status.value,
+        stage=job.stage,
+        events=[event.model_dump() for event in job.events],
+        workout_plan=_workout_plan_response(job.workout_plan) if job.workout_plan else None,
+        error=job.error,
+        chat_id=job.chat_id,
+        created_at=job.created_at,
+        completed_at=job.completed_at
+    )
+
+@router.get("/workout/jobs/{job_id}", response_model=WorkoutJobResponse)
+async def get_workout_job(
+    job_id: str,
+    job_service: WorkoutJobService = Depends(get_workout_job_service)
+):
+    """
+    Stato, avanzamento e risultato di una generazione in background
+    """
+    job = job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job di generazione non trovato")
+    return _workout_job_response(job)
+
+@router.get("/workout/jobs/{job_id}/events")
+async def stream_workout_job(
+    job_id: str,
+    job_service: WorkoutJobService = Depends(get_workout_job_service)
+):
+    """
+    Avanzamento di una generazione in background come Server-Sent Events
+    
+    Un evento per fase (`event: <fase>`); l'ultimo è `completed`, con la scheda
+    completa, oppure `failed`.
+    """
+    if job_service.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job di generazione non trovato")
+    
+    async def event_stream():
+        async for event in job_service.subscribe(job_id):
+            data = event.model_dump(mode="json")
+            job = job_service.get_job(job_id)
+            if event.stage == "completed" and job and job.workout_plan:
+                data["workout_plan"] = _workout_plan_response(job.workout_plan).model_dump(mode="json")
+            yield f"event: {event.stage}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/workout/list", response_model=WorkoutListResponse)
+async def list_workouts(
+    limit: int = Query(50, ge=1, le=100),
+    workout_service: WorkoutService = Depends(get_workout_service)
+):
+    """
+    Lista tutte le schede di allenamento disponibili
+    """
+    try:
+        workouts = await workout_service.list_workout_plans(limit=limit)
+        
+        return WorkoutListResponse(
+            workouts=[
                 {
-                    "day": day.day,
-                    "focus": day.focus,
-                    "warm_up": day.warm_up,
-                    "exercises": [
-                        {
-                            "name": ex.name,
-                            "sets": ex.sets,
-                            "reps": ex.reps,
-                            "rest": ex.rest,
-                            "weight": ex.weight,
-                            "notes": ex.notes,
-                            "muscle_groups": ex.muscle_groups
-                        }
-                        for ex in day.exercises
-                    ],
-                    "cool_down": day.cool_down,
-                    "duration_minutes": day.duration_minutes
+                    "id": workout["id"],
+                    "title": workout["title"],
+                    "created_at": workout["created_at"],
+                    "total_days": workout["total_days"],
+                    "total_exercises": workout["total_exercises"]
                 }
-                for day in workout_plan.workout_days
+                for workout in workouts
             ],
-            nutrition={
-                "calories_estimate": workout_plan.nutrition.calories_estimate if workout_plan.nutrition else None,
-                "protein_grams": workout_plan.nutrition.protein_grams if workout_plan.nutrition else None,
-                "meal_timing": workout_plan.nutrition.meal_timing if workout_plan.nutrition else [],
-                "hydration": workout_plan.nutrition.hydration if workout_plan.nutrition else None,
-                "supplements": workout_plan.nutrition.supplements if workout_plan.nutrition else []
-            } if workout_plan.nutrition else None,
-            progression={
-                "week_1_2": workout_plan.progression.week_1_2 if workout_plan.progression else "",
-                "week_3_4": workout_plan.progression.week_3_4 if workout_plan.progression else "",
-                "week_5_6": workout_plan.progression.week_5_6 if workout_plan.progression else None,
-                "deload_week": workout_plan.progression.deload_week if workout_plan.progression else None,
-                "progression_notes": workout_plan.progression.progression_notes if workout_plan.progression else []
-            } if workout_plan.progression else None,
-            general_notes=workout_plan.general_notes,
-            sources=workout_plan.sources,
-            created_at=workout_plan.created_at
+            total=len(workouts)
         )
         
+    except ChatbotException as e:
+        logger.error(f"Chatbot error in list_workouts: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in list_workouts: {e}")
+        raise HTTPException(status_code=500, detail="Errore interno del server")
+
+@router.get("/workout/{workout_id}", response_model=WorkoutPlanResponse)
+async def get_workout(
+    workout_id: str,
+    workout_service: WorkoutService = Depends(get_workout_service)
+):
+    """
+    Ottiene i dettagli di una scheda di allenamento specifica
+    """
+    try:
+        workout_plan = await workout_service.get_workout_plan(workout_id)
+        
+        if not workout_plan:
+            raise HTTPException(status_code=404, detail="Scheda di allenamento non trovata")
+        
+        return _workout_plan_response(workout_plan)
+        
     except HTTPException:
         raise
     except ChatbotException as e:
@@ -117,7 +433,7 @@ async def delete_workout(
 @router.post("/workout/{workout_id}/variations", response_model=WorkoutGenerationResponse)
 async def create_workout_variation(
     workout_id: str,
-    variation_type: str = Query(..., description="Tipo di variazione: easier, harder, different_focus"),
+    variation_type: str = Query(..., description="Tipo di variazione: harder, easier, fewer_days, different_exercises (o descrizione libera, es. different_focus)"),
     workout_service: WorkoutService = Depends(get_workout_service)
 ):
     """
@@ -130,49 +446,7 @@ async def create_workout_variation(
         )
         
         # Converti in response schema
-        workout_response = WorkoutPlanResponse(
-            id=variation_workout.id,
-            title=variation_workout.title,
-            workout_days=[
-                {
-                    "day": day.day,
-                    "focus": day.focus,
-                    "warm_up": day.warm_up,
-                    "exercises": [
-                        {
-                            "name": ex.name,
-                            "sets": ex.sets,
-                            "reps": ex.reps,
-                            "rest": ex.rest,
-                            "weight": ex.weight,
-                            "notes": ex.notes,
-                            "muscle_groups": ex.muscle_groups
-                        }
-                        for ex in day.exercises
-                    ],
-                    "cool_down": day.cool_down,
-                    "duration_minutes": day.duration_minutes
-                }
-                for day in variation_workout.workout_days
-            ],
-            nutrition={
-                "calories_estimate": variation_workout.nutrition.calories_estimate if variation_workout.nutrition else None,
-                "protein_grams": variation_workout.nutrition.protein_grams if variation_workout.nutrition else None,
-                "meal_timing": variation_workout.nutrition.meal_timing if variation_workout.nutrition else [],
-                "hydration": variation_workout.nutrition.hydration if variation_workout.nutrition else None,
-                "supplements": variation_workout.nutrition.supplements if variation_workout.nutrition else []
-            } if variation_workout.nutrition else None,
-            progression={
-                "week_1_2": variation_workout.progression.week_1_2 if variation_workout.progression else "",
-                "week_3_4": variation_workout.progression.week_3_4 if variation_workout.progression else "",
-                "week_5_6": variation_workout.progression.week_5_6 if variation_workout.progression else None,
-                "deload_week": variation_workout.progression.deload_week if variation_workout.progression else None,
-                "progression_notes": variation_workout.progression.progression_notes if variation_workout.progression else []
-            } if variation_workout.progression else None,
-            general_notes=variation_workout.general_notes,
-            sources=variation_workout.sources,
-            created_at=variation_workout.created_at
-        )
+        workout_response = _workout_plan_response(variation_workout)
         
         return WorkoutGenerationResponse(
             success=True,
@@ -232,119 +506,4 @@ async def get_workout_recommendations(
             "success": False,
             "recommendations": [],
             "message": "Errore interno nel recupero delle raccomandazioni"
-        }plan.progression else "",
-                "week_5_6": workout_plan.progression.week_5_6 if workout_plan.progression else None,
-                "deload_week": workout_plan.progression.deload_week if workout_plan.progression else None,
-                "progression_notes": workout_plan.progression.progression_notes if workout_plan.progression else []
-            } if workout_plan.progression else None,
-            general_notes=workout_plan.general_notes,
-            sources=workout_plan.sources,
-            created_at=workout_plan.created_at
-        )
-        
-        return WorkoutGenerationResponse(
-            success=True,
-            workout_plan=workout_response,
-            message="Scheda di allenamento generata con successo!",
-            chat_id=request.chat_id
-        )
-        
-    except ChatbotException as e:
-        logger.error(f"Chatbot error in generate_workout: {e}")
-        return WorkoutGenerationResponse(
-            success=False,
-            workout_plan=None,
-            message=f"Errore nella generazione della scheda: {str(e)}",
-            chat_id=request.chat_id
-        )
-    except Exception as e:
-        logger.error(f"Unexpected error in generate_workout: {e}")
-        return WorkoutGenerationResponse(
-            success=False,
-            workout_plan=None,
-            message="Errore interno nella generazione della scheda",
-            chat_id=request.chat_id
-        )
-
-@router.get("/workout/list", response_model=WorkoutListResponse)
-async def list_workouts(
-    limit: int = Query(50, ge=1, le=100),
-    workout_service: WorkoutService = Depends(get_workout_service)
-):
-    """
-    Lista tutte le schede di allenamento disponibili
-    """
-    try:
-        workouts = await workout_service.list_workout_plans(limit=limit)
-        
-        return WorkoutListResponse(
-            workouts=[
-                {
-                    "id": workout["id"],
-                    "title": workout["title"],
-                    "created_at": workout["created_at"],
-                    "total_days": workout["total_days"],
-                    "total_exercises": workout["total_exercises"]
-                }
-                for workout in workouts
-            ],
-            total=len(workouts)
-        )
-        
-    except ChatbotException as e:
-        logger.error(f"Chatbot error in list_workouts: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-    except Exception as e:
-        logger.error(f"Unexpected error in list_workouts: {e}")
-        raise HTTPException(status_code=500, detail="Errore interno del server")
-
-@router.get("/workout/{workout_id}", response_model=WorkoutPlanResponse)
-async def get_workout(
-    workout_id: str,
-    workout_service: WorkoutService = Depends(get_workout_service)
-):
-    """
-    Ottiene i dettagli di una scheda di allenamento specifica
-    """
-    try:
-        workout_plan = await workout_service.get_workout_plan(workout_id)
-        
-        if not workout_plan:
-            raise HTTPException(status_code=404, detail="Scheda di allenamento non trovata")
-        
-        # Converti in response schema (stesso codice del generate_workout)
-        return WorkoutPlanResponse(
-            id=workout_plan.id,
-            title=workout_plan.title,
-            workout_days=[
-                {
-                    "day": day.day,
-                    "focus": day.focus,
-                    "warm_up": day.warm_up,
-                    "exercises": [
-                        {
-                            "name": ex.name,
-                            "sets": ex.sets,
-                            "reps": ex.reps,
-                            "rest": ex.rest,
-                            "weight": ex.weight,
-                            "notes": ex.notes,
-                            "muscle_groups": ex.muscle_groups
-                        }
-                        for ex in day.exercises
-                    ],
-                    "cool_down": day.cool_down,
-                    "duration_minutes": day.duration_minutes
-                }
-                for day in workout_plan.workout_days
-            ],
-            nutrition={
-                "calories_estimate": workout_plan.nutrition.calories_estimate if workout_plan.nutrition else None,
-                "protein_grams": workout_plan.nutrition.protein_grams if workout_plan.nutrition else None,
-                "meal_timing": workout_plan.nutrition.meal_timing if workout_plan.nutrition else [],
-                "hydration": workout_plan.nutrition.hydration if workout_plan.nutrition else None,
-                "supplements": workout_plan.nutrition.supplements if workout_plan.nutrition else []
-            } if workout_plan.nutrition else None,
-            progression={
-                "week_1_2": workout_plan.progression.week_1_2 if workout_plan.progression else "",
-                "week_3_4": workout_plan.progression.week_3_4 if workout_
+        }
@@ -16,8 +16,21 @@ class Settings:
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4-turbo-preview")
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    # Dimensione ridotta degli embeddings text-embedding-3-* (0 = dimensione piena del modello)
+    EMBEDDING_DIMENSIONS: int = int(os.getenv("EMBEDDING_DIMENSIONS", "0"))
+    # Backend degli embeddings: openai (API) o local (modello sentence-transformers su CPU)
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "openai")
+    # Directory del modello locale, runtime (torch o onnx) e prefisso delle query (es. "query: " per e5)
+    LOCAL_EMBEDDING_MODEL_PATH: str = os.getenv("LOCAL_EMBEDDING_MODEL_PATH", "")
+    LOCAL_EMBEDDING_RUNTIME: str = os.getenv("LOCAL_EMBEDDING_RUNTIME", "torch")
+    LOCAL_EMBEDDING_QUERY_PREFIX: str = os.getenv("LOCAL_EMBEDDING_QUERY_PREFIX", "")
+    # Testi per blocco di inferenza e thread usati (0 = tutti i core)
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    EMBEDDING_THREADS: int = int(os.getenv("EMBEDDING_THREADS", "0"))
     MAX_TOKENS: int = int(os.getenv("MAX_TOKENS", "4000"))
     TEMPERATURE: float = float(os.getenv("TEMPERATURE", "0.3"))
+    # Output strutturato per le risposte JSON: json_schema, json_object o off
+    STRUCTURED_OUTPUT_MODE: str = os.getenv("STRUCTURED_OUTPUT_MODE", "json_schema")
     
     # Application Settings
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
@@ -30,6 +43,7 @@ class Settings:
     VECTOR_STORE_PATH: Path = BASE_DIR / "app" / "data" / "indexes"
     CHATS_PATH: Path = BASE_DIR / "app" / "data" / "chats"
     WORKOUTS_PATH: Path = BASE_DIR / "app" / "data" / "workouts"
+    PLAN_LIBRARY_PATH: Path = BASE_DIR / "app" / "data" / "plan_library"
     
     # Supporti file type
     SUPPORTED_EXTENSIONS: list[str] = [".pdf", ".docx", ".txt"]
@@ -37,8 +51,88 @@ class Settings:
     # RAG Settings
     CHUNK_SIZE: int = 1024
     CHUNK_OVERLAP: int = 200
+    # Suddivisione: structure (titoli e tabelle) o sentence (solo per frasi)
+    CHUNKING_MODE: str = os.getenv("CHUNKING_MODE", "structure")
+    # Frazione delle pagine di un file oltre cui una riga di testa o di piede viene rimossa (0 = disattivato)
+    PAGE_FURNITURE_MIN_RATIO: float = float(os.getenv("PAGE_FURNITURE_MIN_RATIO", "0.5"))
+    # Frammenti quasi duplicati (SimHash entro CHUNK_DEDUP_MAX_DISTANCE bit) scartati prima degli embeddings
+    CHUNK_DEDUP_ENABLED: bool = os.getenv("CHUNK_DEDUP_ENABLED", "True").lower() == "true"
+    CHUNK_DEDUP_MAX_DISTANCE: int = int(os.getenv("CHUNK_DEDUP_MAX_DISTANCE", "3"))
     TOP_K_DOCUMENTS: int = 5
     SIMILARITY_THRESHOLD: float = 0.7
+    # Recupero ibrido: indice lessicale BM25 affiancato a quello vettoriale, classifiche fuse con RRF
+    HYBRID_RETRIEVAL_ENABLED: bool = os.getenv("HYBRID_RETRIEVAL_ENABLED", "True").lower() == "true"
+    # Candidati recuperati da ciascun indice prima della fusione
+    HYBRID_CANDIDATES: int = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    # Costante k della Reciprocal Rank Fusion
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    # Indice approssimato (IVF) al posto della ricerca esatta sui corpus grandi
+    ANN_INDEX_ENABLED: bool = os.getenv("ANN_INDEX_ENABLED", "False").lower() == "true"
+    # Vettori minimi per usare l'indice approssimato
+    ANN_MIN_VECTORS: int = int(os.getenv("ANN_MIN_VECTORS", "10000"))
+    # Liste dell'indice (0 = automatico, circa 4·√n) e liste esplorate per ogni ricerca
+    ANN_LISTS: int = int(os.getenv("ANN_LISTS", "0"))
+    ANN_PROBES: int = int(os.getenv("ANN_PROBES", "32"))
+    # Quantizzazione dei vettori in memoria (none, int8, pq) con riclassificazione float32 dei candidati
+    VECTOR_QUANTIZATION: str = os.getenv("VECTOR_QUANTIZATION", "none")
+    # Candidati riclassificati per ogni risultato e sottovettori della product quantization
+    QUANTIZATION_RERANK: int = int(os.getenv("QUANTIZATION_RERANK", "10"))
+    PQ_SUBVECTORS: int = int(os.getenv("PQ_SUBVECTORS", "96"))
+    # Recupero in due fasi: RERANK_CANDIDATES frammenti senza soglia di similarità,
+    # riclassificati (lexical o cross_encoder locale) e ridotti a RERANK_TOP_K
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "False").lower() == "true"
+    RERANKER: str = os.getenv("RERANKER", "lexical")
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "30"))
+    RERANK_TOP_K: int = int(os.getenv("RERANK_TOP_K", "3"))
+    # Pertinenza minima (0-1) dopo la riclassificazione, al posto di SIMILARITY_THRESHOLD
+    RERANK_MIN_SCORE: float = float(os.getenv("RERANK_MIN_SCORE", "0.1"))
+    # Directory locale del modello cross-encoder (RERANKER=cross_encoder)
+    RERANK_MODEL_PATH: str = os.getenv("RERANK_MODEL_PATH", "")
+    # Formato di caricamento dell'indice: binary (generazioni mappate in memoria in indexes/shared,
+    # condivise tra i worker, testo dei nodi letto su richiesta) o json (docstore e vector store llama-index)
+    INDEX_FORMAT: str = os.getenv("INDEX_FORMAT", "binary")
+    # Secondi tra due controlli della generazione pubblicata da un altro processo
+    SHARED_INDEX_CHECK_INTERVAL: float = float(os.getenv("SHARED_INDEX_CHECK_INTERVAL", "2"))
+    
+    # Workout Generation Settings
+    # standard: una risposta testuale; multi_stage: struttura, giorni, nutrizione e progressione
+    # in chiamate separate; single_shot: l'intera scheda in un'unica chiamata con schema JSON
+    WORKOUT_GENERATION_MODE: str = os.getenv("WORKOUT_GENERATION_MODE", "standard")
+    # Frammenti RAG inclusi nel contesto di ogni fase (giorno, nutrizione, progressione)
+    STAGE_CONTEXT_CHUNKS: int = int(os.getenv("STAGE_CONTEXT_CHUNKS", "3"))
+    # Profili standard (principiante/intermedio, 2-5 giorni) generati da template senza LLM
+    TEMPLATE_ENGINE_ENABLED: bool = os.getenv("TEMPLATE_ENGINE_ENABLED", "True").lower() == "true"
+    # Schede pregenerate offline (build_plan_library.py) servite per firma del profilo
+    PLAN_LIBRARY_ENABLED: bool = os.getenv("PLAN_LIBRARY_ENABLED", "True").lower() == "true"
+    # Variazioni incrementali: il modello rielabora solo i giorni uniti o con esercizi fuori catalogo
+    VARIATION_LLM_REFINEMENT: bool = os.getenv("VARIATION_LLM_REFINEMENT", "True").lower() == "true"
+    
+    # Richieste identiche contemporanee (chiamate al modello e generazioni di schede) eseguite una sola volta
+    SINGLE_FLIGHT_ENABLED: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "True").lower() == "true"
+    
+    # Batch Generation Settings
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+    BATCH_MAX_JOBS: int = int(os.getenv("BATCH_MAX_JOBS", "100"))
+    
+    # Background Job Settings (POST /workout/generate?background=true)
+    WORKOUT_JOB_CONCURRENCY: int = int(os.getenv("WORKOUT_JOB_CONCURRENCY", "4"))
+    WORKOUT_JOB_MAX_JOBS: int = int(os.getenv("WORKOUT_JOB_MAX_JOBS", "200"))
+    
+    # Chat Cache Settings
+    CHAT_CACHE_SIZE: int = int(os.getenv("CHAT_CACHE_SIZE", "256"))
+    CHAT_FLUSH_INTERVAL: float = float(os.getenv("CHAT_FLUSH_INTERVAL", "5"))
+    
+    # Prompt Budget Settings
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+    HISTORY_MAX_MESSAGES: int = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))
+    HISTORY_MESSAGE_MAX_TOKENS: int = int(os.getenv("HISTORY_MESSAGE_MAX_TOKENS", "800"))
+    
+    # Chat Summary Settings
+    CHAT_SUMMARY_THRESHOLD: int = int(os.getenv("CHAT_SUMMARY_THRESHOLD", "12"))
+    CHAT_SUMMARY_KEEP_RECENT: int = int(os.getenv("CHAT_SUMMARY_KEEP_RECENT", "6"))
+    CHAT_SUMMARY_MAX_TOKENS: int = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "400"))
     
     def __post_init__(self):
         """Crea le directory necessarie"""
@@ -52,6 +146,26 @@ class Settings:
         """Valida le configurazioni essenziali"""
         if not self.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY non configurata nel file .env")
+        if self.EMBEDDING_DIMENSIONS < 0:
+            raise ValueError("EMBEDDING_DIMENSIONS deve essere positivo (0 = dimensione piena)")
+        if self.EMBEDDING_BACKEND not in ("openai", "local"):
+            raise ValueError(f"EMBEDDING_BACKEND non valido: {self.EMBEDDING_BACKEND} (valori ammessi: openai, local)")
+        if self.EMBEDDING_BACKEND == "local" and not self.LOCAL_EMBEDDING_MODEL_PATH:
+            raise ValueError("LOCAL_EMBEDDING_MODEL_PATH non configurato per EMBEDDING_BACKEND=local")
+        if (
+            self.EMBEDDING_BACKEND == "openai"
+            and self.EMBEDDING_DIMENSIONS
+            and not self.EMBEDDING_MODEL.startswith("text-embedding-3")
+        ):
+            raise ValueError(f"EMBEDDING_DIMENSIONS non è supportato dal modello {self.EMBEDDING_MODEL}")
+        if self.CHUNKING_MODE not in ("structure", "sentence"):
+            raise ValueError(f"CHUNKING_MODE non valido: {self.CHUNKING_MODE} (valori ammessi: structure, sentence)")
+        if self.RERANKER not in ("lexical", "cross_encoder"):
+            raise ValueError(f"RERANKER non valido: {self.RERANKER} (valori ammessi: lexical, cross_encoder)")
+        if self.RERANK_ENABLED and self.RERANKER == "cross_encoder" and not self.RERANK_MODEL_PATH:
+            raise ValueError("RERANK_MODEL_PATH non configurato per RERANKER=cross_encoder")
+        if not 0 <= self.RERANK_MIN_SCORE <= 1:
+            raise ValueError("RERANK_MIN_SCORE deve essere compreso tra 0 e 1")
         return True
 
 # Istanza globale delle configurazioni
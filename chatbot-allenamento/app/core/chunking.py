@@ -0,0 +1,457 @@
+"""
+Suddivisione dei documenti in frammenti: intestazioni di pagina, struttura e quasi duplicati
+"""
+
+import hashlib
+import logging
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.node_parser.interface import NodeParser
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode, Document, TransformComponent
+from llama_index.core.utils import get_tokenizer, get_tqdm_iterable
+from pydantic import PrivateAttr
+from app.core.sparse_index import analyze
+from app.core.token_budget import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+CHUNKING_MODES = ("structure", "sentence")
+
+# Righe iniziali e finali di ogni pagina in cui si cercano intestazioni, piè di pagina e numeri
+_EDGE_LINES = 3
+# Pagine minime di un file perché una riga ripetuta sia considerata intestazione o piè di pagina
+_MIN_FURNITURE_PAGES = 3
+# Numero di pagina: con prefisso ("pag. 12", "p. 12"), nella forma "12 di 40" o "12/40", o da solo sulla riga
+_PAGE_NUMBER = re.compile(r"(?:\b(?:pagina|pag\.?|p\.)\s*)?\b(\d{1,4})\b(?:\s*(?:di|/)\s*\d{1,4}\b)?", re.IGNORECASE)
+
+_MARKDOWN_HEADING = re.compile(r"^#{1,6}\s+\S")
+_NUMBERED_HEADING = re.compile(r"^\d{1,2}(\.\d{1,2})*[.)]?\s+[A-ZÀ-Ý]")
+_COLUMN_GAP = re.compile(r"(?<=\S)(?:\t+| {3,})(?=\S)")
+_HEADING_MAX_CHARS = 80
+_HEADING_MAX_WORDS = 10
+
+# Termini minimi per confrontare due frammenti con SimHash (sotto conta solo l'uguaglianza esatta)
+_MIN_SIMHASH_TERMS = 8
+_SIMHASH_BITS = 64
+
+def _furniture_key(line: str, ordinal: int) -> str:
+    """
+    Forma normalizzata di una riga di testa o di piede
+    
+    Il numero di pagina viene sostituito dalla sua differenza con la posizione
+    della pagina nel file: "pag. 12" e "pag. 13" su pagine consecutive hanno la
+    stessa chiave, mentre gli altri numeri ("Serie: 4 x 8") devono coincidere esattamente.
+    
+    Args:
+        line: Riga della pagina
+        ordinal: Posizione della pagina tra quelle del file
+        
+    Returns:
+        Chiave confrontata tra le pagine del file
+    """
+    text = " ".join(line.lower().split())
+    for match in _PAGE_NUMBER.finditer(text):
+        if match.group(0) != match.group(1) or match.group(0) == text:
+            return f"{text[:match.start()]}<pagina{int(match.group(1)) - ordinal:+d}>{text[match.end():]}"
+    return text
+
+def _edge_lines(lines: List[str]) -> List[int]:
+    """Posizioni delle prime e ultime righe non vuote di una pagina"""
+    filled = [position for position, line in enumerate(lines) if line.strip()]
+    return sorted(set(filled[:_EDGE_LINES] + filled[-_EDGE_LINES:]))
+
+def strip_page_furniture(documents: Sequence[Document], min_ratio: float) -> Tuple[List[Document], List[str]]:
+    """
+    Rimuove intestazioni, piè di pagina e numeri di pagina ripetuti
+    
+    I lettori PDF producono un documento per pagina: una riga in testa o in piede
+    che ricorre identica in almeno `min_ratio` delle pagine dello stesso file, a
+    meno di un numero di pagina che avanza con le pagine (es. "Manuale di
+    allenamento - pag. 12"), non è contenuto e finirebbe in ogni frammento.
+    
+    Args:
+        documents: Documenti da ripulire (non vengono modificati)
+        min_ratio: Frazione minima delle pagine del file in cui la riga deve comparire
+        
+    Returns:
+        Documenti ripuliti, nello stesso ordine, e righe rimosse
+    """
+    pages_by_file: Dict[str, List[int]] = defaultdict(list)
+    for position, document in enumerate(documents):
+        key = document.metadata.get("file_path") or document.metadata.get("filename")
+        if key:
+            pages_by_file[key].append(position)
+            
+    result = list(documents)
+    removed: List[str] = []
+    for positions in pages_by_file.values():
+        if len(positions) < _MIN_FURNITURE_PAGES:
+            continue
+        pages = [documents[position].get_content().split("\n") for position in positions]
+        keys = [
+            {line: _furniture_key(lines[line], ordinal) for line in _edge_lines(lines)}
+            for ordinal, lines in enumerate(pages)
+        ]
+        counts = Counter()
+        for page_keys in keys:
+            counts.update(set(page_keys.values()))
+        threshold = max(_MIN_FURNITURE_PAGES, min_ratio * len(positions))
+        furniture = {key for key, count in counts.items() if count >= threshold}
+        
+        for position, lines, page_keys in zip(positions, pages, keys):
+            drop = {line for line, key in page_keys.items() if key in furniture}
+            if not drop:
+                continue
+            removed.extend(lines[line] for line in sorted(drop))
+            document = documents[position].model_copy()
+            document.set_content("\n".join(text for line, text in enumerate(lines) if line not in drop))
+            result[position] = document
+    return result, removed
+
+def _is_heading(line: str) -> bool:
+    """Titolo markdown, numerato (es. "2.1 Riscaldamento") o tutto maiuscolo e breve"""
+    if _MARKDOWN_HEADING.match(line):
+        return True
+    if len(line) > _HEADING_MAX_CHARS or len(line.split()) > _HEADING_MAX_WORDS or line[-1] in ".,;:!?":
+        return False
+    if _NUMBERED_HEADING.match(line):
+        return True
+    letters = [char for char in line if char.isalpha()]
+    return len(letters) >= 3 and all(char.isupper() for char in letters)
+
+def _is_table_row(line: str) -> bool:
+    """Riga a colonne: celle separate da | o da tabulazioni e spazi multipli"""
+    return line.count("|") >= 2 or len(_COLUMN_GAP.findall(line)) >= 2
+
+class StructureAwareSplitter(NodeParser):
+    """
+    Suddivisione che segue titoli e tabelle del documento
+    
+    Ogni titolo apre una sezione e le righe a colonne consecutive formano una
+    tabella: una sezione che sta in `chunk_size` token resta un frammento, le
+    sezioni più lunghe vengono divise per frasi (SentenceSplitter) ripetendo il
+    titolo e le tabelle per gruppi di righe ripetendo l'intestazione. Le sezioni
+    brevi consecutive vengono unite finché il frammento resta sotto metà di `chunk_size`.
+    """
+    
+    chunk_size: int = 1024
+    chunk_overlap: int = 200
+    
+    _sentence_splitters: Dict[int, SentenceSplitter] = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+    
+    def __init__(self, chunk_size: int = 1024, chunk_overlap: int = 200, **kwargs: Any):
+        """
+        Args:
+            chunk_size: Token massimi per frammento
+            chunk_overlap: Token sovrapposti tra i frammenti di una sezione lunga
+        """
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+        self._sentence_splitters = {}
+        self._tokenizer = get_tokenizer()
+    
+    @classmethod
+    def class_name(cls) -> str:
+        return "StructureAwareSplitter"
+    
+    def _tokens(self, text: str) -> int:
+        return len(self._tokenizer(text))
+    
+    def _blocks(self, text: str) -> List[Tuple[str, str]]:
+        """Titoli, tabelle (almeno due righe a colonne consecutive) e testo, nell'ordine del documento"""
+        lines = text.split("\n")
+        kinds = []
+        for line in lines:
+            stripped = line.strip()
+            if not stripped:
+                kinds.append("text")
+            elif _is_heading(stripped):
+                kinds.append("heading")
+            else:
+                kinds.append("table" if _is_table_row(stripped) else "text")
+        # Una riga a colonne isolata è testo
+        for position, kind in enumerate(kinds):
+            if kind == "table" and "table" not in kinds[max(position - 1, 0):position] + kinds[position + 1:position + 2]:
+                kinds[position] = "text"
+                
+        blocks: List[Tuple[str, List[str]]] = []
+        for kind, line in zip(kinds, lines):
+            if kind == "heading" or not blocks or blocks[-1][0] != kind:
+                blocks.append((kind, [line]))
+            else:
+                blocks[-1][1].append(line)
+        return [(kind, "\n".join(block)) for kind, block in blocks if "".join(block).strip()]
+    
+    def _sentence_splitter(self, budget: int) -> SentenceSplitter:
+        """Suddivisione per frasi in parti di al massimo `budget` token (una per budget)"""
+        if budget not in self._sentence_splitters:
+            self._sentence_splitters[budget] = SentenceSplitter(
+                chunk_size=budget, chunk_overlap=min(self.chunk_overlap, budget // 2)
+            )
+        return self._sentence_splitters[budget]
+    
+    def _split_table(self, table: str, budget: int) -> List[str]:
+        """Divide una tabella lunga in gruppi di righe entro `budget` token, ripetendo l'intestazione"""
+        header, *rows = table.split("\n")
+        pieces, current = [], [header]
+        for row in rows:
+            if len(current) > 1 and self._tokens("\n".join(current + [row])) > budget:
+                pieces.append("\n".join(current))
+                current = [header]
+            current.append(row)
+        pieces.append("\n".join(current))
+        return pieces
+    
+    def _split_section(self, section: List[Tuple[str, str]]) -> List[str]:
+        """Frammenti di una sezione (titolo e blocchi seguenti)"""
+        text = "\n".join(block for _, block in section)
+        if self._tokens(text) <= self.chunk_size:
+            return [text]
+            
+        heading = section[0][1] if section[0][0] == "heading" else ""
+        # Token lasciati alle parti dopo il titolo ripetuto e il suo a capo
+        budget = max(self.chunk_size - self._tokens(f"{heading}\n") if heading else self.chunk_size, 1)
+        pieces = []
+        for kind, block in section:
+            if kind == "heading":
+                continue
+            if kind == "table":
+                parts = [block] if self._tokens(block) <= budget else self._split_table(block, budget)
+            else:
+                parts = self._sentence_splitter(budget).split_text(block)
+            # Il titolo resta con ogni parte: i frammenti di una sezione lunga non perdono l'argomento
+            pieces.extend(f"{heading}\n{part}" if heading else part for part in parts)
+        return pieces
+    
+    def split_text(self, text: str) -> List[str]:
+        """
+        Divide un testo in frammenti seguendone la struttura
+        
+        Args:
+            text: Testo del documento
+            
+        Returns:
+            Testi dei frammenti
+        """
+        sections: List[List[Tuple[str, str]]] = []
+        for kind, block in self._blocks(text):
+            if kind == "heading" or not sections:
+                sections.append([])
+            sections[-1].append((kind, block))
+            
+        chunks: List[str] = []
+        sizes: List[int] = []
+        for section in sections:
+            for piece in self._split_section(section):
+                if chunks and sizes[-1] < self.chunk_size // 2:
+                    # Il conteggio dell'unione include il separatore tra i due frammenti
+                    merged = f"{chunks[-1]}\n{piece}"
+                    merged_size = self._tokens(merged)
+                    if merged_size <= self.chunk_size:
+                        chunks[-1] = merged
+                        sizes[-1] = merged_size
+                        continue
+                chunks.append(piece)
+                sizes.append(self._tokens(piece))
+        return chunks
+    
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> List[BaseNode]:
+        all_nodes: List[BaseNode] = []
+        for node in get_tqdm_iterable(nodes, show_progress, "Suddivisione per struttura"):
+            splits = self.split_text(node.get_content())
+            all_nodes.extend(build_nodes_from_splits(splits, node, id_func=self.id_func))
+        return all_nodes
+
+def simhash(text: str) -> Optional[int]:
+    """
+    Impronta SimHash a 64 bit dei trigrammi di termini del testo
+    
+    Testi quasi uguali (stesso paragrafo con un numero o una parola diversi)
+    hanno impronte che differiscono in pochi bit.
+    
+    Args:
+        text: Testo del frammento
+        
+    Returns:
+        Impronta o None se il testo ha troppo pochi termini per un confronto affidabile
+    """
+    terms = analyze(text)
+    if len(terms) < _MIN_SIMHASH_TERMS:
+        return None
+    shingles = {" ".join(terms[i:i + 3]) for i in range(len(terms) - 2)}
+    hashes = np.array([
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for shingle in shingles
+    ], dtype=np.uint64)
+    bits = (hashes[:, None] >> np.arange(_SIMHASH_BITS, dtype=np.uint64)) & np.uint64(1)
+    majority = np.flatnonzero(bits.sum(axis=0) * 2 > len(hashes))
+    return sum(1 << int(bit) for bit in majority)
+
+class NearDuplicateFilter:
+    """
+    Riconosce i frammenti uguali o quasi uguali a uno già accettato
+    
+    Le impronte sono divise in bande: due impronte entro `max_distance` bit
+    hanno almeno una banda identica, quindi si confrontano solo quelle che
+    condividono una banda invece di tutte le coppie.
+    """
+    
+    def __init__(self, max_distance: int = 3):
+        """
+        Args:
+            max_distance: Bit diversi al massimo tra due impronte considerate duplicate
+        """
+        self.max_distance = max_distance
+        self.bands = max(4, max_distance + 1)
+        self._band_bits = _SIMHASH_BITS // self.bands
+        self._exact: set = set()
+        self._buckets: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    
+    def _band_keys(self, fingerprint: int) -> List[Tuple[int, int]]:
+        mask = (1 << self._band_bits) - 1
+        return [(band, (fingerprint >> (band * self._band_bits)) & mask) for band in range(self.bands)]
+    
+    def is_duplicate(self, text: str) -> bool:
+        """
+        Verifica se il testo duplica un frammento accettato; altrimenti lo accetta
+        
+        Args:
+            text: Testo del frammento
+            
+        Returns:
+            True se il frammento va scartato
+        """
+        normalized = hashlib.blake2b(" ".join(text.lower().split()).encode("utf-8"), digest_size=16).digest()
+        if normalized in self._exact:
+            return True
+            
+        fingerprint = simhash(text)
+        if fingerprint is not None:
+            keys = self._band_keys(fingerprint)
+            for key in keys:
+                for other in self._buckets.get(key, ()):
+                    if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                        return True
+            for key in keys:
+                self._buckets[key].append(fingerprint)
+        self._exact.add(normalized)
+        return False
+
+_STATS_KEYS = (
+    "batches", "documents", "furniture_lines_removed", "chunks_before_dedup",
+    "duplicate_chunks_removed", "chunks", "embedded_tokens", "tokens_saved"
+)
+
+class ChunkingPipeline(TransformComponent):
+    """
+    Dai documenti ai frammenti da indicizzare
+    
+    Rimuove intestazioni e piè di pagina ripetuti, divide i documenti con lo
+    splitter configurato e scarta i frammenti quasi duplicati prima che vengano
+    calcolati gli embeddings. Le impronte dei frammenti accettati restano tra un
+    caricamento e l'altro, così i documenti aggiunti vengono confrontati anche con
+    quelli già indicizzati; le statistiche sommano tutti i caricamenti dall'ultimo `reset`.
+    """
+    
+    splitter: NodeParser
+    furniture_min_ratio: float = 0.5
+    dedup: bool = True
+    dedup_max_distance: int = 3
+    token_model: Optional[str] = None
+    
+    _token_counter: TokenCounter = PrivateAttr()
+    _seen: NearDuplicateFilter = PrivateAttr()
+    _stats: Dict[str, int] = PrivateAttr()
+    
+    def __init__(
+        self,
+        splitter: NodeParser,
+        furniture_min_ratio: float = 0.5,
+        dedup: bool = True,
+        dedup_max_distance: int = 3,
+        token_model: Optional[str] = None,
+        **kwargs: Any
+    ):
+        """
+        Args:
+            splitter: Suddivisione dei documenti (StructureAwareSplitter o SentenceSplitter)
+            furniture_min_ratio: Frazione delle pagine di un file oltre cui una riga di testa
+                o di piede viene rimossa (0 = nessuna rimozione)
+            dedup: Scarta i frammenti quasi duplicati
+            dedup_max_distance: Bit diversi al massimo tra impronte SimHash duplicate
+            token_model: Modello del cui tokenizer si contano i token risparmiati
+        """
+        super().__init__(
+            splitter=splitter,
+            furniture_min_ratio=furniture_min_ratio,
+            dedup=dedup,
+            dedup_max_distance=dedup_max_distance,
+            token_model=token_model,
+            **kwargs
+        )
+        self._token_counter = TokenCounter(token_model)
+        self.reset()
+    
+    def reset(self, indexed_texts: Iterable[str] = ()) -> None:
+        """
+        Riparte da un indice: azzera le statistiche e le impronte dei frammenti
+        
+        Args:
+            indexed_texts: Testi dei frammenti già presenti nell'indice, contro cui
+                deduplicare i prossimi caricamenti
+        """
+        self._seen = NearDuplicateFilter(self.dedup_max_distance)
+        if self.dedup:
+            for text in indexed_texts:
+                self._seen.is_duplicate(text)
+        self._stats = dict.fromkeys(_STATS_KEYS, 0)
+    
+    def __call__(self, nodes: Sequence[BaseNode], **kwargs: Any) -> Sequence[BaseNode]:
+        documents = list(nodes)
+        removed_lines: List[str] = []
+        if self.furniture_min_ratio > 0:
+            documents, removed_lines = strip_page_furniture(documents, self.furniture_min_ratio)
+            
+        chunks = self.splitter(documents, **kwargs)
+        kept, duplicates = chunks, []
+        if self.dedup:
+            kept = []
+            for chunk in chunks:
+                (duplicates if self._seen.is_duplicate(chunk.get_content()) else kept).append(chunk)
+                
+        count = self._token_counter.count
+        batch = {
+            "batches": 1,
+            "documents": len(documents),
+            "furniture_lines_removed": len(removed_lines),
+            "chunks_before_dedup": len(chunks),
+            "duplicate_chunks_removed": len(duplicates),
+            "chunks": len(kept),
+            "embedded_tokens": sum(count(chunk.get_content()) for chunk in kept),
+            "tokens_saved": (
+                sum(count(line) for line in removed_lines)
+                + sum(count(chunk.get_content()) for chunk in duplicates)
+            )
+        }
+        for key, value in batch.items():
+            self._stats[key] += value
+        logger.info(
+            f"Suddivisione: {len(kept)} frammenti da {len(documents)} documenti "
+            f"({len(removed_lines)} righe di intestazione/piè di pagina e {len(duplicates)} "
+            f"frammenti duplicati rimossi, {batch['tokens_saved']} token risparmiati)"
+        )
+        return kept
+    
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Ottiene le statistiche delle suddivisioni dall'ultimo reset
+        
+        Returns:
+            Caricamenti, documenti, righe rimosse, frammenti prima e dopo la
+            deduplicazione, token dei frammenti indicizzati e token risparmiati
+        """
+        return dict(self._stats)
@@ -0,0 +1,151 @@
+"""
+Riassunto progressivo delle conversazioni lunghe
+"""
+
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from app.config import settings
+from app.models.chat import Chat, MessageRole, MessageType
+from app.core.llm_manager import LLMManager
+from app.core.token_budget import TokenCounter
+from app.utils.prompt_templates import PromptTemplates
+
+logger = logging.getLogger(__name__)
+
+# Chiave dei metadati della chat in cui è memorizzato il riassunto
+SUMMARY_METADATA_KEY = "summary"
+
+# Token massimi di ciascun messaggio passato al modello per il riassunto
+SUMMARY_INPUT_MESSAGE_TOKENS = 300
+
+class ConversationSummarizer:
+    """Condensa i turni più vecchi di una chat in un riassunto incrementale"""
+    
+    def __init__(
+        self,
+        llm_manager: LLMManager,
+        token_counter: Optional[TokenCounter] = None,
+        threshold: Optional[int] = None,
+        keep_recent: Optional[int] = None,
+        max_tokens: Optional[int] = None
+    ):
+        """
+        Args:
+            llm_manager: Gestore LLM usato per generare il riassunto
+            token_counter: Contatore di token per troncare i messaggi lunghi
+            threshold: Numero di messaggi oltre il quale la chat viene riassunta (0 disabilita)
+            keep_recent: Messaggi più recenti sempre inviati per intero
+            max_tokens: Token massimi del riassunto
+        """
+        self.llm_manager = llm_manager
+        self.token_counter = token_counter or TokenCounter()
+        self.threshold = settings.CHAT_SUMMARY_THRESHOLD if threshold is None else threshold
+        self.keep_recent = settings.CHAT_SUMMARY_KEEP_RECENT if keep_recent is None else keep_recent
+        self.max_tokens = max_tokens or settings.CHAT_SUMMARY_MAX_TOKENS
+        self.prompt_templates = PromptTemplates()
+    
+    @property
+    def enabled(self) -> bool:
+        """Indica se il riassunto delle chat è attivo"""
+        return self.threshold > 0
+    
+    @staticmethod
+    def get_summary(chat: Chat) -> Optional[str]:
+        """Restituisce il testo del riassunto della chat, se presente"""
+        state = (chat.metadata or {}).get(SUMMARY_METADATA_KEY) or {}
+        return state.get("text") or None
+    
+    @staticmethod
+    def get_summarized_count(chat: Chat) -> int:
+        """Restituisce il numero di messaggi iniziali già inclusi nel riassunto"""
+        state = (chat.metadata or {}).get(SUMMARY_METADATA_KEY) or {}
+        return min(state.get("summarized_messages", 0), len(chat.messages))
+    
+    def needs_update(self, chat: Chat) -> bool:
+        """
+        Verifica se la chat ha abbastanza turni vecchi da aggiungere al riassunto
+        
+        Il riassunto viene aggiornato a blocchi di almeno `keep_recent` messaggi,
+        così la cronologia inviata per intero resta tra `keep_recent` e
+        `2 * keep_recent` messaggi senza una chiamata al modello a ogni turno.
+        
+        Args:
+            chat: Chat da verificare
+            
+        Returns:
+            True se il riassunto va aggiornato
+        """
+        if not self.enabled or len(chat.messages) <= self.threshold:
+            return False
+            
+        pending = len(chat.messages) - self.keep_recent - self.get_summarized_count(chat)
+        return pending >= max(self.keep_recent, 1)
+    
+    async def summarize(self, chat: Chat) -> Optional[Dict[str, Any]]:
+        """
+        Genera il nuovo stato del riassunto senza modificare la chat
+        
+        Args:
+            chat: Chat da riassumere
+            
+        Returns:
+            Stato del riassunto da salvare nei metadati, None se non necessario
+        """
+        if not self.needs_update(chat):
+            return None
+            
+        start = self.get_summarized_count(chat)
+        end = len(chat.messages) - self.keep_recent
+        transcript = self._format_transcript(chat, start, end)
+        previous_summary = self.get_summary(chat)
+        
+        if not transcript:
+            summary_text = previous_summary or ""
+        else:
+            summary_text = await self.llm_manager.generate_response(
+                messages=[{
+                    "role": "user",
+                    "content": self.prompt_templates.format_conversation_summary_request(
+                        previous_summary, transcript
+                    )
+                }],
+                system_prompt=self.prompt_templates.get_conversation_summary_prompt(),
+                temperature=0.1,
+                max_tokens=self.max_tokens
+            )
+            
+        logger.info(f"Riassunto della chat {chat.id} aggiornato fino al messaggio {end}")
+        
+        return {
+            "text": summary_text,
+            "summarized_messages": end,
+            "updated_at": datetime.now().isoformat()
+        }
+    
+    @staticmethod
+    def apply(chat: Chat, state: Dict[str, Any]) -> None:
+        """
+        Memorizza lo stato del riassunto nei metadati della chat
+        
+        Args:
+            chat: Chat da aggiornare
+            state: Stato restituito da summarize
+        """
+        metadata = dict(chat.metadata or {})
+        metadata[SUMMARY_METADATA_KEY] = state
+        chat.metadata = metadata
+    
+    def _format_transcript(self, chat: Chat, start: int, end: int) -> str:
+        """Formatta i messaggi da riassumere, troncando quelli lunghi (es. schede)"""
+        lines: List[str] = []
+        
+        for msg in chat.messages[start:end]:
+            if msg.type == MessageType.ERROR or msg.role not in [MessageRole.USER, MessageRole.ASSISTANT]:
+                continue
+                
+            speaker = "Utente" if msg.role == MessageRole.USER else "Assistente"
+            content = self.token_counter.truncate(msg.content, SUMMARY_INPUT_MESSAGE_TOKENS)
+            lines.append(f"{speaker}: {content}")
+            
+        return "\n\n".join(lines)
@@ -2,19 +2,86 @@
 Funzionalità di embedding e indicizzazione
 """
 
+import json
 import logging
-from typing import List, Dict, Any, Optional
+import os
+from typing import List, Dict, Any, Optional, Sequence
 from pathlib import Path
 from llama_index.core import Document, VectorStoreIndex, Settings
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.ingestion import run_transformations
 from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import BaseNode, TransformComponent
 from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.llms.openai import OpenAI
 from llama_index.readers.file import PDFReader, DocxReader
 from app.config import settings
+from app.core.chunking import ChunkingPipeline, StructureAwareSplitter
 from app.core.error_handler import RAGException
+from app.core.metadata_index import MetadataIndex, METADATA_INDEX_FILENAME, TOPICS_METADATA_KEY, assign_topics
+from app.core.sparse_index import BM25Index, SPARSE_INDEX_FILENAME
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_META_FILENAME = "embedding_meta.json"
+
+# Dimensione piena degli embeddings dei modelli OpenAI
+MODEL_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536
+}
+
+def embedding_model_name() -> str:
+    """Identificativo del modello di embedding configurato, salvato con l'indice"""
+    if settings.EMBEDDING_BACKEND == "local":
+        name = os.path.basename(os.path.normpath(settings.LOCAL_EMBEDDING_MODEL_PATH))
+        # Con i modelli locali la dimensione piena non è nota prima di caricarli
+        return f"local:{name}" + (f"@{settings.EMBEDDING_DIMENSIONS}" if settings.EMBEDDING_DIMENSIONS else "")
+    return settings.EMBEDDING_MODEL
+
+def expected_embedding_dimension() -> Optional[int]:
+    """Dimensione degli embeddings configurata (None se il modello non è noto)"""
+    if settings.EMBEDDING_BACKEND == "local":
+        return settings.EMBEDDING_DIMENSIONS or None
+    return settings.EMBEDDING_DIMENSIONS or MODEL_DIMENSIONS.get(settings.EMBEDDING_MODEL)
+
+def create_embed_model() -> BaseEmbedding:
+    """
+    Crea il modello di embedding del backend configurato
+    
+    Returns:
+        Modello usato da llama-index sia per l'indicizzazione sia per le query
+    """
+    if settings.EMBEDDING_BACKEND == "local":
+        from app.core.local_embeddings import LocalEmbedding
+        
+        return LocalEmbedding(
+            model_path=settings.LOCAL_EMBEDDING_MODEL_PATH,
+            runtime=settings.LOCAL_EMBEDDING_RUNTIME,
+            threads=settings.EMBEDDING_THREADS,
+            embed_batch_size=settings.EMBEDDING_BATCH_SIZE,
+            query_prefix=settings.LOCAL_EMBEDDING_QUERY_PREFIX,
+            truncate_dim=settings.EMBEDDING_DIMENSIONS or None
+        )
+    return OpenAIEmbedding(
+        api_key=settings.OPENAI_API_KEY,
+        model=settings.EMBEDDING_MODEL,
+        dimensions=settings.EMBEDDING_DIMENSIONS or None
+    )
+
+class TopicTagger(TransformComponent):
+    """Assegna ai frammenti gli argomenti (nutrizione, esercizi, ...) usati dai filtri del recupero"""
+    
+    def __call__(self, nodes: Sequence[BaseNode], **kwargs: Any) -> Sequence[BaseNode]:
+        for node in nodes:
+            node.metadata[TOPICS_METADATA_KEY] = ",".join(assign_topics(node.get_content()))
+            # Gli argomenti servono solo a filtrare: restano fuori dal testo degli embeddings e del modello
+            for excluded in (node.excluded_embed_metadata_keys, node.excluded_llm_metadata_keys):
+                if TOPICS_METADATA_KEY not in excluded:
+                    excluded.append(TOPICS_METADATA_KEY)
+        return nodes
+
 class EmbeddingManager:
     """Gestore per gli embeddings e l'indicizzazione"""
     
@@ -26,10 +93,8 @@ class EmbeddingManager:
             temperature=settings.TEMPERATURE
         )
         
-        Settings.embed_model = OpenAIEmbedding(
-            api_key=settings.OPENAI_API_KEY,
-            model=settings.EMBEDDING_MODEL
-        )
+        # Lo stesso modello (e la stessa dimensione) per indicizzazione e query
+        Settings.embed_model = create_embed_model()
         
         # Configura il parser dei nodi
         self.node_parser = SentenceSplitter(
@@ -37,6 +102,27 @@ class EmbeddingManager:
             chunk_overlap=settings.CHUNK_OVERLAP
         )
         
+        # Pulizia delle pagine, suddivisione e deduplicazione prima degli embeddings
+        splitter = self.node_parser
+        if settings.CHUNKING_MODE == "structure":
+            splitter = StructureAwareSplitter(
+                chunk_size=settings.CHUNK_SIZE,
+                chunk_overlap=settings.CHUNK_OVERLAP
+            )
+        self.chunking = ChunkingPipeline(
+            splitter=splitter,
+            furniture_min_ratio=settings.PAGE_FURNITURE_MIN_RATIO,
+            dedup=settings.CHUNK_DEDUP_ENABLED,
+            dedup_max_distance=settings.CHUNK_DEDUP_MAX_DISTANCE,
+            token_model=settings.EMBEDDING_MODEL
+        )
+        
+        # Suddivisione e argomenti dei frammenti, anche per i documenti inseriti in un indice ricaricato
+        self.transformations = [self.chunking, TopicTagger()]
+        # Indice i cui frammenti sono già tra le impronte della deduplicazione
+        self._chunked_index: Optional[VectorStoreIndex] = None
+        Settings.transformations = self.transformations
+        
         # Lettori per diversi formati
         self.readers = {
             '.pdf': PDFReader(),
@@ -45,6 +131,12 @@ class EmbeddingManager:
         
         self.index: Optional[VectorStoreIndex] = None
         self.documents: List[Document] = []
+        
+        # Indice lessicale BM25 sugli stessi frammenti dell'indice vettoriale
+        self.sparse_index: Optional[BM25Index] = None
+        
+        # Nodi per fonte, tipo di file e argomento, con la tabella riassuntiva delle fonti
+        self.metadata_index: Optional[MetadataIndex] = None
     
     def load_documents_from_directory(self, directory_path: Path) -> List[Document]:
         """
@@ -144,18 +236,50 @@ class EmbeddingManager:
             logger.info(f"Creazione indice da {len(documents)} documenti")
             
             # Crea l'indice
+            self.chunking.reset()
             index = VectorStoreIndex.from_documents(
                 documents,
-                node_parser=self.node_parser,
+                transformations=self.transformations,
                 show_progress=True
             )
+            self._chunked_index = index
             
+            if settings.HYBRID_RETRIEVAL_ENABLED:
+                self.build_sparse_index(index)
+            self.build_metadata_index(index)
+                
             logger.info("Indice creato con successo")
             return index
             
         except Exception as e:
             raise RAGException(f"Errore nella creazione dell'indice: {str(e)}")
     
+    def insert_documents(self, index: VectorStoreIndex, documents: List[Document]) -> List[BaseNode]:
+        """
+        Inserisce nuovi documenti in un indice esistente
+        
+        I documenti vengono suddivisi in un'unica passata: le pagine dello stesso
+        file arrivano insieme alla rimozione di intestazioni e piè di pagina, e i
+        frammenti vengono deduplicati tra loro e rispetto a quelli già indicizzati.
+        
+        Args:
+            index: Indice da aggiornare
+            documents: Documenti da aggiungere
+            
+        Returns:
+            Frammenti inseriti
+        """
+        if self._chunked_index is not index:
+            # Indice caricato da disco: le impronte dei suoi frammenti si calcolano al primo inserimento
+            self.chunking.reset(node.get_content() for node in index.docstore.docs.values())
+            self._chunked_index = index
+            
+        nodes = run_transformations(documents, self.transformations, show_progress=True)
+        index.insert_nodes(nodes)
+        for document in documents:
+            index.docstore.set_document_hash(document.doc_id, document.hash)
+        return nodes
+    
     def save_index(self, index: VectorStoreIndex, save_path: Path) -> None:
         """
         Salva l'indice su disco
@@ -167,6 +291,15 @@ class EmbeddingManager:
         try:
             save_path.mkdir(parents=True, exist_ok=True)
             index.storage_context.persist(persist_dir=str(save_path))
+            if self.sparse_index is not None:
+                self.sparse_index.save(save_path / SPARSE_INDEX_FILENAME)
+            if self.metadata_index is not None:
+                self.metadata_index.save(save_path / METADATA_INDEX_FILENAME)
+            with open(save_path / EMBEDDING_META_FILENAME, "w", encoding="utf-8") as f:
+                json.dump({
+                    "model": embedding_model_name(),
+                    "dimensions": self._index_dimension(index) or expected_embedding_dimension()
+                }, f, indent=2)
             logger.info(f"Indice salvato in {save_path}")
         except Exception as e:
             raise RAGException(f"Errore nel salvataggio dell'indice: {str(e)}")
@@ -191,6 +324,23 @@ class EmbeddingManager:
             storage_context = StorageContext.from_defaults(persist_dir=str(index_path))
             index = load_index_from_storage(storage_context)
             
+            if not self._check_index_embeddings(index, index_path):
+                # Vettori non confrontabili con quelli delle query: l'indice va ricostruito
+                return None
+            
+            if settings.HYBRID_RETRIEVAL_ENABLED:
+                self.sparse_index = BM25Index.load(index_path / SPARSE_INDEX_FILENAME)
+                if self.sparse_index is None:
+                    # Indici salvati prima del recupero ibrido: si ricostruisce dal docstore
+                    self.build_sparse_index(index)
+                    self.sparse_index.save(index_path / SPARSE_INDEX_FILENAME)
+            
+            self.metadata_index = MetadataIndex.load(index_path / METADATA_INDEX_FILENAME)
+            if self.metadata_index is None:
+                # Indici salvati prima dei filtri sui metadati: argomenti assegnati ora dal testo
+                self.build_metadata_index(index)
+                self.metadata_index.save(index_path / METADATA_INDEX_FILENAME)
+                    
             logger.info(f"Indice caricato da {index_path}")
             return index
             
@@ -198,6 +348,84 @@ class EmbeddingManager:
             logger.error(f"Errore nel caricamento dell'indice: {e}")
             return None
     
+    @staticmethod
+    def _index_dimension(index: VectorStoreIndex) -> Optional[int]:
+        """Dimensione dei vettori presenti nell'indice (None se non ne contiene)"""
+        embeddings = index.vector_store.data.embedding_dict
+        return len(next(iter(embeddings.values()))) if embeddings else None
+    
+    def _check_index_embeddings(self, index: VectorStoreIndex, index_path: Path) -> bool:
+        """
+        Verifica che l'indice sia stato creato con il modello e la dimensione configurati
+        
+        Gli indici salvati prima dei metadati degli embeddings vengono verificati
+        sulla dimensione dei vettori.
+        
+        Args:
+            index: Indice caricato
+            index_path: Percorso dell'indice
+            
+        Returns:
+            True se i vettori dell'indice sono confrontabili con quelli delle query
+        """
+        meta_path = index_path / EMBEDDING_META_FILENAME
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            model, dimensions = meta.get("model"), meta.get("dimensions")
+        else:
+            model, dimensions = settings.EMBEDDING_MODEL, self._index_dimension(index)
+            
+        expected = expected_embedding_dimension()
+        if model != embedding_model_name() or (expected and dimensions and dimensions != expected):
+            logger.warning(
+                f"Indice creato con {model} a {dimensions} dimensioni, configurato "
+                f"{embedding_model_name()} a {expected}: verrà ricostruito"
+            )
+            return False
+        return True
+    
+    def build_sparse_index(self, index: VectorStoreIndex) -> BM25Index:
+        """
+        Costruisce l'indice lessicale BM25 sui frammenti dell'indice vettoriale
+        
+        Args:
+            index: Indice vettoriale di cui indicizzare i nodi
+            
+        Returns:
+            Indice lessicale costruito
+        """
+        nodes = index.docstore.docs.values()
+        self.sparse_index = BM25Index.from_texts(
+            (node.node_id, node.get_content()) for node in nodes
+        )
+        logger.info(f"Indice lessicale creato su {len(self.sparse_index)} frammenti")
+        return self.sparse_index
+    
+    def build_metadata_index(self, index: VectorStoreIndex) -> MetadataIndex:
+        """
+        Costruisce l'indice dei metadati sui frammenti dell'indice vettoriale
+        
+        Args:
+            index: Indice vettoriale di cui indicizzare i nodi
+            
+        Returns:
+            Indice dei metadati costruito
+        """
+        records = []
+        for node in index.docstore.docs.values():
+            metadata = dict(node.metadata)
+            if TOPICS_METADATA_KEY not in metadata:
+                metadata[TOPICS_METADATA_KEY] = ",".join(assign_topics(node.get_content()))
+            end_char = getattr(node, 'end_char_idx', None) or len(node.get_content())
+            records.append((node.node_id, metadata, node.ref_doc_id, end_char))
+        self.metadata_index = MetadataIndex.from_records(records)
+        logger.info(
+            f"Indice dei metadati creato su {len(self.metadata_index)} frammenti "
+            f"({len(self.metadata_index.sources)} fonti)"
+        )
+        return self.metadata_index
+    
     def get_document_sources(self) -> List[str]:
         """
         Ottiene la lista delle fonti dei documenti caricati
@@ -0,0 +1,259 @@
+"""
+Catalogo esercizi per la generazione di schede senza LLM
+"""
+
+from typing import List, Optional, Set
+from pydantic import BaseModel, Field
+from app.models.workout import ExperienceLevel
+
+ALL_LEVELS = [ExperienceLevel.BEGINNER, ExperienceLevel.INTERMEDIATE, ExperienceLevel.ADVANCED]
+NOT_BEGINNER = [ExperienceLevel.INTERMEDIATE, ExperienceLevel.ADVANCED]
+
+# Classi di attrezzatura e parole chiave con cui l'utente le descrive
+EQUIPMENT_KEYWORDS = {
+    "bilanciere": ["bilancier", "barra olimpica"],
+    "manubri": ["manubri", "manubrio"],
+    "macchine": ["macchin", "leg press", "lat machine", "chest press", "cyclette", "tapis"],
+    "cavi": ["cavi", "cavo", "pulley", "croce ai cavi"],
+    "kettlebell": ["kettlebell"],
+    "elastici": ["elastic", "banda", "bande"],
+    "sbarra": ["sbarra", "trazioni"]
+}
+
+# Parole chiave che indicano una palestra completamente attrezzata
+FULL_GYM_KEYWORDS = ["palestra", "standard"]
+
+# Sempre disponibile
+BODYWEIGHT = "corpo_libero"
+
+# Zone con limitazioni e parole chiave con cui vengono descritti gli infortuni
+INJURY_KEYWORDS = {
+    "spalla": ["spall", "cuffia", "rotator"],
+    "ginocchio": ["ginocch", "menisc", "crociat", "rotule"],
+    "schiena": ["schiena", "lombar", "lombalg", "ernia", "dorsal", "disco", "sciatic"],
+    "polso": ["polso", "polsi", "tunnel carpale"],
+    "gomito": ["gomit", "epicondil"],
+    "anca": ["anca", "anche"],
+    "caviglia": ["cavigli"],
+    "collo": ["collo", "cervical"]
+}
+
+class CatalogExercise(BaseModel):
+    """Esercizio del catalogo con i vincoli di utilizzo"""
+    name: str = Field(..., description="Nome dell'esercizio")
+    pattern: str = Field(..., description="Schema motorio (squat, hinge, push_h, ...)")
+    muscle_groups: List[str] = Field(..., description="Gruppi muscolari coinvolti")
+    equipment: List[str] = Field(..., description="Attrezzature alternative con cui eseguirlo")
+    levels: List[ExperienceLevel] = Field(default_factory=lambda: list(ALL_LEVELS), description="Livelli adatti")
+    contraindications: List[str] = Field(default_factory=list, description="Zone da evitare in caso di infortunio")
+    compound: bool = Field(default=True, description="Esercizio multiarticolare")
+    reps_override: Optional[str] = Field(default=None, description="Ripetizioni fisse (es. esercizi isometrici)")
+    notes: Optional[str] = Field(default=None, description="Note tecniche")
+
+def _ex(name, pattern, muscle_groups, equipment, levels=None, contraindications=None,
+        compound=True, reps_override=None, notes=None) -> CatalogExercise:
+    """Costruttore compatto per le voci del catalogo"""
+    return CatalogExercise(
+        name=name,
+        pattern=pattern,
+        muscle_groups=muscle_groups,
+        equipment=equipment,
+        levels=levels or list(ALL_LEVELS),
+        contraindications=contraindications or [],
+        compound=compound,
+        reps_override=reps_override,
+        notes=notes
+    )
+
+EXERCISE_CATALOG: List[CatalogExercise] = [
+    # Squat
+    _ex("Squat con bilanciere", "squat", ["quadricipiti", "glutei", "core"], ["bilanciere"], NOT_BEGINNER,
+        ["ginocchio", "schiena"], notes="Schiena neutra, ginocchia in linea con le punte dei piedi"),
+    _ex("Goblet squat", "squat", ["quadricipiti", "glutei"], ["manubri", "kettlebell"], contraindications=["ginocchio"],
+        notes="Peso al petto, busto eretto, scendi controllando il movimento"),
+    _ex("Leg press", "squat", ["quadricipiti", "glutei"], ["macchine"], contraindications=["ginocchio"],
+        notes="Non bloccare le ginocchia in estensione, zona lombare aderente allo schienale"),
+    _ex("Squat a corpo libero", "squat", ["quadricipiti", "glutei"], [BODYWEIGHT], contraindications=["ginocchio"],
+        notes="Scendi fino a dove mantieni la schiena neutra"),
+        
+    # Hinge
+    _ex("Stacco rumeno con bilanciere", "hinge", ["femorali", "glutei", "lombari"], ["bilanciere"], NOT_BEGINNER,
+        ["schiena"], notes="Bilanciere vicino alle gambe, movimento guidato dalle anche"),
+    _ex("Stacco rumeno con manubri", "hinge", ["femorali", "glutei", "lombari"], ["manubri"], contraindications=["schiena"],
+        notes="Ginocchia leggermente flesse, schiena neutra"),
+    _ex("Hip thrust", "hinge", ["glutei", "femorali"], ["bilanciere", "manubri"],
+        notes="Spingi con i talloni e contrai i glutei in alto"),
+    _ex("Ponte glutei", "hinge", ["glutei", "femorali"], [BODYWEIGHT],
+        notes="Bacino in retroversione, pausa di un secondo in alto"),
+    _ex("Kettlebell swing", "hinge", ["glutei", "femorali", "core"], ["kettlebell"], NOT_BEGINNER, ["schiena"],
+        notes="Movimento esplosivo delle anche, non delle braccia"),
+        
+    # Affondi
+    _ex("Affondi con manubri", "lunge", ["quadricipiti", "glutei"], ["manubri"], contraindications=["ginocchio"],
+        notes="Passo ampio, busto eretto"),
+    _ex("Step-up su panca", "lunge", ["quadricipiti", "glutei"], ["manubri", BODYWEIGHT], contraindications=["ginocchio"],
+        notes="Spingi con la gamba sul rialzo senza slanciarti"),
+    _ex("Affondi a corpo libero", "lunge", ["quadricipiti", "glutei"], [BODYWEIGHT], contraindications=["ginocchio"],
+        notes="Ginocchio posteriore vicino al pavimento, controllo nella discesa"),
+    _ex("Bulgarian split squat", "lunge", ["quadricipiti", "glutei"], ["manubri", BODYWEIGHT], NOT_BEGINNER,
+        ["ginocchio"], notes="Piede posteriore su panca, busto leggermente inclinato"),
+        
+    # Spinta orizzontale
+    _ex("Panca piana con bilanciere", "push_h", ["petto", "tricipiti", "deltoidi anteriori"], ["bilanciere"],
+        contraindications=["spalla", "polso"], notes="Scapole addotte, piedi ben appoggiati"),
+    _ex("Panca con manubri", "push_h", ["petto", "tricipiti", "deltoidi anteriori"], ["manubri"],
+        contraindications=["spalla"], notes="Gomiti a circa 45° dal busto"),
+    _ex("Chest press", "push_h", ["petto", "tricipiti"], ["macchine"], contraindications=["spalla"],
+        notes="Regola il sedile con le maniglie all'altezza del petto"),
+    _ex("Push-up", "push_h", ["petto", "tricipiti", "core"], [BODYWEIGHT], NOT_BEGINNER, ["polso", "spalla"],
+        notes="Corpo in linea dalla testa ai talloni"),
+    _ex("Push-up su rialzo", "push_h", ["petto", "tricipiti"], [BODYWEIGHT], contraindications=["polso"],
+        notes="Mani su panca o rialzo per ridurre il carico"),
+        
+    # Spinta verticale
+    _ex("Military press con bilanciere", "push_v", ["deltoidi", "tricipiti"], ["bilanciere"], NOT_BEGINNER,
+        ["spalla", "schiena"], notes="Glutei e addome contratti, non inarcare la schiena"),
+    _ex("Shoulder press con manubri", "push_v", ["deltoidi", "tricipiti"], ["manubri"], contraindications=["spalla"],
+        notes="Da seduto con schienale, non bloccare i gomiti in alto"),
+    _ex("Shoulder press alla macchina", "push_v", ["deltoidi", "tricipiti"], ["macchine"], contraindications=["spalla"]),
+    _ex("Pike push-up", "push_v", ["deltoidi", "tricipiti"], [BODYWEIGHT], NOT_BEGINNER, ["spalla", "polso"]),
+    
+    # Tirata orizzontale
+    _ex("Rematore con bilanciere", "pull_h", ["dorsali", "romboidi", "bicipiti"], ["bilanciere"], NOT_BEGINNER,
+        ["schiena"], notes="Busto inclinato a circa 45°, tira verso l'ombelico"),
+    _ex("Rematore con manubrio", "pull_h", ["dorsali", "romboidi", "bicipiti"], ["manubri"],
+        notes="Appoggio su panca, schiena piatta"),
+    _ex("Pulley basso", "pull_h", ["dorsali", "romboidi", "bicipiti"], ["cavi", "macchine"],
+        notes="Petto in fuori, porta le scapole indietro prima di flettere i gomiti"),
+    _ex("Rematore con elastico", "pull_h", ["dorsali", "romboidi"], ["elastici"]),
+    _ex("Rematore inverso", "pull_h", ["dorsali", "romboidi", "bicipiti"], ["sbarra"], notes="Corpo rigido come in un plank"),
+    
+    # Tirata verticale
+    _ex("Lat machine", "pull_v", ["dorsali", "bicipiti"], ["macchine", "cavi"], contraindications=["spalla"],
+        notes="Tira verso il petto, non dietro la nuca"),
+    _ex("Trazioni alla sbarra", "pull_v", ["dorsali", "bicipiti"], ["sbarra"], NOT_BEGINNER, ["spalla", "gomito"]),
+    _ex("Trazioni assistite", "pull_v", ["dorsali", "bicipiti"], ["macchine", "elastici"], contraindications=["spalla"]),
+    _ex("Lat pulldown con elastico", "pull_v", ["dorsali", "bicipiti"], ["elastici"]),
+    
+    # Core
+    _ex("Plank", "core", ["core"], [BODYWEIGHT], compound=False, reps_override="30-45 sec",
+        notes="Bacino neutro, non trattenere il respiro"),
+    _ex("Dead bug", "core", ["core"], [BODYWEIGHT], compound=False, reps_override="8-10 per lato",
+        notes="Zona lombare sempre a contatto con il pavimento"),
+    _ex("Pallof press", "core", ["core", "obliqui"], ["cavi", "elastici"], compound=False, reps_override="10-12 per lato"),
+    _ex("Side plank", "core", ["obliqui", "core"], [BODYWEIGHT], contraindications=["spalla"], compound=False,
+        reps_override="20-30 sec per lato"),
+        
+    # Braccia e spalle
+    _ex("Curl con manubri", "biceps", ["bicipiti"], ["manubri"], contraindications=["gomito"], compound=False),
+    _ex("Curl ai cavi", "biceps", ["bicipiti"], ["cavi"], contraindications=["gomito"], compound=False),
+    _ex("Curl con elastico", "biceps", ["bicipiti"], ["elastici"], contraindications=["gomito"], compound=False),
+    _ex("French press con manubrio", "triceps", ["tricipiti"], ["manubri"], contraindications=["gomito", "spalla"],
+        compound=False),
+    _ex("Push-down ai cavi", "triceps", ["tricipiti"], ["cavi"], contraindications=["gomito"], compound=False),
+    _ex("Dip su panca", "triceps", ["tricipiti", "petto"], [BODYWEIGHT], NOT_BEGINNER, ["spalla", "polso"],
+        compound=False),
+    _ex("Alzate laterali con manubri", "shoulders", ["deltoidi laterali"], ["manubri"], contraindications=["spalla"],
+        compound=False, notes="Gomiti leggermente flessi, non superare l'altezza delle spalle"),
+    _ex("Face pull", "shoulders", ["deltoidi posteriori", "trapezio"], ["cavi", "elastici"], compound=False,
+        notes="Tira verso il viso aprendo i gomiti"),
+    _ex("Alzate posteriori a busto flesso", "shoulders", ["deltoidi posteriori"], ["manubri"], compound=False),
+    
+    # Gambe (complementari)
+    _ex("Leg extension", "quad_iso", ["quadricipiti"], ["macchine"], contraindications=["ginocchio"], compound=False),
+    _ex("Wall sit", "quad_iso", ["quadricipiti"], [BODYWEIGHT], compound=False, reps_override="30-45 sec"),
+    _ex("Leg curl", "ham_iso", ["femorali"], ["macchine"], compound=False),
+    _ex("Ponte glutei monopodalico", "ham_iso", ["femorali", "glutei"], [BODYWEIGHT], compound=False,
+        reps_override="10-12 per lato"),
+    _ex("Calf raise", "calves", ["polpacci"], ["macchine", "manubri", BODYWEIGHT], contraindications=["caviglia"],
+        compound=False),
+        
+    # Condizionamento
+    _ex("Cyclette a intervalli", "conditioning", ["cardio"], ["macchine"], compound=False,
+        reps_override="8-10 min (30 sec veloce / 60 sec lento)"),
+    _ex("Mountain climber", "conditioning", ["cardio", "core"], [BODYWEIGHT], contraindications=["polso", "spalla"],
+        compound=False, reps_override="30 sec"),
+    _ex("Jumping jack", "conditioning", ["cardio"], [BODYWEIGHT], contraindications=["ginocchio", "caviglia"],
+        compound=False, reps_override="45 sec")
+]
+
+def resolve_equipment(user_equipment: List[str]) -> Set[str]:
+    """
+    Converte l'attrezzatura descritta dall'utente nelle classi del catalogo
+    
+    Senza indicazioni (o con una palestra standard) si considera disponibile
+    tutta l'attrezzatura; il corpo libero è sempre incluso.
+    
+    Args:
+        user_equipment: Attrezzature indicate dall'utente
+        
+    Returns:
+        Classi di attrezzatura disponibili
+    """
+    all_classes = set(EQUIPMENT_KEYWORDS) | {BODYWEIGHT}
+    
+    if not user_equipment:
+        return all_classes
+        
+    available = {BODYWEIGHT}
+    for item in user_equipment:
+        item_lower = item.lower()
+        if any(keyword in item_lower for keyword in FULL_GYM_KEYWORDS):
+            return all_classes
+        for equipment_class, keywords in EQUIPMENT_KEYWORDS.items():
+            if any(keyword in item_lower for keyword in keywords):
+                available.add(equipment_class)
+                
+    return available
+
+def resolve_injuries(injuries: List[str]) -> Optional[Set[str]]:
+    """
+    Converte gli infortuni descritti dall'utente nelle zone del catalogo
+    
+    Args:
+        injuries: Infortuni o limitazioni indicati dall'utente
+        
+    Returns:
+        Zone da evitare, o None se un infortunio non è riconosciuto
+    """
+    zones = set()
+    for injury in injuries:
+        injury_lower = injury.lower()
+        matched = {zone for zone, keywords in INJURY_KEYWORDS.items() if any(k in injury_lower for k in keywords)}
+        if not matched:
+            return None
+        zones |= matched
+    return zones
+
+class ExerciseCatalog:
+    """Selezione di esercizi dal catalogo in base a livello, attrezzatura e infortuni"""
+    
+    def __init__(self, exercises: Optional[List[CatalogExercise]] = None):
+        self.exercises = exercises if exercises is not None else EXERCISE_CATALOG
+    
+    def candidates(
+        self,
+        pattern: str,
+        level: ExperienceLevel,
+        equipment: Set[str],
+        avoid_zones: Set[str]
+    ) -> List[CatalogExercise]:
+        """
+        Esercizi adatti per uno schema motorio, nell'ordine di preferenza del catalogo
+        
+        Args:
+            pattern: Schema motorio
+            level: Livello dell'utente
+            equipment: Classi di attrezzatura disponibili
+            avoid_zones: Zone con infortuni
+            
+        Returns:
+            Esercizi utilizzabili
+        """
+        return [
+            exercise for exercise in self.exercises
+            if exercise.pattern == pattern
+            and level in exercise.levels
+            and equipment.intersection(exercise.equipment)
+            and not avoid_zones.intersection(exercise.contraindications)
+        ]
@@ -0,0 +1,151 @@
+"""
+Coda di lavori in-process con concorrenza limitata
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Generic, Iterator, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+JobT = TypeVar("JobT")
+
+class JobQueue:
+    """
+    Coda FIFO di funzioni asincrone eseguite da un numero fisso di worker
+    
+    I worker vengono avviati al primo inserimento, nel loop in esecuzione;
+    ogni funzione inserita restituisce un Future con il suo risultato.
+    """
+    
+    def __init__(self, concurrency: int = 4):
+        """
+        Args:
+            concurrency: Numero massimo di lavori eseguiti contemporaneamente
+        """
+        self.concurrency = max(1, concurrency)
+        
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._running = 0
+        self._processed = 0
+        self._failed = 0
+    
+    def _ensure_workers(self) -> None:
+        """Avvia coda e worker se non ancora attivi"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+    
+    def submit(self, func: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """
+        Accoda un lavoro
+        
+        Args:
+            func: Funzione asincrona senza argomenti da eseguire
+            
+        Returns:
+            Future completato con il risultato (o l'eccezione) del lavoro
+        """
+        self._ensure_workers()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((func, future))
+        return future
+    
+    async def _worker(self) -> None:
+        """Esegue i lavori in coda uno alla volta"""
+        while True:
+            func, future = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                self._running += 1
+                try:
+                    result = await func()
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    self._failed += 1
+                    logger.warning(f"Lavoro in coda fallito: {e}")
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self._running -= 1
+                    self._processed += 1
+            finally:
+                self._queue.task_done()
+    
+    async def join(self) -> None:
+        """Attende l'esecuzione di tutti i lavori in coda"""
+        if self._queue is not None:
+            await self._queue.join()
+    
+    async def shutdown(self) -> None:
+        """Ferma i worker e annulla i lavori non ancora eseguiti"""
+        for worker in self._workers:
+            worker.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                future.cancel()
+            self._queue = None
+    
+    def get_stats(self) -> dict:
+        """
+        Ottiene statistiche sulla coda
+        
+        Returns:
+            Lavori in attesa, in esecuzione, completati e falliti
+        """
+        return {
+            "concurrency": self.concurrency,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "running": self._running,
+            "processed": self._processed,
+            "failed": self._failed
+        }
+
+class JobRegistry(Generic[JobT]):
+    """
+    Job in memoria interrogabili per ID
+    
+    Oltre `max_jobs` vengono eliminati i job terminati più vecchi; i job
+    devono esporre `id` e `is_finished()`.
+    """
+    
+    def __init__(self, max_jobs: int = 100):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, JobT]" = OrderedDict()
+    
+    def add(self, job: JobT) -> None:
+        """Registra un job eliminando i job terminati più vecchi oltre il limite"""
+        self._jobs[job.id] = job
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in [job_id for job_id, stored in self._jobs.items() if stored.is_finished()]:
+            if len(self._jobs) <= self.max_jobs:
+                break
+            del self._jobs[job_id]
+    
+    def get(self, job_id: str) -> Optional[JobT]:
+        """Job con l'ID indicato o None"""
+        return self._jobs.get(job_id)
+    
+    def __iter__(self) -> Iterator[JobT]:
+        return iter(list(self._jobs.values()))
+    
+    def __len__(self) -> int:
+        return len(self._jobs)
@@ -3,13 +3,77 @@ Gestione interazioni con OpenAI
 """
 
 import logging
-from typing import List, Dict, Any, Optional
-from openai import AsyncOpenAI
+from typing import List, Dict, Any, Optional, Type
+from openai import AsyncOpenAI, BadRequestError
+from pydantic import BaseModel
 from app.config import settings
 from app.core.error_handler import LLMException
+from app.core.prompt_builder import PromptBuilder
+from app.core.single_flight import SingleFlight, request_key, normalize_text
 
 logger = logging.getLogger(__name__)
 
+def strict_json_schema(schema: Any) -> Any:
+    """
+    Adatta uno schema JSON di Pydantic alla modalità strict di OpenAI
+    
+    In modalità strict ogni oggetto deve elencare tutte le proprietà tra quelle
+    richieste e vietare proprietà aggiuntive, i valori di default non sono
+    ammessi e un riferimento ($ref) non può avere altre chiavi accanto. I campi
+    facoltativi restano tali perché il loro tipo ammette già null.
+    
+    Args:
+        schema: Schema (o parte di schema) da adattare
+        
+    Returns:
+        Copia dello schema compatibile con la modalità strict
+    """
+    if isinstance(schema, list):
+        return [strict_json_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    if "$ref" in schema:
+        return {"$ref": schema["$ref"]}
+        
+    strict = {}
+    for key, value in schema.items():
+        if key == "default":
+            continue
+        if key in ("properties", "$defs"):
+            strict[key] = {name: strict_json_schema(item) for name, item in value.items()}
+        else:
+            strict[key] = strict_json_schema(value)
+    if strict.get("type") == "object" and "properties" in strict:
+        strict["required"] = list(strict["properties"])
+        strict["additionalProperties"] = False
+    return strict
+
+def build_response_format(model: Type[BaseModel], mode: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Costruisce il parametro response_format per ottenere JSON conforme a un modello
+    
+    Args:
+        model: Modello Pydantic da cui derivare lo schema
+        mode: json_schema, json_object o off (default da settings)
+        
+    Returns:
+        Parametro response_format o None se l'output strutturato è disattivato
+    """
+    mode = (mode or settings.STRUCTURED_OUTPUT_MODE).lower()
+    
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": model.__name__,
+                "schema": strict_json_schema(model.model_json_schema()),
+                "strict": True
+            }
+        }
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
 class LLMManager:
     """Gestore per le interazioni con OpenAI"""
     
@@ -18,13 +82,17 @@ class LLMManager:
         self.model = settings.OPENAI_MODEL
         self.max_tokens = settings.MAX_TOKENS
         self.temperature = settings.TEMPERATURE
+        self.prompt_builder = PromptBuilder()
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self.single_flight = SingleFlight("llm")
     
     async def generate_response(
         self,
         messages: List[Dict[str, str]],
         system_prompt: Optional[str] = None,
         temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         Genera una risposta utilizzando OpenAI
@@ -34,6 +102,7 @@ class LLMManager:
             system_prompt: Prompt di sistema opzionale
             temperature: Temperatura per la generazione
             max_tokens: Numero massimo di token
+            response_format: Formato strutturato della risposta (vedi build_response_format)
             
         Returns:
             Risposta generata dal modello
@@ -57,19 +126,22 @@ class LLMManager:
                 "max_tokens": max_tokens or self.max_tokens
             }
             
-            logger.info(f"Generating response with {len(api_messages)} messages")
-            
-            # Chiamata API
-            response = await self.client.chat.completions.create(**call_params)
-            
-            # Estrai la risposta
-            content = response.choices[0].message.content
-            
-            if not content:
-                raise LLMException("Il modello ha restituito una risposta vuota")
-            
-            logger.info("Response generated successfully")
-            return content.strip()
+            if response_format:
+                call_params["response_format"] = response_format
+                
+            if not settings.SINGLE_FLIGHT_ENABLED:
+                return await self._complete(call_params)
+                
+            # Richieste identiche contemporanee condividono una sola chiamata
+            key = request_key(
+                [
+                    {**message, "content": normalize_text(message["content"])}
+                    if isinstance(message.get("content"), str) else message
+                    for message in api_messages
+                ],
+                {name: value for name, value in call_params.items() if name != "messages"}
+            )
+            return await self.single_flight.do(key, lambda: self._complete(call_params))
             
         except Exception as e:
             logger.error(f"Error generating response: {e}")
@@ -82,6 +154,41 @@ class LLMManager:
             else:
                 raise LLMException(f"Errore nella generazione della risposta: {str(e)}")
     
+    async def _complete(self, call_params: Dict[str, Any]) -> str:
+        """Esegue la chiamata al modello e restituisce il testo della risposta"""
+        logger.info(f"Generating response with {len(call_params['messages'])} messages")
+        
+        # Chiamata API
+        try:
+            response = await self.client.chat.completions.create(**call_params)
+        except BadRequestError as e:
+            # Modelli senza supporto json_schema: ripiega sulla modalità JSON semplice
+            response_format = call_params.get("response_format")
+            if not response_format or response_format.get("type") != "json_schema":
+                raise
+            logger.warning(f"json_schema non supportato da {self.model}, uso json_object: {e}")
+            call_params["response_format"] = {"type": "json_object"}
+            response = await self.client.chat.completions.create(**call_params)
+            
+        # Estrai la risposta
+        content = response.choices[0].message.content
+        
+        if not content:
+            raise LLMException("Il modello ha restituito una risposta vuota")
+            
+        usage = getattr(response, "usage", None)
+        self.usage["calls"] += 1
+        if usage:
+            self.usage["prompt_tokens"] += usage.prompt_tokens
+            self.usage["completion_tokens"] += usage.completion_tokens
+            logger.info(
+                f"Response generated successfully "
+                f"(prompt: {usage.prompt_tokens} token, completion: {usage.completion_tokens} token)"
+            )
+        else:
+            logger.info("Response generated successfully")
+        return content.strip()
+    
     async def generate_workout_response(
         self,
         user_input: str,
@@ -124,42 +231,31 @@ Genera una scheda di allenamento personalizzata basandoti sul contesto fornito e
         self,
         conversation_history: List[Dict[str, str]],
         context: str,
-        system_prompt: str
+        system_prompt: str,
+        summary: Optional[str] = None
     ) -> str:
         """
         Genera una risposta per la chat
         
         Args:
-            conversation_history: Cronologia della conversazione
+            conversation_history: Cronologia della conversazione (non viene modificata)
             context: Contesto recuperato dal RAG
             system_prompt: Prompt di sistema
+            summary: Riassunto della conversazione precedente
             
         Returns:
             Risposta generata
         """
-        # Aggiungi il contesto come messaggio di sistema aggiuntivo
-        enhanced_messages = conversation_history.copy()
-        
-        # Se c'è contesto, aggiungilo al primo messaggio utente
-        if context and enhanced_messages:
-            last_user_msg = None
-            for i, msg in enumerate(enhanced_messages):
-                if msg["role"] == "user":
-                    last_user_msg = i
-            
-            if last_user_msg is not None:
-                original_content = enhanced_messages[last_user_msg]["content"]
-                enhanced_messages[last_user_msg]["content"] = f"""
-Contesto dalle fonti documentali:
-{context}
-
-{original_content}
-"""
-        
-        return await self.generate_response(
-            messages=enhanced_messages,
-            system_prompt=system_prompt
+        prompt = self.prompt_builder.build_chat_messages(
+            system_prompt=system_prompt,
+            history=conversation_history,
+            context=context,
+            summary=summary
         )
+        logger.debug(f"Chat prompt assembled: {prompt.token_counts}")
+        
+        # Il prompt di sistema è già il primo dei messaggi composti
+        return await self.generate_response(messages=prompt.messages)
     
     async def extract_user_profile(self, user_input: str) -> Dict[str, Any]:
         """
@@ -220,6 +316,24 @@ Restituisci SOLO un JSON valido con i seguenti campi (usa null per valori non sp
             logger.error(f"Error extracting user profile: {e}")
             raise LLMException(f"Errore nell'estrazione del profilo utente: {str(e)}")
     
+    def get_coalescing_stats(self) -> Dict[str, int]:
+        """
+        Ottiene statistiche sulle chiamate identiche deduplicate
+        
+        Returns:
+            Richieste, chiamate effettive, richieste accodate e chiamate in corso
+        """
+        return self.single_flight.get_stats()
+    
+    def get_usage_stats(self) -> Dict[str, int]:
+        """
+        Ottiene il consumo cumulativo di token
+        
+        Returns:
+            Chiamate completate e token di prompt e completamento
+        """
+        return dict(self.usage)
+    
     def is_available(self) -> bool:
         """Verifica se il servizio LLM è disponibile"""
         return bool(settings.OPENAI_API_KEY)
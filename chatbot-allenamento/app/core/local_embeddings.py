@@ -0,0 +1,117 @@
+"""
+Backend locale (CPU) per gli embeddings, senza chiamate di rete
+"""
+
+import logging
+import os
+from typing import Any, List, Optional
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+from app.core.error_handler import RAGException
+
+logger = logging.getLogger(__name__)
+
+LOCAL_RUNTIMES = ("torch", "onnx")
+
+class LocalEmbedding(BaseEmbedding):
+    """
+    Embeddings calcolati in locale con un modello sentence-transformers
+    
+    Il modello viene letto da una directory locale (nessun download); con il
+    runtime onnx l'inferenza passa da ONNX Runtime. I testi vengono codificati
+    a blocchi di `embed_batch_size`, con l'inferenza distribuita su `threads` core.
+    """
+    
+    model_path: str
+    runtime: str = "torch"
+    threads: int = 0
+    query_prefix: str = ""
+    truncate_dim: Optional[int] = None
+    
+    _model: Any = PrivateAttr()
+    
+    def __init__(
+        self,
+        model_path: str,
+        runtime: str = "torch",
+        threads: int = 0,
+        embed_batch_size: int = 64,
+        query_prefix: str = "",
+        truncate_dim: Optional[int] = None,
+        **kwargs: Any
+    ):
+        """
+        Args:
+            model_path: Directory del modello sentence-transformers (o esportato in ONNX)
+            runtime: torch o onnx
+            threads: Thread per l'inferenza (0 = tutti i core)
+            embed_batch_size: Testi codificati per blocco
+            query_prefix: Prefisso delle query richiesto da alcuni modelli (es. "query: ")
+            truncate_dim: Dimensione ridotta (modelli Matryoshka), None = piena
+        """
+        if runtime not in LOCAL_RUNTIMES:
+            raise RAGException(f"Runtime di embedding locale non valido: {runtime} (valori ammessi: {', '.join(LOCAL_RUNTIMES)})")
+        super().__init__(
+            model_name=os.path.basename(os.path.normpath(model_path)),
+            model_path=model_path,
+            runtime=runtime,
+            threads=threads,
+            embed_batch_size=embed_batch_size,
+            query_prefix=query_prefix,
+            truncate_dim=truncate_dim,
+            **kwargs
+        )
+        
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise RAGException(
+                "EMBEDDING_BACKEND=local richiede sentence-transformers "
+                "(pip install sentence-transformers, più optimum[onnxruntime] per il runtime onnx)"
+            )
+            
+        threads = threads or os.cpu_count() or 1
+        if runtime == "torch":
+            import torch
+            torch.set_num_threads(threads)
+            
+        logger.info(f"Caricamento modello di embedding locale da {model_path} ({runtime}, {threads} thread)")
+        self._model = SentenceTransformer(
+            model_path,
+            device="cpu",
+            backend=runtime,
+            truncate_dim=truncate_dim,
+            local_files_only=True
+        )
+    
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalEmbedding"
+    
+    @property
+    def dimension(self) -> int:
+        """Dimensione dei vettori prodotti"""
+        return self.truncate_dim or self._model.get_sentence_embedding_dimension()
+    
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        """Codifica un blocco di testi in vettori normalizzati"""
+        vectors = self._model.encode(
+            texts,
+            batch_size=self.embed_batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+    
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._encode([self.query_prefix + query])[0]
+    
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+    
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+    
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
@@ -0,0 +1,210 @@
+"""
+Indice dei metadati per il recupero filtrato (fonte, tipo di file, argomento)
+"""
+
+import json
+import logging
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+from app.core.error_handler import RAGException
+from app.core.sparse_index import analyze
+
+logger = logging.getLogger(__name__)
+
+METADATA_INDEX_FILENAME = "metadata_index.json"
+METADATA_INDEX_VERSION = 1
+
+# Campi filtrabili; gli argomenti sono salvati nei metadati dei nodi in 'topics', separati da virgole
+FILTER_FIELDS = ("source", "file_type", "topic")
+TOPICS_METADATA_KEY = "topics"
+
+# Parole chiave degli argomenti assegnati ai frammenti in fase di indicizzazione
+TOPIC_KEYWORDS = {
+    "nutrizione": (
+        "alimentazione nutrizione dieta proteine carboidrati grassi calorie calorico pasto pasti "
+        "idratazione acqua integratori integrazione creatina vitamine macronutrienti fabbisogno"
+    ),
+    "esercizi": (
+        "esercizio esercizi tecnica esecuzione squat panca stacco trazioni rematore affondi curl "
+        "presa impugnatura bilanciere manubri macchina cavi"
+    ),
+    "programmazione": (
+        "programmazione periodizzazione progressione scheda volume intensità frequenza serie "
+        "ripetizioni carico carichi massimale scarico mesociclo microciclo settimana"
+    ),
+    "recupero": (
+        "recupero riposo sonno stretching mobilità riscaldamento defaticamento massaggio"
+    ),
+    "infortuni": (
+        "infortunio infortuni dolore lesione riabilitazione prevenzione tendinite postura articolazioni"
+    )
+}
+
+# Occorrenze minime delle parole chiave perché un frammento riceva l'argomento
+_MIN_TOPIC_MATCHES = 2
+
+_TOPIC_TERMS = {topic: frozenset(analyze(keywords)) for topic, keywords in TOPIC_KEYWORDS.items()}
+
+MetadataFilters = Dict[str, Union[str, List[str]]]
+
+def assign_topics(text: str) -> List[str]:
+    """
+    Argomenti di un frammento in base alle parole chiave presenti
+    
+    Args:
+        text: Testo del frammento
+        
+    Returns:
+        Argomenti con almeno _MIN_TOPIC_MATCHES occorrenze, in ordine alfabetico
+    """
+    counts = Counter(analyze(text))
+    return sorted(
+        topic for topic, terms in _TOPIC_TERMS.items()
+        if sum(counts[term] for term in terms) >= _MIN_TOPIC_MATCHES
+    )
+
+def split_topics(value: Any) -> List[str]:
+    """Argomenti salvati nei metadati di un nodo (stringa separata da virgole)"""
+    return [topic for topic in str(value or "").split(",") if topic]
+
+class MetadataIndex:
+    """
+    Nodi per valore di fonte, tipo di file e argomento, con la tabella riassuntiva delle fonti
+    
+    I filtri vengono risolti in insiemi di identificativi prima della ricerca, così
+    la ricerca vettoriale e quella lessicale valutano solo i frammenti ammessi. La
+    tabella delle fonti è calcolata una volta alla costruzione invece che a ogni richiesta.
+    """
+    
+    def __init__(self):
+        self.values: Dict[str, Dict[str, List[str]]] = {field: {} for field in FILTER_FIELDS}
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        self._matches: Dict[str, FrozenSet[str]] = {}
+    
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[str, Dict[str, Any], Optional[str], int]]) -> "MetadataIndex":
+        """
+        Costruisce l'indice dai nodi
+        
+        Args:
+            records: Tuple (id nodo, metadati, id documento, fine del nodo nel documento in caratteri)
+            
+        Returns:
+            Indice costruito
+        """
+        index = cls()
+        chunks: Dict[str, int] = Counter()
+        file_types: Dict[str, set] = defaultdict(set)
+        topics: Dict[str, Counter] = defaultdict(Counter)
+        # Lunghezza di ogni documento: la fine più lontana tra i suoi nodi (le sovrapposizioni non contano)
+        documents: Dict[str, Dict[str, int]] = defaultdict(dict)
+        
+        for node_id, metadata, document_id, end_char in records:
+            source = metadata.get("source") or metadata.get("filename") or "unknown"
+            file_type = metadata.get("file_type") or "unknown"
+            node_topics = split_topics(metadata.get(TOPICS_METADATA_KEY))
+            
+            index.values["source"].setdefault(source, []).append(node_id)
+            index.values["file_type"].setdefault(file_type, []).append(node_id)
+            for topic in node_topics:
+                index.values["topic"].setdefault(topic, []).append(node_id)
+                
+            chunks[source] += 1
+            file_types[source].add(file_type)
+            topics[source].update(node_topics)
+            document_key = document_id or node_id
+            documents[source][document_key] = max(documents[source].get(document_key, 0), end_char)
+            
+        for source in sorted(chunks):
+            index.sources[source] = {
+                "document_count": len(documents[source]),
+                "chunk_count": chunks[source],
+                "total_characters": sum(documents[source].values()),
+                "file_types": sorted(file_types[source]),
+                "topics": dict(topics[source].most_common())
+            }
+        return index
+    
+    def match(self, filters: Optional[MetadataFilters]) -> Optional[FrozenSet[str]]:
+        """
+        Risolve i filtri negli identificativi dei nodi ammessi
+        
+        Campi diversi si combinano in AND, più valori dello stesso campo in OR.
+        
+        Args:
+            filters: Valori ammessi per campo (es. {"topic": "nutrizione", "file_type": ["pdf", "docx"]})
+            
+        Returns:
+            Identificativi ammessi (anche vuoto) o None senza filtri
+        """
+        if not filters:
+            return None
+        unknown = set(filters) - set(FILTER_FIELDS)
+        if unknown:
+            raise RAGException(f"Filtro non valido: {', '.join(sorted(unknown))} (campi ammessi: {', '.join(FILTER_FIELDS)})")
+            
+        key = json.dumps(filters, sort_keys=True, ensure_ascii=False)
+        if key not in self._matches:
+            allowed: Optional[set] = None
+            for field, wanted in filters.items():
+                values = [wanted] if isinstance(wanted, str) else list(wanted)
+                node_ids = {node_id for value in values for node_id in self.values[field].get(value, ())}
+                allowed = node_ids if allowed is None else allowed & node_ids
+            # Lo stesso oggetto a ogni richiesta: la conversione in righe dell'indice compatto resta in cache
+            self._matches[key] = frozenset(allowed or ())
+        return self._matches[key]
+    
+    def field_values(self, field: str) -> Dict[str, int]:
+        """Valori di un campo con il numero di frammenti"""
+        return {value: len(node_ids) for value, node_ids in sorted(self.values[field].items())}
+    
+    def __len__(self) -> int:
+        return sum(len(node_ids) for node_ids in self.values["source"].values())
+    
+    def save(self, path: Path) -> None:
+        """
+        Salva l'indice in JSON
+        
+        Args:
+            path: File di destinazione
+        """
+        data = {
+            "version": METADATA_INDEX_VERSION,
+            "values": self.values,
+            "sources": self.sources
+        }
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+        except Exception as e:
+            raise RAGException(f"Errore nel salvataggio dell'indice dei metadati: {str(e)}")
+    
+    @classmethod
+    def load(cls, path: Path) -> Optional["MetadataIndex"]:
+        """
+        Carica l'indice da JSON
+        
+        Args:
+            path: File dell'indice
+            
+        Returns:
+            Indice caricato o None se assente, corrotto o di una versione diversa
+        """
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != METADATA_INDEX_VERSION:
+                logger.info(f"Indice dei metadati in {path} di una versione diversa, verrà ricostruito")
+                return None
+                
+            index = cls()
+            index.values.update(data["values"])
+            index.sources = data["sources"]
+            return index
+        except Exception as e:
+            logger.warning(f"Indice dei metadati in {path} non leggibile, verrà ricostruito: {e}")
+            return None
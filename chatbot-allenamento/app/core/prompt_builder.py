@@ -0,0 +1,85 @@
+"""
+Composizione dei messaggi inviati al modello
+"""
+
+from typing import List, Dict, Optional
+from pydantic import BaseModel, Field
+from app.core.token_budget import TokenCounter, MESSAGE_OVERHEAD_TOKENS
+from app.utils.prompt_templates import PromptTemplates
+
+# Intestazione preformattata del contesto documentale
+CONTEXT_HEADER = "\nContesto dalle fonti documentali:\n"
+
+class BuiltPrompt(BaseModel):
+    """Messaggi pronti per l'API con il conteggio dei token per sezione"""
+    messages: List[Dict[str, str]] = Field(default_factory=list, description="Messaggi in formato OpenAI")
+    token_counts: Dict[str, int] = Field(default_factory=dict, description="Token per sezione del prompt")
+
+class PromptBuilder:
+    """Compone i messaggi della chat senza modificare la cronologia ricevuta"""
+    
+    def __init__(self, token_counter: Optional[TokenCounter] = None):
+        self.token_counter = token_counter or TokenCounter()
+    
+    def build_chat_messages(
+        self,
+        system_prompt: str,
+        history: List[Dict[str, str]],
+        context: str = "",
+        summary: Optional[str] = None
+    ) -> BuiltPrompt:
+        """
+        Compone i messaggi per una risposta chat
+        
+        Il contesto documentale viene anteposto all'ultimo messaggio utente e
+        il riassunto della conversazione aggiunto al prompt di sistema. I
+        messaggi della cronologia sono riusati così come sono: solo quello
+        arricchito con il contesto è un nuovo dizionario.
+        
+        Args:
+            system_prompt: Prompt di sistema statico
+            history: Cronologia in formato OpenAI
+            context: Contesto recuperato dal RAG
+            summary: Riassunto della conversazione precedente
+            
+        Returns:
+            Messaggi composti e conteggio dei token
+        """
+        counter = self.token_counter
+        
+        system_content = system_prompt
+        summary_tokens = 0
+        if summary:
+            summary_section = PromptTemplates.format_conversation_summary(summary)
+            system_content = system_prompt + summary_section
+            summary_tokens = counter.count(summary_section)
+            
+        system_tokens = counter.count_static(system_prompt) + summary_tokens + MESSAGE_OVERHEAD_TOKENS
+        
+        messages = [{"role": "system", "content": system_content}]
+        messages.extend(history)
+        
+        context_tokens = 0
+        if context:
+            # L'ultimo messaggio utente è quasi sempre in fondo alla cronologia
+            for i in range(len(messages) - 1, 0, -1):
+                if messages[i]["role"] == "user":
+                    original = messages[i]
+                    messages[i] = {
+                        **original,
+                        "content": f"{CONTEXT_HEADER}{context}\n\n{original['content']}\n"
+                    }
+                    context_tokens = counter.count(context) + counter.count_static(CONTEXT_HEADER)
+                    break
+                    
+        history_tokens = counter.count_messages(history)
+        
+        token_counts = {
+            "system": system_tokens,
+            "summary": summary_tokens,
+            "context": context_tokens,
+            "history": history_tokens,
+            "total": system_tokens + context_tokens + history_tokens
+        }
+        
+        return BuiltPrompt(messages=messages, token_counts=token_counts)
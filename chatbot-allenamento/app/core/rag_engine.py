@@ -4,15 +4,21 @@ Motore RAG (Retrieval-Augmented Generation)
 
 import logging
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple
+import time
+from typing import List, Dict, Any, FrozenSet, Optional, Tuple
 from pathlib import Path
-from llama_index.core import VectorStoreIndex
+from llama_index.core import VectorStoreIndex, Settings as LlamaSettings
 from llama_index.core.retrievers import VectorIndexRetriever
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.postprocessor import SimilarityPostprocessor
+from llama_index.core.schema import BaseNode, NodeWithScore
 from app.config import settings
 from app.core.embeddings import EmbeddingManager
 from app.core.error_handler import RAGException
+from app.core.metadata_index import MetadataFilters
+from app.core.reranker import LexicalReranker, Reranker, create_reranker
+from app.core.sparse_index import reciprocal_rank_fusion
+from app.db.vectorstore import VectorStoreManager
 
 logger = logging.getLogger(__name__)
 
@@ -21,10 +27,15 @@ class RAGEngine:
     
     def __init__(self):
         self.embedding_manager = EmbeddingManager()
+        self.vector_store_manager = VectorStoreManager()
         self.index: Optional[VectorStoreIndex] = None
         self.query_engine = None
         self._initialized = False
         self._initialization_lock = asyncio.Lock()
+        
+        # Riclassificatore della seconda fase (creato al primo uso) e latenze per fase
+        self.reranker: Optional[Reranker] = None
+        self.retrieval_timings: Dict[str, Dict[str, float]] = {}
     
     async def initialize(self) -> None:
         """Inizializza il motore RAG"""
@@ -35,18 +46,27 @@ class RAGEngine:
             try:
                 logger.info("🔄 Inizializzazione motore RAG...")
                 
-                # Prova a caricare un indice esistente
-                index_path = settings.VECTOR_STORE_PATH
-                self.index = self.embedding_manager.load_index(index_path)
+                # Formato binario: si mappa l'ultima generazione pubblicata, senza leggere il JSON
+                shared = self._binary_index_enabled() and self._use_shared_index()
                 
-                if self.index is None:
-                    # Crea un nuovo indice dai documenti
-                    await self._create_new_index()
-                else:
-                    logger.info("✅ Indice esistente caricato")
+                if not shared:
+                    # Prova a caricare un indice esistente
+                    index_path = settings.VECTOR_STORE_PATH
+                    self.index = self.embedding_manager.load_index(index_path)
+                    
+                    if self.index is None:
+                        # Crea un nuovo indice dai documenti
+                        await self._create_new_index()
+                    else:
+                        logger.info("✅ Indice esistente caricato")
+                    shared = self._binary_index_enabled() and self._publish_shared_index()
                 
-                # Configura il query engine
-                self._setup_query_engine()
+                if shared:
+                    logger.info(f"✅ Indice condiviso in uso ({self.vector_store_manager.shared_generation.name})")
+                else:
+                    # Configura il query engine
+                    self._setup_query_engine()
+                    self._prepare_ann_index()
                 
                 self._initialized = True
                 logger.info("🎉 Motore RAG inizializzato con successo")
@@ -106,67 +126,406 @@ class RAGEngine:
         
         logger.info("🔧 Query engine configurato")
     
-    async def retrieve_context(self, query: str) -> Tuple[str, List[str]]:
+    def _compact_index_enabled(self) -> bool:
+        """Verifica se è configurato un indice compatto (approssimato o quantizzato)"""
+        return settings.ANN_INDEX_ENABLED or settings.VECTOR_QUANTIZATION != "none"
+    
+    def _prepare_ann_index(self) -> None:
+        """Prepara l'indice compatto; se non riesce resta la ricerca esatta"""
+        if not self._compact_index_enabled():
+            return
+        try:
+            if self.vector_store_manager.prepare_ann_index(self.index) is not None:
+                self.vector_store_manager.release_embeddings(self.index)
+        except Exception as e:
+            self.vector_store_manager.ann_index = None
+            logger.warning(f"⚠️ Indice approssimato non disponibile, uso la ricerca esatta: {e}")
+    
+    def _binary_index_enabled(self) -> bool:
+        """Verifica se l'indice si carica dal formato binario mappato in memoria invece che dal JSON"""
+        return settings.INDEX_FORMAT == "binary"
+    
+    def _use_shared_index(self) -> bool:
+        """Passa alla generazione corrente dell'indice condiviso, se ne è stata pubblicata una"""
+        if self.vector_store_manager.open_shared_index() is None:
+            return False
+        self._adopt_shared_generation()
+        return True
+    
+    def _publish_shared_index(self) -> bool:
+        """
+        Pubblica l'indice del processo come nuova generazione condivisa e passa a usarla
+        
+        Returns:
+            True se il processo ora usa l'indice condiviso
+        """
+        try:
+            self.vector_store_manager.publish_shared_index(
+                self.index, self.embedding_manager.sparse_index, self.embedding_manager.metadata_index
+            )
+            return self._use_shared_index()
+        except Exception as e:
+            self.vector_store_manager.close_shared_index()
+            logger.warning(f"⚠️ Indice condiviso non disponibile, uso l'indice del processo: {e}")
+            return False
+    
+    def _adopt_shared_generation(self) -> None:
+        """Usa indice lessicale e nodi della generazione condivisa al posto di quelli del processo"""
+        generation = self.vector_store_manager.shared_generation
+        if settings.HYBRID_RETRIEVAL_ENABLED:
+            self.embedding_manager.sparse_index = generation.sparse_index
+        self.embedding_manager.metadata_index = generation.metadata_index
+        # L'indice JSON viene ricaricato solo per aggiungere documenti
+        self.index = None
+        self.query_engine = None
+    
+    def _refresh_shared_index(self) -> None:
+        """Passa alla generazione pubblicata da un altro processo, se è cambiata"""
+        if self.vector_store_manager.refresh_shared_index():
+            self._adopt_shared_generation()
+    
+    def _index_ready(self) -> bool:
+        """Verifica se è disponibile un indice per la ricerca (del processo o condiviso)"""
+        return self.index is not None or self.vector_store_manager.shared_generation is not None
+    
+    def _get_node(self, node_id: str) -> Optional[BaseNode]:
+        """Nodo per identificativo, dalla generazione condivisa o dal docstore"""
+        generation = self.vector_store_manager.shared_generation
+        if generation is not None:
+            return generation.get_node(node_id)
+        return self.index.docstore.get_node(node_id, raise_error=False)
+    
+    def _filter_node_ids(self, filters: Optional[MetadataFilters]) -> Optional[FrozenSet[str]]:
+        """
+        Nodi ammessi dai filtri sui metadati
+        
+        Args:
+            filters: Valori ammessi per fonte, tipo di file e argomento
+            
+        Returns:
+            Identificativi ammessi o None senza filtri
+        """
+        if not filters:
+            return None
+        if self.embedding_manager.metadata_index is None:
+            raise RAGException("Indice dei metadati non disponibile per il recupero filtrato")
+        node_ids = self.embedding_manager.metadata_index.match(filters)
+        logger.debug(f"Filtri {filters}: {len(node_ids)} frammenti ammessi")
+        return node_ids
+    
+    def _dense_retrieve(self, query: str, top_k: int, node_ids: Optional[FrozenSet[str]] = None) -> List[NodeWithScore]:
+        """
+        Recupero vettoriale: indice approssimato se disponibile, altrimenti ricerca esatta
+        
+        Args:
+            query: Query di ricerca
+            top_k: Numero massimo di nodi
+            node_ids: Nodi a cui limitare la ricerca (filtro sui metadati), None = tutti
+            
+        Returns:
+            Nodi con similarità coseno, in ordine decrescente
+        """
+        if node_ids is not None and not node_ids:
+            return []
+        if self.vector_store_manager.ann_index is None:
+            retriever = VectorIndexRetriever(
+                index=self.index,
+                similarity_top_k=top_k,
+                node_ids=list(node_ids) if node_ids is not None else None
+            )
+            return retriever.retrieve(query)
+            
+        embed_model = self.index._embed_model if self.index is not None else LlamaSettings.embed_model
+        query_embedding = embed_model.get_query_embedding(query)
+        results = []
+        for node_id, score in self.vector_store_manager.ann_search(query_embedding, top_k, node_ids):
+            node = self._get_node(node_id)
+            if node is not None:
+                results.append(NodeWithScore(node=node, score=score))
+        return results
+    
+    async def retrieve_context(self, query: str, filters: Optional[MetadataFilters] = None) -> Tuple[str, List[str]]:
         """
         Recupera il contesto rilevante per una query
         
         Args:
             query: Query di ricerca
+            filters: Filtri sui metadati (source, file_type, topic)
             
         Returns:
             Tupla contenente (contesto_combinato, lista_fonti)
         """
+        chunks = await self.retrieve_chunks(query, filters)
+        
+        # Combina il contesto
+        context_parts = [chunk['text'] for chunk in chunks]
+        sources = set()
+        
+        for chunk in chunks:
+            metadata = chunk['metadata']
+            
+            # Aggiungi la fonte
+            if 'source' in metadata:
+                sources.add(metadata['source'])
+            elif 'filename' in metadata:
+                sources.add(metadata['filename'])
+                
+        combined_context = "\n\n".join(context_parts)
+        source_list = list(sources)
+        
+        logger.info(f"✅ Recuperati {len(context_parts)} frammenti da {len(source_list)} fonti")
+        
+        return combined_context, source_list
+    
+    async def retrieve_chunks(self, query: str, filters: Optional[MetadataFilters] = None) -> List[Dict[str, Any]]:
+        """
+        Recupera i frammenti rilevanti per una query con il relativo punteggio
+        
+        Args:
+            query: Query di ricerca
+            filters: Filtri sui metadati (es. {"topic": "nutrizione"}): la ricerca valuta solo i frammenti ammessi
+            
+        Returns:
+            Lista di frammenti (dizionari con 'text', 'metadata', 'score')
+        """
         if not self._initialized:
             await self.initialize()
         
-        if not self.query_engine:
+        if not self.query_engine and self.vector_store_manager.shared_generation is None:
             raise RAGException("Query engine non configurato")
         
         try:
+            self._refresh_shared_index()
             logger.info(f"🔍 Ricerca contesto per: {query[:100]}...")
+            node_ids = self._filter_node_ids(filters)
             
+            if settings.RERANK_ENABLED:
+                return self._two_stage_retrieve(query, settings.RERANK_TOP_K, node_ids)
+                
+            if self._hybrid_available():
+                return self._hybrid_retrieve(query, settings.TOP_K_DOCUMENTS, node_ids=node_ids)
+                
+            if self.vector_store_manager.ann_index is not None or node_ids is not None:
+                # Embeddings liberati o ricerca filtrata: il query engine non limita i nodi
+                return [
+                    {
+                        'text': node.node.get_content(),
+                        'metadata': node.node.metadata,
+                        'score': node.score
+                    }
+                    for node in self._dense_retrieve(query, settings.TOP_K_DOCUMENTS, node_ids)
+                    if (node.score or 0.0) >= settings.SIMILARITY_THRESHOLD
+                ]
+                
             # Esegui la query
             response = self.query_engine.query(query)
             
             # Estrai i nodi sorgente
             source_nodes = response.source_nodes if hasattr(response, 'source_nodes') else []
             
-            # Combina il testo dei nodi rilevanti
-            context_parts = []
-            sources = set()
-            
+            chunks = []
             for node in source_nodes:
                 if hasattr(node, 'node'):
-                    text = node.node.text
-                    metadata = node.node.metadata
-                    
-                    context_parts.append(text)
-                    
-                    # Aggiungi la fonte
-                    if 'source' in metadata:
-                        sources.add(metadata['source'])
-                    elif 'filename' in metadata:
-                        sources.add(metadata['filename'])
-            
-            # Combina il contesto
-            combined_context = "\n\n".join(context_parts)
-            source_list = list(sources)
-            
-            logger.info(f"✅ Recuperati {len(context_parts)} frammenti da {len(source_list)} fonti")
+                    chunks.append({
+                        'text': node.node.text,
+                        'metadata': node.node.metadata,
+                        'score': getattr(node, 'score', None)
+                    })
             
-            return combined_context, source_list
+            return chunks
             
         except Exception as e:
             logger.error(f"❌ Errore nel recupero del contesto: {e}")
             raise RAGException(f"Errore nel recupero del contesto: {str(e)}")
     
-    async def search_documents(self, query: str, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+    def _hybrid_available(self) -> bool:
+        """Verifica se il recupero ibrido è attivo e l'indice lessicale è pronto"""
+        return (
+            settings.HYBRID_RETRIEVAL_ENABLED
+            and self._index_ready()
+            and self.embedding_manager.sparse_index is not None
+        )
+    
+    def _hybrid_retrieve(
+        self,
+        query: str,
+        top_k: int,
+        apply_threshold: bool = True,
+        node_ids: Optional[FrozenSet[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Recupero ibrido: classifica vettoriale e BM25 fuse con la Reciprocal Rank Fusion
+        
+        I termini esatti (nomi di esercizi come "stacco rumeno") vengono trovati dall'indice
+        lessicale anche quando la similarità vettoriale li classifica male, quindi bastano
+        meno frammenti per coprire la richiesta.
+        
+        Args:
+            query: Query di ricerca
+            top_k: Numero di frammenti restituiti dopo la fusione
+            apply_threshold: Esclude dalla classifica vettoriale i nodi sotto SIMILARITY_THRESHOLD
+            node_ids: Nodi a cui limitare entrambe le ricerche (filtro sui metadati)
+            
+        Returns:
+            Lista di frammenti (dizionari con 'text', 'metadata', 'score' di fusione)
+        """
+        dense_nodes = [
+            node for node in self._dense_retrieve(query, settings.HYBRID_CANDIDATES, node_ids)
+            if not apply_threshold or (node.score or 0.0) >= settings.SIMILARITY_THRESHOLD
+        ]
+        sparse_results = self.embedding_manager.sparse_index.search(query, settings.HYBRID_CANDIDATES, node_ids)
+        
+        nodes = {node.node.node_id: node.node for node in dense_nodes}
+        fused = reciprocal_rank_fusion(
+            [list(nodes), [node_id for node_id, _ in sparse_results]],
+            k=settings.RRF_K
+        )
+        
+        chunks = []
+        for node_id, score in fused:
+            node = nodes.get(node_id) or self._get_node(node_id)
+            if node is None:
+                continue
+            chunks.append({
+                'text': node.get_content(),
+                'metadata': node.metadata,
+                'score': score
+            })
+            if len(chunks) >= top_k:
+                break
+                
+        logger.debug(
+            f"Recupero ibrido: {len(dense_nodes)} candidati vettoriali, "
+            f"{len(sparse_results)} lessicali, {len(chunks)} restituiti"
+        )
+        return chunks
+    
+    def _first_stage_retrieve(
+        self,
+        query: str,
+        count: int,
+        node_ids: Optional[FrozenSet[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Prima fase del recupero in due fasi: molti candidati, senza soglia di similarità
+        
+        Args:
+            query: Query di ricerca
+            count: Numero di candidati
+            node_ids: Nodi a cui limitare la ricerca (filtro sui metadati)
+            
+        Returns:
+            Lista di frammenti in ordine di prima fase
+        """
+        if self._hybrid_available():
+            return self._hybrid_retrieve(query, count, apply_threshold=False, node_ids=node_ids)
+        return [
+            {
+                'text': node.node.get_content(),
+                'metadata': node.node.metadata,
+                'score': node.score
+            }
+            for node in self._dense_retrieve(query, count, node_ids)
+        ]
+    
+    def _get_reranker(self) -> Reranker:
+        """Riclassificatore configurato; se il cross-encoder non si carica resta quello lessicale"""
+        if self.reranker is None:
+            try:
+                self.reranker = create_reranker(settings.RERANKER, settings.RERANK_MODEL_PATH)
+            except Exception as e:
+                logger.warning(f"⚠️ Riclassificatore {settings.RERANKER} non disponibile, uso quello lessicale: {e}")
+                self.reranker = LexicalReranker()
+        if isinstance(self.reranker, LexicalReranker):
+            # Pesi dei termini dall'indice lessicale corrente (cambia con le generazioni condivise)
+            self.reranker.sparse_index = self.embedding_manager.sparse_index
+        return self.reranker
+    
+    def _two_stage_retrieve(
+        self,
+        query: str,
+        top_k: int,
+        node_ids: Optional[FrozenSet[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Recupero in due fasi: RERANK_CANDIDATES candidati economici, poi riclassificazione
+        
+        La soglia fissa sulla similarità coseno viene sostituita da RERANK_MIN_SCORE sul
+        punteggio di pertinenza della riclassificazione (i candidati non pertinenti non
+        vengono restituiti); a parità di punteggio resta l'ordine della prima fase, il
+        cui punteggio resta in 'retrieval_score'.
+        
+        Args:
+            query: Query di ricerca
+            top_k: Numero di frammenti restituiti dopo la riclassificazione
+            node_ids: Nodi a cui limitare la prima fase (filtro sui metadati)
+            
+        Returns:
+            Lista di frammenti (dizionari con 'text', 'metadata', 'score', 'retrieval_score')
+        """
+        start = time.perf_counter()
+        candidates = self._first_stage_retrieve(query, settings.RERANK_CANDIDATES, node_ids)
+        first_stage = time.perf_counter() - start
+        
+        reranker = self._get_reranker()
+        scores = reranker.score(query, [chunk['text'] for chunk in candidates])
+        rerank = time.perf_counter() - start - first_stage
+        
+        for chunk, score in zip(candidates, scores):
+            chunk['retrieval_score'] = chunk['score']
+            chunk['score'] = score
+        # Ordinamento stabile: a parità di pertinenza resta l'ordine della prima fase
+        ranked = sorted(candidates, key=lambda chunk: chunk['score'], reverse=True)
+        chunks = [chunk for chunk in ranked if chunk['score'] >= settings.RERANK_MIN_SCORE][:top_k]
+        
+        self._record_timing('first_stage', first_stage)
+        self._record_timing('rerank', rerank)
+        self._record_timing('total', time.perf_counter() - start)
+        logger.info(
+            f"⏱️ Recupero in due fasi: {len(candidates)} candidati in {first_stage * 1000:.1f}ms, "
+            f"riclassificazione {reranker.name} in {rerank * 1000:.1f}ms, {len(chunks)} restituiti"
+        )
+        return chunks
+    
+    def _record_timing(self, stage: str, seconds: float) -> None:
+        """Aggiorna le latenze cumulative di una fase del recupero"""
+        timing = self.retrieval_timings.setdefault(stage, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0})
+        elapsed = seconds * 1000
+        timing['calls'] += 1
+        timing['total_ms'] += elapsed
+        timing['max_ms'] = max(timing['max_ms'], elapsed)
+        timing['last_ms'] = elapsed
+    
+    def get_retrieval_timings(self) -> Dict[str, Dict[str, float]]:
+        """
+        Latenze per fase del recupero in due fasi
+        
+        Returns:
+            Per ogni fase (first_stage, rerank, total): chiamate, media, massimo e ultima in ms
+        """
+        return {
+            stage: {
+                'calls': timing['calls'],
+                'avg_ms': round(timing['total_ms'] / timing['calls'], 2),
+                'max_ms': round(timing['max_ms'], 2),
+                'last_ms': round(timing['last_ms'], 2)
+            }
+            for stage, timing in self.retrieval_timings.items()
+        }
+    
+    async def search_documents(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        filters: Optional[MetadataFilters] = None
+    ) -> List[Dict[str, Any]]:
         """
         Cerca documenti rilevanti
         
         Args:
             query: Query di ricerca
             top_k: Numero massimo di risultati
+            filters: Filtri sui metadati (source, file_type, topic)
             
         Returns:
             Lista di documenti rilevanti con metadata
@@ -174,15 +533,26 @@ class RAGEngine:
         if not self._initialized:
             await self.initialize()
         
-        if not self.index:
+        if not self._index_ready():
             raise RAGException("Indice non disponibile")
         
         try:
+            self._refresh_shared_index()
             k = top_k or settings.TOP_K_DOCUMENTS
-            retriever = VectorIndexRetriever(index=self.index, similarity_top_k=k)
+            node_ids = self._filter_node_ids(filters)
             
+            if settings.RERANK_ENABLED:
+                results = self._two_stage_retrieve(query, k, node_ids)
+                logger.info(f"🔍 Trovati {len(results)} documenti per la query (con riclassificazione)")
+                return results
+                
+            if self._hybrid_available():
+                results = self._hybrid_retrieve(query, k, apply_threshold=False, node_ids=node_ids)
+                logger.info(f"🔍 Trovati {len(results)} documenti per la query (ricerca ibrida)")
+                return results
+                
             # Esegui la ricerca
-            nodes = retriever.retrieve(query)
+            nodes = self._dense_retrieve(query, k, node_ids)
             
             results = []
             for node in nodes:
@@ -224,15 +594,37 @@ class RAGEngine:
                 logger.warning("⚠️ Nessun documento valido da aggiungere")
                 return
             
-            # Aggiorna l'indice
-            for doc in new_documents:
-                self.index.insert(doc)
+            shared = self.vector_store_manager.shared_generation is not None
+            if self.index is None:
+                # Con l'indice condiviso il processo non tiene l'indice vettoriale: si ricarica per scriverlo
+                self.index = self.embedding_manager.load_index(settings.VECTOR_STORE_PATH)
+                if self.index is None:
+                    raise RAGException("Indice non disponibile per l'aggiunta dei documenti")
+            
+            # Aggiorna l'indice con una sola suddivisione di tutti i nuovi documenti
+            self.embedding_manager.insert_documents(self.index, new_documents)
             
+            if self._hybrid_available():
+                self.embedding_manager.build_sparse_index(self.index)
+            if self.embedding_manager.metadata_index is not None:
+                self.embedding_manager.build_metadata_index(self.index)
+            if not shared and self._compact_index_enabled():
+                self.vector_store_manager.sync_ann_index(self.index)
+                self.vector_store_manager.restore_embeddings(self.index)
+                
             # Aggiorna il manager
             self.embedding_manager.update_documents(new_documents)
             
             # Salva l'indice aggiornato
             self.embedding_manager.save_index(self.index, settings.VECTOR_STORE_PATH)
+            if shared:
+                # Gli altri worker passano alla nuova generazione al prossimo controllo
+                self.vector_store_manager.publish_shared_index(
+                    self.index, self.embedding_manager.sparse_index, self.embedding_manager.metadata_index
+                )
+                self._use_shared_index()
+            elif self.vector_store_manager.ann_index is not None:
+                self.vector_store_manager.release_embeddings(self.index)
             
             logger.info(f"✅ Aggiunti {len(new_documents)} documenti all'indice")
             
@@ -249,10 +641,14 @@ class RAGEngine:
             self.index = None
             self.query_engine = None
             self.embedding_manager.clear_documents()
+            self.embedding_manager.sparse_index = None
+            self.embedding_manager.metadata_index = None
             
             # Ricrea l'indice
             await self._create_new_index()
-            self._setup_query_engine()
+            if not (self._binary_index_enabled() and self._publish_shared_index()):
+                self._setup_query_engine()
+                self._prepare_ann_index()
             
             logger.info("✅ Indice ricostruito con successo")
             
@@ -267,12 +663,23 @@ class RAGEngine:
         Returns:
             Dizionario con le statistiche
         """
+        metadata_index = self.embedding_manager.metadata_index
         stats = {
             'initialized': self._initialized,
-            'index_available': self.index is not None,
+            'index_available': self._index_ready(),
             'query_engine_available': self.query_engine is not None,
+            'hybrid_retrieval': self._hybrid_available(),
+            'ann_index': self.vector_store_manager.ann_index is not None,
+            'shared_index': getattr(self.vector_store_manager.shared_generation, 'name', None),
+            'reranker': settings.RERANKER if settings.RERANK_ENABLED else None,
+            'retrieval_timings': self.get_retrieval_timings(),
             'total_documents': len(self.embedding_manager.documents),
-            'available_sources': self.embedding_manager.get_document_sources()
+            'available_sources': (
+                list(metadata_index.sources) if metadata_index is not None
+                else self.embedding_manager.get_document_sources()
+            ),
+            'topics': metadata_index.field_values('topic') if metadata_index is not None else {},
+            'chunking': self.embedding_manager.chunking.get_stats()
         }
         
         return stats
@@ -288,6 +695,11 @@ class RAGEngine:
         Returns:
             Lista con informazioni sulle fonti
         """
+        metadata_index = self.embedding_manager.metadata_index
+        if metadata_index is not None:
+            # Tabella calcolata alla costruzione dell'indice dei metadati
+            return [{'source': source, **summary} for source, summary in metadata_index.sources.items()]
+            
         sources_info = []
         
         for source in self.embedding_manager.get_document_sources():
@@ -0,0 +1,140 @@
+"""
+Riclassificazione dei frammenti recuperati (seconda fase del recupero RAG)
+"""
+
+import logging
+import math
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence
+from app.core.error_handler import RAGException
+from app.core.sparse_index import BM25Index, analyze
+
+logger = logging.getLogger(__name__)
+
+RERANKERS = ("lexical", "cross_encoder")
+
+class Reranker(ABC):
+    """
+    Assegna a ogni frammento candidato un punteggio di pertinenza rispetto alla query
+    
+    I punteggi sono tra 0 e 1 e misurano solo la pertinenza, così RERANK_MIN_SCORE
+    può scartare i candidati non pertinenti; i candidati arrivano nell'ordine della
+    prima fase, che resta a parità di punteggio.
+    """
+    
+    name = "none"
+    
+    @abstractmethod
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        """
+        Args:
+            query: Query di ricerca
+            texts: Testi dei candidati, in ordine di prima fase
+            
+        Returns:
+            Punteggio di pertinenza di ogni candidato
+        """
+
+class LexicalReranker(Reranker):
+    """
+    Riclassificazione lessicale leggera, senza modelli
+    
+    Misura quanta parte della query (termini pesati per IDF, come nell'indice BM25)
+    compare nel frammento e premia le coppie di termini consecutive della query
+    presenti anche nel frammento ("stacco rumeno", "recupero tra le serie").
+    Un frammento senza termini della query ha punteggio 0.
+    """
+    
+    name = "lexical"
+    
+    # Peso delle coppie di termini consecutive rispetto alla copertura dei termini
+    _BIGRAM_WEIGHT = 0.5
+    
+    def __init__(self, sparse_index: Optional[BM25Index] = None):
+        """
+        Args:
+            sparse_index: Indice BM25 da cui leggere le frequenze dei termini (None = pesi uniformi)
+        """
+        self.sparse_index = sparse_index
+    
+    def _idf(self, term: str) -> float:
+        """IDF del termine nell'indice lessicale (1 senza indice)"""
+        if self.sparse_index is None or not len(self.sparse_index):
+            return 1.0
+        frequency = len(self.sparse_index.postings.get(term, ()))
+        total = len(self.sparse_index)
+        return math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+    
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        query_terms = analyze(query)
+        if not query_terms or not texts:
+            return [0.0] * len(texts)
+        weights = {term: self._idf(term) for term in set(query_terms)}
+        total_weight = sum(weights.values()) or 1.0
+        query_bigrams = set(zip(query_terms, query_terms[1:]))
+        
+        scores = []
+        for text in texts:
+            terms = analyze(text)
+            present = set(terms)
+            coverage = sum(weight for term, weight in weights.items() if term in present) / total_weight
+            bigrams = len(query_bigrams & set(zip(terms, terms[1:]))) / len(query_bigrams) if query_bigrams else 0.0
+            scores.append((coverage + self._BIGRAM_WEIGHT * bigrams) / (1 + self._BIGRAM_WEIGHT))
+        return scores
+
+class CrossEncoderReranker(Reranker):
+    """
+    Cross-encoder locale su CPU (sentence-transformers)
+    
+    Valuta ogni coppia (query, frammento) insieme: più preciso della similarità
+    tra embeddings calcolati separatamente, ma applicabile solo a pochi candidati.
+    """
+    
+    name = "cross_encoder"
+    
+    def __init__(self, model_path: str, batch_size: int = 32):
+        """
+        Args:
+            model_path: Directory locale del modello cross-encoder
+            batch_size: Coppie valutate per blocco
+        """
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise RAGException("RERANKER=cross_encoder richiede sentence-transformers (pip install sentence-transformers)")
+        if not model_path:
+            raise RAGException("RERANK_MODEL_PATH non configurato per RERANKER=cross_encoder")
+            
+        logger.info(f"Caricamento cross-encoder da {model_path}")
+        self.model = CrossEncoder(model_path, device="cpu", local_files_only=True)
+        self.batch_size = batch_size
+    
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        if not texts:
+            return []
+        logits = self.model.predict(
+            [(query, text) for text in texts],
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        # Logit del modello (una classe) convertiti in probabilità di pertinenza
+        return [1.0 / (1.0 + math.exp(-float(logit))) for logit in logits.reshape(len(texts), -1)[:, -1]]
+
+def create_reranker(mode: str, model_path: str = "", sparse_index: Optional[BM25Index] = None) -> Reranker:
+    """
+    Crea il riclassificatore configurato
+    
+    Args:
+        mode: lexical o cross_encoder
+        model_path: Directory del modello cross-encoder
+        sparse_index: Indice BM25 per i pesi dei termini del riclassificatore lessicale
+        
+    Returns:
+        Riclassificatore
+    """
+    if mode not in RERANKERS:
+        raise RAGException(f"Riclassificatore non valido: {mode} (valori ammessi: {', '.join(RERANKERS)})")
+    if mode == "cross_encoder":
+        return CrossEncoderReranker(model_path)
+    return LexicalReranker(sparse_index)
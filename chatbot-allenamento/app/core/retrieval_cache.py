@@ -0,0 +1,137 @@
+"""
+Cache del recupero RAG per una singola richiesta
+"""
+
+import json
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+from app.config import settings
+from app.core.metadata_index import MetadataFilters
+from app.core.rag_engine import RAGEngine
+
+logger = logging.getLogger(__name__)
+
+class RetrievalCache:
+    """
+    Recupero mirato per le fasi di una generazione, con cache per la durata della richiesta
+    
+    Ogni fase interroga il RAG con una query specifica (es. gruppi muscolari
+    del giorno, nutrizione); le query ripetute non vengono rieseguite e i
+    frammenti duplicati tra più query compaiono una sola volta nel contesto.
+    """
+    
+    def __init__(self, rag_engine: RAGEngine, max_chunks: Optional[int] = None):
+        """
+        Args:
+            rag_engine: Motore RAG
+            max_chunks: Numero massimo di frammenti nel contesto di una fase
+        """
+        self.rag_engine = rag_engine
+        self.max_chunks = max_chunks or settings.STAGE_CONTEXT_CHUNKS
+        
+        self._results: Dict[str, List[Dict[str, Any]]] = {}
+        self._used_sources: List[str] = []
+        self._hits = 0
+        self._misses = 0
+    
+    @staticmethod
+    def _normalize(query: str) -> str:
+        """Normalizza la query per la chiave di cache"""
+        return " ".join(query.lower().split())
+    
+    async def get_chunks(self, query: str, filters: Optional[MetadataFilters] = None) -> List[Dict[str, Any]]:
+        """
+        Recupera i frammenti per una query, usando la cache se disponibile
+        
+        Con i filtri la ricerca riguarda solo il materiale indicato (es. l'argomento
+        nutrizione); se nessun frammento li soddisfa si cerca nell'intero indice.
+        
+        Args:
+            query: Query di ricerca
+            filters: Filtri sui metadati (source, file_type, topic)
+            
+        Returns:
+            Frammenti recuperati (dizionari con 'text', 'metadata', 'score')
+        """
+        key = self._normalize(query)
+        if filters:
+            key += "|" + json.dumps(filters, sort_keys=True, ensure_ascii=False)
+        
+        if key in self._results:
+            self._hits += 1
+            return self._results[key]
+            
+        self._misses += 1
+        try:
+            chunks = []
+            if filters:
+                chunks = await self.rag_engine.retrieve_chunks(query, filters=filters)
+                if not chunks:
+                    logger.info(f"Nessun frammento con i filtri {filters} per '{query[:60]}', ricerca sull'intero indice")
+            if not chunks:
+                chunks = await self.rag_engine.retrieve_chunks(query)
+        except Exception as e:
+            # Una fase senza contesto è preferibile al fallimento della generazione
+            logger.warning(f"Recupero non riuscito per '{query[:60]}': {e}")
+            chunks = []
+            
+        self._results[key] = chunks
+        return chunks
+    
+    async def get_context(self, *queries: str, filters: Optional[MetadataFilters] = None) -> Tuple[str, List[str]]:
+        """
+        Compone il contesto di una fase da una o più query
+        
+        I frammenti sono ordinati per punteggio, deduplicati e limitati a `max_chunks`.
+        
+        Args:
+            queries: Query specifiche della fase
+            filters: Filtri sui metadati applicati a tutte le query
+            
+        Returns:
+            Tupla (contesto, fonti)
+        """
+        candidates = []
+        for query in queries:
+            candidates.extend(await self.get_chunks(query, filters))
+            
+        candidates.sort(key=lambda c: c.get("score") or 0.0, reverse=True)
+        
+        seen_texts = set()
+        context_parts = []
+        sources = []
+        
+        for chunk in candidates:
+            if chunk["text"] in seen_texts:
+                continue
+            seen_texts.add(chunk["text"])
+            context_parts.append(chunk["text"])
+            
+            metadata = chunk.get("metadata") or {}
+            source = metadata.get("source") or metadata.get("filename")
+            if source and source not in sources:
+                sources.append(source)
+                
+            if len(context_parts) >= self.max_chunks:
+                break
+                
+        self._used_sources.extend(source for source in sources if source not in self._used_sources)
+        return "\n\n".join(context_parts), sources
+    
+    def get_sources(self) -> List[str]:
+        """Restituisce le fonti dei frammenti inclusi nei contesti della richiesta"""
+        return list(self._used_sources)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Ottiene statistiche sul recupero della richiesta
+        
+        Returns:
+            Query eseguite, query servite dalla cache e frammenti unici
+        """
+        unique_texts = {chunk["text"] for chunks in self._results.values() for chunk in chunks}
+        return {
+            "queries": self._misses,
+            "cache_hits": self._hits,
+            "unique_chunks": len(unique_texts)
+        }
@@ -0,0 +1,137 @@
+"""
+Deduplicazione delle richieste identiche in corso (single-flight)
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+def normalize_text(text: str) -> str:
+    """Testo normalizzato per il confronto delle richieste: minuscolo e spazi compattati"""
+    return " ".join(text.lower().split())
+
+def request_key(*parts: Any) -> str:
+    """
+    Chiave compatta per il contenuto di una richiesta
+    
+    Args:
+        parts: Parti della richiesta serializzabili in JSON
+        
+    Returns:
+        Hash SHA-1 delle parti
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+class _Flight:
+    """Calcolo in corso condiviso dalle richieste con la stessa chiave"""
+    
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.listeners: List[Callable[..., None]] = []
+
+class SingleFlight:
+    """
+    Esegue una sola volta le richieste identiche contemporanee
+    
+    La prima richiesta per una chiave avvia il calcolo; le successive che
+    arrivano prima della fine ne attendono il risultato (o l'eccezione) invece
+    di ripeterlo. Non è una cache: a calcolo concluso la chiave viene liberata.
+    Il calcolo viene annullato solo se tutte le richieste in attesa vengono
+    annullate. Le notifiche del calcolo (`notify`) raggiungono i listener di
+    tutte le richieste accodate.
+    """
+    
+    def __init__(self, name: str = "single_flight"):
+        """
+        Args:
+            name: Nome usato nei log
+        """
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._calls = 0
+        self._executions = 0
+        self._coalesced = 0
+    
+    async def do(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[T]],
+        listener: Optional[Callable[..., None]] = None
+    ) -> T:
+        """
+        Esegue la funzione o si accoda al calcolo identico già in corso
+        
+        Args:
+            key: Chiave della richiesta normalizzata
+            func: Funzione asincrona senza argomenti che esegue il calcolo
+            listener: Riceve le notifiche del calcolo da questo momento in poi
+            
+        Returns:
+            Risultato del calcolo condiviso
+        """
+        self._calls += 1
+        flight = self._flights.get(key)
+        if flight is None or flight.task.done():
+            flight = _Flight(asyncio.create_task(func()))
+            self._flights[key] = flight
+            self._executions += 1
+            flight.task.add_done_callback(lambda _: self._release(key, flight))
+        else:
+            self._coalesced += 1
+            logger.info(f"{self.name}: richiesta accodata al calcolo identico in corso")
+            
+        flight.waiters += 1
+        if listener is not None:
+            flight.listeners.append(listener)
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if listener is not None:
+                flight.listeners.remove(listener)
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+    
+    def notify(self, key: Hashable, *args: Any) -> None:
+        """
+        Inoltra una notifica ai listener del calcolo in corso per la chiave
+        
+        Args:
+            key: Chiave del calcolo
+            args: Argomenti passati a ogni listener
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            return
+        for listener in list(flight.listeners):
+            try:
+                listener(*args)
+            except Exception as e:
+                logger.warning(f"{self.name}: errore in un listener: {e}")
+    
+    def _release(self, key: Hashable, flight: _Flight) -> None:
+        """Libera la chiave al termine del calcolo"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+    
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Ottiene statistiche sulla deduplicazione
+        
+        Returns:
+            Richieste ricevute, calcoli eseguiti, richieste accodate e calcoli in corso
+        """
+        return {
+            "calls": self._calls,
+            "executions": self._executions,
+            "coalesced": self._coalesced,
+            "in_flight": len(self._flights)
+        }
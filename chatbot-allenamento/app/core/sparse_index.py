@@ -0,0 +1,272 @@
+"""
+Indice lessicale BM25 per il recupero ibrido (lessicale + vettoriale)
+"""
+
+import json
+import heapq
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+from app.core.error_handler import RAGException
+
+logger = logging.getLogger(__name__)
+
+SPARSE_INDEX_FILENAME = "sparse_index.json"
+SPARSE_INDEX_VERSION = 1
+
+ITALIAN_STOPWORDS = frozenset("""
+a ad agli ai al all alla alle allo anche ancora avere c che chi ci coi col come con contro cui d da dagl dagli dai dal dall dalla dalle
+dallo degl degli dei del dell della delle dello di dopo dove e ed era essere fa fare gli ha hai hanno ho i il in io l la le lei lo loro lui
+ma me mi mia mie miei mio ne negl negli nei nel nell nella nelle nello no noi non o ogni per perche piu po poi quale quali quando quanto
+quella quelle quelli quello questa queste questi questo se sei si sia siamo sono su sua sue sugl sugli sui sul sull sulla sulle sullo suo
+suoi ti tra tu tua tue tuo tuoi tutti tutto un una uno vi voi vorrei voglio
+""".split())
+
+# Suffissi derivazionali e verbali rimossi prima della vocale finale (dal più lungo)
+_DERIVATIONAL_SUFFIXES = (
+    "amente", "azioni", "azione", "amenti", "amento", "imenti", "imento",
+    "mente", "are", "ere", "ire"
+)
+_MIN_STEM_LENGTH = 4
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def stem_italian(token: str) -> str:
+    """
+    Stemming leggero per l'italiano
+    
+    Rimuove pochi suffissi derivazionali e le desinenze di genere e numero, così
+    "panca inclinata" e "panche inclinate" producono gli stessi termini.
+    
+    Args:
+        token: Parola minuscola senza accenti
+        
+    Returns:
+        Radice della parola
+    """
+    if len(token) <= _MIN_STEM_LENGTH or token.isdigit():
+        return token
+        
+    for suffix in _DERIVATIONAL_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM_LENGTH:
+            return token[:-len(suffix)]
+            
+    # Desinenze di genere e numero: esercizio/esercizi, stacco/stacchi, panca/panche
+    if token[-1] in "aeio":
+        token = token[:-1]
+        if token.endswith("i") and len(token) > _MIN_STEM_LENGTH:
+            token = token[:-1]
+        if token.endswith(("ch", "gh")):
+            token = token[:-1]
+    return token
+
+def analyze(text: str) -> List[str]:
+    """
+    Converte un testo nei termini indicizzati
+    
+    Args:
+        text: Testo da analizzare
+        
+    Returns:
+        Termini minuscoli, senza accenti e stopword, ridotti alla radice
+    """
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    normalized = "".join(char for char in normalized if not unicodedata.combining(char))
+    return [
+        stem_italian(token)
+        for token in _TOKEN_PATTERN.findall(normalized)
+        if token not in ITALIAN_STOPWORDS and len(token) > 1
+    ]
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fonde più classifiche con la Reciprocal Rank Fusion
+    
+    Ogni elemento riceve 1 / (k + posizione) per ogni classifica in cui compare;
+    conta solo la posizione, quindi punteggi di scale diverse (coseno, BM25) non
+    vanno normalizzati.
+    
+    Args:
+        rankings: Classifiche di identificativi, dal più rilevante
+        k: Costante di smorzamento delle prime posizioni
+        
+    Returns:
+        Coppie (identificativo, punteggio) ordinate per punteggio decrescente
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for position, item_id in enumerate(ranking, start=1):
+            scores[item_id] += 1.0 / (k + position)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class BM25Index:
+    """Indice invertito BM25 sui frammenti dell'indice vettoriale"""
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            k1: Saturazione della frequenza dei termini
+            b: Peso della normalizzazione per lunghezza del frammento
+        """
+        self.k1 = k1
+        self.b = b
+        self.node_ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._positions: Dict[str, int] = {}
+        self._total_length = 0
+    
+    @classmethod
+    def from_texts(cls, items: Iterable[Tuple[str, str]], **params) -> "BM25Index":
+        """
+        Costruisce l'indice da coppie (id nodo, testo)
+        
+        Args:
+            items: Frammenti da indicizzare
+            params: Parametri BM25 (k1, b)
+            
+        Returns:
+            Indice costruito
+        """
+        index = cls(**params)
+        for node_id, text in items:
+            index.add(node_id, text)
+        return index
+    
+    def add(self, node_id: str, text: str) -> None:
+        """
+        Aggiunge (o sostituisce) un frammento nell'indice
+        
+        Args:
+            node_id: Identificativo del nodo nel docstore
+            text: Testo del frammento
+        """
+        if node_id in self._positions:
+            self.remove(node_id)
+            
+        terms = Counter(analyze(text))
+        position = len(self.node_ids)
+        self.node_ids.append(node_id)
+        self.doc_lengths.append(sum(terms.values()))
+        self._positions[node_id] = position
+        self._total_length += self.doc_lengths[position]
+        
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[position] = frequency
+    
+    def remove(self, node_id: str) -> None:
+        """Rimuove un frammento dall'indice (la posizione resta vuota)"""
+        position = self._positions.pop(node_id, None)
+        if position is None:
+            return
+        for term in list(self.postings):
+            documents = self.postings[term]
+            if documents.pop(position, None) is not None and not documents:
+                del self.postings[term]
+        self._total_length -= self.doc_lengths[position]
+        self.doc_lengths[position] = 0
+    
+    def search(self, query: str, top_k: int, node_ids: Optional[Collection[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Cerca i frammenti più rilevanti per una query
+        
+        Args:
+            query: Query di ricerca
+            top_k: Numero massimo di risultati
+            node_ids: Nodi a cui limitare la ricerca (filtro sui metadati), None = tutti
+            
+        Returns:
+            Coppie (id nodo, punteggio BM25) ordinate per punteggio decrescente
+        """
+        total = len(self._positions)
+        if not total or top_k <= 0:
+            return []
+        allowed = None
+        if node_ids is not None:
+            allowed = {self._positions[node_id] for node_id in node_ids if node_id in self._positions}
+            if not allowed:
+                return []
+            
+        avg_length = self._total_length / total or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(analyze(query)):
+            documents = self.postings.get(term)
+            if not documents:
+                continue
+            idf = math.log(1 + (total - len(documents) + 0.5) / (len(documents) + 0.5))
+            for position, frequency in documents.items():
+                if allowed is not None and position not in allowed:
+                    continue
+                length_norm = 1 - self.b + self.b * self.doc_lengths[position] / avg_length
+                scores[position] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(self.node_ids[position], score) for position, score in best]
+    
+    def __len__(self) -> int:
+        return len(self._positions)
+    
+    def save(self, path: Path) -> None:
+        """
+        Salva l'indice in JSON
+        
+        Args:
+            path: File di destinazione
+        """
+        # Compatta le posizioni lasciate vuote dalle rimozioni
+        live = sorted(self._positions.values())
+        remap = {old: new for new, old in enumerate(live)}
+        data = {
+            "version": SPARSE_INDEX_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "node_ids": [self.node_ids[position] for position in live],
+            "doc_lengths": [self.doc_lengths[position] for position in live],
+            "postings": {
+                term: [[remap[position], frequency] for position, frequency in documents.items()]
+                for term, documents in self.postings.items()
+            }
+        }
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+        except Exception as e:
+            raise RAGException(f"Errore nel salvataggio dell'indice lessicale: {str(e)}")
+    
+    @classmethod
+    def load(cls, path: Path) -> Optional["BM25Index"]:
+        """
+        Carica l'indice da JSON
+        
+        Args:
+            path: File dell'indice
+            
+        Returns:
+            Indice caricato o None se assente, corrotto o di una versione diversa
+        """
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != SPARSE_INDEX_VERSION:
+                logger.info(f"Indice lessicale in {path} di una versione diversa, verrà ricostruito")
+                return None
+                
+            index = cls(k1=data["k1"], b=data["b"])
+            index.node_ids = list(data["node_ids"])
+            index.doc_lengths = list(data["doc_lengths"])
+            index._positions = {node_id: position for position, node_id in enumerate(index.node_ids)}
+            index.postings = {
+                term: {position: frequency for position, frequency in documents}
+                for term, documents in data["postings"].items()
+            }
+            index._total_length = sum(index.doc_lengths)
+            return index
+        except Exception as e:
+            logger.warning(f"Indice lessicale in {path} non leggibile: {e}")
+            return None
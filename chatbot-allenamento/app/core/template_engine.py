@@ -0,0 +1,339 @@
+"""
+Generazione deterministica di schede da template, senza chiamate al modello
+"""
+
+import logging
+import uuid
+from typing import List, Dict, Optional, Set, Tuple
+from app.models.workout import (
+    WorkoutPlan, WorkoutDay, Exercise, UserProfile, NutritionGuidelines,
+    ProgressionPlan, ExperienceLevel, WorkoutGoal
+)
+from app.core.exercise_catalog import (
+    ExerciseCatalog, CatalogExercise, resolve_equipment, resolve_injuries
+)
+
+logger = logging.getLogger(__name__)
+
+# Schemi motori di ogni tipo di giornata, in ordine di priorità
+DAY_TEMPLATES: Dict[str, List[str]] = {
+    "full_body_a": ["squat", "push_h", "pull_h", "hinge", "shoulders", "core", "triceps"],
+    "full_body_b": ["hinge", "push_v", "pull_v", "lunge", "push_h", "core", "biceps"],
+    "full_body_c": ["lunge", "push_h", "pull_h", "squat", "shoulders", "core", "calves"],
+    "upper": ["push_h", "pull_h", "push_v", "pull_v", "shoulders", "biceps", "triceps"],
+    "lower": ["squat", "hinge", "lunge", "quad_iso", "ham_iso", "calves", "core"],
+    "push": ["push_h", "push_v", "push_h", "shoulders", "triceps", "core"],
+    "pull": ["pull_v", "pull_h", "hinge", "shoulders", "biceps", "core"],
+    "legs": ["squat", "hinge", "lunge", "quad_iso", "ham_iso", "calves"]
+}
+
+DAY_FOCUS = {
+    "full_body_a": "Corpo completo A",
+    "full_body_b": "Corpo completo B",
+    "full_body_c": "Corpo completo C",
+    "upper": "Parte superiore",
+    "lower": "Parte inferiore",
+    "push": "Spinta - Petto, Spalle e Tricipiti",
+    "pull": "Trazione - Dorso e Bicipiti",
+    "legs": "Gambe"
+}
+
+# Giorni della settimana e tipo di giornata per numero di allenamenti
+SPLITS: Dict[int, Tuple[str, List[Tuple[str, str]]]] = {
+    2: ("full_body", [("Lunedì", "full_body_a"), ("Giovedì", "full_body_b")]),
+    3: ("full_body", [("Lunedì", "full_body_a"), ("Mercoledì", "full_body_b"), ("Venerdì", "full_body_c")]),
+    4: ("upper_lower", [
+        ("Lunedì", "upper"), ("Martedì", "lower"), ("Giovedì", "upper"), ("Venerdì", "lower")
+    ]),
+    5: ("push_pull_legs", [
+        ("Lunedì", "push"), ("Martedì", "pull"), ("Mercoledì", "legs"), ("Venerdì", "upper"), ("Sabato", "lower")
+    ])
+}
+
+# Serie, ripetizioni e recupero per obiettivo: (esercizi multiarticolari, complementari)
+PRESCRIPTIONS: Dict[WorkoutGoal, Tuple[Tuple[int, str, str], Tuple[int, str, str]]] = {
+    WorkoutGoal.STRENGTH: ((4, "4-6", "2-3 min"), (3, "8-10", "90 sec")),
+    WorkoutGoal.HYPERTROPHY: ((4, "8-12", "90 sec"), (3, "10-15", "60 sec")),
+    WorkoutGoal.WEIGHT_LOSS: ((3, "12-15", "45-60 sec"), (3, "15", "45 sec")),
+    WorkoutGoal.ENDURANCE: ((3, "15-20", "45 sec"), (2, "20", "30 sec")),
+    WorkoutGoal.GENERAL_FITNESS: ((3, "10-12", "60-90 sec"), (2, "12-15", "60 sec"))
+}
+
+# Priorità dell'obiettivo che determina le prescrizioni quando ce ne sono più d'uno
+GOAL_PRIORITY = [
+    WorkoutGoal.STRENGTH,
+    WorkoutGoal.HYPERTROPHY,
+    WorkoutGoal.WEIGHT_LOSS,
+    WorkoutGoal.ENDURANCE,
+    WorkoutGoal.GENERAL_FITNESS
+]
+
+# Schemi usati per completare le giornate in cui alcuni schemi non sono disponibili
+FILLER_PATTERNS = ["core", "calves", "conditioning"]
+
+SUPPORTED_LEVELS = {ExperienceLevel.BEGINNER, ExperienceLevel.INTERMEDIATE}
+MIN_DAYS, MAX_DAYS = min(SPLITS), max(SPLITS)
+DEFAULT_SESSION_DURATION = 60
+
+class TemplateWorkoutEngine:
+    """
+    Motore a regole per le schede dei profili standard
+    
+    Combina split predefiniti, un catalogo di esercizi e tabelle di
+    prescrizione per obiettivo: la scheda è generata in pochi millisecondi ed
+    è deterministica a parità di profilo. I profili non coperti dalle regole
+    (livello avanzato, riabilitazione, preferenze particolari, infortuni non
+    riconosciuti) vanno generati con il modello.
+    """
+    
+    def __init__(self, catalog: Optional[ExerciseCatalog] = None):
+        self.catalog = catalog or ExerciseCatalog()
+    
+    def supports(self, user_profile: UserProfile) -> bool:
+        """
+        Verifica se il profilo è coperto dalle regole del motore
+        
+        Args:
+            user_profile: Profilo dell'utente
+            
+        Returns:
+            True se la scheda può essere generata da template
+        """
+        if user_profile.experience_level not in SUPPORTED_LEVELS:
+            return False
+        if not MIN_DAYS <= user_profile.available_days <= MAX_DAYS:
+            return False
+        if WorkoutGoal.REHABILITATION in user_profile.goals:
+            return False
+        if user_profile.preferences:
+            return False
+        return resolve_injuries(user_profile.injuries) is not None
+    
+    def generate(self, user_profile: UserProfile) -> WorkoutPlan:
+        """
+        Genera la scheda completa dal profilo
+        
+        Args:
+            user_profile: Profilo dell'utente
+            
+        Returns:
+            Piano di allenamento
+        """
+        days = min(max(user_profile.available_days, MIN_DAYS), MAX_DAYS)
+        split_type, schedule = SPLITS[days]
+        
+        equipment = resolve_equipment(user_profile.equipment)
+        avoid_zones = resolve_injuries(user_profile.injuries) or set()
+        goal = self._primary_goal(user_profile)
+        duration = user_profile.session_duration or DEFAULT_SESSION_DURATION
+        
+        workout_days = []
+        usage: Dict[str, int] = {}
+        for day_name, template in schedule:
+            workout_days.append(self._build_day(
+                day_name, template, usage, user_profile, goal, equipment, avoid_zones, duration
+            ))
+            
+        logger.info(f"Scheda da template generata: {split_type}, {days} giorni, obiettivo {goal.value}")
+        
+        return WorkoutPlan(
+            id=str(uuid.uuid4()),
+            title=self._generate_title(user_profile, goal, days),
+            user_profile=user_profile,
+            workout_days=workout_days,
+            nutrition=self._get_nutrition(user_profile),
+            progression=self._get_progression(user_profile, goal),
+            general_notes=self._get_general_notes(user_profile, avoid_zones),
+            sources=[],
+            metadata={"generated_by": "template_engine", "split_type": split_type}
+        )
+    
+    def _primary_goal(self, user_profile: UserProfile) -> WorkoutGoal:
+        """Obiettivo che determina serie, ripetizioni e recuperi"""
+        for goal in GOAL_PRIORITY:
+            if goal in user_profile.goals:
+                return goal
+        return WorkoutGoal.GENERAL_FITNESS
+    
+    def _exercise_count(self, user_profile: UserProfile, duration: int) -> int:
+        """Numero di esercizi in base alla durata della sessione"""
+        if duration <= 45:
+            count = 4
+        elif duration <= 60:
+            count = 5
+        elif duration <= 75:
+            count = 6
+        else:
+            count = 7
+            
+        if user_profile.experience_level == ExperienceLevel.BEGINNER:
+            count = min(count, 5)
+        return count
+    
+    def _build_day(
+        self,
+        day_name: str,
+        template: str,
+        usage: Dict[str, int],
+        user_profile: UserProfile,
+        goal: WorkoutGoal,
+        equipment: Set[str],
+        avoid_zones: Set[str],
+        duration: int
+    ) -> WorkoutDay:
+        """
+        Compone una giornata scegliendo un esercizio per ogni schema motorio
+        
+        Per ogni schema si sceglie l'esercizio meno usato finora nella
+        settimana (`usage`, aggiornato), così le giornate ripetute ruotano le
+        varianti. Gli schemi senza esercizi compatibili con attrezzatura e
+        infortuni vengono saltati e sostituiti con schemi complementari.
+        """
+        focus = DAY_FOCUS[template]
+        target = self._exercise_count(user_profile, duration)
+        
+        selected: List[CatalogExercise] = []
+        for pattern in DAY_TEMPLATES[template] + FILLER_PATTERNS:
+            if len(selected) >= target:
+                break
+            candidates = [
+                exercise for exercise in self.catalog.candidates(
+                    pattern, user_profile.experience_level, equipment, avoid_zones
+                )
+                if exercise not in selected
+            ]
+            if candidates:
+                # A parità di utilizzo vale l'ordine di preferenza del catalogo
+                exercise = min(candidates, key=lambda e: usage.get(e.name, 0))
+                usage[exercise.name] = usage.get(exercise.name, 0) + 1
+                selected.append(exercise)
+                
+        exercises = [self._prescribe(exercise, user_profile, goal) for exercise in selected]
+        
+        warm_up = ["5-8 minuti di cardio leggero", "Mobilità articolare dinamica"]
+        if exercises:
+            warm_up.append(f"1-2 serie di avvicinamento di {exercises[0].name}")
+            
+        cool_down = ["Stretching statico dei muscoli allenati (5-10 minuti)"]
+        if goal in (WorkoutGoal.WEIGHT_LOSS, WorkoutGoal.ENDURANCE):
+            cool_down.insert(0, "10-15 minuti di cardio a intensità moderata")
+            
+        return WorkoutDay(
+            day=day_name,
+            focus=focus,
+            warm_up=warm_up,
+            exercises=exercises,
+            cool_down=cool_down,
+            duration_minutes=duration
+        )
+    
+    def _prescribe(self, exercise: CatalogExercise, user_profile: UserProfile, goal: WorkoutGoal) -> Exercise:
+        """Applica serie, ripetizioni, recupero e carico all'esercizio del catalogo"""
+        compound, accessory = PRESCRIPTIONS[goal]
+        sets, reps, rest = compound if exercise.compound else accessory
+        
+        beginner = user_profile.experience_level == ExperienceLevel.BEGINNER
+        if beginner:
+            sets = max(2, sets - 1)
+            if goal == WorkoutGoal.STRENGTH and exercise.compound:
+                # Carichi massimali sconsigliati finché la tecnica non è consolidata
+                reps = "6-8"
+                
+        if beginner:
+            weight = "Carico moderato, tecnica prima di tutto"
+        elif goal == WorkoutGoal.STRENGTH and exercise.compound:
+            weight = "RPE 8 (2 ripetizioni di riserva)"
+        else:
+            weight = "RPE 7-8"
+            
+        return Exercise(
+            name=exercise.name,
+            sets=sets,
+            reps=exercise.reps_override or reps,
+            rest=rest,
+            weight=None if exercise.reps_override else weight,
+            notes=exercise.notes,
+            muscle_groups=list(exercise.muscle_groups)
+        )
+    
+    def _generate_title(self, user_profile: UserProfile, goal: WorkoutGoal, days: int) -> str:
+        """Genera titolo per la scheda"""
+        level = "Principiante" if user_profile.experience_level == ExperienceLevel.BEGINNER else "Intermedio"
+        goal_map = {
+            WorkoutGoal.STRENGTH: "Forza",
+            WorkoutGoal.HYPERTROPHY: "Massa",
+            WorkoutGoal.ENDURANCE: "Resistenza",
+            WorkoutGoal.WEIGHT_LOSS: "Dimagrimento",
+            WorkoutGoal.GENERAL_FITNESS: "Fitness"
+        }
+        return f"Scheda {level} - {goal_map[goal]} ({days} giorni)"
+    
+    def _get_nutrition(self, user_profile: UserProfile) -> Optional[NutritionGuidelines]:
+        """Linee guida nutrizionali generali per gli obiettivi di composizione corporea"""
+        if WorkoutGoal.WEIGHT_LOSS in user_profile.goals:
+            calories = "Leggero deficit calorico (circa 300-500 kcal sotto il fabbisogno)"
+            protein = "1.6-2.0 g per kg di peso corporeo"
+        elif WorkoutGoal.HYPERTROPHY in user_profile.goals:
+            calories = "Leggero surplus calorico (circa 200-300 kcal sopra il fabbisogno)"
+            protein = "1.6-2.2 g per kg di peso corporeo"
+        else:
+            return None
+            
+        return NutritionGuidelines(
+            calories_estimate=calories,
+            protein_grams=protein,
+            meal_timing=[
+                "Distribuisci le proteine in 3-4 pasti nella giornata",
+                "Pasto con carboidrati e proteine 1-3 ore prima dell'allenamento",
+                "Pasto completo entro 2 ore dalla fine dell'allenamento"
+            ],
+            hydration="Almeno 2-3 litri di acqua al giorno, di più nei giorni di allenamento"
+        )
+    
+    def _get_progression(self, user_profile: UserProfile, goal: WorkoutGoal) -> ProgressionPlan:
+        """Piano di progressione a doppia progressione (ripetizioni, poi carico)"""
+        if user_profile.experience_level == ExperienceLevel.BEGINNER:
+            return ProgressionPlan(
+                week_1_2="Impara la tecnica con carichi leggeri, resta nella parte bassa del range di ripetizioni",
+                week_3_4="Aumenta le ripetizioni fino al limite superiore del range mantenendo la tecnica",
+                week_5_6="Quando completi tutte le serie al limite superiore aumenta il carico del 2.5-5%",
+                deload_week="Settimana 7: riduci il volume del 40% mantenendo i carichi",
+                progression_notes=[
+                    "Annota carichi e ripetizioni di ogni seduta",
+                    "Se la tecnica peggiora, torna al carico precedente"
+                ]
+            )
+            
+        notes = ["Annota carichi e ripetizioni di ogni seduta"]
+        if goal == WorkoutGoal.STRENGTH:
+            notes.append("Sui multiarticolari aumenta il carico di 2.5 kg quando completi tutte le serie a RPE 8 o meno")
+        else:
+            notes.append("Aumenta il carico quando completi tutte le serie al limite superiore del range")
+            
+        return ProgressionPlan(
+            week_1_2="Volume di partenza a RPE 7, consolida la tecnica degli esercizi nuovi",
+            week_3_4="Aggiungi una serie ai primi due esercizi di ogni giornata, RPE 8",
+            week_5_6="Aumenta i carichi del 2.5-5% riportando le serie al volume iniziale",
+            deload_week="Settimana 7: dimezza le serie e riduci i carichi del 10%",
+            progression_notes=notes
+        )
+    
+    def _get_general_notes(self, user_profile: UserProfile, avoid_zones: Set[str]) -> List[str]:
+        """Genera note generali basate sul profilo"""
+        notes = [
+            "Inizia sempre con un riscaldamento adeguato di 5-10 minuti",
+            "Mantieni sempre la corretta esecuzione tecnica",
+            "Riposa 7-8 ore per notte per ottimizzare il recupero"
+        ]
+        
+        if user_profile.experience_level == ExperienceLevel.BEGINNER:
+            notes.append("Come principiante, concentrati prima sulla tecnica poi sull'intensità")
+            
+        if avoid_zones:
+            zones = ", ".join(sorted(avoid_zones))
+            notes.append(
+                f"Esclusi gli esercizi che sollecitano le zone con infortuni ({zones}): "
+                "interrompi qualsiasi esercizio che provochi dolore e consulta un professionista"
+            )
+            
+        return notes
@@ -0,0 +1,235 @@
+"""
+Conteggio token e budget del contesto per i prompt
+"""
+
+import logging
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from app.config import settings
+from app.utils.prompt_templates import PromptTemplates
+
+logger = logging.getLogger(__name__)
+
+# Token aggiuntivi che l'API conta per ogni messaggio (ruolo e separatori)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Stima usata quando il tokenizer non è disponibile
+CHARS_PER_TOKEN = 4
+
+TRUNCATION_MARKER = "\n[...]"
+
+# Segmenti statici (prompt di sistema, intestazioni) di cui si memorizza il conteggio
+STATIC_CACHE_SIZE = 64
+
+@lru_cache(maxsize=8)
+def _load_encoding(model: str):
+    """Carica l'encoding tiktoken per il modello (None se non disponibile)"""
+    try:
+        import tiktoken
+        
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+            
+    except Exception as e:
+        logger.warning(f"Tokenizer non disponibile per {model}, uso una stima sui caratteri: {e}")
+        return None
+
+class TokenCounter:
+    """Conta i token di testi e messaggi per un modello"""
+    
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or settings.OPENAI_MODEL
+        self.encoding = _load_encoding(self.model)
+        self._static_counts: Dict[str, int] = {}
+    
+    def count(self, text: str) -> int:
+        """
+        Conta i token di un testo
+        
+        Args:
+            text: Testo da misurare
+            
+        Returns:
+            Numero di token
+        """
+        if not text:
+            return 0
+            
+        if self.encoding is None:
+            return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+            
+        return len(self.encoding.encode(text, disallowed_special=()))
+    
+    def count_static(self, text: str) -> int:
+        """
+        Conta i token di un segmento statico riusando il conteggio precedente
+        
+        Da usare per testi che si ripetono identici a ogni richiesta, come
+        i prompt di sistema dei template.
+        
+        Args:
+            text: Segmento da misurare
+            
+        Returns:
+            Numero di token
+        """
+        tokens = self._static_counts.get(text)
+        if tokens is None:
+            tokens = self.count(text)
+            if len(self._static_counts) < STATIC_CACHE_SIZE:
+                self._static_counts[text] = tokens
+        return tokens
+    
+    def count_message(self, message: Dict[str, str]) -> int:
+        """Conta i token di un messaggio in formato OpenAI"""
+        return self.count(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+    
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """Conta i token di una lista di messaggi in formato OpenAI"""
+        return sum(self.count_message(msg) for msg in messages)
+    
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Tronca un testo al numero massimo di token
+        
+        Args:
+            text: Testo da troncare
+            max_tokens: Numero massimo di token
+            
+        Returns:
+            Testo eventualmente troncato
+        """
+        if max_tokens <= 0:
+            return ""
+            
+        if self.count(text) <= max_tokens:
+            return text
+            
+        if self.encoding is None:
+            return text[:max_tokens * CHARS_PER_TOKEN] + TRUNCATION_MARKER
+            
+        tokens = self.encoding.encode(text, disallowed_special=())
+        return self.encoding.decode(tokens[:max_tokens]) + TRUNCATION_MARKER
+
+class BudgetedPrompt(BaseModel):
+    """Risultato dell'adattamento del prompt al budget di token"""
+    history: List[Dict[str, str]] = Field(default_factory=list, description="Cronologia inclusa nel prompt")
+    context: str = Field(default="", description="Contesto documentale incluso nel prompt")
+    sources: List[str] = Field(default_factory=list, description="Fonti dei frammenti inclusi")
+    dropped_messages: int = Field(default=0, description="Messaggi di cronologia esclusi")
+    dropped_chunks: int = Field(default=0, description="Frammenti di contesto esclusi")
+    token_counts: Dict[str, int] = Field(default_factory=dict, description="Token per sezione del prompt")
+
+class ContextBudgeter:
+    """Adatta system prompt, contesto RAG e cronologia a un budget di token"""
+    
+    def __init__(
+        self,
+        token_counter: Optional[TokenCounter] = None,
+        prompt_budget: Optional[int] = None,
+        context_budget: Optional[int] = None,
+        message_max_tokens: Optional[int] = None
+    ):
+        self.token_counter = token_counter or TokenCounter()
+        self.prompt_budget = settings.PROMPT_TOKEN_BUDGET if prompt_budget is None else prompt_budget
+        self.context_budget = settings.CONTEXT_TOKEN_BUDGET if context_budget is None else context_budget
+        self.message_max_tokens = (
+            settings.HISTORY_MESSAGE_MAX_TOKENS if message_max_tokens is None else message_max_tokens
+        )
+    
+    def fit(
+        self,
+        system_prompt: str,
+        chunks: List[Dict[str, Any]],
+        history: List[Dict[str, str]],
+        summary: Optional[str] = None
+    ) -> BudgetedPrompt:
+        """
+        Seleziona contesto e cronologia che rientrano nel budget
+        
+        L'ultimo messaggio utente è sempre incluso; i frammenti di contesto
+        sono scelti per punteggio decrescente e la cronologia dal messaggio
+        più recente al più vecchio, troncando i messaggi troppo lunghi.
+        
+        Args:
+            system_prompt: Prompt di sistema
+            chunks: Frammenti recuperati (dizionari con 'text', 'metadata', 'score')
+            history: Cronologia in formato OpenAI, ultimo messaggio utente incluso
+            summary: Riassunto della conversazione aggiunto al prompt di sistema
+            
+        Returns:
+            Prompt adattato con il conteggio dei token per sezione
+        """
+        counter = self.token_counter
+        
+        system_tokens = counter.count_static(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+        if summary:
+            system_tokens += counter.count(PromptTemplates.format_conversation_summary(summary))
+        remaining = self.prompt_budget - system_tokens
+        
+        # L'ultimo messaggio è la domanda corrente e non può essere escluso
+        previous, current = (history[:-1], history[-1:]) if history else ([], [])
+        current = [
+            {**msg, "content": counter.truncate(msg["content"], max(remaining // 2, 1))}
+            for msg in current
+        ]
+        current_tokens = counter.count_messages(current)
+        remaining -= current_tokens
+        
+        # Contesto: i frammenti con punteggio più alto per primi
+        context_parts = []
+        sources = []
+        context_tokens = 0
+        context_limit = min(self.context_budget, max(remaining, 0))
+        ranked_chunks = sorted(chunks, key=lambda c: c.get("score") or 0.0, reverse=True)
+        
+        for chunk in ranked_chunks:
+            chunk_tokens = counter.count(chunk["text"])
+            if context_tokens + chunk_tokens > context_limit:
+                continue
+                
+            context_parts.append(chunk["text"])
+            context_tokens += chunk_tokens
+            
+            metadata = chunk.get("metadata") or {}
+            source = metadata.get("source") or metadata.get("filename")
+            if source and source not in sources:
+                sources.append(source)
+                
+        remaining -= context_tokens
+        
+        # Cronologia: dal più recente, finché c'è spazio (nessuna con budget per messaggio nullo)
+        kept_history = []
+        history_tokens = 0
+        
+        for msg in reversed(previous if self.message_max_tokens > 0 else []):
+            content = counter.truncate(msg["content"], self.message_max_tokens)
+            msg_tokens = counter.count(content) + MESSAGE_OVERHEAD_TOKENS
+            if history_tokens + msg_tokens > remaining:
+                break
+                
+            kept_history.append({**msg, "content": content})
+            history_tokens += msg_tokens
+            
+        kept_history.reverse()
+        
+        token_counts = {
+            "system": system_tokens,
+            "context": context_tokens,
+            "history": history_tokens,
+            "user_message": current_tokens,
+            "total": system_tokens + context_tokens + history_tokens + current_tokens,
+            "budget": self.prompt_budget
+        }
+        
+        return BudgetedPrompt(
+            history=kept_history + current,
+            context="\n\n".join(context_parts),
+            sources=sources,
+            dropped_messages=len(previous) - len(kept_history),
+            dropped_chunks=len(chunks) - len(context_parts),
+            token_counts=token_counts
+        )
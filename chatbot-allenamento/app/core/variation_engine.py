@@ -0,0 +1,381 @@
+"""
+Variazioni incrementali delle schede a partire dalla scheda base
+"""
+
+import logging
+import re
+import uuid
+from itertools import zip_longest
+from typing import Dict, List, Optional, Set, Tuple, Union
+from app.models.workout import (
+    WorkoutPlan, WorkoutDay, Exercise, UserProfile, WorkoutVariation, DayExercises
+)
+from app.core.exercise_catalog import ExerciseCatalog, resolve_equipment, resolve_injuries
+from app.core.workout_generator import WorkoutGenerator
+from app.core.error_handler import ChatbotException
+
+logger = logging.getLogger(__name__)
+
+# Variazioni gestite dal motore e descrizioni con cui possono essere richieste
+VARIATION_ALIASES: Dict[str, List[str]] = {
+    "harder": ["harder", "più intenso", "piu intenso", "più intensa", "intenso", "più difficile", "difficile"],
+    "easier": ["easier", "più facile", "piu facile", "facile", "più leggero", "leggero", "meno intenso"],
+    "fewer_days": ["fewer_days", "meno giorni", "un giorno in meno", "meno allenamenti"],
+    "different_exercises": [
+        "different_exercises", "esercizi diversi", "altri esercizi", "cambia esercizi", "alternativa"
+    ]
+}
+
+# Etichette per titoli e prompt
+VARIATION_LABELS = {
+    "harder": "Più intensa",
+    "easier": "Più leggera",
+    "fewer_days": "Meno giorni",
+    "different_exercises": "Esercizi alternativi"
+}
+
+# Note aggiunte alla scheda per ogni variazione
+VARIATION_NOTES = {
+    "harder": "Variazione più intensa: una serie in più per esercizio e recuperi più brevi; "
+              "riduci il carico se la tecnica peggiora",
+    "easier": "Variazione più leggera: una serie in meno per esercizio e recuperi più lunghi",
+    "fewer_days": "Variazione con un giorno in meno: due sedute sono state unite in una",
+    "different_exercises": "Variazione con esercizi alternativi per gli stessi gruppi muscolari"
+}
+
+# Limiti delle serie per esercizio e del recupero (secondi)
+MIN_SETS = 2
+MAX_SETS = 6
+MIN_REST = 30
+MAX_REST = 300
+
+# Entrate della variazione: indice del giorno base invariato o giorno modificato
+DayEntry = Union[int, WorkoutDay]
+
+def resolve_variation_type(variation_type: str) -> Optional[str]:
+    """
+    Riconduce la descrizione di una variazione a un tipo gestito dal motore
+    
+    Args:
+        variation_type: Tipo o descrizione della variazione (es. "più intenso")
+        
+    Returns:
+        Tipo canonico o None se la variazione richiede una rigenerazione completa
+    """
+    normalized = " ".join(variation_type.lower().replace("_", " ").split())
+    for canonical, aliases in VARIATION_ALIASES.items():
+        if normalized in (alias.replace("_", " ") for alias in aliases):
+            return canonical
+    return None
+
+def parse_rest_seconds(rest: str) -> Optional[int]:
+    """
+    Converte un tempo di recupero in secondi
+    
+    Args:
+        rest: Recupero (es. "90 sec", "2 min", "1:30", "60-90 sec")
+        
+    Returns:
+        Secondi (media per gli intervalli) o None se non interpretabile
+    """
+    text = rest.lower()
+    match = re.search(r"(\d+):(\d{2})", text)
+    if match:
+        return int(match.group(1)) * 60 + int(match.group(2))
+        
+    numbers = [float(value.replace(",", ".")) for value in re.findall(r"\d+(?:[.,]\d+)?", text)]
+    if not numbers:
+        return None
+    value = sum(numbers[:2]) / len(numbers[:2])
+    if "min" in text or "'" in text:
+        value *= 60
+    return int(round(value))
+
+def format_rest(seconds: int) -> str:
+    """Formatta un recupero in secondi come nelle schede generate"""
+    if seconds >= 120 and seconds % 60 == 0:
+        return f"{seconds // 60} min"
+    return f"{seconds} sec"
+
+class VariationEngine:
+    """
+    Motore per le variazioni di una scheda esistente
+    
+    Le variazioni comuni sono trasformazioni deterministiche della scheda base
+    (volume, recuperi, unione di giorni, sostituzione di esercizi dal catalogo);
+    il modello viene interpellato solo per i giorni che le regole non possono
+    completare da sole. Il risultato riporta solo i giorni modificati, gli altri
+    sono riferimenti alla scheda base.
+    """
+    
+    def __init__(self, workout_generator: WorkoutGenerator, catalog: Optional[ExerciseCatalog] = None):
+        self.workout_generator = workout_generator
+        self.catalog = catalog or ExerciseCatalog()
+    
+    def supports(self, variation_type: str) -> bool:
+        """
+        Verifica se la variazione è gestita dal motore
+        
+        Args:
+            variation_type: Tipo o descrizione della variazione
+            
+        Returns:
+            True se la variazione può essere calcolata in modo incrementale
+        """
+        return resolve_variation_type(variation_type) is not None
+    
+    async def create_variation(
+        self,
+        base_workout: WorkoutPlan,
+        variation_type: str,
+        refine_with_llm: bool = True
+    ) -> WorkoutVariation:
+        """
+        Calcola una variazione della scheda base
+        
+        Args:
+            base_workout: Scheda di partenza
+            variation_type: Tipo o descrizione della variazione
+            refine_with_llm: Usa il modello per i giorni uniti o con esercizi fuori catalogo
+            
+        Returns:
+            Variazione con i soli giorni modificati
+        """
+        canonical = resolve_variation_type(variation_type)
+        if canonical is None:
+            raise ChatbotException(f"Variazione non supportata: {variation_type}")
+            
+        if canonical == "harder":
+            days, to_refine = self._adjust_volume(base_workout, sets_delta=1, rest_delta=-15), {}
+        elif canonical == "easier":
+            days, to_refine = self._adjust_volume(base_workout, sets_delta=-1, rest_delta=30), {}
+        elif canonical == "fewer_days":
+            days, to_refine = self._merge_days(base_workout)
+        else:
+            days, to_refine = self._substitute_exercises(base_workout)
+            
+        refined = []
+        if refine_with_llm:
+            for position, instruction in to_refine.items():
+                draft = days[position]
+                if isinstance(draft, int):
+                    draft = base_workout.workout_days[draft]
+                workout_day = await self._refine_day(draft, base_workout.user_profile, canonical, instruction)
+                if workout_day is not None:
+                    days[position] = workout_day
+                    refined.append(position)
+                    
+        variation = WorkoutVariation(
+            id=str(uuid.uuid4()),
+            base_workout_id=base_workout.id,
+            variation_type=canonical,
+            title=f"{base_workout.title} - Variazione {VARIATION_LABELS[canonical]}",
+            days=days,
+            general_notes=[VARIATION_NOTES[canonical]],
+            metadata={"generated_by": "variation_engine", "llm_days": refined}
+        )
+        
+        logger.info(
+            f"Variazione {canonical} di {base_workout.id}: giorni modificati {variation.get_changed_days()}, "
+            f"rifiniti dal modello {refined}"
+        )
+        return variation
+    
+    def _adjust_volume(self, base_workout: WorkoutPlan, sets_delta: int, rest_delta: int) -> List[DayEntry]:
+        """Modifica serie e recuperi di tutti gli esercizi"""
+        days: List[DayEntry] = []
+        for index, day in enumerate(base_workout.workout_days):
+            exercises = [self._adjust_exercise(exercise, sets_delta, rest_delta) for exercise in day.exercises]
+            if exercises == day.exercises:
+                days.append(index)
+            else:
+                days.append(day.model_copy(update={"exercises": exercises}, deep=True))
+        return days
+    
+    def _adjust_exercise(self, exercise: Exercise, sets_delta: int, rest_delta: int) -> Exercise:
+        """Applica la variazione di volume a un esercizio entro i limiti"""
+        sets = min(max(exercise.sets + sets_delta, MIN_SETS), MAX_SETS)
+        # Non si superano i limiti, ma non si riportano al limite schede che già lo eccedono
+        if (sets_delta > 0 and exercise.sets >= MAX_SETS) or (sets_delta < 0 and exercise.sets <= MIN_SETS):
+            sets = exercise.sets
+            
+        rest = exercise.rest
+        seconds = parse_rest_seconds(exercise.rest)
+        if seconds is not None:
+            adjusted = min(max(seconds + rest_delta, MIN_REST), MAX_REST)
+            if adjusted != seconds:
+                rest = format_rest(adjusted)
+                
+        return exercise.model_copy(update={"sets": sets, "rest": rest})
+    
+    def _merge_days(self, base_workout: WorkoutPlan) -> Tuple[List[DayEntry], Dict[int, str]]:
+        """Unisce i due giorni più leggeri in un'unica seduta"""
+        base_days = base_workout.workout_days
+        if len(base_days) < 2:
+            raise ChatbotException("La scheda ha un solo giorno di allenamento")
+            
+        lightest = sorted(range(len(base_days)), key=lambda i: (len(base_days[i].exercises), i))[:2]
+        first, second = sorted(lightest)
+        merged = self._merge_pair(base_days[first], base_days[second])
+        
+        days: List[DayEntry] = []
+        for index in range(len(base_days)):
+            if index == first:
+                days.append(merged)
+            elif index != second:
+                days.append(index)
+                
+        instruction = (
+            "Questo giorno unisce due sedute della scheda originale. Riequilibra gli esercizi per "
+            f"allenare tutti i gruppi muscolari in una sola seduta di circa {merged.duration_minutes or 60} "
+            "minuti, senza ripetere più volte lo stesso schema motorio."
+        )
+        return days, {first: instruction}
+    
+    def _merge_pair(self, first: WorkoutDay, second: WorkoutDay) -> WorkoutDay:
+        """Bozza deterministica della seduta unita: esercizi alternati, una serie in meno"""
+        limit = max(len(first.exercises), len(second.exercises)) + 2
+        exercises = []
+        seen = set()
+        for pair in zip_longest(first.exercises, second.exercises):
+            for exercise in pair:
+                if exercise is None or exercise.name.lower() in seen or len(exercises) >= limit:
+                    continue
+                seen.add(exercise.name.lower())
+                exercises.append(exercise.model_copy(update={"sets": max(MIN_SETS, exercise.sets - 1)}))
+                
+        durations = [day.duration_minutes for day in (first, second) if day.duration_minutes]
+        return WorkoutDay(
+            day=first.day,
+            focus=f"{first.focus} + {second.focus}",
+            warm_up=list(first.warm_up or second.warm_up),
+            exercises=exercises,
+            cool_down=list(first.cool_down or second.cool_down),
+            duration_minutes=max(durations) if durations else None
+        )
+    
+    def _substitute_exercises(self, base_workout: WorkoutPlan) -> Tuple[List[DayEntry], Dict[int, str]]:
+        """Sostituisce gli esercizi con alternative del catalogo per lo stesso schema motorio"""
+        profile = base_workout.user_profile
+        equipment = resolve_equipment(profile.equipment)
+        avoid_zones = resolve_injuries(profile.injuries) or set()
+        by_name = {exercise.name.lower(): exercise for exercise in self.catalog.exercises}
+        used: Set[str] = {
+            exercise.name.lower() for day in base_workout.workout_days for exercise in day.exercises
+        }
+        
+        days: List[DayEntry] = []
+        to_refine: Dict[int, str] = {}
+        for index, day in enumerate(base_workout.workout_days):
+            exercises = []
+            unknown = []
+            for exercise in day.exercises:
+                entry = by_name.get(exercise.name.lower())
+                if entry is None:
+                    unknown.append(exercise.name)
+                    exercises.append(exercise)
+                    continue
+                    
+                alternatives = [
+                    candidate for candidate in self.catalog.candidates(
+                        entry.pattern, profile.experience_level, equipment, avoid_zones
+                    )
+                    if candidate.name.lower() not in used
+                ]
+                if not alternatives:
+                    exercises.append(exercise)
+                    continue
+                    
+                alternative = alternatives[0]
+                used.add(alternative.name.lower())
+                exercises.append(exercise.model_copy(update={
+                    "name": alternative.name,
+                    "reps": alternative.reps_override or exercise.reps,
+                    "notes": alternative.notes,
+                    "muscle_groups": list(alternative.muscle_groups)
+                }))
+                
+            if unknown:
+                to_refine[index] = (
+                    f"Sostituisci questi esercizi con alternative che allenino gli stessi gruppi muscolari, "
+                    f"mantenendo serie, ripetizioni e recuperi: {', '.join(unknown)}. "
+                    "Lascia invariati gli altri esercizi."
+                )
+            if exercises == day.exercises:
+                days.append(index)
+            else:
+                days.append(day.model_copy(update={"exercises": exercises}, deep=True))
+                
+        return days, to_refine
+    
+    async def _refine_day(
+        self,
+        workout_day: WorkoutDay,
+        user_profile: UserProfile,
+        variation_type: str,
+        instruction: str
+    ) -> Optional[WorkoutDay]:
+        """Fa rielaborare al modello un singolo giorno; None se la risposta non è utilizzabile"""
+        exercises = "\n".join(
+            f"- {exercise.name}: {exercise.sets} x {exercise.reps}, recupero {exercise.rest}"
+            for exercise in workout_day.exercises
+        )
+        refine_prompt = f"""
+Modifica questo giorno di allenamento per una variazione "{VARIATION_LABELS[variation_type]}" della scheda.
+
+GIORNO: {workout_day.day} - {workout_day.focus}
+ESERCIZI ATTUALI:
+{exercises}
+
+PROFILO UTENTE:
+- Livello: {user_profile.experience_level.value}
+- Obiettivi: {', '.join([g.value for g in user_profile.goals])}
+- Attrezzature: {', '.join(user_profile.equipment) if user_profile.equipment else 'Standard palestra'}
+- Limitazioni: {', '.join(user_profile.injuries) if user_profile.injuries else 'Nessuna'}
+
+ISTRUZIONI:
+{instruction}
+
+Restituisci JSON con questa struttura:
+{{
+    "warm_up": ["esercizio1", "esercizio2"],
+    "exercises": [
+        {{
+            "name": "Nome esercizio",
+            "sets": 3,
+            "reps": "8-12",
+            "rest": "90 sec",
+            "weight": "Indicazioni peso",
+            "notes": "Note tecniche",
+            "muscle_groups": ["muscolo1", "muscolo2"]
+        }}
+    ],
+    "cool_down": ["defaticamento1", "defaticamento2"]
+}}
+"""
+        try:
+            response = await self.workout_generator.llm_manager.generate_response(
+                messages=[{"role": "user", "content": refine_prompt}],
+                system_prompt="Sei un personal trainer esperto. Crea esercizi sicuri e appropriati. Rispondi SOLO con JSON.",
+                temperature=0.3,
+                response_format=self.workout_generator._response_format("exercises")
+            )
+        except Exception as e:
+            logger.warning(f"Rielaborazione di {workout_day.day} non riuscita: {e}")
+            return None
+            
+        day_data = self.workout_generator._parse_stage_response("exercises", response)
+        if day_data is None:
+            return None
+        day_exercises = DayExercises.model_validate(day_data)
+        if not day_exercises.exercises:
+            return None
+            
+        return WorkoutDay(
+            day=workout_day.day,
+            focus=workout_day.focus,
+            warm_up=day_exercises.warm_up or workout_day.warm_up,
+            exercises=day_exercises.exercises,
+            cool_down=day_exercises.cool_down or workout_day.cool_down,
+            duration_minutes=workout_day.duration_minutes
+        )
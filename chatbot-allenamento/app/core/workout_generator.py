@@ -4,18 +4,93 @@ Generatore di schede allenamento
 
 import logging
 import json
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, Type
+from pydantic import BaseModel, ValidationError
 from app.models.workout import (
     WorkoutPlan, WorkoutDay, Exercise, UserProfile, 
-    NutritionGuidelines, ProgressionPlan, ExperienceLevel, WorkoutGoal
+    NutritionGuidelines, ProgressionPlan, ExperienceLevel, WorkoutGoal,
+    WorkoutStructure, DayExercises, WorkoutPlanDraft
 )
-from app.core.llm_manager import LLMManager
+from app.core.llm_manager import LLMManager, build_response_format
 from app.core.rag_engine import RAGEngine
+from app.core.retrieval_cache import RetrievalCache
 from app.utils.prompt_templates import PromptTemplates
+from app.utils.json_repair import loads_lenient
 from app.core.error_handler import ChatbotException
 
 logger = logging.getLogger(__name__)
 
+# Fasi della generazione con il modello atteso in risposta
+GENERATION_STAGES: Dict[str, Type[BaseModel]] = {
+    "structure": WorkoutStructure,
+    "exercises": DayExercises,
+    "nutrition": NutritionGuidelines,
+    "progression": ProgressionPlan,
+    "plan": WorkoutPlanDraft
+}
+
+# Valori usati per i campi di un esercizio che il modello non ha fornito
+EXERCISE_DEFAULTS: Dict[str, Any] = {"name": "Esercizio", "sets": 3, "reps": "10-12", "rest": "60 sec"}
+
+# Modalità di generazione: una chiamata per fase o l'intera scheda in una sola chiamata
+MULTI_STAGE = "multi_stage"
+SINGLE_SHOT = "single_shot"
+GENERATION_MODES = (MULTI_STAGE, SINGLE_SHOT)
+
+# Callback di avanzamento: riceve la fase che sta iniziando e i suoi dettagli
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+# Eventi con risultati parziali (non fasi): schema della scheda e singolo giorno completato
+PARTIAL_RESULT_STAGES = ("outline", "day_ready")
+
+def _with_exercise_defaults(exercises: Any) -> Any:
+    """Completa gli esercizi con i valori di EXERCISE_DEFAULTS per i campi mancanti o nulli"""
+    if not isinstance(exercises, list):
+        return exercises
+    return [
+        {**EXERCISE_DEFAULTS, **{key: value for key, value in exercise.items() if value is not None}}
+        if isinstance(exercise, dict) else exercise
+        for exercise in exercises
+    ]
+
+def apply_stage_defaults(stage: str, data: Any) -> Any:
+    """
+    Applica i valori di default alla risposta di una fase prima della validazione
+    
+    Un esercizio senza recupero o serie non invalida l'intero giorno: i campi
+    mancanti ricevono gli stessi valori usati per le schede di default.
+    
+    Args:
+        stage: Nome della fase (vedi GENERATION_STAGES)
+        data: Dati decodificati dalla risposta (non vengono modificati)
+        
+    Returns:
+        Dati completati
+    """
+    if not isinstance(data, dict):
+        return data
+    if stage == "exercises":
+        return {**data, "exercises": _with_exercise_defaults(data.get("exercises", []))}
+    if stage == "plan" and isinstance(data.get("workout_days"), list):
+        return {
+            **data,
+            "workout_days": [
+                {**day, "exercises": _with_exercise_defaults(day.get("exercises", []))}
+                if isinstance(day, dict) else day
+                for day in data["workout_days"]
+            ]
+        }
+    return data
+
+def report_progress(progress: Optional[ProgressCallback], stage: str, **details: Any) -> None:
+    """Notifica l'inizio di una fase; un errore del callback non interrompe la generazione"""
+    if progress is None:
+        return
+    try:
+        progress(stage, details)
+    except Exception as e:
+        logger.warning(f"Errore nel callback di avanzamento ({stage}): {e}")
+
 class WorkoutGenerator:
     """Generatore intelligente di schede di allenamento"""
     
@@ -23,11 +98,62 @@ class WorkoutGenerator:
         self.llm_manager = llm_manager
         self.rag_engine = rag_engine
         self.prompt_templates = PromptTemplates()
+        self.parse_stats: Dict[str, Dict[str, int]] = {
+            stage: {"calls": 0, "repaired": 0, "failures": 0}
+            for stage in GENERATION_STAGES
+        }
+    
+    def _response_format(self, stage: str) -> Optional[Dict[str, Any]]:
+        """Formato strutturato della risposta per una fase"""
+        return build_response_format(GENERATION_STAGES[stage])
+    
+    def _parse_stage_response(self, stage: str, response: str) -> Optional[Dict[str, Any]]:
+        """
+        Interpreta la risposta JSON di una fase, riparandola se necessario
+        
+        Args:
+            stage: Nome della fase (vedi GENERATION_STAGES)
+            response: Risposta del modello
+            
+        Returns:
+            Dati della risposta, conformi allo schema dopo aver applicato i valori
+            di default, o None se non recuperabili
+        """
+        stats = self.parse_stats[stage]
+        stats["calls"] += 1
+        model = GENERATION_STAGES[stage]
+        
+        def validate(data: Any) -> BaseModel:
+            return model.model_validate(apply_stage_defaults(stage, data))
+            
+        try:
+            data, repaired = loads_lenient(response, validate=validate)
+        except (json.JSONDecodeError, ValidationError) as e:
+            stats["failures"] += 1
+            logger.warning(f"Risposta non valida nella fase {stage}: {e}")
+            return None
+            
+        if repaired:
+            stats["repaired"] += 1
+            logger.info(f"Risposta della fase {stage} riparata")
+            
+        return apply_stage_defaults(stage, data)
+    
+    def get_parse_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Ottiene i contatori di parsing per fase
+        
+        Returns:
+            Per ogni fase: chiamate, risposte riparate e risposte scartate
+        """
+        return {stage: dict(stats) for stage, stats in self.parse_stats.items()}
     
     async def generate_complete_workout(
         self, 
         user_profile: UserProfile, 
-        user_input: str
+        user_input: str,
+        mode: str = MULTI_STAGE,
+        progress: Optional[ProgressCallback] = None
     ) -> WorkoutPlan:
         """
         Genera una scheda di allenamento completa
@@ -35,29 +161,64 @@ class WorkoutGenerator:
         Args:
             user_profile: Profilo dell'utente
             user_input: Input originale dell'utente
+            mode: multi_stage (3 + N chiamate) o single_shot (una chiamata)
+            progress: Callback chiamato all'inizio di ogni fase (context, structure,
+                days per ogni giorno, nutrition, progression; plan in single_shot) e
+                con i risultati parziali in multi_stage: outline dopo la struttura,
+                day_ready con il WorkoutDay appena completato
             
         Returns:
             Scheda di allenamento completa
         """
+        if mode not in GENERATION_MODES:
+            raise ChatbotException(f"Modalità di generazione non supportata: {mode}")
+            
         try:
             # Recupera contesto rilevante
+            report_progress(progress, "context")
             context, sources = await self._get_relevant_context(user_profile)
             
+            if mode == SINGLE_SHOT:
+                report_progress(progress, "plan")
+                workout_plan = await self._generate_single_shot(user_profile, user_input, context, sources)
+                workout_plan.metadata = {"generation_mode": SINGLE_SHOT}
+                logger.info(f"Scheda generata in una chiamata: {len(workout_plan.workout_days)} giorni")
+                return workout_plan
+            
             # Genera la scheda base
+            report_progress(progress, "structure")
             workout_structure = await self._generate_workout_structure(
                 user_profile, user_input, context
             )
+            report_progress(
+                progress,
+                "outline",
+                title=self._generate_title(user_profile),
+                user_profile=user_profile,
+                days=[
+                    {"day": day_info.get("day"), "focus": day_info.get("focus")}
+                    for day_info in workout_structure.get("days_structure", [])
+                ]
+            )
+            
+            # Le fasi successive usano solo il contesto specifico, recuperato una volta per query
+            retrieval = RetrievalCache(self.rag_engine)
             
             # Genera esercizi dettagliati
             workout_days = await self._generate_detailed_exercises(
-                workout_structure, user_profile, context
+                workout_structure, user_profile, context, retrieval=retrieval, progress=progress
             )
             
             # Genera linee guida nutrizionali
-            nutrition = await self._generate_nutrition_guidelines(user_profile, context)
+            report_progress(progress, "nutrition")
+            nutrition = await self._generate_nutrition_guidelines(user_profile, context, retrieval=retrieval)
             
             # Genera piano di progressione
-            progression = await self._generate_progression_plan(user_profile, context)
+            report_progress(progress, "progression")
+            progression = await self._generate_progression_plan(user_profile, context, retrieval=retrieval)
+            
+            sources = sources + [source for source in retrieval.get_sources() if source not in sources]
+            logger.info(f"Recupero per fase: {retrieval.get_stats()}")
             
             # Assembla la scheda finale
             workout_plan = self._assemble_workout_plan(
@@ -67,6 +228,7 @@ class WorkoutGenerator:
                 progression=progression,
                 sources=sources
             )
+            workout_plan.metadata = {"generation_mode": MULTI_STAGE}
             
             logger.info(f"Scheda generata: {len(workout_days)} giorni, {self._count_exercises(workout_days)} esercizi")
             return workout_plan
@@ -102,6 +264,27 @@ class WorkoutGenerator:
         query = " ".join(query_parts)
         return await self.rag_engine.retrieve_context(query)
     
+    def _day_query(self, day_info: Dict[str, Any], user_profile: UserProfile) -> str:
+        """Query di recupero per gli esercizi di un giorno"""
+        query_parts = [
+            "esercizi",
+            " ".join(day_info.get("muscle_groups", [])),
+            day_info.get("workout_type", ""),
+            user_profile.experience_level.value
+        ]
+        query_parts.extend(user_profile.injuries)
+        return " ".join(part for part in query_parts if part)
+    
+    def _nutrition_query(self, user_profile: UserProfile) -> str:
+        """Query di recupero per le linee guida nutrizionali"""
+        goals_str = " ".join([goal.value for goal in user_profile.goals])
+        return f"alimentazione nutrizione proteine idratazione {goals_str}"
+    
+    def _progression_query(self, user_profile: UserProfile) -> str:
+        """Query di recupero per il piano di progressione"""
+        goals_str = " ".join([goal.value for goal in user_profile.goals])
+        return f"progressione carichi periodizzazione scarico {user_profile.experience_level.value} {goals_str}"
+    
     async def _generate_workout_structure(
         self, 
         user_profile: UserProfile, 
@@ -146,26 +329,36 @@ Restituisci SOLO un JSON con questa struttura:
         response = await self.llm_manager.generate_response(
             messages=[{"role": "user", "content": structure_prompt}],
             system_prompt="Sei un esperto programmatore di allenamenti. Rispondi SOLO con JSON valido.",
-            temperature=0.2
+            temperature=0.2,
+            response_format=self._response_format("structure")
         )
         
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
+        structure = self._parse_stage_response("structure", response)
+        if structure is None:
             logger.warning("Risposta struttura non in JSON, uso struttura di default")
             return self._get_default_structure(user_profile)
+            
+        return structure
     
     async def _generate_detailed_exercises(
         self, 
         structure: Dict[str, Any], 
         user_profile: UserProfile, 
-        context: str
+        context: str,
+        retrieval: Optional[RetrievalCache] = None,
+        progress: Optional[ProgressCallback] = None
     ) -> List[WorkoutDay]:
         """Genera esercizi dettagliati per ogni giorno"""
         
         workout_days = []
+        days_structure = structure.get("days_structure", [])
         
-        for day_info in structure.get("days_structure", []):
+        for index, day_info in enumerate(days_structure, start=1):
+            report_progress(progress, "days", day=day_info.get("day"), index=index, total=len(days_structure))
+            
+            if retrieval is not None:
+                context, _ = await retrieval.get_context(self._day_query(day_info, user_profile))
+                
             exercises_prompt = f"""
 Basandoti sul contesto documentale, crea gli ESERCIZI per questo giorno di allenamento:
 
@@ -202,54 +395,47 @@ Restituisci JSON con questa struttura:
             response = await self.llm_manager.generate_response(
                 messages=[{"role": "user", "content": exercises_prompt}],
                 system_prompt="Sei un personal trainer esperto. Crea esercizi sicuri e appropriati. Rispondi SOLO con JSON.",
-                temperature=0.3
+                temperature=0.3,
+                response_format=self._response_format("exercises")
             )
             
-            try:
-                day_data = json.loads(response)
-                
-                # Converti in oggetti Exercise
-                exercises = []
-                for ex_data in day_data.get("exercises", []):
-                    exercise = Exercise(
-                        name=ex_data.get("name", "Esercizio"),
-                        sets=ex_data.get("sets", 3),
-                        reps=ex_data.get("reps", "10-12"),
-                        rest=ex_data.get("rest", "60 sec"),
-                        weight=ex_data.get("weight"),
-                        notes=ex_data.get("notes"),
-                        muscle_groups=ex_data.get("muscle_groups", [])
-                    )
-                    exercises.append(exercise)
-                
-                workout_day = WorkoutDay(
-                    day=day_info["day"],
-                    focus=day_info["focus"],
-                    warm_up=day_data.get("warm_up", []),
-                    exercises=exercises,
-                    cool_down=day_data.get("cool_down", []),
-                    duration_minutes=structure.get("session_duration", 60)
-                )
-                
-                workout_days.append(workout_day)
-                
-            except json.JSONDecodeError:
+            day_data = self._parse_stage_response("exercises", response)
+            if day_data is None:
                 logger.warning(f"Errore parsing esercizi per {day_info['day']}, uso default")
                 workout_day = self._get_default_day(day_info, user_profile)
                 workout_days.append(workout_day)
+                report_progress(progress, "day_ready", workout_day=workout_day, index=index, total=len(days_structure))
+                continue
+                
+            # I campi mancanti degli esercizi sono già completati dal parsing
+            workout_day = WorkoutDay(
+                day=day_info["day"],
+                focus=day_info["focus"],
+                warm_up=day_data.get("warm_up", []),
+                exercises=[Exercise(**ex_data) for ex_data in day_data["exercises"]],
+                cool_down=day_data.get("cool_down", []),
+                duration_minutes=structure.get("session_duration", 60)
+            )
+            
+            workout_days.append(workout_day)
+            report_progress(progress, "day_ready", workout_day=workout_day, index=index, total=len(days_structure))
         
         return workout_days
     
     async def _generate_nutrition_guidelines(
         self, 
         user_profile: UserProfile, 
-        context: str
+        context: str,
+        retrieval: Optional[RetrievalCache] = None
     ) -> Optional[NutritionGuidelines]:
         """Genera linee guida nutrizionali"""
         
         if WorkoutGoal.WEIGHT_LOSS not in user_profile.goals and \
            WorkoutGoal.HYPERTROPHY not in user_profile.goals:
             return None
+            
+        if retrieval is not None:
+            context, _ = await retrieval.get_context(self._nutrition_query(user_profile), filters={"topic": "nutrizione"})
         
         nutrition_prompt = f"""
 Basandoti sul contesto, crea linee guida nutrizionali GENERALI per:
@@ -278,10 +464,13 @@ IMPORTANTE: Fornisci solo linee guida generali, NON piani alimentari specifici.
             response = await self.llm_manager.generate_response(
                 messages=[{"role": "user", "content": nutrition_prompt}],
                 system_prompt=self.prompt_templates.get_nutrition_advice_prompt(),
-                temperature=0.2
+                temperature=0.2,
+                response_format=self._response_format("nutrition")
             )
             
-            nutrition_data = json.loads(response)
+            nutrition_data = self._parse_stage_response("nutrition", response)
+            if nutrition_data is None:
+                return None
             
             return NutritionGuidelines(
                 calories_estimate=nutrition_data.get("calories_estimate"),
@@ -298,10 +487,14 @@ IMPORTANTE: Fornisci solo linee guida generali, NON piani alimentari specifici.
     async def _generate_progression_plan(
         self, 
         user_profile: UserProfile, 
-        context: str
+        context: str,
+        retrieval: Optional[RetrievalCache] = None
     ) -> Optional[ProgressionPlan]:
         """Genera piano di progressione"""
         
+        if retrieval is not None:
+            context, _ = await retrieval.get_context(self._progression_query(user_profile), filters={"topic": "programmazione"})
+        
         progression_prompt = f"""
 Crea un piano di progressione di 6 settimane per:
 
@@ -326,10 +519,13 @@ Restituisci JSON:
             response = await self.llm_manager.generate_response(
                 messages=[{"role": "user", "content": progression_prompt}],
                 system_prompt="Crea progressioni graduali e sicure. Rispondi SOLO con JSON.",
-                temperature=0.2
+                temperature=0.2,
+                response_format=self._response_format("progression")
             )
             
-            prog_data = json.loads(response)
+            prog_data = self._parse_stage_response("progression", response)
+            if prog_data is None:
+                return self._get_default_progression(user_profile)
             
             return ProgressionPlan(
                 week_1_2=prog_data.get("week_1_2", ""),
@@ -343,23 +539,104 @@ Restituisci JSON:
             logger.warning(f"Errore generazione progressione: {e}")
             return self._get_default_progression(user_profile)
     
+    async def _generate_single_shot(
+        self,
+        user_profile: UserProfile,
+        user_input: str,
+        context: str,
+        sources: List[str]
+    ) -> WorkoutPlan:
+        """Genera l'intera scheda con una sola chiamata vincolata allo schema"""
+        
+        needs_nutrition = WorkoutGoal.WEIGHT_LOSS in user_profile.goals or \
+            WorkoutGoal.HYPERTROPHY in user_profile.goals
+        nutrition_instruction = (
+            "linee guida GENERALI (calories_estimate, protein_grams, meal_timing, hydration, supplements)"
+            if needs_nutrition else "null"
+        )
+        
+        plan_prompt = f"""
+Basandoti sul contesto fornito, crea una scheda di allenamento COMPLETA.
+
+PROFILO UTENTE:
+- Livello: {user_profile.experience_level.value}
+- Obiettivi: {', '.join([g.value for g in user_profile.goals])}
+- Giorni disponibili: {user_profile.available_days}
+- Durata sessione: {user_profile.session_duration or 60} minuti
+- Età: {user_profile.age or 'Non specificata'}
+- Limitazioni: {', '.join(user_profile.injuries) if user_profile.injuries else 'Nessuna'}
+- Attrezzature: {', '.join(user_profile.equipment) if user_profile.equipment else 'Standard palestra'}
+
+CONTESTO DOCUMENTALE:
+{context}
+
+RICHIESTA ORIGINALE:
+{user_input}
+
+Restituisci SOLO un JSON con:
+- "title": titolo della scheda
+- "workout_days": esattamente {user_profile.available_days} giorni, ognuno con "day", "focus",
+  "warm_up", "exercises" (name, sets, reps, rest, weight, notes, muscle_groups), "cool_down", "duration_minutes"
+- "nutrition": {nutrition_instruction}
+- "progression": piano di 6 settimane (week_1_2, week_3_4, week_5_6, deload_week, progression_notes)
+- "general_notes": note generali
+"""
+        
+        response = await self.llm_manager.generate_response(
+            messages=[{"role": "user", "content": plan_prompt}],
+            system_prompt="Sei un personal trainer certificato. Crea schede sicure e appropriate. Rispondi SOLO con JSON valido.",
+            temperature=0.3,
+            response_format=self._response_format("plan")
+        )
+        
+        plan_data = self._parse_stage_response("plan", response)
+        
+        if plan_data is None:
+            logger.warning("Risposta scheda completa non valida, uso scheda di default")
+            structure = self._get_default_structure(user_profile)
+            workout_days = [
+                self._get_default_day(day_info, user_profile)
+                for day_info in structure["days_structure"]
+            ]
+            return self._assemble_workout_plan(
+                user_profile=user_profile,
+                workout_days=workout_days,
+                nutrition=None,
+                progression=self._get_default_progression(user_profile),
+                sources=sources
+            )
+            
+        draft = WorkoutPlanDraft.model_validate(plan_data)
+        
+        return self._assemble_workout_plan(
+            user_profile=user_profile,
+            workout_days=draft.workout_days,
+            nutrition=draft.nutrition if needs_nutrition else None,
+            progression=draft.progression or self._get_default_progression(user_profile),
+            sources=sources,
+            title=draft.title,
+            general_notes=draft.general_notes
+        )
+    
     def _assemble_workout_plan(
         self,
         user_profile: UserProfile,
         workout_days: List[WorkoutDay],
         nutrition: Optional[NutritionGuidelines],
         progression: Optional[ProgressionPlan],
-        sources: List[str]
+        sources: List[str],
+        title: Optional[str] = None,
+        general_notes: Optional[List[str]] = None
     ) -> WorkoutPlan:
-        """Assembla la scheda finale"""
+        """Assembla la scheda finale (titolo e note dal profilo se il modello non li ha forniti)"""
         
         import uuid
         
         # Genera titolo basato sul profilo
-        title = self._generate_title(user_profile)
+        title = title or self._generate_title(user_profile)
         
         # Note generali
-        general_notes = self._generate_general_notes(user_profile)
+        general_notes = general_notes or self._generate_general_notes(user_profile)
         
         return WorkoutPlan(
             id=str(uuid.uuid4()),
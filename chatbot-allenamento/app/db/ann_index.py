@@ -0,0 +1,418 @@
+"""
+Indice approssimato (IVF) per la ricerca dei vicini più prossimi
+"""
+
+import logging
+import math
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.error_handler import RAGException
+from app.db.quantization import VectorQuantizer, QUANTIZERS, kmeans
+
+logger = logging.getLogger(__name__)
+
+ANN_INDEX_FILENAME = "ann_index.npz"
+ANN_INDEX_VERSION = 2
+
+# Vettori usati per l'addestramento dei centroidi per ogni lista
+_TRAINING_POINTS_PER_LIST = 64
+_KMEANS_ITERATIONS = 10
+_ASSIGN_BATCH_SIZE = 16384
+# Codici decodificati per volta durante il calcolo dei punteggi approssimati
+_SCORE_BLOCK_SIZE = 8192
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Normalizza le righe a norma unitaria (prodotto scalare = similarità coseno)"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def float_vectors_path(path: Path) -> Path:
+    """File dei vettori float32 usati per la riclassificazione degli indici quantizzati"""
+    return path.with_name(f"{path.stem}_vectors.npy")
+
+class IVFIndex:
+    """
+    Indice a file invertiti (IVF) per la similarità coseno
+    
+    I vettori vengono raggruppati attorno a `n_lists` centroidi (k-means sferico);
+    una ricerca confronta la query con i centroidi e calcola la similarità solo
+    con i vettori delle `n_probe` liste più vicine, invece che con tutti.
+    I vettori sono ordinati per lista, così ogni lista è un blocco contiguo.
+    Con una sola lista la ricerca è esatta.
+    
+    Con un quantizzatore in memoria restano solo i codici compatti: i candidati
+    migliori secondo il punteggio approssimato vengono riclassificati sui vettori
+    float32, letti dal file mappato in memoria (`float_vectors`).
+    """
+    
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        vectors: np.ndarray,
+        ids: np.ndarray,
+        assignments: np.ndarray,
+        quantizer: Optional[VectorQuantizer] = None,
+        float_vectors: Optional[np.ndarray] = None
+    ):
+        """
+        Args:
+            centroids: Centroidi normalizzati (n_lists, dim)
+            vectors: Vettori normalizzati (o codici, con un quantizzatore) ordinati per lista
+            ids: Identificativi dei nodi (byte ASCII) nello stesso ordine dei vettori
+            assignments: Lista di ogni vettore, non decrescente
+            quantizer: Codifica dei vettori (None = float32)
+            float_vectors: Vettori float32 per la riclassificazione, nello stesso ordine
+        """
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.assignments = assignments
+        self.quantizer = quantizer
+        self.float_vectors = float_vectors
+        self.offsets = np.searchsorted(assignments, np.arange(len(centroids) + 1))
+    
+    @property
+    def dimension(self) -> int:
+        return self.centroids.shape[1]
+    
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+    
+    @property
+    def quantization(self) -> str:
+        return self.quantizer.name if self.quantizer is not None else "none"
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    @staticmethod
+    def default_lists(count: int) -> int:
+        """Numero di liste consigliato per `count` vettori (circa 4·√n)"""
+        return max(1, min(count, int(4 * math.sqrt(count))))
+    
+    @classmethod
+    def build(
+        cls,
+        node_ids: Sequence[str],
+        vectors: np.ndarray,
+        n_lists: Optional[int] = None,
+        seed: int = 0,
+        quantizer: Optional[VectorQuantizer] = None
+    ) -> "IVFIndex":
+        """
+        Costruisce l'indice addestrando i centroidi su un campione dei vettori
+        
+        Args:
+            node_ids: Identificativi dei nodi
+            vectors: Embeddings (n, dim) nello stesso ordine degli identificativi
+            n_lists: Numero di liste (default: circa 4·√n)
+            seed: Seme per campionamento e inizializzazione
+            quantizer: Codifica da addestrare sugli stessi vettori (None = float32)
+            
+        Returns:
+            Indice costruito
+        """
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if len(vectors) == 0:
+            raise RAGException("Nessun vettore da indicizzare")
+            
+        n_lists = min(n_lists or cls.default_lists(len(vectors)), len(vectors))
+        rng = np.random.default_rng(seed)
+        if n_lists == 1:
+            centroids = _normalize(vectors.mean(axis=0, keepdims=True))
+        else:
+            sample_size = min(len(vectors), n_lists * _TRAINING_POINTS_PER_LIST)
+            sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+            centroids = kmeans(sample, n_lists, _KMEANS_ITERATIONS, rng, spherical=True)
+            
+        empty_ids = np.array([], dtype="S")
+        empty_assignments = np.array([], dtype=np.int32)
+        if quantizer is not None:
+            quantizer.fit(vectors, rng)
+            index = cls(
+                centroids, quantizer.encode(vectors[:0]), empty_ids, empty_assignments,
+                quantizer=quantizer, float_vectors=vectors[:0]
+            )
+        else:
+            index = cls(centroids, vectors[:0], empty_ids, empty_assignments)
+        index.add(node_ids, vectors)
+        return index
+    
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Lista più vicina per ogni vettore, a blocchi per limitare la memoria"""
+        return np.concatenate([
+            np.argmax(vectors[start:start + _ASSIGN_BATCH_SIZE] @ self.centroids.T, axis=1)
+            for start in range(0, len(vectors), _ASSIGN_BATCH_SIZE)
+        ]).astype(np.int32)
+    
+    def add(self, node_ids: Sequence[str], vectors: np.ndarray) -> None:
+        """
+        Aggiunge vettori assegnandoli ai centroidi esistenti (senza riaddestrarli)
+        
+        Args:
+            node_ids: Identificativi dei nodi
+            vectors: Embeddings (n, dim)
+        """
+        if len(node_ids) == 0:
+            return
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if vectors.shape[1] != self.dimension:
+            raise RAGException(
+                f"Dimensione dei vettori ({vectors.shape[1]}) diversa da quella dell'indice ({self.dimension})"
+            )
+            
+        assignments = np.concatenate([self.assignments, self._assign(vectors)])
+        order = np.argsort(assignments, kind="stable")
+        if self.quantizer is not None:
+            self.vectors = np.concatenate([self.vectors, self.quantizer.encode(vectors)])[order]
+            if self.float_vectors is not None:
+                # I vettori mappati vengono copiati in memoria fino al prossimo salvataggio
+                self.float_vectors = np.concatenate([np.asarray(self.float_vectors), vectors])[order]
+        else:
+            self.vectors = np.concatenate([self.vectors, vectors])[order]
+        # Identificativi come byte: un UUID occupa 36 byte invece di 144 in UTF-32
+        self.ids = np.concatenate([self.ids, np.char.encode(np.asarray(node_ids, dtype=str), "ascii")])[order]
+        self.assignments = assignments[order]
+        self.offsets = np.searchsorted(self.assignments, np.arange(self.n_lists + 1))
+    
+    def get_ids(self) -> List[str]:
+        """Identificativi dei nodi nello stesso ordine dei vettori"""
+        return [node_id.decode("ascii") for node_id in self.ids.tolist()]
+    
+    def get_vectors(self) -> Optional[np.ndarray]:
+        """Vettori float32 normalizzati nello stesso ordine di `ids` (None se non disponibili)"""
+        return self.vectors if self.quantizer is None else self.float_vectors
+    
+    def rows_for(self, node_ids: Iterable[str]) -> np.ndarray:
+        """
+        Righe dei nodi indicati, in ordine crescente
+        
+        Args:
+            node_ids: Identificativi dei nodi (quelli assenti dall'indice vengono ignorati)
+            
+        Returns:
+            Posizioni nei vettori dell'indice
+        """
+        wanted = np.char.encode(np.asarray(list(node_ids), dtype=str), "ascii")
+        if not len(wanted):
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(np.isin(self.ids, wanted))
+    
+    def search(
+        self,
+        query: Sequence[float],
+        top_k: int,
+        n_probe: int,
+        rerank: int = 4,
+        rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Cerca i vettori più simili alla query nelle liste più vicine
+        
+        Args:
+            query: Embedding della query
+            top_k: Numero massimo di risultati
+            n_probe: Liste esplorate (più alto = recall maggiore, ricerca più lenta)
+            rerank: Con un quantizzatore, candidati riclassificati sui vettori float32
+                per ogni risultato richiesto (0 = solo punteggio approssimato)
+            rows: Righe a cui limitare la ricerca (filtro sui metadati, da `rows_for`):
+                vengono valutate tutte, senza esplorare le liste
+                
+        Returns:
+            Coppie (id nodo, similarità coseno) ordinate per similarità decrescente
+        """
+        if not len(self) or top_k <= 0:
+            return []
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        if query.shape[-1] != self.dimension:
+            raise RAGException(
+                f"Dimensione della query ({query.shape[-1]}) diversa da quella dell'indice ({self.dimension}): "
+                "ricostruire l'indice con EMBEDDING_DIMENSIONS attuale"
+            )
+        
+        if rows is not None:
+            # Prefiltro: l'insieme ammesso è già ristretto, una ricerca esatta su di esso non perde risultati
+            candidates = np.asarray(rows, dtype=np.int64)
+            blocks = [candidates[block:block + _SCORE_BLOCK_SIZE] for block in range(0, len(candidates), _SCORE_BLOCK_SIZE)]
+        else:
+            n_probe = min(max(n_probe, 1), self.n_lists)
+            probed = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+            ranges = [(self.offsets[list_id], self.offsets[list_id + 1]) for list_id in probed]
+            candidates = np.concatenate([np.arange(start, end) for start, end in ranges])
+            # Le liste sono blocchi contigui: nessuna copia dei vettori candidati
+            blocks = [
+                slice(block, min(block + _SCORE_BLOCK_SIZE, end))
+                for start, end in ranges
+                for block in range(start, end, _SCORE_BLOCK_SIZE)
+            ]
+        if not len(candidates):
+            return []
+            
+        if self.quantizer is None:
+            scores = np.concatenate([self.vectors[block] @ query for block in blocks])
+        else:
+            prepared = self.quantizer.prepare_query(query)
+            scores = np.concatenate([self.quantizer.score(self.vectors[block], prepared) for block in blocks])
+            if self.float_vectors is not None and rerank > 0:
+                shortlist = min(top_k * rerank, len(candidates))
+                best = np.argpartition(-scores, shortlist - 1)[:shortlist]
+                # Righe lette in ordine dal file mappato
+                candidates = np.sort(candidates[best])
+                scores = self.float_vectors[candidates] @ query
+                
+        top = min(top_k, len(candidates))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+        return [(self.ids[candidates[i]].decode("ascii"), float(scores[i])) for i in best]
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Memoria occupata dall'indice
+        
+        Returns:
+            Byte residenti (centroidi, vettori o codici, identificativi, parametri della
+            codifica) e byte dei vettori float32 mappati da disco per la riclassificazione
+        """
+        arrays = [self.centroids, self.vectors, self.ids, self.assignments]
+        resident = mapped = 0
+        if self.quantizer is not None:
+            resident += self.quantizer.parameters_bytes()
+            if self.float_vectors is not None:
+                arrays.append(self.float_vectors)
+        for array in arrays:
+            # Gli array mappati (indice condiviso, vettori di riclassificazione) stanno nella page cache
+            if isinstance(array, np.memmap):
+                mapped += array.nbytes
+            else:
+                resident += array.nbytes
+        return {"resident_bytes": int(resident), "mapped_bytes": int(mapped)}
+    
+    def save(self, path: Path) -> None:
+        """
+        Salva l'indice in formato NumPy (.npz)
+        
+        Con un quantizzatore i vettori float32 vanno in un file .npy separato, che
+        viene poi mappato in memoria invece di restare nella memoria del processo.
+        
+        Args:
+            path: File di destinazione
+        """
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            arrays = {
+                "version": np.array(ANN_INDEX_VERSION),
+                "quantization": np.array(self.quantization),
+                "centroids": self.centroids,
+                "vectors": self.vectors,
+                "ids": self.ids,
+                "assignments": self.assignments
+            }
+            if self.quantizer is not None:
+                arrays.update({f"q_{name}": array for name, array in self.quantizer.to_arrays().items()})
+                if self.float_vectors is not None:
+                    float_path = float_vectors_path(path)
+                    tmp_path = float_path.with_name(float_path.name + ".tmp")
+                    with open(tmp_path, "wb") as f:
+                        np.save(f, np.asarray(self.float_vectors))
+                    # Il file mappato viene sostituito, non riscritto sul posto
+                    tmp_path.replace(float_path)
+                    self.float_vectors = np.load(float_path, mmap_mode="r")
+            with open(path, "wb") as f:
+                np.savez(f, **arrays)
+        except Exception as e:
+            raise RAGException(f"Errore nel salvataggio dell'indice approssimato: {str(e)}")
+    
+    @classmethod
+    def load(cls, path: Path) -> Optional["IVFIndex"]:
+        """
+        Carica l'indice da disco
+        
+        Args:
+            path: File dell'indice
+            
+        Returns:
+            Indice caricato o None se assente, corrotto o di una versione diversa
+        """
+        if not path.exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["version"]) != ANN_INDEX_VERSION:
+                    logger.info(f"Indice approssimato in {path} di una versione diversa, verrà ricostruito")
+                    return None
+                    
+                quantizer = None
+                float_vectors = None
+                quantization = str(data["quantization"])
+                if quantization != "none":
+                    quantizer = QUANTIZERS[quantization].from_arrays({
+                        name[2:]: data[name] for name in data.files if name.startswith("q_")
+                    })
+                    float_path = float_vectors_path(path)
+                    if float_path.exists():
+                        float_vectors = np.load(float_path, mmap_mode="r")
+                        
+                return cls(
+                    data["centroids"], data["vectors"], data["ids"], data["assignments"],
+                    quantizer=quantizer, float_vectors=float_vectors
+                )
+        except Exception as e:
+            logger.warning(f"Indice approssimato in {path} non leggibile: {e}")
+            return None
+    
+    def save_arrays(self, directory: Path) -> None:
+        """
+        Salva l'indice come file .npy separati, mappabili in memoria in sola lettura
+        
+        A differenza del formato .npz ogni array può essere aperto con `mmap_mode`,
+        così più processi condividono le stesse pagine dalla page cache.
+        
+        Args:
+            directory: Directory di destinazione
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        arrays = {
+            "centroids": self.centroids,
+            "vectors": self.vectors,
+            "ids": self.ids,
+            "assignments": self.assignments
+        }
+        if self.quantizer is not None:
+            arrays.update({f"q_{name}": array for name, array in self.quantizer.to_arrays().items()})
+            if self.float_vectors is not None:
+                arrays["float_vectors"] = self.float_vectors
+        for name, array in arrays.items():
+            np.save(directory / f"{name}.npy", np.asarray(array))
+    
+    @classmethod
+    def load_arrays(cls, directory: Path, quantization: str = "none") -> "IVFIndex":
+        """
+        Apre un indice salvato con `save_arrays` mappando gli array in sola lettura
+        
+        Args:
+            directory: Directory dell'indice
+            quantization: Modalità di quantizzazione con cui è stato costruito
+            
+        Returns:
+            Indice i cui array restano su disco (nessuna copia nella memoria del processo)
+        """
+        def load(name: str) -> np.ndarray:
+            return np.load(directory / f"{name}.npy", mmap_mode="r")
+            
+        quantizer = None
+        float_vectors = None
+        if quantization != "none":
+            # I parametri della codifica sono piccoli e vengono letti in memoria
+            quantizer = QUANTIZERS[quantization].from_arrays({
+                path.stem[2:]: np.load(path) for path in directory.glob("q_*.npy")
+            })
+            if (directory / "float_vectors.npy").exists():
+                float_vectors = load("float_vectors")
+                
+        return cls(
+            np.load(directory / "centroids.npy"), load("vectors"), load("ids"), load("assignments"),
+            quantizer=quantizer, float_vectors=float_vectors
+        )
@@ -0,0 +1,195 @@
+"""
+Cache in memoria delle chat attive con scrittura differita
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Optional, Set
+from app.models.chat import Chat
+
+logger = logging.getLogger(__name__)
+
+class ChatCache:
+    """Cache LRU delle chat attive con tracciamento delle modifiche (write-back)"""
+    
+    def __init__(self, writer: Callable[[Chat], None], max_size: int = 256, flush_interval: float = 5.0):
+        """
+        Args:
+            writer: Funzione che persiste una chat su storage
+            max_size: Numero massimo di chat mantenute in memoria (0 disabilita la cache)
+            flush_interval: Intervallo in secondi tra due flush in background
+        """
+        self.writer = writer
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        
+        self._chats: "OrderedDict[str, Chat]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        
+        # Contatori per le statistiche
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._coalesced = 0
+    
+    @property
+    def enabled(self) -> bool:
+        """Indica se la cache è attiva"""
+        return self.max_size > 0
+    
+    def get(self, chat_id: str) -> Optional[Chat]:
+        """
+        Recupera una chat dalla cache
+        
+        Args:
+            chat_id: ID della chat
+        
+        Returns:
+            Chat in cache o None
+        """
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            self._misses += 1
+            return None
+        
+        self._chats.move_to_end(chat_id)
+        self._hits += 1
+        return chat
+    
+    def put(self, chat: Chat, dirty: bool = False) -> None:
+        """
+        Inserisce o aggiorna una chat nella cache
+        
+        Args:
+            chat: Chat da memorizzare
+            dirty: True se la chat contiene modifiche non ancora persistite
+        """
+        if not self.enabled:
+            if dirty:
+                self._write(chat)
+            return
+        
+        self._chats[chat.id] = chat
+        self._chats.move_to_end(chat.id)
+        
+        if dirty:
+            if chat.id in self._dirty:
+                self._coalesced += 1
+            self._dirty.add(chat.id)
+        
+        self._evict()
+    
+    def discard(self, chat_id: str) -> bool:
+        """
+        Rimuove una chat dalla cache senza persisterla
+        
+        Args:
+            chat_id: ID della chat
+        
+        Returns:
+            True se la chat aveva modifiche non ancora scritte su disco
+        """
+        self._chats.pop(chat_id, None)
+        was_dirty = chat_id in self._dirty
+        self._dirty.discard(chat_id)
+        return was_dirty
+    
+    def clear(self) -> None:
+        """Svuota la cache senza persistere le modifiche"""
+        self._chats.clear()
+        self._dirty.clear()
+    
+    def flush(self) -> int:
+        """
+        Scrive su storage tutte le chat modificate
+        
+        Returns:
+            Numero di chat scritte
+        """
+        flushed = 0
+        
+        for chat_id in list(self._dirty):
+            chat = self._chats.get(chat_id)
+            self._dirty.discard(chat_id)
+            
+            if chat is None:
+                continue
+            
+            try:
+                self._write(chat)
+                flushed += 1
+            except Exception as e:
+                # Riprova al prossimo flush
+                self._dirty.add(chat_id)
+                logger.error(f"Errore nel flush della chat {chat_id}: {e}")
+        
+        if flushed:
+            logger.debug(f"Flush completato: {flushed} chat scritte")
+        
+        return flushed
+    
+    def _write(self, chat: Chat) -> None:
+        """Persiste una singola chat"""
+        self.writer(chat)
+        self._writes += 1
+    
+    def _evict(self) -> None:
+        """Rimuove le chat meno usate oltre la capacità, scrivendo quelle modificate"""
+        while len(self._chats) > self.max_size:
+            chat_id, chat = self._chats.popitem(last=False)
+            
+            if chat_id in self._dirty:
+                self._dirty.discard(chat_id)
+                try:
+                    self._write(chat)
+                except Exception as e:
+                    logger.error(f"Errore nella scrittura della chat {chat_id} in uscita dalla cache: {e}")
+    
+    # === FLUSH IN BACKGROUND ===
+    
+    def start(self) -> None:
+        """Avvia il task di flush periodico"""
+        if not self.enabled or self._flush_task is not None:
+            return
+        
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Flush periodico delle chat avviato (ogni {self.flush_interval}s)")
+    
+    async def stop(self) -> None:
+        """Ferma il task di flush e scrive le modifiche pendenti"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        
+        flushed = self.flush()
+        logger.info(f"Cache chat chiusa, {flushed} chat scritte su disco")
+    
+    async def _flush_loop(self) -> None:
+        """Esegue il flush a intervalli regolari"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Ottiene statistiche sulla cache
+        
+        Returns:
+            Dizionario con le statistiche
+        """
+        return {
+            'enabled': self.enabled,
+            'size': len(self._chats),
+            'max_size': self.max_size,
+            'dirty': len(self._dirty),
+            'hits': self._hits,
+            'misses': self._misses,
+            'writes': self._writes,
+            'coalesced_writes': self._coalesced
+        }
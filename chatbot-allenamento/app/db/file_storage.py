@@ -18,10 +18,12 @@ class FileStorage:
     def __init__(self):
         self.chats_path = settings.CHATS_PATH
         self.workouts_path = settings.WORKOUTS_PATH
+        self.variations_path = self.workouts_path / "variations"
         
         # Assicurati che le directory esistano
         self.chats_path.mkdir(parents=True, exist_ok=True)
         self.workouts_path.mkdir(parents=True, exist_ok=True)
+        self.variations_path.mkdir(parents=True, exist_ok=True)
     
     # === GESTIONE CHAT ===
     
@@ -231,6 +233,7 @@ class FileStorage:
         """
         try:
             workouts = []
+            base_days = {}
             
             for file_path in self.workouts_path.glob("*.json"):
                 try:
@@ -250,9 +253,12 @@ class FileStorage:
                     }
                     
                     workouts.append(workout_info)
+                    base_days[workout_data.get('id')] = workout_data.get('workout_days', [])
                     
                 except Exception as e:
                     logger.warning(f"Errore nel caricamento della scheda {file_path.name}: {e}")
+                    
+            workouts.extend(self._list_variation_infos(base_days))
             
             # Ordina per data di creazione (più recenti prima)
             workouts.sort(key=lambda x: x.get('created_at', ''), reverse=True)
@@ -290,6 +296,133 @@ class FileStorage:
         except Exception as e:
             logger.error(f"Errore nell'eliminazione della scheda {workout_id}: {e}")
             raise StorageException(f"Errore nell'eliminazione della scheda: {str(e)}")
+            
+    # === VARIAZIONI DELLE SCHEDE ===
+    
+    def save_workout_variation(self, variation_data: Dict[str, Any]) -> None:
+        """
+        Salva una variazione come differenza rispetto alla scheda base
+        
+        Args:
+            variation_data: Dati della variazione da salvare
+        """
+        try:
+            variation_id = variation_data['id']
+            file_path = self.variations_path / f"{variation_id}.json"
+            
+            serializable_data = self._prepare_for_json(variation_data)
+            
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(serializable_data, f, ensure_ascii=False, indent=2)
+                
+            logger.info(f"Variazione {variation_id} salvata con successo")
+            
+        except Exception as e:
+            logger.error(f"Errore nel salvataggio della variazione {variation_data.get('id')}: {e}")
+            raise StorageException(f"Errore nel salvataggio della variazione: {str(e)}")
+    
+    def load_workout_variation(self, variation_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Carica una variazione
+        
+        Args:
+            variation_id: ID della variazione
+            
+        Returns:
+            Dati della variazione o None se non trovata
+        """
+        try:
+            file_path = self.variations_path / f"{variation_id}.json"
+            
+            if not file_path.exists():
+                return None
+                
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                
+            return self._restore_from_json(data)
+            
+        except Exception as e:
+            logger.error(f"Errore nel caricamento della variazione {variation_id}: {e}")
+            raise StorageException(f"Errore nel caricamento della variazione: {str(e)}")
+    
+    def list_workout_variations(self, base_workout_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Lista le variazioni salvate
+        
+        Args:
+            base_workout_id: Se indicato, solo le variazioni di questa scheda
+            
+        Returns:
+            Dati delle variazioni
+        """
+        return [
+            self._restore_from_json(variation_data)
+            for variation_data in self._read_variation_files()
+            if base_workout_id is None or variation_data.get('base_workout_id') == base_workout_id
+        ]
+    
+    def delete_workout_variation(self, variation_id: str) -> bool:
+        """
+        Elimina una variazione
+        
+        Args:
+            variation_id: ID della variazione
+            
+        Returns:
+            True se eliminata, False se non trovata
+        """
+        try:
+            file_path = self.variations_path / f"{variation_id}.json"
+            
+            if not file_path.exists():
+                return False
+                
+            file_path.unlink()
+            logger.info(f"Variazione {variation_id} eliminata con successo")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Errore nell'eliminazione della variazione {variation_id}: {e}")
+            raise StorageException(f"Errore nell'eliminazione della variazione: {str(e)}")
+    
+    def _read_variation_files(self) -> List[Dict[str, Any]]:
+        """Legge i file delle variazioni così come salvati"""
+        variations = []
+        for file_path in self.variations_path.glob("*.json"):
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    variations.append(json.load(f))
+            except Exception as e:
+                logger.warning(f"Errore nel caricamento della variazione {file_path.name}: {e}")
+        return variations
+    
+    def _list_variation_infos(self, base_days: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Informazioni di base delle variazioni per l'elenco delle schede
+        
+        Args:
+            base_days: Giorni delle schede complete per ID, per contare gli esercizi dei giorni invariati
+        """
+        infos = []
+        for variation_data in self._read_variation_files():
+            days = variation_data.get('days', [])
+            reference_days = base_days.get(variation_data.get('base_workout_id'), [])
+            total_exercises = 0
+            for day in days:
+                if isinstance(day, int):
+                    day = reference_days[day] if day < len(reference_days) else {}
+                total_exercises += len(day.get('exercises', []))
+                
+            infos.append({
+                'id': variation_data.get('id'),
+                'title': variation_data.get('title', 'Variazione senza titolo'),
+                'created_at': variation_data.get('created_at'),
+                'total_days': len(days),
+                'total_exercises': total_exercises,
+                'base_workout_id': variation_data.get('base_workout_id')
+            })
+        return infos
     
     # === UTILITÀ ===
     
@@ -0,0 +1,345 @@
+"""
+Libreria di schede pregenerate indicizzate per firma del profilo
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from app.config import settings
+from app.models.workout import WorkoutPlan, UserProfile, ExperienceLevel, WorkoutGoal
+from app.core.exercise_catalog import resolve_equipment
+from app.core.error_handler import StorageException
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.json"
+
+# Durata sessione rappresentativa di ogni fascia
+DURATION_BUCKETS = {"breve": 40, "standard": 60, "lunga": 90}
+
+# Attrezzatura rappresentativa di ogni classe
+EQUIPMENT_CLASSES = {
+    "palestra": ["palestra attrezzata"],
+    "pesi_liberi": ["manubri", "kettlebell", "elastici"],
+    "corpo_libero": ["corpo libero"]
+}
+
+# Spazio dei profili in ordine di diffusione stimata, usato quando lo storico non basta
+COMMON_LEVELS = [ExperienceLevel.BEGINNER, ExperienceLevel.INTERMEDIATE, ExperienceLevel.ADVANCED]
+COMMON_GOALS = [
+    [WorkoutGoal.GENERAL_FITNESS],
+    [WorkoutGoal.HYPERTROPHY],
+    [WorkoutGoal.WEIGHT_LOSS],
+    [WorkoutGoal.STRENGTH],
+    [WorkoutGoal.HYPERTROPHY, WorkoutGoal.STRENGTH],
+    [WorkoutGoal.ENDURANCE]
+]
+COMMON_DAYS = [3, 4, 2, 5]
+
+def duration_bucket(session_duration: Optional[int]) -> str:
+    """Fascia di durata della sessione"""
+    if session_duration is None:
+        return "standard"
+    if session_duration <= 45:
+        return "breve"
+    if session_duration <= 75:
+        return "standard"
+    return "lunga"
+
+def equipment_class(equipment: List[str]) -> str:
+    """Classe di attrezzatura disponibile (palestra, pesi_liberi, corpo_libero)"""
+    available = resolve_equipment(equipment)
+    if available.intersection({"bilanciere", "macchine", "cavi"}):
+        return "palestra"
+    if available.intersection({"manubri", "kettlebell", "elastici"}):
+        return "pesi_liberi"
+    return "corpo_libero"
+
+def profile_signature(user_profile: UserProfile) -> Optional[str]:
+    """
+    Firma del profilo: livello, obiettivi, giorni, fascia di durata e classe di attrezzatura
+    
+    Args:
+        user_profile: Profilo dell'utente
+        
+    Returns:
+        Firma del profilo, o None se infortuni o preferenze richiedono una scheda su misura
+    """
+    if user_profile.injuries or user_profile.preferences:
+        return None
+        
+    goals = "+".join(sorted({goal.value for goal in user_profile.goals})) or WorkoutGoal.GENERAL_FITNESS.value
+    return "|".join([
+        user_profile.experience_level.value,
+        goals,
+        str(user_profile.available_days),
+        duration_bucket(user_profile.session_duration),
+        equipment_class(user_profile.equipment)
+    ])
+
+def profile_from_signature(signature: str) -> UserProfile:
+    """
+    Profilo rappresentativo di una firma, usato per pregenerare la scheda
+    
+    Args:
+        signature: Firma del profilo
+        
+    Returns:
+        Profilo con valori tipici per la firma
+    """
+    level, goals, days, duration, equipment = signature.split("|")
+    return UserProfile(
+        experience_level=ExperienceLevel(level),
+        goals=[WorkoutGoal(goal) for goal in goals.split("+")],
+        available_days=int(days),
+        session_duration=DURATION_BUCKETS[duration],
+        equipment=list(EQUIPMENT_CLASSES[equipment])
+    )
+
+def iter_common_signatures() -> Iterable[str]:
+    """Firme dello spazio dei profili in ordine di diffusione stimata"""
+    for goals, level, days, equipment in itertools.product(
+        COMMON_GOALS, COMMON_LEVELS, COMMON_DAYS, EQUIPMENT_CLASSES
+    ):
+        yield profile_signature(UserProfile(
+            experience_level=level,
+            goals=goals,
+            available_days=days,
+            equipment=list(EQUIPMENT_CLASSES[equipment])
+        ))
+
+def top_signatures(saved_profiles: Iterable[Dict[str, Any]], limit: int) -> List[str]:
+    """
+    Firme più richieste: prima quelle dello storico delle schede, poi lo spazio comune
+    
+    Args:
+        saved_profiles: Profili utente delle schede salvate
+        limit: Numero massimo di firme
+        
+    Returns:
+        Firme ordinate per priorità
+    """
+    counts = Counter()
+    for profile_data in saved_profiles:
+        try:
+            signature = profile_signature(UserProfile(**profile_data))
+        except Exception:
+            continue
+        if signature:
+            counts[signature] += 1
+            
+    signatures = [signature for signature, _ in counts.most_common()]
+    for signature in iter_common_signatures():
+        if len(signatures) >= limit:
+            break
+        if signature not in signatures:
+            signatures.append(signature)
+            
+    return signatures[:limit]
+
+class PlanLibrary:
+    """
+    Schede pregenerate su disco con indice firma → file
+    
+    L'indice resta in memoria finché il file su disco non cambia: a ogni
+    consultazione se ne controlla la data di modifica, così una libreria
+    generata o rigenerata con build_plan_library.py a server avviato viene
+    servita senza riavvio. Le schede sono lette al primo utilizzo e restano in
+    memoria fino al cambio dell'indice.
+    """
+    
+    def __init__(self, path: Optional[Path] = None):
+        """
+        Args:
+            path: Directory della libreria (default da settings)
+        """
+        self.path = Path(path or settings.PLAN_LIBRARY_PATH)
+        self._index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._index_version: Optional[Tuple[int, int]] = None
+        self._plans: Dict[str, WorkoutPlan] = {}
+        self._hits = 0
+        self._misses = 0
+    
+    @staticmethod
+    def _filename(signature: str) -> str:
+        """Nome file della scheda per una firma"""
+        return hashlib.sha1(signature.encode("utf-8")).hexdigest()[:16] + ".json"
+    
+    def _index_file_version(self) -> Optional[Tuple[int, int]]:
+        """Data di modifica e dimensione del file indice, None se non esiste"""
+        try:
+            stat = (self.path / INDEX_FILENAME).stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        """Carica l'indice della libreria, rileggendolo se il file è cambiato (vuoto se non ancora generata)"""
+        version = self._index_file_version()
+        if self._index is not None and version == self._index_version:
+            return self._index
+            
+        if self._index is not None:
+            logger.info("Indice della libreria di schede cambiato su disco, lo rileggo")
+        self._plans.clear()
+        self._index_version = version
+        
+        if version is None:
+            self._index = {}
+            return self._index
+            
+        try:
+            with open(self.path / INDEX_FILENAME, "r", encoding="utf-8") as f:
+                self._index = json.load(f)
+        except Exception as e:
+            logger.error(f"Errore nel caricamento dell'indice della libreria: {e}")
+            self._index = {}
+        return self._index
+    
+    def reload(self) -> None:
+        """Rilegge l'indice da disco alla prossima consultazione"""
+        self._index = None
+        self._index_version = None
+        self._plans.clear()
+    
+    def signatures(self) -> List[str]:
+        """Firme presenti nella libreria"""
+        return list(self._load_index())
+    
+    def get(self, signature: str) -> Optional[WorkoutPlan]:
+        """
+        Scheda pregenerata per una firma
+        
+        Args:
+            signature: Firma del profilo
+            
+        Returns:
+            Scheda così come è stata generata, o None
+        """
+        if signature in self._plans:
+            return self._plans[signature]
+            
+        entry = self._load_index().get(signature)
+        if not entry:
+            return None
+            
+        try:
+            with open(self.path / entry["file"], "r", encoding="utf-8") as f:
+                plan = WorkoutPlan.model_validate(json.load(f))
+        except Exception as e:
+            logger.error(f"Errore nel caricamento della scheda di libreria {signature}: {e}")
+            return None
+            
+        self._plans[signature] = plan
+        return plan
+    
+    def lookup(self, user_profile: UserProfile) -> Optional[WorkoutPlan]:
+        """
+        Cerca una scheda per il profilo e la personalizza
+        
+        Args:
+            user_profile: Profilo dell'utente
+            
+        Returns:
+            Nuova scheda personalizzata, o None se la firma non è in libreria
+        """
+        signature = profile_signature(user_profile)
+        plan = self.get(signature) if signature else None
+        
+        if plan is None:
+            self._misses += 1
+            return None
+            
+        self._hits += 1
+        return self.personalize(plan, user_profile, signature)
+    
+    @staticmethod
+    def personalize(plan: WorkoutPlan, user_profile: UserProfile, signature: str) -> WorkoutPlan:
+        """
+        Adatta una scheda di libreria all'utente senza modificare l'originale
+        
+        Assegna nuovo ID e data, il profilo reale dell'utente e, se indicata,
+        la sua durata di sessione.
+        
+        Args:
+            plan: Scheda pregenerata
+            user_profile: Profilo dell'utente
+            signature: Firma con cui è stata trovata
+            
+        Returns:
+            Copia personalizzata della scheda
+        """
+        personalized = plan.model_copy(deep=True, update={
+            "id": str(uuid.uuid4()),
+            "created_at": datetime.now(),
+            "user_profile": user_profile,
+            "metadata": {
+                **(plan.metadata or {}),
+                "library_signature": signature,
+                "served_from_library": True
+            }
+        })
+        
+        if user_profile.session_duration:
+            for day in personalized.workout_days:
+                day.duration_minutes = user_profile.session_duration
+                
+        return personalized
+    
+    def add(self, plan: WorkoutPlan, signature: Optional[str] = None) -> str:
+        """
+        Aggiunge o sostituisce la scheda di una firma
+        
+        Args:
+            plan: Scheda generata
+            signature: Firma (default: calcolata dal profilo della scheda)
+            
+        Returns:
+            Firma con cui la scheda è stata salvata
+        """
+        signature = signature or profile_signature(plan.user_profile)
+        if not signature:
+            raise StorageException("Le schede con infortuni o preferenze non possono essere in libreria")
+            
+        index = self._load_index()
+        filename = self._filename(signature)
+        
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            with open(self.path / filename, "w", encoding="utf-8") as f:
+                json.dump(plan.model_dump(mode="json"), f, ensure_ascii=False, indent=2)
+                
+            index[signature] = {"file": filename, "generated_at": datetime.now().isoformat()}
+            
+            # Scrittura atomica dell'indice: un lettore vede sempre un indice completo
+            tmp_file = self.path / (INDEX_FILENAME + ".tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(index, f, ensure_ascii=False, indent=2)
+            tmp_file.replace(self.path / INDEX_FILENAME)
+            self._index_version = self._index_file_version()
+            
+        except Exception as e:
+            logger.error(f"Errore nel salvataggio della scheda di libreria {signature}: {e}")
+            raise StorageException(f"Errore nel salvataggio della scheda di libreria: {str(e)}")
+            
+        self._plans[signature] = plan
+        return signature
+    
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Ottiene statistiche sulla libreria
+        
+        Returns:
+            Schede disponibili, richieste servite e non trovate
+        """
+        return {
+            "plans": len(self._load_index()),
+            "hits": self._hits,
+            "misses": self._misses
+        }
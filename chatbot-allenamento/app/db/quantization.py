@@ -0,0 +1,217 @@
+"""
+Quantizzazione dei vettori (int8 e product quantization) per ridurre la memoria dell'indice
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+import numpy as np
+from app.core.error_handler import RAGException
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("none", "int8", "pq")
+
+# Centroidi per sottospazio della product quantization (un byte per codice)
+PQ_CENTROIDS = 256
+# Punti di addestramento per centroide dei sottospazi
+_PQ_TRAINING_POINTS = PQ_CENTROIDS * 40
+# Vettori assegnati per blocco durante il k-means (limita la matrice delle distanze)
+_KMEANS_BATCH_SIZE = 16384
+
+def kmeans(data: np.ndarray, k: int, iterations: int, rng: np.random.Generator, spherical: bool = False) -> np.ndarray:
+    """
+    K-means di Lloyd sui vettori
+    
+    Args:
+        data: Vettori di addestramento (n, dim)
+        k: Numero di centroidi
+        iterations: Iterazioni di Lloyd
+        rng: Generatore casuale per inizializzazione e centroidi vuoti
+        spherical: Usa la similarità coseno e centroidi normalizzati
+        
+    Returns:
+        Centroidi (k, dim)
+    """
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        # A blocchi: con 256k punti e 4000 centroidi la matrice completa occuperebbe 4 GB
+        if spherical:
+            labels = np.concatenate([
+                np.argmax(data[start:start + _KMEANS_BATCH_SIZE] @ centroids.T, axis=1)
+                for start in range(0, len(data), _KMEANS_BATCH_SIZE)
+            ])
+        else:
+            # |x - c|² = |x|² - 2 x·c + |c|², |x|² è costante per ogni riga
+            squared_norms = (centroids ** 2).sum(axis=1)
+            labels = np.concatenate([
+                np.argmin(squared_norms - 2 * data[start:start + _KMEANS_BATCH_SIZE] @ centroids.T, axis=1)
+                for start in range(0, len(data), _KMEANS_BATCH_SIZE)
+            ])
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(data[order], np.cumsum(counts)[filled] - counts[filled])
+        
+        # I centroidi rimasti vuoti ripartono da un punto casuale
+        empty = ~filled
+        sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        counts[empty] = 1
+        centroids = sums / counts[:, None]
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = centroids / norms
+    return centroids.astype(np.float32)
+
+class VectorQuantizer(ABC):
+    """
+    Codifica compatta dei vettori normalizzati con punteggio approssimato
+    
+    Le sottoclassi stimano il prodotto scalare tra la query e i vettori codificati;
+    la classifica finale viene ricalcolata sui vettori originali dei migliori candidati.
+    """
+    
+    name = "none"
+    
+    @abstractmethod
+    def fit(self, vectors: np.ndarray, rng: np.random.Generator) -> None:
+        """Addestra i parametri della codifica su un campione di vettori"""
+    
+    @abstractmethod
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Codifica i vettori (n, dim) nei codici compatti"""
+    
+    @abstractmethod
+    def prepare_query(self, query: np.ndarray) -> np.ndarray:
+        """Prepara la query per il calcolo dei punteggi (una volta per ricerca)"""
+    
+    @abstractmethod
+    def score(self, codes: np.ndarray, prepared_query: np.ndarray) -> np.ndarray:
+        """Prodotto scalare approssimato tra la query e un blocco di codici"""
+    
+    @abstractmethod
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Parametri della codifica da salvare con l'indice"""
+    
+    @classmethod
+    @abstractmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "VectorQuantizer":
+        """Ricostruisce la codifica dai parametri salvati"""
+    
+    def parameters_bytes(self) -> int:
+        """Memoria occupata dai parametri della codifica"""
+        return sum(array.nbytes for array in self.to_arrays().values())
+
+class Int8Quantizer(VectorQuantizer):
+    """
+    Quantizzazione scalare a 8 bit con una scala per dimensione
+    
+    Un byte per componente (4 volte meno di float32).
+    """
+    
+    name = "int8"
+    
+    def __init__(self, scales: Optional[np.ndarray] = None):
+        self.scales = scales
+    
+    def fit(self, vectors: np.ndarray, rng: np.random.Generator) -> None:
+        scales = np.abs(vectors).max(axis=0) / 127.0
+        scales[scales == 0] = 1.0
+        self.scales = scales.astype(np.float32)
+    
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors / self.scales), -127, 127).astype(np.int8)
+    
+    def prepare_query(self, query: np.ndarray) -> np.ndarray:
+        # La scala viene applicata alla query invece che a ogni vettore
+        return (query * self.scales).astype(np.float32)
+    
+    def score(self, codes: np.ndarray, prepared_query: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) @ prepared_query
+    
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"scales": self.scales}
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "Int8Quantizer":
+        return cls(arrays["scales"])
+
+class ProductQuantizer(VectorQuantizer):
+    """
+    Product quantization: il vettore è diviso in sottovettori, ognuno sostituito
+    dall'indice (un byte) del centroide più vicino del proprio sottospazio
+    
+    Con 1536 dimensioni e 96 sottovettori ogni vettore occupa 96 byte invece di 6 KB.
+    """
+    
+    name = "pq"
+    
+    def __init__(self, subvectors: int = 96, codebooks: Optional[np.ndarray] = None):
+        """
+        Args:
+            subvectors: Numero di sottovettori (viene ridotto a un divisore della dimensione)
+            codebooks: Centroidi per sottospazio (subvectors, 256, dim / subvectors)
+        """
+        self.subvectors = subvectors
+        self.codebooks = codebooks
+    
+    def fit(self, vectors: np.ndarray, rng: np.random.Generator) -> None:
+        dim = vectors.shape[1]
+        subvectors = max(m for m in range(1, min(self.subvectors, dim) + 1) if dim % m == 0)
+        if subvectors != self.subvectors:
+            logger.info(f"Product quantization: {subvectors} sottovettori (divisore di {dim})")
+        self.subvectors = subvectors
+        
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), _PQ_TRAINING_POINTS), replace=False)]
+        parts = sample.reshape(len(sample), subvectors, -1)
+        self.codebooks = np.stack([
+            kmeans(parts[:, m], PQ_CENTROIDS, iterations=10, rng=rng)
+            for m in range(subvectors)
+        ])
+    
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = vectors.reshape(len(vectors), self.subvectors, vectors.shape[1] // self.subvectors)
+        codes = np.empty((len(vectors), self.subvectors), dtype=np.uint8)
+        for m, codebook in enumerate(self.codebooks):
+            distances = (codebook ** 2).sum(axis=1) - 2 * parts[:, m] @ codebook.T
+            codes[:, m] = np.argmin(distances, axis=1)
+        return codes
+    
+    def prepare_query(self, query: np.ndarray) -> np.ndarray:
+        # Tabella (sottovettori, centroidi) dei prodotti scalari parziali
+        return np.einsum("mkd,md->mk", self.codebooks, query.reshape(self.subvectors, -1))
+    
+    def score(self, codes: np.ndarray, prepared_query: np.ndarray) -> np.ndarray:
+        return prepared_query[np.arange(self.subvectors), codes].sum(axis=1)
+    
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "ProductQuantizer":
+        codebooks = arrays["codebooks"]
+        return cls(subvectors=len(codebooks), codebooks=codebooks)
+
+QUANTIZERS = {quantizer.name: quantizer for quantizer in (Int8Quantizer, ProductQuantizer)}
+
+def create_quantizer(mode: str, pq_subvectors: int = 96) -> Optional[VectorQuantizer]:
+    """
+    Crea la codifica per una modalità di quantizzazione
+    
+    Args:
+        mode: Modalità (none, int8, pq)
+        pq_subvectors: Sottovettori per la product quantization
+        
+    Returns:
+        Codifica da addestrare o None per i vettori float32
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise RAGException(f"Modalità di quantizzazione non valida: {mode} (valori ammessi: {', '.join(QUANTIZATION_MODES)})")
+    if mode == "none":
+        return None
+    if mode == "pq":
+        return ProductQuantizer(subvectors=pq_subvectors)
+    return Int8Quantizer()
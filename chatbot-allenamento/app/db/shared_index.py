@@ -0,0 +1,305 @@
+"""
+Formato binario dell'indice: generazioni in sola lettura mappate in memoria e condivise tra i worker
+"""
+
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from llama_index.core.schema import BaseNode, TextNode
+from app.core.error_handler import RAGException
+from app.core.metadata_index import MetadataIndex, METADATA_INDEX_FILENAME
+from app.core.sparse_index import BM25Index, SPARSE_INDEX_FILENAME
+from app.db.ann_index import IVFIndex
+
+logger = logging.getLogger(__name__)
+
+SHARED_INDEX_DIRNAME = "shared"
+SHARED_INDEX_VERSION = 3
+CURRENT_FILENAME = "CURRENT"
+MANIFEST_FILENAME = "manifest.json"
+METADATA_COLUMNS_FILENAME = "metadata_columns.json"
+
+# Generazioni precedenti lasciate su disco per i worker che non hanno ancora cambiato
+_KEEP_PREVIOUS_GENERATIONS = 1
+
+def _write_blob(directory: Path, name: str, payloads: List[bytes]) -> None:
+    """Scrive i record concatenati in `<name>.bin` e i loro offset in `<name>_offsets.npy`"""
+    offsets = np.zeros(len(payloads) + 1, dtype=np.int64)
+    np.cumsum([len(payload) for payload in payloads], out=offsets[1:])
+    with open(directory / f"{name}.bin", "wb") as f:
+        for payload in payloads:
+            f.write(payload)
+    np.save(directory / f"{name}_offsets.npy", offsets)
+
+def _encode_metadata(records: List[Dict[str, Any]]) -> Tuple[Dict[str, list], np.ndarray]:
+    """
+    Codifica i metadati dei nodi per colonne a dizionario
+    
+    Ogni chiave diventa una colonna: i valori distinti (fonte, file, tipo, pagina)
+    sono salvati una volta e ogni nodo ne tiene solo l'indice (-1 = chiave assente).
+    
+    Args:
+        records: Metadati dei nodi, nello stesso ordine delle righe
+        
+    Returns:
+        Valori distinti per chiave e matrice dei codici (nodi, chiavi)
+    """
+    keys = sorted({key for metadata in records for key in metadata})
+    columns: Dict[str, list] = {key: [] for key in keys}
+    positions: Dict[str, Dict[str, int]] = {key: {} for key in keys}
+    codes = np.full((len(records), len(keys)), -1, dtype=np.int32)
+    for row, metadata in enumerate(records):
+        for column, key in enumerate(keys):
+            if key not in metadata:
+                continue
+            value = metadata[key]
+            value_key = json.dumps(value, sort_keys=True, ensure_ascii=False)
+            if value_key not in positions[key]:
+                positions[key][value_key] = len(columns[key])
+                columns[key].append(value)
+            codes[row, column] = positions[key][value_key]
+    return columns, codes
+
+def _map_blob(directory: Path, name: str) -> np.ndarray:
+    """Mappa in sola lettura i byte di un blob (un file vuoto non si può mappare)"""
+    path = directory / f"{name}.bin"
+    if path.stat().st_size == 0:
+        return np.empty(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+class SharedIndexGeneration:
+    """
+    Generazione pubblicata dell'indice, aperta in sola lettura
+    
+    Vettori, identificativi e testi dei nodi sono file mappati in memoria: i worker
+    che aprono la stessa generazione condividono le pagine della page cache invece di
+    tenere ciascuno una copia di docstore ed embeddings. I metadati sono colonne a
+    dizionario (pochi valori distinti, codici int32). I nodi sono ordinati per
+    identificativo e il testo viene decodificato solo quando un nodo è richiesto.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        path: Path,
+        ann_index: IVFIndex,
+        node_ids: np.ndarray,
+        texts: np.ndarray,
+        text_offsets: np.ndarray,
+        metadata_columns: Dict[str, list],
+        metadata_codes: np.ndarray,
+        sparse_index: Optional[BM25Index] = None,
+        metadata_index: Optional[MetadataIndex] = None,
+        manifest: Optional[Dict[str, Any]] = None
+    ):
+        self.name = name
+        self.path = path
+        self.manifest = manifest or {}
+        self.ann_index = ann_index
+        self.node_ids = node_ids
+        self.texts = texts
+        self.text_offsets = text_offsets
+        self.metadata_columns = metadata_columns
+        self.metadata_keys = list(metadata_columns)
+        self.metadata_codes = metadata_codes
+        self.sparse_index = sparse_index
+        self.metadata_index = metadata_index
+    
+    def __len__(self) -> int:
+        return len(self.node_ids)
+    
+    def _row(self, node_id: str) -> Optional[int]:
+        """Riga del nodo (ricerca binaria sugli identificativi ordinati)"""
+        try:
+            key = node_id.encode("ascii")
+        except UnicodeEncodeError:
+            return None
+        row = int(np.searchsorted(self.node_ids, key))
+        if row < len(self.node_ids) and self.node_ids[row] == key:
+            return row
+        return None
+    
+    def get_node(self, node_id: str) -> Optional[TextNode]:
+        """
+        Ricostruisce un nodo dai file mappati
+        
+        Args:
+            node_id: Identificativo del nodo
+            
+        Returns:
+            Nodo con testo e metadati o None se assente
+        """
+        row = self._row(node_id)
+        if row is None:
+            return None
+        text = bytes(self.texts[self.text_offsets[row]:self.text_offsets[row + 1]]).decode("utf-8")
+        return TextNode(id_=node_id, text=text, metadata=self.get_metadata(row))
+    
+    def get_metadata(self, row: int) -> Dict[str, Any]:
+        """Metadati di una riga ricostruiti dalle colonne"""
+        return {
+            key: self.metadata_columns[key][code]
+            for key, code in zip(self.metadata_keys, self.metadata_codes[row].tolist())
+            if code >= 0
+        }
+
+class SharedIndexStore:
+    """
+    Pubblicazione e apertura delle generazioni dell'indice condiviso
+    
+    Ogni ricostruzione scrive una nuova directory `gen-*` e poi sostituisce
+    atomicamente il file CURRENT che la indica: i worker vedono sempre una
+    generazione completa, la vecchia o la nuova, e passano alla nuova senza
+    ricaricare l'indice JSON.
+    """
+    
+    def __init__(self, root: Path):
+        """
+        Args:
+            root: Directory delle generazioni
+        """
+        self.root = root
+    
+    def current_name(self) -> Optional[str]:
+        """Nome della generazione corrente (None se non ne è stata pubblicata nessuna)"""
+        try:
+            return (self.root / CURRENT_FILENAME).read_text(encoding="utf-8").strip() or None
+        except FileNotFoundError:
+            return None
+    
+    def publish(
+        self,
+        ann_index: IVFIndex,
+        nodes: Iterable[BaseNode],
+        sparse_index: Optional[BM25Index] = None,
+        metadata_index: Optional[MetadataIndex] = None,
+        source_version: Optional[int] = None,
+        embedding_model: Optional[str] = None
+    ) -> str:
+        """
+        Scrive una nuova generazione e la rende corrente
+        
+        Args:
+            ann_index: Indice compatto con i vettori dei nodi
+            nodes: Nodi del docstore
+            sparse_index: Indice lessicale da pubblicare con la generazione
+            metadata_index: Indice dei metadati (filtri e tabella delle fonti)
+            source_version: Versione dell'indice JSON da cui è stata prodotta
+            embedding_model: Modello che ha prodotto i vettori
+            
+        Returns:
+            Nome della generazione pubblicata
+        """
+        name = f"gen-{time.time_ns():020d}-{os.getpid()}"
+        tmp_path = self.root / f".{name}.tmp"
+        try:
+            tmp_path.mkdir(parents=True)
+            ann_index.save_arrays(tmp_path / "ann")
+            
+            records = sorted(((node.node_id, node) for node in nodes), key=lambda item: item[0])
+            np.save(tmp_path / "node_ids.npy", np.array([node_id.encode("ascii") for node_id, _ in records], dtype="S"))
+            _write_blob(tmp_path, "texts", [node.get_content().encode("utf-8") for _, node in records])
+            columns, codes = _encode_metadata([node.metadata for _, node in records])
+            with open(tmp_path / METADATA_COLUMNS_FILENAME, "w", encoding="utf-8") as f:
+                json.dump(columns, f, ensure_ascii=False)
+            np.save(tmp_path / "metadata_codes.npy", codes)
+            if sparse_index is not None:
+                sparse_index.save(tmp_path / SPARSE_INDEX_FILENAME)
+            if metadata_index is not None:
+                metadata_index.save(tmp_path / METADATA_INDEX_FILENAME)
+                
+            manifest = {
+                "version": SHARED_INDEX_VERSION,
+                "created_at": datetime.now().isoformat(),
+                "nodes": len(records),
+                "vectors": len(ann_index),
+                "dimension": ann_index.dimension,
+                "lists": ann_index.n_lists,
+                "quantization": ann_index.quantization,
+                "source_version": source_version,
+                "embedding_model": embedding_model
+            }
+            with open(tmp_path / MANIFEST_FILENAME, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            tmp_path.rename(self.root / name)
+            
+            # Il puntatore viene sostituito, mai riscritto sul posto
+            pointer_tmp = self.root / f".{CURRENT_FILENAME}.{os.getpid()}.tmp"
+            pointer_tmp.write_text(name, encoding="utf-8")
+            os.replace(pointer_tmp, self.root / CURRENT_FILENAME)
+        except Exception as e:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise RAGException(f"Errore nella pubblicazione dell'indice condiviso: {str(e)}")
+            
+        self._remove_old_generations(name)
+        return name
+    
+    def open(self, name: str, load_sparse: bool = True) -> SharedIndexGeneration:
+        """
+        Apre una generazione mappandone i file in sola lettura
+        
+        Args:
+            name: Nome della generazione
+            load_sparse: Carica anche l'indice lessicale pubblicato con la generazione
+            
+        Returns:
+            Generazione aperta
+        """
+        path = self.root / name
+        with open(path / MANIFEST_FILENAME, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != SHARED_INDEX_VERSION:
+            raise RAGException(f"Generazione {name} di una versione diversa dell'indice condiviso")
+        with open(path / METADATA_COLUMNS_FILENAME, "r", encoding="utf-8") as f:
+            metadata_columns = json.load(f)
+            
+        return SharedIndexGeneration(
+            name=name,
+            path=path,
+            ann_index=IVFIndex.load_arrays(path / "ann", manifest["quantization"]),
+            node_ids=np.load(path / "node_ids.npy", mmap_mode="r"),
+            texts=_map_blob(path, "texts"),
+            text_offsets=np.load(path / "texts_offsets.npy", mmap_mode="r"),
+            metadata_columns=metadata_columns,
+            metadata_codes=np.load(path / "metadata_codes.npy"),
+            sparse_index=BM25Index.load(path / SPARSE_INDEX_FILENAME) if load_sparse else None,
+            metadata_index=MetadataIndex.load(path / METADATA_INDEX_FILENAME),
+            manifest=manifest
+        )
+    
+    def open_current(self, load_sparse: bool = True) -> Optional[SharedIndexGeneration]:
+        """
+        Apre la generazione corrente
+        
+        Returns:
+            Generazione aperta o None se assente o non leggibile
+        """
+        name = self.current_name()
+        if name is None:
+            return None
+        try:
+            return self.open(name, load_sparse)
+        except Exception as e:
+            logger.warning(f"Generazione {name} dell'indice condiviso non leggibile: {e}")
+            return None
+    
+    def _remove_old_generations(self, current: str) -> None:
+        """
+        Elimina le generazioni superate, tranne le più recenti
+        
+        Su POSIX i worker che hanno ancora mappata una generazione eliminata
+        continuano a leggerla finché non passano a quella nuova.
+        """
+        previous = sorted(
+            path for path in self.root.glob("gen-*")
+            if path.is_dir() and path.name != current
+        )
+        for path in previous[:len(previous) - _KEEP_PREVIOUS_GENERATIONS]:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"Generazione {path.name} dell'indice condiviso eliminata")
@@ -3,12 +3,20 @@ Gestione del vectorstore per il sistema RAG
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, FrozenSet, Optional, Tuple
 from pathlib import Path
+import numpy as np
 from llama_index.core import VectorStoreIndex, StorageContext, load_index_from_storage
 from llama_index.core.vector_stores import SimpleVectorStore
 from app.config import settings
+from app.core.embeddings import embedding_model_name, expected_embedding_dimension
 from app.core.error_handler import RAGException
+from app.core.metadata_index import MetadataIndex
+from app.core.sparse_index import BM25Index
+from app.db.ann_index import IVFIndex, ANN_INDEX_FILENAME
+from app.db.quantization import create_quantizer
+from app.db.shared_index import SharedIndexStore, SharedIndexGeneration, SHARED_INDEX_DIRNAME
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +26,13 @@ class VectorStoreManager:
     def __init__(self):
         self.storage_path = settings.VECTOR_STORE_PATH
         self.index: Optional[VectorStoreIndex] = None
+        self.ann_index: Optional[IVFIndex] = None
+        self._embeddings_released = False
+        self.shared_store = SharedIndexStore(self.storage_path / SHARED_INDEX_DIRNAME)
+        self.shared_generation: Optional[SharedIndexGeneration] = None
+        self._shared_checked_at = 0.0
+        # Righe dell'indice compatto per ogni filtro risolto: (nodi ammessi, indice, righe)
+        self._filter_rows: Dict[int, Tuple[FrozenSet[str], IVFIndex, np.ndarray]] = {}
         self._ensure_storage_path()
     
     def _ensure_storage_path(self) -> None:
@@ -108,6 +123,8 @@ class VectorStoreManager:
                 shutil.rmtree(self.storage_path)
                 self.storage_path.mkdir(parents=True, exist_ok=True)
                 self.index = None
+                self.ann_index = None
+                self.shared_generation = None
                 logger.info("Indice eliminato con successo")
                 return True
             
@@ -128,7 +145,18 @@ class VectorStoreManager:
             info = {
                 'exists': self._index_exists(),
                 'storage_path': str(self.storage_path),
-                'loaded': self.index is not None
+                'loaded': self.index is not None,
+                'ann_index': {
+                    'vectors': len(self.ann_index),
+                    'lists': self.ann_index.n_lists,
+                    'probes': settings.ANN_PROBES,
+                    'quantization': self.ann_index.quantization,
+                    **self.ann_index.memory_usage()
+                } if self.ann_index is not None else None,
+                'shared_index': {
+                    'generation': self.shared_generation.name,
+                    'nodes': len(self.shared_generation)
+                } if self.shared_generation is not None else None
             }
             
             if self._index_exists():
@@ -242,6 +270,264 @@ class VectorStoreManager:
             logger.error(f"Errore nell'ottimizzazione indice: {e}")
             return False
     
+    def prepare_ann_index(self, index: VectorStoreIndex) -> Optional[IVFIndex]:
+        """
+        Prepara l'indice compatto (IVF e/o quantizzato) per i vettori dell'indice
+        
+        Usa quello salvato accanto all'indice se contiene gli stessi nodi con la stessa
+        configurazione, altrimenti lo ricostruisce. Sotto ANN_MIN_VECTORS la ricerca
+        esatta è già abbastanza veloce: con la quantizzazione attiva si usa comunque
+        l'indice, con una sola lista (ricerca esatta sui codici).
+        
+        Args:
+            index: Indice vettoriale di cui indicizzare gli embeddings
+            
+        Returns:
+            Indice compatto o None se disattivato o non necessario
+        """
+        self.ann_index = None
+        self._embeddings_released = False
+        embeddings = index.vector_store.data.embedding_dict
+        use_ann = settings.ANN_INDEX_ENABLED and len(embeddings) >= settings.ANN_MIN_VECTORS
+        quantizer = create_quantizer(settings.VECTOR_QUANTIZATION, settings.PQ_SUBVECTORS)
+        
+        if not use_ann and quantizer is None:
+            if settings.ANN_INDEX_ENABLED:
+                logger.info(f"Ricerca esatta su {len(embeddings)} vettori (indice approssimato da {settings.ANN_MIN_VECTORS})")
+            return None
+            
+        ann_path = self.storage_path / ANN_INDEX_FILENAME
+        ann_index = IVFIndex.load(ann_path)
+        if (
+            ann_index is None
+            or ann_index.quantization != settings.VECTOR_QUANTIZATION
+            or (ann_index.n_lists > 1) != use_ann
+            or len(ann_index) != len(embeddings)
+            or set(ann_index.get_ids()) != set(embeddings)
+        ):
+            logger.info(f"Costruzione indice compatto su {len(embeddings)} vettori...")
+            node_ids = list(embeddings)
+            ann_index = IVFIndex.build(
+                node_ids,
+                np.array([embeddings[node_id] for node_id in node_ids], dtype=np.float32),
+                n_lists=(settings.ANN_LISTS or None) if use_ann else 1,
+                quantizer=quantizer
+            )
+            ann_index.save(ann_path)
+            
+        self.ann_index = ann_index
+        memory = ann_index.memory_usage()
+        logger.info(
+            f"Indice compatto pronto: {len(ann_index)} vettori in {ann_index.n_lists} liste, "
+            f"quantizzazione {ann_index.quantization}, {memory['resident_bytes'] / (1024 * 1024):.1f} MB in memoria"
+        )
+        return ann_index
+    
+    def sync_ann_index(self, index: VectorStoreIndex) -> None:
+        """
+        Aggiunge all'indice compatto i nodi inseriti dopo la sua costruzione
+        
+        Args:
+            index: Indice vettoriale aggiornato
+        """
+        if self.ann_index is None:
+            self.prepare_ann_index(index)
+            return
+            
+        embeddings = index.vector_store.data.embedding_dict
+        new_ids = list(set(embeddings) - set(self.ann_index.get_ids()))
+        if new_ids:
+            self.ann_index.add(new_ids, np.array([embeddings[node_id] for node_id in new_ids], dtype=np.float32))
+            self.ann_index.save(self.storage_path / ANN_INDEX_FILENAME)
+            logger.info(f"Aggiunti {len(new_ids)} vettori all'indice compatto")
+    
+    def release_embeddings(self, index: VectorStoreIndex) -> None:
+        """
+        Libera gli embeddings dell'indice (liste di float Python), già presenti nell'indice compatto
+        
+        Ogni embedding occupa in Python circa 8 volte i suoi byte float32; con l'indice
+        compatto attivo la ricerca vettoriale non li usa più.
+        
+        Args:
+            index: Indice vettoriale caricato
+        """
+        if self.ann_index is None or self.ann_index.get_vectors() is None:
+            return
+        index.vector_store.data.embedding_dict = {}
+        self._embeddings_released = True
+        logger.info("Embeddings dell'indice vettoriale liberati dalla memoria")
+    
+    def restore_embeddings(self, index: VectorStoreIndex) -> None:
+        """
+        Ripristina gli embeddings liberati, prima di salvare l'indice vettoriale
+        
+        I vettori ripristinati sono normalizzati: la similarità coseno non cambia.
+        
+        Args:
+            index: Indice vettoriale di cui ripristinare gli embeddings
+        """
+        if not self._embeddings_released or self.ann_index is None:
+            return
+        embedding_dict = index.vector_store.data.embedding_dict
+        for node_id, vector in zip(self.ann_index.get_ids(), self.ann_index.get_vectors()):
+            embedding_dict.setdefault(node_id, vector.tolist())
+        self._embeddings_released = False
+    
+    def ann_search(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        node_ids: Optional[FrozenSet[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Cerca i nodi più simili con l'indice compatto
+        
+        Args:
+            query_embedding: Embedding della query
+            top_k: Numero massimo di risultati
+            node_ids: Nodi a cui limitare la ricerca (filtro sui metadati), None = tutti
+            
+        Returns:
+            Coppie (id nodo, similarità coseno) ordinate per similarità decrescente
+        """
+        if self.ann_index is None:
+            raise RAGException("Indice approssimato non disponibile")
+        return self.ann_index.search(
+            query_embedding, top_k,
+            n_probe=settings.ANN_PROBES,
+            rerank=settings.QUANTIZATION_RERANK,
+            rows=self._rows_for(node_ids) if node_ids is not None else None
+        )
+    
+    def _rows_for(self, node_ids: FrozenSet[str]) -> np.ndarray:
+        """
+        Righe dell'indice compatto dei nodi ammessi da un filtro
+        
+        L'indice dei metadati restituisce lo stesso insieme per lo stesso filtro:
+        la conversione viene fatta una volta per filtro e per indice compatto.
+        """
+        cached = self._filter_rows.get(id(node_ids))
+        if cached is not None and cached[0] is node_ids and cached[1] is self.ann_index:
+            return cached[2]
+        if len(self._filter_rows) >= 64:
+            self._filter_rows.clear()
+        rows = self.ann_index.rows_for(node_ids)
+        self._filter_rows[id(node_ids)] = (node_ids, self.ann_index, rows)
+        return rows
+    
+    def publish_shared_index(
+        self,
+        index: VectorStoreIndex,
+        sparse_index: Optional[BM25Index] = None,
+        metadata_index: Optional[MetadataIndex] = None
+    ) -> str:
+        """
+        Pubblica l'indice come nuova generazione dell'indice condiviso
+        
+        I vettori vanno nell'indice compatto configurato (IVF e/o quantizzato) o,
+        se disattivato, in un indice esatto a una sola lista.
+        
+        Args:
+            index: Indice vettoriale con embeddings e docstore completi
+            sparse_index: Indice lessicale da pubblicare con la generazione
+            metadata_index: Indice dei metadati da pubblicare con la generazione
+            
+        Returns:
+            Nome della generazione pubblicata
+        """
+        ann_index = self.prepare_ann_index(index)
+        if ann_index is None:
+            embeddings = index.vector_store.data.embedding_dict
+            node_ids = list(embeddings)
+            ann_index = IVFIndex.build(
+                node_ids,
+                np.array([embeddings[node_id] for node_id in node_ids], dtype=np.float32),
+                n_lists=1
+            )
+        name = self.shared_store.publish(
+            ann_index, index.docstore.docs.values(), sparse_index,
+            metadata_index=metadata_index,
+            source_version=self._docstore_version(),
+            embedding_model=embedding_model_name()
+        )
+        logger.info(f"Indice condiviso pubblicato: generazione {name} con {len(ann_index)} vettori")
+        return name
+    
+    def _docstore_version(self) -> Optional[int]:
+        """Versione dell'indice JSON (istante di modifica del docstore), None se assente"""
+        path = self.storage_path / "docstore.json"
+        return path.stat().st_mtime_ns if path.exists() else None
+    
+    def open_shared_index(self) -> Optional[SharedIndexGeneration]:
+        """
+        Apre la generazione corrente dell'indice condiviso e la usa per la ricerca
+        
+        Returns:
+            Generazione aperta o None se non ne è stata pubblicata nessuna o se
+            l'indice JSON è stato modificato dopo la sua pubblicazione
+        """
+        generation = self.shared_store.open_current(load_sparse=settings.HYBRID_RETRIEVAL_ENABLED)
+        self._shared_checked_at = time.monotonic()
+        if generation is None:
+            return None
+        source_version = self._docstore_version()
+        if source_version is not None and generation.manifest.get("source_version") != source_version:
+            logger.info(f"Indice JSON modificato dopo la generazione {generation.name}, verrà ripubblicato")
+            return None
+        expected = expected_embedding_dimension()
+        if (
+            (generation.manifest.get("embedding_model") or embedding_model_name()) != embedding_model_name()
+            or (expected and generation.ann_index.dimension != expected)
+        ):
+            logger.warning(
+                f"Generazione {generation.name} creata con {generation.manifest.get('embedding_model')} "
+                f"a {generation.ann_index.dimension} dimensioni, diversa dalla configurazione: verrà ripubblicata"
+            )
+            return None
+        self._use_shared_generation(generation)
+        return generation
+    
+    def refresh_shared_index(self) -> bool:
+        """
+        Passa alla generazione pubblicata più recente, se è cambiata
+        
+        Il controllo legge solo il file CURRENT, al massimo una volta ogni
+        SHARED_INDEX_CHECK_INTERVAL secondi.
+        
+        Returns:
+            True se il processo ora usa una nuova generazione
+        """
+        if self.shared_generation is None:
+            return False
+        now = time.monotonic()
+        if now - self._shared_checked_at < settings.SHARED_INDEX_CHECK_INTERVAL:
+            return False
+        self._shared_checked_at = now
+        
+        name = self.shared_store.current_name()
+        if name is None or name == self.shared_generation.name:
+            return False
+        try:
+            generation = self.shared_store.open(name, load_sparse=settings.HYBRID_RETRIEVAL_ENABLED)
+        except Exception as e:
+            logger.warning(f"Generazione {name} non leggibile, resta in uso {self.shared_generation.name}: {e}")
+            return False
+        self._use_shared_generation(generation)
+        return True
+    
+    def close_shared_index(self) -> None:
+        """Smette di usare l'indice condiviso (la ricerca torna all'indice del processo)"""
+        if self.shared_generation is not None and self.ann_index is self.shared_generation.ann_index:
+            self.ann_index = None
+        self.shared_generation = None
+    
+    def _use_shared_generation(self, generation: SharedIndexGeneration) -> None:
+        """Sostituisce la generazione in uso (assegnazione atomica per le ricerche in corso)"""
+        self.shared_generation = generation
+        self.ann_index = generation.ann_index
+        self._embeddings_released = False
+        logger.info(f"Indice condiviso in uso: generazione {generation.name} ({len(generation)} nodi)")
+    
     def get_current_index(self) -> Optional[VectorStoreIndex]:
         """
         Ottiene l'indice correntemente caricato
@@ -9,6 +9,8 @@ from app.core.llm_manager import LLMManager
 from app.db.file_storage import FileStorage
 from app.services.chat_service import ChatService
 from app.services.workout_service import WorkoutService
+from app.services.batch_service import BatchWorkoutService
+from app.services.workout_job_service import WorkoutJobService
 
 # Cache per le istanze singleton
 _rag_engine = None
@@ -16,6 +18,8 @@ _llm_manager = None
 _file_storage = None
 _chat_service = None
 _workout_service = None
+_batch_service = None
+_workout_job_service = None
 
 @lru_cache()
 def get_settings():
@@ -62,3 +66,24 @@ def get_workout_service() -> WorkoutService:
         rag = get_rag_engine()
         _workout_service = WorkoutService(storage, llm, rag)
     return _workout_service
+
+def get_batch_service() -> BatchWorkoutService:
+    """Ottieni l'istanza del servizio batch"""
+    global _batch_service
+    if _batch_service is None:
+        _batch_service = BatchWorkoutService(get_workout_service())
+    return _batch_service
+
+def get_workout_job_service() -> WorkoutJobService:
+    """Ottieni l'istanza del servizio dei job di generazione"""
+    global _workout_job_service
+    if _workout_job_service is None:
+        _workout_job_service = WorkoutJobService(get_workout_service())
+    return _workout_job_service
+
+async def shutdown_workers() -> None:
+    """Ferma i worker delle generazioni batch e in background, solo se i servizi sono stati creati"""
+    if _batch_service is not None:
+        await _batch_service.shutdown()
+    if _workout_job_service is not None:
+        await _workout_job_service.shutdown()
@@ -12,7 +12,7 @@ from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.dependencies import get_rag_engine
+from app.dependencies import get_rag_engine, get_chat_service, shutdown_workers
 from app.api.routes import chat, workout
 from app.core.error_handler import setup_exception_handlers
 
@@ -40,9 +40,19 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ Errore nell'inizializzazione del motore RAG: {e}")
     
+    # Avvia il flush periodico delle chat in cache
+    chat_service = get_chat_service()
+    chat_service.start()
+    
     yield
     
     logger.info("🔄 Arresto del Chatbot Allenamento...")
+    
+    # Scrivi su disco le chat ancora in memoria
+    await chat_service.shutdown()
+    
+    # Ferma i worker delle generazioni batch e in background (se mai avviati)
+    await shutdown_workers()
 
 # Inizializza FastAPI
 app = FastAPI(
@@ -63,9 +63,10 @@ class Chat(BaseModel):
         """Ottiene tutti i messaggi di un determinato ruolo"""
         return [msg for msg in self.messages if msg.role == role]
     
-    def get_conversation_history(self, limit: Optional[int] = None) -> List[Dict[str, str]]:
-        """Ottiene la cronologia della conversazione in formato OpenAI"""
-        messages = self.messages[-limit:] if limit else self.messages
+    def get_conversation_history(self, limit: Optional[int] = None, start: int = 0) -> List[Dict[str, str]]:
+        """Ottiene la cronologia della conversazione in formato OpenAI, a partire dal messaggio `start`"""
+        messages = self.messages[start:]
+        messages = messages[-limit:] if limit else messages
         return [
             {"role": msg.role.value, "content": msg.content}
             for msg in messages
@@ -0,0 +1,73 @@
+"""
+Modelli dati per i job di generazione in background
+"""
+
+from datetime import datetime
+from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field
+from enum import Enum
+from app.models.workout import WorkoutPlan
+
+class JobStatus(str, Enum):
+    """Stati di un job o di un suo elemento"""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class BatchJobItem(BaseModel):
+    """Singola richiesta di un job batch"""
+    index: int = Field(..., description="Posizione nella richiesta batch")
+    user_input: str = Field(..., description="Descrizione delle esigenze del membro")
+    member_id: Optional[str] = Field(default=None, description="Identificativo del membro lato cliente")
+    generation_mode: Optional[str] = Field(default=None, description="Modalità di generazione")
+    status: JobStatus = Field(default=JobStatus.PENDING, description="Stato dell'elemento")
+    workout_id: Optional[str] = Field(default=None, description="ID della scheda generata")
+    title: Optional[str] = Field(default=None, description="Titolo della scheda generata")
+    error: Optional[str] = Field(default=None, description="Errore di generazione")
+    duplicate_of: Optional[int] = Field(default=None, description="Indice dell'elemento identico generato una sola volta")
+
+class BatchJob(BaseModel):
+    """Job di generazione di più schede"""
+    id: str = Field(..., description="ID univoco del job")
+    status: JobStatus = Field(default=JobStatus.PENDING, description="Stato del job")
+    items: List[BatchJobItem] = Field(default_factory=list, description="Elementi del job")
+    unique_requests: int = Field(default=0, description="Richieste distinte dopo la deduplicazione")
+    created_at: datetime = Field(default_factory=datetime.now, description="Data di creazione")
+    started_at: Optional[datetime] = Field(default=None, description="Inizio della prima generazione")
+    completed_at: Optional[datetime] = Field(default=None, description="Fine dell'ultima generazione")
+    
+    def get_progress(self) -> Dict[str, int]:
+        """Conteggio degli elementi per stato"""
+        progress = {"total": len(self.items)}
+        for status in JobStatus:
+            progress[status.value] = sum(1 for item in self.items if item.status == status)
+        return progress
+    
+    def is_finished(self) -> bool:
+        """Indica se tutti gli elementi sono terminati"""
+        return all(item.status in (JobStatus.COMPLETED, JobStatus.FAILED) for item in self.items)
+
+class JobEvent(BaseModel):
+    """Evento di avanzamento di un job"""
+    stage: str = Field(..., description="Fase iniziata (o completed/failed al termine)")
+    details: Dict[str, Any] = Field(default_factory=dict, description="Dettagli della fase")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Momento dell'evento")
+
+class WorkoutJob(BaseModel):
+    """Job di generazione di una singola scheda in background"""
+    id: str = Field(..., description="ID univoco del job")
+    user_input: str = Field(..., description="Descrizione delle esigenze utente")
+    chat_id: Optional[str] = Field(default=None, description="ID della chat associata")
+    generation_mode: Optional[str] = Field(default=None, description="Modalità di generazione")
+    status: JobStatus = Field(default=JobStatus.PENDING, description="Stato del job")
+    stage: Optional[str] = Field(default=None, description="Fase corrente")
+    events: List[JobEvent] = Field(default_factory=list, description="Avanzamento fase per fase")
+    workout_plan: Optional[WorkoutPlan] = Field(default=None, description="Scheda generata")
+    error: Optional[str] = Field(default=None, description="Errore di generazione")
+    created_at: datetime = Field(default_factory=datetime.now, description="Data di creazione")
+    completed_at: Optional[datetime] = Field(default=None, description="Data di completamento")
+    
+    def is_finished(self) -> bool:
+        """Indica se il job è terminato"""
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED)
@@ -3,7 +3,7 @@ Modelli dati per le schede di allenamento
 """
 
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 from pydantic import BaseModel, Field
 from enum import Enum
 
@@ -63,6 +63,35 @@ class ProgressionPlan(BaseModel):
     deload_week: Optional[str] = Field(default=None, description="Settimana di scarico")
     progression_notes: List[str] = Field(default_factory=list, description="Note sulla progressione")
 
+class DayStructure(BaseModel):
+    """Struttura di un giorno prima della generazione degli esercizi"""
+    day: str = Field(..., description="Giorno della settimana")
+    focus: str = Field(..., description="Focus del giorno")
+    muscle_groups: List[str] = Field(default_factory=list, description="Gruppi muscolari allenati")
+    workout_type: str = Field(default="mixed", description="Tipo di allenamento (strength, hypertrophy, endurance, mixed)")
+
+class WorkoutStructure(BaseModel):
+    """Struttura settimanale della scheda generata nella prima fase"""
+    title: str = Field(..., description="Titolo della scheda")
+    split_type: str = Field(..., description="Tipo di split (full_body, upper_lower, push_pull_legs, body_part_split)")
+    days_structure: List[DayStructure] = Field(..., description="Struttura dei giorni di allenamento")
+    session_duration: Optional[int] = Field(default=60, description="Durata sessione in minuti")
+    weekly_volume: Optional[str] = Field(default=None, description="Volume settimanale (alto, medio, basso)")
+
+class DayExercises(BaseModel):
+    """Contenuto di un giorno generato nella fase degli esercizi"""
+    warm_up: List[str] = Field(default_factory=list, description="Esercizi di riscaldamento")
+    exercises: List[Exercise] = Field(default_factory=list, description="Esercizi principali")
+    cool_down: List[str] = Field(default_factory=list, description="Esercizi di defaticamento")
+
+class WorkoutPlanDraft(BaseModel):
+    """Scheda completa generata con una sola chiamata al modello"""
+    title: str = Field(..., description="Titolo della scheda")
+    workout_days: List[WorkoutDay] = Field(..., description="Giorni di allenamento")
+    nutrition: Optional[NutritionGuidelines] = Field(default=None, description="Linee guida nutrizionali")
+    progression: Optional[ProgressionPlan] = Field(default=None, description="Piano di progressione")
+    general_notes: List[str] = Field(default_factory=list, description="Note generali")
+
 class UserProfile(BaseModel):
     """Profilo dell'utente per la generazione della scheda"""
     age: Optional[int] = Field(default=None, description="Età")
@@ -106,3 +135,54 @@ class WorkoutPlan(BaseModel):
             for exercise in day.exercises:
                 muscle_groups.update(exercise.muscle_groups)
         return list(muscle_groups)
+
+class WorkoutVariation(BaseModel):
+    """Variazione di una scheda salvata come differenza rispetto alla scheda base"""
+    id: str = Field(..., description="ID univoco della variazione")
+    base_workout_id: str = Field(..., description="ID della scheda base")
+    variation_type: str = Field(..., description="Tipo di variazione applicata")
+    title: str = Field(..., description="Titolo della variazione")
+    days: List[Union[int, WorkoutDay]] = Field(
+        ..., description="Per ogni giorno: indice del giorno base invariato o giorno modificato"
+    )
+    general_notes: List[str] = Field(default_factory=list, description="Note aggiunte a quelle della scheda base")
+    created_at: datetime = Field(default_factory=datetime.now, description="Data di creazione")
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="Metadati della variazione")
+    
+    def get_changed_days(self) -> List[int]:
+        """Posizioni dei giorni modificati rispetto alla scheda base"""
+        return [i for i, day in enumerate(self.days) if isinstance(day, WorkoutDay)]
+    
+    def apply(self, base_workout: WorkoutPlan) -> WorkoutPlan:
+        """
+        Ricostruisce la scheda completa a partire dalla scheda base
+        
+        Args:
+            base_workout: Scheda da cui è stata derivata la variazione
+            
+        Returns:
+            Scheda completa della variazione
+        """
+        workout_days = [
+            base_workout.workout_days[day] if isinstance(day, int) else day
+            for day in self.days
+        ]
+        metadata = dict(base_workout.metadata or {})
+        metadata.update(self.metadata)
+        metadata.update({
+            "variation_of": self.base_workout_id,
+            "variation_type": self.variation_type,
+            "changed_days": self.get_changed_days()
+        })
+        
+        return base_workout.model_copy(
+            update={
+                "id": self.id,
+                "title": self.title,
+                "workout_days": [day.model_copy(deep=True) for day in workout_days],
+                "general_notes": base_workout.general_notes + self.general_notes,
+                "created_at": self.created_at,
+                "metadata": metadata
+            },
+            deep=True
+        )
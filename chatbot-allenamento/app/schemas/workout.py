@@ -10,6 +10,11 @@ class WorkoutGenerationRequest(BaseModel):
     """Schema per la richiesta di generazione scheda"""
     user_input: str = Field(..., min_length=10, max_length=2000, description="Descrizione delle esigenze utente")
     chat_id: Optional[str] = Field(default=None, description="ID della chat associata")
+    generation_mode: Optional[str] = Field(
+        default=None,
+        pattern="^(template|standard|multi_stage|single_shot)$",
+        description="Modalità di generazione (template, standard, multi_stage, single_shot)"
+    )
     
     # Parametri opzionali per override
     age: Optional[int] = Field(default=None, ge=12, le=100, description="Età")
@@ -69,6 +74,7 @@ class WorkoutGenerationResponse(BaseModel):
     workout_plan: Optional[WorkoutPlanResponse] = Field(default=None, description="Scheda generata")
     message: str = Field(..., description="Messaggio di risposta")
     chat_id: Optional[str] = Field(default=None, description="ID chat associata")
+    job_id: Optional[str] = Field(default=None, description="ID del job in background")
 
 class WorkoutListItem(BaseModel):
     """Schema per un elemento nella lista schede"""
@@ -88,3 +94,55 @@ class WorkoutDeleteResponse(BaseModel):
     success: bool = Field(..., description="Successo operazione")
     message: str = Field(..., description="Messaggio conferma")
     deleted_workout_id: str = Field(..., description="ID scheda eliminata")
+
+class BatchWorkoutItemRequest(BaseModel):
+    """Schema per una richiesta all'interno di un batch"""
+    user_input: str = Field(..., min_length=10, max_length=2000, description="Descrizione delle esigenze del membro")
+    member_id: Optional[str] = Field(default=None, max_length=100, description="Identificativo del membro lato cliente")
+    generation_mode: Optional[str] = Field(
+        default=None,
+        pattern="^(template|standard|multi_stage|single_shot)$",
+        description="Modalità di generazione (template, standard, multi_stage, single_shot)"
+    )
+
+class BatchWorkoutRequest(BaseModel):
+    """Schema per la richiesta di generazione batch"""
+    items: List[BatchWorkoutItemRequest] = Field(..., min_length=1, description="Richieste da generare")
+
+class BatchJobItemResponse(BaseModel):
+    """Schema per lo stato di un elemento del batch"""
+    index: int = Field(..., description="Posizione nella richiesta")
+    member_id: Optional[str] = Field(default=None, description="Identificativo del membro")
+    status: str = Field(..., description="Stato (pending, running, completed, failed)")
+    workout_id: Optional[str] = Field(default=None, description="ID della scheda generata")
+    title: Optional[str] = Field(default=None, description="Titolo della scheda")
+    error: Optional[str] = Field(default=None, description="Errore di generazione")
+    duplicate_of: Optional[int] = Field(default=None, description="Indice dell'elemento identico")
+
+class BatchJobResponse(BaseModel):
+    """Schema per lo stato di un job batch"""
+    job_id: str = Field(..., description="ID del job")
+    status: str = Field(..., description="Stato del job")
+    progress: Dict[str, int] = Field(..., description="Elementi per stato")
+    unique_requests: int = Field(..., description="Richieste distinte generate")
+    items: List[BatchJobItemResponse] = Field(default_factory=list, description="Stato degli elementi")
+    created_at: datetime = Field(..., description="Data creazione")
+    completed_at: Optional[datetime] = Field(default=None, description="Data completamento")
+
+class JobEventResponse(BaseModel):
+    """Schema per un evento di avanzamento"""
+    stage: str = Field(..., description="Fase (profile, structure, days, nutrition, progression, ...)")
+    details: Dict[str, Any] = Field(default_factory=dict, description="Dettagli della fase")
+    timestamp: datetime = Field(..., description="Momento dell'evento")
+
+class WorkoutJobResponse(BaseModel):
+    """Schema per lo stato di un job di generazione"""
+    job_id: str = Field(..., description="ID del job")
+    status: str = Field(..., description="Stato (pending, running, completed, failed)")
+    stage: Optional[str] = Field(default=None, description="Fase corrente")
+    events: List[JobEventResponse] = Field(default_factory=list, description="Avanzamento fase per fase")
+    workout_plan: Optional[WorkoutPlanResponse] = Field(default=None, description="Scheda generata")
+    error: Optional[str] = Field(default=None, description="Errore di generazione")
+    chat_id: Optional[str] = Field(default=None, description="ID chat associata")
+    created_at: datetime = Field(..., description="Data creazione")
+    completed_at: Optional[datetime] = Field(default=None, description="Data completamento")
@@ -0,0 +1,164 @@
+"""
+Servizio per la generazione di schede in batch
+"""
+
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.models.job import BatchJob, BatchJobItem, JobStatus
+from app.core.job_queue import JobQueue, JobRegistry
+from app.core.single_flight import normalize_text
+from app.services.workout_service import WorkoutService
+from app.core.error_handler import ChatbotException
+
+logger = logging.getLogger(__name__)
+
+class BatchWorkoutService:
+    """
+    Generazione di molte schede in background con avanzamento interrogabile
+    
+    Gli elementi identici dello stesso batch (stessa descrizione normalizzata
+    e stessa modalità) sono generati una sola volta e condividono la scheda.
+    I job restano in memoria fino al limite `max_jobs`, oltre il quale si
+    eliminano i job terminati più vecchi.
+    """
+    
+    def __init__(
+        self,
+        workout_service: WorkoutService,
+        concurrency: Optional[int] = None,
+        max_jobs: Optional[int] = None
+    ):
+        """
+        Args:
+            workout_service: Servizio di generazione delle schede
+            concurrency: Generazioni contemporanee (default da settings)
+            max_jobs: Job mantenuti in memoria (default da settings)
+        """
+        self.workout_service = workout_service
+        self.queue = JobQueue(concurrency or settings.BATCH_CONCURRENCY)
+        self.jobs: JobRegistry[BatchJob] = JobRegistry(max_jobs or settings.BATCH_MAX_JOBS)
+    
+    @staticmethod
+    def _dedup_key(item: BatchJobItem) -> Tuple[str, Optional[str]]:
+        """Chiave di deduplicazione: descrizione normalizzata e modalità"""
+        return normalize_text(item.user_input), item.generation_mode
+    
+    def submit_batch(self, requests: List[Dict[str, Optional[str]]]) -> BatchJob:
+        """
+        Crea un job batch e accoda le generazioni
+        
+        Args:
+            requests: Richieste con 'user_input' e opzionalmente 'member_id' e 'generation_mode'
+            
+        Returns:
+            Job creato, con gli elementi in attesa
+        """
+        if not requests:
+            raise ChatbotException("Il batch deve contenere almeno una richiesta")
+        if len(requests) > settings.BATCH_MAX_ITEMS:
+            raise ChatbotException(f"Il batch supera il limite di {settings.BATCH_MAX_ITEMS} richieste")
+            
+        job = BatchJob(
+            id=str(uuid.uuid4()),
+            items=[
+                BatchJobItem(
+                    index=i,
+                    user_input=request["user_input"],
+                    member_id=request.get("member_id"),
+                    generation_mode=request.get("generation_mode")
+                )
+                for i, request in enumerate(requests)
+            ]
+        )
+        
+        groups: "OrderedDict[Tuple[str, Optional[str]], List[BatchJobItem]]" = OrderedDict()
+        for item in job.items:
+            group = groups.setdefault(self._dedup_key(item), [])
+            if group:
+                item.duplicate_of = group[0].index
+            group.append(item)
+            
+        job.unique_requests = len(groups)
+        self.jobs.add(job)
+        
+        for group in groups.values():
+            self.queue.submit(lambda job=job, group=group: self._run_group(job, group))
+            
+        logger.info(f"Job batch {job.id}: {len(job.items)} richieste, {job.unique_requests} distinte")
+        return job
+    
+    async def _run_group(self, job: BatchJob, group: List[BatchJobItem]) -> None:
+        """Genera la scheda condivisa da un gruppo di elementi identici"""
+        if job.started_at is None:
+            job.started_at = datetime.now()
+            job.status = JobStatus.RUNNING
+        for item in group:
+            item.status = JobStatus.RUNNING
+            
+        first = group[0]
+        try:
+            workout_plan = await self.workout_service.generate_workout_plan(
+                user_input=first.user_input,
+                generation_mode=first.generation_mode
+            )
+        except Exception as e:
+            logger.warning(f"Job batch {job.id}, elemento {first.index}: {e}")
+            self._finish_group(job, group, error=str(e))
+        else:
+            for item in group:
+                item.workout_id = workout_plan.id
+                item.title = workout_plan.title
+            self._finish_group(job, group)
+    
+    def _finish_group(self, job: BatchJob, group: List[BatchJobItem], error: Optional[str] = None) -> None:
+        """Segna il gruppo come terminato e chiude il job se era l'ultimo"""
+        for item in group:
+            item.status = JobStatus.FAILED if error else JobStatus.COMPLETED
+            item.error = error
+            
+        if job.is_finished():
+            job.completed_at = datetime.now()
+            all_failed = all(item.status == JobStatus.FAILED for item in job.items)
+            job.status = JobStatus.FAILED if all_failed else JobStatus.COMPLETED
+            logger.info(f"Job batch {job.id} terminato: {job.get_progress()}")
+    
+    def get_job(self, job_id: str) -> Optional[BatchJob]:
+        """
+        Recupera un job batch
+        
+        Args:
+            job_id: ID del job
+            
+        Returns:
+            Job con lo stato corrente o None
+        """
+        return self.jobs.get(job_id)
+    
+    async def shutdown(self) -> None:
+        """Ferma i worker e segna come fallite le generazioni non completate"""
+        await self.queue.shutdown()
+        
+        for job in self.jobs:
+            unfinished = [
+                item for item in job.items
+                if item.status in (JobStatus.PENDING, JobStatus.RUNNING)
+            ]
+            if unfinished:
+                self._finish_group(job, unfinished, error="Generazione annullata all'arresto del servizio")
+    
+    def get_stats(self) -> dict:
+        """
+        Ottiene statistiche sui job batch
+        
+        Returns:
+            Job in memoria, job attivi e stato della coda
+        """
+        return {
+            "jobs": len(self.jobs),
+            "active_jobs": sum(1 for job in self.jobs if not job.is_finished()),
+            "queue": self.queue.get_stats()
+        }
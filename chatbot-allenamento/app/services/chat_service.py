@@ -2,14 +2,19 @@
 Servizio per gestione chat
 """
 
+import asyncio
 import logging
 import uuid
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
 from app.models.chat import Chat, Message, MessageRole, MessageType
+from app.db.chat_cache import ChatCache
 from app.db.file_storage import FileStorage
 from app.core.llm_manager import LLMManager
 from app.core.rag_engine import RAGEngine
+from app.core.token_budget import ContextBudgeter
+from app.core.conversation_summarizer import ConversationSummarizer
 from app.utils.prompt_templates import PromptTemplates
 from app.core.error_handler import ChatbotException
 
@@ -23,6 +28,29 @@ class ChatService:
         self.llm_manager = llm_manager
         self.rag_engine = rag_engine
         self.prompt_templates = PromptTemplates()
+        self.system_prompt = self.prompt_templates.get_chat_system_prompt()
+        self.context_budgeter = ContextBudgeter()
+        self.summarizer = ConversationSummarizer(llm_manager, token_counter=self.context_budgeter.token_counter)
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+        self.chat_cache = ChatCache(
+            writer=self._write_chat,
+            max_size=settings.CHAT_CACHE_SIZE,
+            flush_interval=settings.CHAT_FLUSH_INTERVAL
+        )
+    
+    def start(self) -> None:
+        """Avvia il flush periodico della cache delle chat"""
+        self.chat_cache.start()
+    
+    async def shutdown(self) -> None:
+        """Scrive su disco le chat modificate e ferma il flush periodico"""
+        # I riassunti in corso verranno rigenerati al prossimo messaggio
+        for task in self._summary_tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._summary_tasks.values(), return_exceptions=True)
+        self._summary_tasks.clear()
+        
+        await self.chat_cache.stop()
     
     async def send_message(self, message_content: str, chat_id: Optional[str] = None) -> Tuple[Chat, Message, Message]:
         """
@@ -36,21 +64,10 @@ class ChatService:
             Tupla (chat, messaggio_utente, messaggio_assistente)
         """
         try:
-            # Carica o crea la chat
-            if chat_id:
-                chat = await self.get_chat(chat_id)
-                if not chat:
-                    raise ChatbotException(f"Chat {chat_id} non trovata")
-            else:
-                chat = self._create_new_chat()
+            chat = await self._load_or_create_chat(chat_id)
             
             # Crea il messaggio dell'utente
-            user_message = Message(
-                id=str(uuid.uuid4()),
-                role=MessageRole.USER,
-                content=message_content,
-                type=MessageType.TEXT
-            )
+            user_message = self._create_user_message(message_content)
             
             # Aggiungi il messaggio alla chat
             chat.add_message(user_message)
@@ -64,6 +81,9 @@ class ChatService:
             # Salva la chat
             await self.save_chat(chat)
             
+            # Aggiorna il riassunto dopo aver restituito la risposta
+            self._schedule_summary_update(chat)
+            
             logger.info(f"Messaggio elaborato per chat {chat.id}")
             return chat, user_message, assistant_message
             
@@ -71,6 +91,92 @@ class ChatService:
             logger.error(f"Errore nell'elaborazione del messaggio: {e}")
             raise ChatbotException(f"Errore nell'elaborazione del messaggio: {str(e)}")
     
+    async def send_workout_message(
+        self,
+        message_content: str,
+        workout_content: str,
+        chat_id: Optional[str] = None,
+        sources: Optional[List[str]] = None,
+        workout_id: Optional[str] = None
+    ) -> Tuple[Chat, Message, Message]:
+        """
+        Registra nella chat una richiesta di scheda e la scheda già generata
+        
+        A differenza di send_message non esegue né il recupero RAG né la
+        generazione della risposta: il contenuto arriva dal servizio workout.
+        
+        Args:
+            message_content: Contenuto del messaggio dell'utente
+            workout_content: Scheda formattata per la chat
+            chat_id: ID della chat esistente (None per nuova chat)
+            sources: Fonti utilizzate per la scheda
+            workout_id: ID della scheda salvata
+            
+        Returns:
+            Tupla (chat, messaggio_utente, messaggio_assistente)
+        """
+        try:
+            chat = await self._load_or_create_chat(chat_id)
+            
+            user_message = self._create_user_message(message_content)
+            chat.add_message(user_message)
+            
+            assistant_message = Message(
+                id=str(uuid.uuid4()),
+                role=MessageRole.ASSISTANT,
+                content=workout_content,
+                type=MessageType.WORKOUT,
+                sources=sources if sources else None,
+                metadata={"workout_id": workout_id} if workout_id else None
+            )
+            chat.add_message(assistant_message)
+            
+            await self.save_chat(chat)
+            self._schedule_summary_update(chat)
+            
+            logger.info(f"Scheda registrata nella chat {chat.id}")
+            return chat, user_message, assistant_message
+            
+        except Exception as e:
+            logger.error(f"Errore nella registrazione della scheda: {e}")
+            raise ChatbotException(f"Errore nella registrazione della scheda: {str(e)}")
+    
+    async def _load_or_create_chat(self, chat_id: Optional[str]) -> Chat:
+        """
+        Carica una chat esistente o ne crea una nuova
+        
+        Args:
+            chat_id: ID della chat esistente (None per nuova chat)
+            
+        Returns:
+            Chat caricata o appena creata
+        """
+        if not chat_id:
+            return self._create_new_chat()
+            
+        chat = await self.get_chat(chat_id)
+        if not chat:
+            raise ChatbotException(f"Chat {chat_id} non trovata")
+            
+        return chat
+    
+    def _create_user_message(self, message_content: str) -> Message:
+        """
+        Crea un messaggio dell'utente
+        
+        Args:
+            message_content: Contenuto del messaggio
+            
+        Returns:
+            Messaggio dell'utente
+        """
+        return Message(
+            id=str(uuid.uuid4()),
+            role=MessageRole.USER,
+            content=message_content,
+            type=MessageType.TEXT
+        )
+    
     async def _generate_response(self, chat: Chat, user_message: str) -> Message:
         """
         Genera una risposta dell'assistente
@@ -83,19 +189,29 @@ class ChatService:
             Messaggio di risposta dell'assistente
         """
         try:
-            # Recupera il contesto dal RAG
-            context, sources = await self.rag_engine.retrieve_context(user_message)
+            # Recupera i frammenti rilevanti dal RAG
+            chunks = await self.rag_engine.retrieve_chunks(user_message)
             
-            # Ottieni la cronologia della conversazione
-            conversation_history = chat.get_conversation_history(limit=10)
+            # Ottieni la cronologia non ancora inclusa nel riassunto
+            conversation_history = chat.get_conversation_history(
+                limit=settings.HISTORY_MAX_MESSAGES,
+                start=self.summarizer.get_summarized_count(chat)
+            )
             
-            # Genera la risposta
-            system_prompt = self.prompt_templates.get_chat_system_prompt()
+            summary = self.summarizer.get_summary(chat)
+            
+            # Adatta contesto e cronologia al budget di token
+            prompt = self.context_budgeter.fit(self.system_prompt, chunks, conversation_history, summary=summary)
+            logger.info(
+                f"Prompt chat: {prompt.token_counts['total']}/{prompt.token_counts['budget']} token "
+                f"({prompt.dropped_messages} messaggi e {prompt.dropped_chunks} frammenti esclusi)"
+            )
             
             response_content = await self.llm_manager.generate_chat_response(
-                conversation_history=conversation_history,
-                context=context,
-                system_prompt=system_prompt
+                conversation_history=prompt.history,
+                context=prompt.context,
+                system_prompt=self.system_prompt,
+                summary=summary
             )
             
             # Crea il messaggio di risposta
@@ -104,7 +220,8 @@ class ChatService:
                 role=MessageRole.ASSISTANT,
                 content=response_content,
                 type=MessageType.TEXT,
-                sources=sources if sources else None
+                sources=prompt.sources if prompt.sources else None,
+                metadata={"prompt_tokens": prompt.token_counts}
             )
             
             return assistant_message
@@ -122,6 +239,55 @@ class ChatService:
             
             return error_message
     
+    def _schedule_summary_update(self, chat: Chat) -> None:
+        """
+        Avvia in background l'aggiornamento del riassunto se la chat lo richiede
+        
+        Args:
+            chat: Chat appena aggiornata
+        """
+        if not self.summarizer.needs_update(chat):
+            return
+            
+        running = self._summary_tasks.get(chat.id)
+        if running is not None and not running.done():
+            return
+            
+        task = asyncio.create_task(self._update_summary(chat))
+        self._summary_tasks[chat.id] = task
+        
+        def forget_task(done_task: asyncio.Task) -> None:
+            if self._summary_tasks.get(chat.id) is done_task:
+                del self._summary_tasks[chat.id]
+                
+        task.add_done_callback(forget_task)
+    
+    async def _update_summary(self, chat: Chat) -> None:
+        """
+        Aggiorna il riassunto della chat e lo salva
+        
+        Args:
+            chat: Chat da riassumere
+        """
+        try:
+            state = await self.summarizer.summarize(chat)
+            if state is None:
+                return
+                
+            # La chat potrebbe essere stata ricaricata o eliminata nel frattempo
+            current_chat = await self.get_chat(chat.id)
+            if current_chat is None:
+                return
+                
+            self.summarizer.apply(current_chat, state)
+            await self.save_chat(current_chat)
+            
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Senza riassunto la chat continua a funzionare con la sola cronologia
+            logger.error(f"Errore nell'aggiornamento del riassunto della chat {chat.id}: {e}")
+    
     def _create_new_chat(self) -> Chat:
         """
         Crea una nuova chat
@@ -151,6 +317,10 @@ class ChatService:
         Returns:
             Chat trovata o None
         """
+        cached_chat = self.chat_cache.get(chat_id)
+        if cached_chat is not None:
+            return cached_chat
+            
         try:
             chat_data = self.storage.load_chat(chat_id)
             if not chat_data:
@@ -173,6 +343,7 @@ class ChatService:
                 metadata=chat_data.get('metadata')
             )
             
+            self.chat_cache.put(chat)
             return chat
             
         except Exception as e:
@@ -183,28 +354,40 @@ class ChatService:
         """
         Salva una chat
         
+        La chat viene marcata come modificata nella cache e scritta su disco
+        dal flush periodico; più salvataggi ravvicinati producono una sola scrittura.
+        
         Args:
             chat: Chat da salvare
         """
         try:
-            # Converti in dizionario
-            chat_data = {
-                'id': chat.id,
-                'title': chat.title,
-                'messages': [msg.model_dump() for msg in chat.messages],
-                'status': chat.status,
-                'created_at': chat.created_at,
-                'updated_at': chat.updated_at,
-                'user_id': chat.user_id,
-                'metadata': chat.metadata
-            }
-            
-            self.storage.save_chat(chat_data)
+            self.chat_cache.put(chat, dirty=True)
             
         except Exception as e:
             logger.error(f"Errore nel salvataggio della chat {chat.id}: {e}")
             raise ChatbotException(f"Errore nel salvataggio della chat: {str(e)}")
     
+    def _write_chat(self, chat: Chat) -> None:
+        """
+        Scrive una chat su storage
+        
+        Args:
+            chat: Chat da scrivere
+        """
+        # Converti in dizionario
+        chat_data = {
+            'id': chat.id,
+            'title': chat.title,
+            'messages': [msg.model_dump() for msg in chat.messages],
+            'status': chat.status,
+            'created_at': chat.created_at,
+            'updated_at': chat.updated_at,
+            'user_id': chat.user_id,
+            'metadata': chat.metadata
+        }
+        
+        self.storage.save_chat(chat_data)
+    
     async def list_chats(self, limit: Optional[int] = None) -> List[dict]:
         """
         Lista tutte le chat
@@ -216,6 +399,8 @@ class ChatService:
             Lista delle chat
         """
         try:
+            # Allinea il disco con le chat ancora in cache
+            self.chat_cache.flush()
             return self.storage.list_chats(limit=limit)
         except Exception as e:
             logger.error(f"Errore nell'elenco delle chat: {e}")
@@ -232,7 +417,12 @@ class ChatService:
             True se eliminata con successo
         """
         try:
-            return self.storage.delete_chat(chat_id)
+            summary_task = self._summary_tasks.pop(chat_id, None)
+            if summary_task is not None:
+                summary_task.cancel()
+                
+            pending = self.chat_cache.discard(chat_id)
+            return self.storage.delete_chat(chat_id) or pending
         except Exception as e:
             logger.error(f"Errore nell'eliminazione della chat {chat_id}: {e}")
             raise ChatbotException(f"Errore nell'eliminazione della chat: {str(e)}")
@@ -245,6 +435,9 @@ class ChatService:
             Numero di chat eliminate
         """
         try:
+            # Le chat mai scritte su disco devono comparire nel conteggio
+            self.chat_cache.flush()
+            self.chat_cache.clear()
             return self.storage.delete_all_chats()
         except Exception as e:
             logger.error(f"Errore nell'eliminazione di tutte le chat: {e}")
@@ -0,0 +1,174 @@
+"""
+Servizio per la generazione di schede come job in background
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+from app.config import settings
+from app.models.job import WorkoutJob, JobEvent, JobStatus
+from app.core.job_queue import JobQueue, JobRegistry
+from app.services.workout_service import WorkoutService
+from app.core.workout_generator import PARTIAL_RESULT_STAGES
+
+logger = logging.getLogger(__name__)
+
+# Eventi che chiudono lo stream di un job
+TERMINAL_STAGES = (JobStatus.COMPLETED.value, JobStatus.FAILED.value)
+
+class WorkoutJobService:
+    """
+    Generazione di una scheda senza tenere aperta la richiesta HTTP
+    
+    Il job viene eseguito da un pool di worker; l'avanzamento fase per fase
+    è registrato sul job (polling) e inoltrato agli iscritti (SSE).
+    """
+    
+    def __init__(
+        self,
+        workout_service: WorkoutService,
+        concurrency: Optional[int] = None,
+        max_jobs: Optional[int] = None
+    ):
+        """
+        Args:
+            workout_service: Servizio di generazione delle schede
+            concurrency: Generazioni contemporanee (default da settings)
+            max_jobs: Job mantenuti in memoria (default da settings)
+        """
+        self.workout_service = workout_service
+        self.queue = JobQueue(concurrency or settings.WORKOUT_JOB_CONCURRENCY)
+        self.jobs: JobRegistry[WorkoutJob] = JobRegistry(max_jobs or settings.WORKOUT_JOB_MAX_JOBS)
+        
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+    
+    def submit(
+        self,
+        user_input: str,
+        chat_id: Optional[str] = None,
+        generation_mode: Optional[str] = None
+    ) -> WorkoutJob:
+        """
+        Crea un job e accoda la generazione
+        
+        Args:
+            user_input: Input dell'utente in linguaggio naturale
+            chat_id: ID della chat associata
+            generation_mode: Modalità di generazione
+            
+        Returns:
+            Job in attesa
+        """
+        job = WorkoutJob(
+            id=str(uuid.uuid4()),
+            user_input=user_input,
+            chat_id=chat_id,
+            generation_mode=generation_mode
+        )
+        self.jobs.add(job)
+        self.queue.submit(lambda: self._run(job))
+        
+        logger.info(f"Job di generazione {job.id} accodato")
+        return job
+    
+    def get_job(self, job_id: str) -> Optional[WorkoutJob]:
+        """
+        Recupera un job
+        
+        Args:
+            job_id: ID del job
+            
+        Returns:
+            Job con lo stato corrente o None
+        """
+        return self.jobs.get(job_id)
+    
+    async def _run(self, job: WorkoutJob) -> None:
+        """Esegue la generazione registrando l'avanzamento sul job"""
+        job.status = JobStatus.RUNNING
+        
+        def progress(stage: str, details: Dict[str, Any]) -> None:
+            self._record(job, stage, details)
+            
+        try:
+            workout_plan = await self.workout_service.generate_workout_plan(
+                user_input=job.user_input,
+                chat_id=job.chat_id,
+                generation_mode=job.generation_mode,
+                progress=progress
+            )
+        except Exception as e:
+            logger.warning(f"Job di generazione {job.id} fallito: {e}")
+            self._finish(job, error=str(e))
+        else:
+            job.workout_plan = workout_plan
+            self._finish(job)
+    
+    def _record(self, job: WorkoutJob, stage: str, details: Optional[Dict[str, Any]] = None) -> None:
+        """Registra un evento sul job e lo inoltra agli iscritti"""
+        event = JobEvent(stage=stage, details=details or {})
+        job.events.append(event)
+        if stage not in TERMINAL_STAGES and stage not in PARTIAL_RESULT_STAGES:
+            job.stage = stage
+            
+        for subscriber in self._subscribers.get(job.id, []):
+            subscriber.put_nowait(event)
+    
+    def _finish(self, job: WorkoutJob, error: Optional[str] = None) -> None:
+        """Chiude il job con successo o errore"""
+        job.completed_at = datetime.now()
+        if error:
+            job.status = JobStatus.FAILED
+            job.error = error
+            self._record(job, JobStatus.FAILED.value, {"error": error})
+        else:
+            job.status = JobStatus.COMPLETED
+            self._record(job, JobStatus.COMPLETED.value, {"workout_id": job.workout_plan.id})
+    
+    async def subscribe(self, job_id: str) -> AsyncIterator[JobEvent]:
+        """
+        Eventi di avanzamento di un job, dai già registrati fino al termine
+        
+        Args:
+            job_id: ID del job
+            
+        Yields:
+            Eventi del job; l'ultimo è completed o failed
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+            
+        # Copia degli eventi passati e iscrizione senza await intermedi: gli eventi
+        # successivi arrivano solo dalla coda, senza perdite né duplicati
+        subscriber: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(subscriber)
+        past_events = list(job.events)
+        
+        try:
+            for event in past_events:
+                yield event
+                if event.stage in TERMINAL_STAGES:
+                    return
+                    
+            while True:
+                event = await subscriber.get()
+                yield event
+                if event.stage in TERMINAL_STAGES:
+                    return
+        finally:
+            subscribers = self._subscribers.get(job_id, [])
+            if subscriber in subscribers:
+                subscribers.remove(subscriber)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+    
+    async def shutdown(self) -> None:
+        """Ferma i worker e segna come falliti i job non completati"""
+        await self.queue.shutdown()
+        
+        for job in self.jobs:
+            if not job.is_finished():
+                self._finish(job, error="Generazione annullata all'arresto del servizio")
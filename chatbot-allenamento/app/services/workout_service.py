@@ -2,15 +2,22 @@
 Servizio per generazione schede allenamento
 """
 
+import asyncio
 import logging
 import uuid
 import json
 from datetime import datetime
-from typing import Dict, Any, Optional, List
-from app.models.workout import WorkoutPlan, UserProfile, ExperienceLevel, WorkoutGoal, Gender
+from typing import Dict, Any, Optional, List, AsyncIterator, Tuple
+from app.config import settings
+from app.models.workout import WorkoutPlan, WorkoutVariation, UserProfile, ExperienceLevel, WorkoutGoal, Gender
 from app.db.file_storage import FileStorage
+from app.db.plan_library import PlanLibrary
 from app.core.llm_manager import LLMManager
 from app.core.rag_engine import RAGEngine
+from app.core.workout_generator import WorkoutGenerator, GENERATION_MODES, ProgressCallback, report_progress
+from app.core.template_engine import TemplateWorkoutEngine
+from app.core.variation_engine import VariationEngine
+from app.core.single_flight import SingleFlight, request_key, normalize_text
 from app.utils.prompt_templates import PromptTemplates
 from app.core.error_handler import ChatbotException
 
@@ -24,29 +31,104 @@ class WorkoutService:
         self.llm_manager = llm_manager
         self.rag_engine = rag_engine
         self.prompt_templates = PromptTemplates()
+        self.workout_generator = WorkoutGenerator(llm_manager, rag_engine)
+        self.template_engine = TemplateWorkoutEngine()
+        self.plan_library = PlanLibrary()
+        self.variation_engine = VariationEngine(self.workout_generator)
+        self.single_flight = SingleFlight("workout")
     
-    async def generate_workout_plan(self, user_input: str, chat_id: Optional[str] = None) -> WorkoutPlan:
+    async def generate_workout_plan(
+        self,
+        user_input: str,
+        chat_id: Optional[str] = None,
+        generation_mode: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> WorkoutPlan:
         """
         Genera una scheda di allenamento personalizzata
         
         Args:
             user_input: Input dell'utente in linguaggio naturale
             chat_id: ID della chat associata (opzionale)
+            generation_mode: template, standard, multi_stage o single_shot. Senza modalità
+                si usa la libreria di schede pregenerate, poi il template per i profili
+                standard e infine la modalità di settings
+            progress: Callback chiamato all'inizio di ogni fase (profile, library o template,
+                fasi del generatore o generation, saving) e con i risultati parziali
+                del generatore (outline, day_ready)
             
         Returns:
             Piano di allenamento generato
         """
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await self._generate_workout_plan(user_input, generation_mode, progress)
+            
+        # Richieste identiche contemporanee (stesso testo normalizzato e modalità)
+        # attendono la stessa generazione e ricevono la stessa scheda
+        key = request_key(normalize_text(user_input), generation_mode)
+        return await self.single_flight.do(
+            key,
+            lambda: self._generate_workout_plan(
+                user_input,
+                generation_mode,
+                lambda stage, details: self.single_flight.notify(key, stage, details)
+            ),
+            listener=progress
+        )
+    
+    async def _generate_workout_plan(
+        self,
+        user_input: str,
+        generation_mode: Optional[str],
+        progress: Optional[ProgressCallback]
+    ) -> WorkoutPlan:
+        """Esegue la generazione della scheda (vedi generate_workout_plan)"""
         try:
             # Estrai il profilo utente dall'input
+            report_progress(progress, "profile")
             user_profile_data = await self.llm_manager.extract_user_profile(user_input)
             user_profile = self._create_user_profile(user_profile_data)
             
+            if generation_mode is None and settings.PLAN_LIBRARY_ENABLED:
+                workout_plan = self.plan_library.lookup(user_profile)
+                if workout_plan:
+                    report_progress(progress, "library")
+                    report_progress(progress, "saving")
+                    await self.save_workout_plan(workout_plan)
+                    
+                    logger.info(f"Scheda servita dalla libreria: {workout_plan.id}")
+                    return workout_plan
+            
+            if self._use_template_engine(user_profile, generation_mode):
+                # Scheda da regole e catalogo esercizi, senza chiamate al modello
+                report_progress(progress, "template")
+                workout_plan = self.template_engine.generate(user_profile)
+                report_progress(progress, "saving")
+                await self.save_workout_plan(workout_plan)
+                
+                logger.info(f"Scheda generata con successo (template): {workout_plan.id}")
+                return workout_plan
+            
+            mode = generation_mode or settings.WORKOUT_GENERATION_MODE
+            if mode in GENERATION_MODES:
+                # Scheda strutturata generata per fasi o in una sola chiamata
+                workout_plan = await self.workout_generator.generate_complete_workout(
+                    user_profile, user_input, mode=mode, progress=progress
+                )
+                report_progress(progress, "saving")
+                await self.save_workout_plan(workout_plan)
+                
+                logger.info(f"Scheda generata con successo ({mode}): {workout_plan.id}")
+                return workout_plan
+            
             # Recupera contesto rilevante dal RAG
+            report_progress(progress, "context")
             context, sources = await self.rag_engine.retrieve_context(
                 f"allenamento {' '.join(user_profile.goals)} {user_profile.experience_level.value}"
             )
             
             # Genera la scheda usando OpenAI
+            report_progress(progress, "generation")
             workout_content = await self._generate_workout_content(
                 user_input=user_input,
                 user_profile=user_profile,
@@ -61,6 +143,7 @@ class WorkoutService:
             )
             
             # Salva la scheda
+            report_progress(progress, "saving")
             await self.save_workout_plan(workout_plan)
             
             logger.info(f"Scheda generata con successo: {workout_plan.id}")
@@ -70,6 +153,79 @@ class WorkoutService:
             logger.error(f"Errore nella generazione della scheda: {e}")
             raise ChatbotException(f"Errore nella generazione della scheda: {str(e)}")
     
+    async def stream_workout_plan(
+        self,
+        user_input: str,
+        chat_id: Optional[str] = None,
+        generation_mode: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Genera una scheda restituendo gli eventi di avanzamento man mano che arrivano
+        
+        Se l'iterazione viene interrotta (es. client disconnesso) la generazione
+        viene annullata.
+        
+        Args:
+            user_input: Input dell'utente in linguaggio naturale
+            chat_id: ID della chat associata (opzionale)
+            generation_mode: Modalità di generazione (vedi generate_workout_plan)
+            
+        Yields:
+            Coppie (fase, dettagli) come per il callback di avanzamento; l'ultima è
+            completed con la scheda in 'workout_plan' oppure failed con 'error'
+        """
+        events: asyncio.Queue = asyncio.Queue()
+        
+        async def run() -> None:
+            try:
+                workout_plan = await self.generate_workout_plan(
+                    user_input=user_input,
+                    chat_id=chat_id,
+                    generation_mode=generation_mode,
+                    progress=lambda stage, details: events.put_nowait((stage, details))
+                )
+            except Exception as e:
+                events.put_nowait(("failed", {"error": str(e)}))
+            else:
+                events.put_nowait(("completed", {"workout_plan": workout_plan}))
+                
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                stage, details = await events.get()
+                yield stage, details
+                if stage in ("completed", "failed"):
+                    return
+        finally:
+            if not task.done():
+                task.cancel()
+    
+    def get_coalescing_stats(self) -> Dict[str, int]:
+        """
+        Ottiene statistiche sulle generazioni identiche deduplicate
+        
+        Returns:
+            Richieste, generazioni effettive, richieste accodate e generazioni in corso
+        """
+        return self.single_flight.get_stats()
+    
+    def _use_template_engine(self, user_profile: UserProfile, generation_mode: Optional[str]) -> bool:
+        """
+        Decide se generare la scheda con il motore a template
+        
+        Args:
+            user_profile: Profilo estratto dall'input
+            generation_mode: Modalità richiesta esplicitamente
+            
+        Returns:
+            True per la modalità template o per i profili standard senza modalità esplicita
+        """
+        if generation_mode == "template":
+            return True
+        if generation_mode is not None or not settings.TEMPLATE_ENGINE_ENABLED:
+            return False
+        return self.template_engine.supports(user_profile)
+    
     def _create_user_profile(self, profile_data: Dict[str, Any]) -> UserProfile:
         """
         Crea un UserProfile dai dati estratti
@@ -354,7 +510,7 @@ Profilo dell'utente:
         try:
             workout_data = self.storage.load_workout(workout_id)
             if not workout_data:
-                return None
+                return await self._load_workout_variation(workout_id)
             
             # Converti i dati in oggetto WorkoutPlan
             return WorkoutPlan(**workout_data)
@@ -363,6 +519,20 @@ Profilo dell'utente:
             logger.error(f"Errore nel recupero della scheda {workout_id}: {e}")
             return None
     
+    async def _load_workout_variation(self, variation_id: str) -> Optional[WorkoutPlan]:
+        """Ricostruisce una variazione salvata come differenza dalla sua scheda base"""
+        variation_data = self.storage.load_workout_variation(variation_id)
+        if not variation_data:
+            return None
+            
+        variation = WorkoutVariation(**variation_data)
+        base_workout = await self.get_workout_plan(variation.base_workout_id)
+        if base_workout is None:
+            logger.warning(f"Scheda base {variation.base_workout_id} della variazione {variation_id} non trovata")
+            return None
+            
+        return variation.apply(base_workout)
+    
     async def list_workout_plans(self, limit: Optional[int] = None) -> List[dict]:
         """
         Lista tutte le schede di allenamento
@@ -390,6 +560,15 @@ Profilo dell'utente:
             True se eliminata con successo
         """
         try:
+            # Le variazioni che dipendono dalla scheda vengono salvate per intero
+            for variation_data in self.storage.list_workout_variations(base_workout_id=workout_id):
+                workout_plan = await self.get_workout_plan(variation_data["id"])
+                if workout_plan:
+                    await self.save_workout_plan(workout_plan)
+                self.storage.delete_workout_variation(variation_data["id"])
+                
+            if self.storage.delete_workout_variation(workout_id):
+                return True
             return self.storage.delete_workout(workout_id)
         except Exception as e:
             logger.error(f"Errore nell'eliminazione della scheda {workout_id}: {e}")
@@ -399,6 +578,10 @@ Profilo dell'utente:
         """
         Genera variazioni di una scheda esistente
         
+        Le variazioni gestite dal motore incrementale (harder, easier, fewer_days,
+        different_exercises e le loro descrizioni in italiano) trasformano la scheda
+        base e vengono salvate come differenza; le altre rigenerano l'intera scheda.
+        
         Args:
             base_workout_id: ID della scheda base
             variation_type: Tipo di variazione (easier, harder, different_focus, etc.)
@@ -410,6 +593,15 @@ Profilo dell'utente:
             base_workout = await self.get_workout_plan(base_workout_id)
             if not base_workout:
                 raise ChatbotException("Scheda base non trovata")
+                
+            if self.variation_engine.supports(variation_type):
+                variation = await self.variation_engine.create_variation(
+                    base_workout,
+                    variation_type,
+                    refine_with_llm=settings.VARIATION_LLM_REFINEMENT
+                )
+                self.storage.save_workout_variation(variation.model_dump())
+                return variation.apply(base_workout)
             
             # Crea prompt per la variazione
             variation_prompt = f"""
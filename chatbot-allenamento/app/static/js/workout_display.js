@@ -80,6 +80,166 @@ class WorkoutDisplayManager {
         });
     }
     
+    async streamWorkout(userInput, options = {}) {
+        // Genera una scheda mostrando i giorni man mano che sono pronti
+        const container = options.container || document.getElementById('chatContainer');
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'message assistant-message workout-message';
+        messageDiv.innerHTML = '<div class="loading"><span class="loading-text">Preparo la scheda...</span></div>';
+        container.appendChild(messageDiv);
+        
+        const response = await fetch('/api/v1/workout/generate/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                user_input: userInput,
+                chat_id: options.chatId || null,
+                generation_mode: options.generationMode || null
+            })
+        });
+        
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let workoutPlan = null;
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            
+            buffer += decoder.decode(value, { stream: true });
+            const blocks = buffer.split('\n\n');
+            buffer = blocks.pop();
+            
+            blocks.forEach((block) => {
+                const event = this.parseStreamEvent(block);
+                if (!event) return;
+                
+                const result = this.handleStreamEvent(messageDiv, event.name, event.data);
+                if (result) workoutPlan = result;
+            });
+            
+            container.scrollTop = container.scrollHeight;
+        }
+        
+        return workoutPlan;
+    }
+    
+    parseStreamEvent(block) {
+        // Estrae nome e dati da un evento Server-Sent Events
+        let name = 'message';
+        const dataLines = [];
+        
+        block.split('\n').forEach((line) => {
+            if (line.startsWith('event:')) {
+                name = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                dataLines.push(line.slice(5).trim());
+            }
+        });
+        
+        if (!dataLines.length) return null;
+        return { name, data: JSON.parse(dataLines.join('\n')) };
+    }
+    
+    handleStreamEvent(messageDiv, name, data) {
+        const workoutCard = messageDiv.querySelector('.workout-card');
+        
+        switch (name) {
+            case 'progress': {
+                const loadingText = messageDiv.querySelector('.loading-text');
+                if (loadingText) {
+                    loadingText.textContent = this.getStageLabel(data.stage, data);
+                }
+                break;
+            }
+            case 'outline': {
+                // Apertura della scheda con un segnaposto per ogni giorno previsto
+                messageDiv.innerHTML = `${data.html}</div>`;
+                const card = messageDiv.querySelector('.workout-card');
+                data.days.forEach((day) => {
+                    const placeholder = document.createElement('div');
+                    placeholder.className = 'workout-day workout-day-pending';
+                    placeholder.innerHTML = `<h3>📅 ${day.day} - ${day.focus}</h3><p><em>In preparazione...</em></p>`;
+                    card.appendChild(placeholder);
+                });
+                break;
+            }
+            case 'day': {
+                if (!workoutCard) break;
+                const template = document.createElement('template');
+                template.innerHTML = data.html;
+                const dayElement = template.content.firstElementChild;
+                
+                const placeholder = workoutCard.querySelector('.workout-day-pending');
+                if (placeholder) {
+                    placeholder.replaceWith(dayElement);
+                } else {
+                    workoutCard.appendChild(dayElement);
+                }
+                this.animateWorkoutSection(dayElement);
+                break;
+            }
+            case 'completed': {
+                if (!workoutCard) break;
+                workoutCard.querySelectorAll('.workout-day-pending').forEach((placeholder) => placeholder.remove());
+                
+                // L'HTML di chiusura termina con il tag del contenitore, già aperto
+                const template = document.createElement('template');
+                template.innerHTML = data.html.replace(/<\/div>\s*$/, '');
+                Array.from(template.content.children).forEach((section) => {
+                    workoutCard.appendChild(section);
+                    this.animateWorkoutSection(section);
+                });
+                return data.workout_plan;
+            }
+            case 'error':
+                messageDiv.classList.remove('workout-message');
+                messageDiv.innerHTML = data.message;
+                break;
+        }
+        
+        return null;
+    }
+    
+    getStageLabel(stage, details = {}) {
+        const labels = {
+            profile: 'Analizzo il tuo profilo...',
+            library: 'Recupero una scheda adatta...',
+            template: 'Compongo la scheda...',
+            context: 'Consulto le linee guida...',
+            structure: 'Definisco la struttura settimanale...',
+            plan: 'Scrivo la scheda...',
+            generation: 'Scrivo la scheda...',
+            nutrition: 'Preparo le indicazioni nutrizionali...',
+            progression: 'Pianifico la progressione...',
+            saving: 'Salvo la scheda...'
+        };
+        
+        if (stage === 'days') {
+            return `Preparo ${details.day} (${details.index}/${details.total})...`;
+        }
+        return labels[stage] || 'Sto pensando...';
+    }
+    
+    animateWorkoutSection(section) {
+        // Anima una sezione aggiunta a una scheda già visibile
+        section.style.opacity = '0';
+        section.style.transform = 'translateX(-20px)';
+        
+        setTimeout(() => {
+            section.style.transition = 'all 0.4s ease-out';
+            section.style.opacity = '1';
+            section.style.transform = 'translateX(0)';
+        }, 50);
+    }
+    
     setupTableInteractions() {
         // Aggiungi hover effects e interazioni alle tabelle
         document.addEventListener('mouseover', (e) => {
@@ -463,6 +623,13 @@ window.printWorkout = function(workoutCard) {
     }
 };
 
+window.streamWorkout = function(userInput, options = {}) {
+    if (window.workoutDisplayManager) {
+        return window.workoutDisplayManager.streamWorkout(userInput, options);
+    }
+    return Promise.resolve(null);
+};
+
 window.exportWorkout = function(workoutCard) {
     if (window.workoutDisplayManager) {
         window.workoutDisplayManager.exportWorkoutAsText(workoutCard);
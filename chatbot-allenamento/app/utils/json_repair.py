@@ -0,0 +1,143 @@
+"""
+Parsing tollerante delle risposte JSON del modello
+"""
+
+import json
+import re
+from typing import Any, Callable, List, Optional, Tuple
+
+# Numero massimo di punti di troncamento provati durante la riparazione
+MAX_REPAIR_ATTEMPTS = 50
+
+_CODE_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+def loads_lenient(text: str, validate: Optional[Callable[[Any], Any]] = None) -> Tuple[Any, bool]:
+    """
+    Interpreta una risposta JSON riparando gli errori più comuni
+    
+    Gestisce blocchi di codice markdown, testo prima o dopo il JSON,
+    virgole finali e output troncati (stringhe, oggetti e liste non chiusi).
+    In caso di troncamento, o di JSON valido non accettato da `validate`, si
+    prova prima a chiudere l'elemento interrotto e poi a scartarlo, fino a
+    ottenere dati accettati da `validate`.
+    
+    Args:
+        text: Risposta del modello
+        validate: Funzione che solleva un'eccezione se i dati non sono accettabili
+        
+    Returns:
+        Tupla (dati, riparato) dove riparato indica se è servita la riparazione
+        
+    Raises:
+        json.JSONDecodeError: Se la risposta non è recuperabile
+        Exception: L'errore di `validate` sulla risposta originale, se nessuna riparazione è valida
+    """
+    validate = validate or (lambda data: data)
+    
+    first_error: Optional[Exception] = None
+    
+    try:
+        data = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        pass
+    else:
+        try:
+            validate(data)
+            return data, False
+        except Exception as e:
+            # JSON valido ma non conforme: si prova a scartare l'ultimo elemento
+            first_error = e
+            
+    candidate = _extract_json_text(text or "")
+    if not candidate:
+        if first_error is not None:
+            raise first_error
+        raise json.JSONDecodeError("Nessun JSON trovato nella risposta", text or "", 0)
+        
+    for attempt in _repair_candidates(candidate):
+        try:
+            data = _decode_prefix(attempt)
+            validate(data)
+            return data, True
+        except json.JSONDecodeError:
+            continue
+        except Exception as e:
+            first_error = first_error or e
+            
+    if first_error is not None:
+        raise first_error
+    raise json.JSONDecodeError("JSON non recuperabile", candidate, 0)
+
+def _decode_prefix(text: str) -> Any:
+    """Decodifica il primo valore JSON del testo ignorando quanto segue"""
+    data, _ = json.JSONDecoder().raw_decode(text)
+    return data
+
+def _extract_json_text(text: str) -> str:
+    """Estrae la parte JSON da una risposta, rimuovendo blocchi markdown e prosa iniziale"""
+    fenced = _CODE_FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+        
+    starts = [pos for pos in (text.find("{"), text.find("[")) if pos != -1]
+    if not starts:
+        return ""
+        
+    return text[min(starts):].strip()
+
+def _repair_candidates(text: str) -> List[str]:
+    """
+    Genera versioni riparate del testo, dalla più completa alla più corta
+    
+    Il testo viene scandito una sola volta tenendo traccia delle parentesi
+    aperte e dei punti in cui un elemento è appena terminato; ogni punto
+    diventa un candidato chiudendo le strutture ancora aperte.
+    """
+    stack: List[str] = []
+    in_string = False
+    escape = False
+    safe_points: List[Tuple[int, str]] = []
+    end = len(text)
+    
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+            
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack:
+                end = i
+                break
+            stack.pop()
+            if not stack:
+                end = i + 1
+                break
+            safe_points.append((i + 1, "".join(reversed(stack))))
+        elif ch == ",":
+            safe_points.append((i, "".join(reversed(stack))))
+            
+    # JSON già completo, eventualmente seguito da altro testo
+    candidates = [text]
+    
+    # Candidato completo: chiude la stringa e le strutture aperte
+    head = text[:end]
+    if in_string and end == len(text):
+        head += '"'
+    head = head.rstrip().rstrip(",")
+    candidates.append(_TRAILING_COMMA.sub(r"\1", head + "".join(reversed(stack))))
+    
+    # Candidati troncati all'ultimo elemento completo
+    for index, closing in reversed(safe_points[-MAX_REPAIR_ATTEMPTS:]):
+        candidates.append(_TRAILING_COMMA.sub(r"\1", text[:index].rstrip().rstrip(",") + closing))
+        
+    return candidates
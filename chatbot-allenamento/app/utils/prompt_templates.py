@@ -2,7 +2,7 @@
 Template di prompt per OpenAI
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 class PromptTemplates:
     """Collezione di template di prompt per diverse funzionalità"""
@@ -150,6 +150,58 @@ REGOLE DI ESTRAZIONE:
 - Per equipment, considera sia quello menzionato che quello tipico di palestra se non specificato
 
 Non aggiungere spiegazioni, restituisci SOLO il JSON.
+"""
+    
+    @staticmethod
+    def get_conversation_summary_prompt() -> str:
+        """Prompt di sistema per il riassunto progressivo delle chat"""
+        return """
+Sei un assistente che riassume conversazioni tra un utente e un coach di fitness.
+Aggiorna il riassunto esistente integrando i nuovi messaggi.
+
+Conserva sempre:
+- Dati dell'utente (età, livello, obiettivi, giorni disponibili, infortuni, attrezzatura)
+- Schede o programmi già proposti e le modifiche richieste
+- Domande ancora aperte e impegni presi dall'assistente
+
+Scrivi in italiano, in forma di elenco puntato conciso, senza saluti o commenti.
+Restituisci SOLO il riassunto aggiornato.
+"""
+    
+    @staticmethod
+    def format_conversation_summary_request(previous_summary: Optional[str], transcript: str) -> str:
+        """
+        Compone la richiesta di aggiornamento del riassunto
+        
+        Args:
+            previous_summary: Riassunto corrente (None se è il primo)
+            transcript: Nuovi messaggi da integrare
+            
+        Returns:
+            Messaggio utente per il modello
+        """
+        return f"""
+Riassunto attuale:
+{previous_summary or "(nessun riassunto)"}
+
+Nuovi messaggi:
+{transcript}
+"""
+    
+    @staticmethod
+    def format_conversation_summary(summary: str) -> str:
+        """
+        Formatta il riassunto da aggiungere al prompt di sistema della chat
+        
+        Args:
+            summary: Riassunto della conversazione
+            
+        Returns:
+            Sezione del prompt con il riassunto
+        """
+        return f"""
+RIASSUNTO DELLA CONVERSAZIONE PRECEDENTE:
+{summary}
 """
     
     @staticmethod
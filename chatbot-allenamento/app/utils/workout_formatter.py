@@ -4,7 +4,7 @@ Formattazione schede per visualizzazione
 
 import logging
 from typing import Dict, Any, List
-from app.models.workout import WorkoutPlan, WorkoutDay, Exercise
+from app.models.workout import WorkoutPlan, WorkoutDay, Exercise, UserProfile
 
 logger = logging.getLogger(__name__)
 
@@ -22,14 +22,34 @@ class WorkoutFormatter:
         Returns:
             Scheda formattata come HTML/Markdown
         """
+        output = [WorkoutFormatter.format_plan_header(workout_plan.title, workout_plan.user_profile)]
+        output.extend(WorkoutFormatter.format_day(day) for day in workout_plan.workout_days)
+        output.append(WorkoutFormatter.format_plan_footer(workout_plan))
+        
+        return ''.join(output)
+    
+    @staticmethod
+    def format_plan_header(title: str, profile: UserProfile) -> str:
+        """
+        Apertura della scheda: titolo e profilo utente
+        
+        Il contenitore `workout-card` resta aperto e viene chiuso da
+        `format_plan_footer`; in mezzo si aggiungono i giorni con `format_day`.
+        
+        Args:
+            title: Titolo della scheda
+            profile: Profilo dell'utente
+            
+        Returns:
+            Frammento HTML di apertura
+        """
         output = []
         
         # Titolo principale
         output.append(f'<div class="workout-card">')
-        output.append(f'<h2 class="workout-title">🏋️ {workout_plan.title}</h2>')
+        output.append(f'<h2 class="workout-title">🏋️ {title}</h2>')
         
         # Profilo utente
-        profile = workout_plan.user_profile
         output.append('<div class="profile-section">')
         output.append('<h3>👤 Il Tuo Profilo</h3>')
         output.append('<ul>')
@@ -55,37 +75,64 @@ class WorkoutFormatter:
         output.append('</ul>')
         output.append('</div>')
         
-        # Giorni di allenamento
-        for i, day in enumerate(workout_plan.workout_days):
-            output.append(f'<div class="workout-day">')
-            output.append(f'<h3>📅 {day.day} - {day.focus}</h3>')
+        return ''.join(output)
+    
+    @staticmethod
+    def format_day(day: WorkoutDay) -> str:
+        """
+        Formatta un singolo giorno di allenamento
+        
+        Args:
+            day: Giorno da formattare
             
-            # Riscaldamento
-            if day.warm_up:
-                output.append('<h4>🔥 Riscaldamento</h4>')
-                output.append('<ul>')
-                for warmup in day.warm_up:
-                    output.append(f'<li>{warmup}</li>')
-                output.append('</ul>')
+        Returns:
+            Frammento HTML del giorno
+        """
+        output = []
+        output.append(f'<div class="workout-day">')
+        output.append(f'<h3>📅 {day.day} - {day.focus}</h3>')
+        
+        # Riscaldamento
+        if day.warm_up:
+            output.append('<h4>🔥 Riscaldamento</h4>')
+            output.append('<ul>')
+            for warmup in day.warm_up:
+                output.append(f'<li>{warmup}</li>')
+            output.append('</ul>')
             
-            # Esercizi principali
-            if day.exercises:
-                output.append('<h4>💪 Esercizi Principali</h4>')
-                output.append(WorkoutFormatter._format_exercises_table(day.exercises))
+        # Esercizi principali
+        if day.exercises:
+            output.append('<h4>💪 Esercizi Principali</h4>')
+            output.append(WorkoutFormatter._format_exercises_table(day.exercises))
             
-            # Defaticamento
-            if day.cool_down:
-                output.append('<h4>🧘 Defaticamento</h4>')
-                output.append('<ul>')
-                for cooldown in day.cool_down:
-                    output.append(f'<li>{cooldown}</li>')
-                output.append('</ul>')
+        # Defaticamento
+        if day.cool_down:
+            output.append('<h4>🧘 Defaticamento</h4>')
+            output.append('<ul>')
+            for cooldown in day.cool_down:
+                output.append(f'<li>{cooldown}</li>')
+            output.append('</ul>')
             
-            # Durata stimata
-            if day.duration_minutes:
-                output.append(f'<p><strong>⏱️ Durata stimata:</strong> {day.duration_minutes} minuti</p>')
+        # Durata stimata
+        if day.duration_minutes:
+            output.append(f'<p><strong>⏱️ Durata stimata:</strong> {day.duration_minutes} minuti</p>')
             
-            output.append('</div>')
+        output.append('</div>')
+        
+        return ''.join(output)
+    
+    @staticmethod
+    def format_plan_footer(workout_plan: WorkoutPlan) -> str:
+        """
+        Chiusura della scheda: nutrizione, progressione e note generali
+        
+        Args:
+            workout_plan: Scheda completa
+            
+        Returns:
+            Frammento HTML di chiusura
+        """
+        output = []
         
         # Nutrizione
         if workout_plan.nutrition:
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark della riduzione di dimensione degli embeddings (EMBEDDING_DIMENSIONS)
+
+I modelli text-embedding-3-* sono addestrati in modo che i primi componenti
+concentrino l'informazione: richiedere `dimensions=d` equivale a troncare il
+vettore completo ai primi d componenti e rinormalizzarlo. Il benchmark tronca
+quindi gli stessi embeddings a ogni dimensione e misura, rispetto alla ricerca
+esatta a dimensione piena, recall@k, latenza per query e memoria per vettore.
+
+Senza argomenti usa embeddings sintetici con varianza decrescente per componente
+(nessuna chiamata a OpenAI). Per misurare embeddings reali salvarli a dimensione
+piena in file .npy (corpus e query) e passarli con --embeddings e --queries.
+
+Uso:
+    python benchmarks/benchmark_embedding_dimensions.py --dims 256 512 1536
+    python benchmarks/benchmark_embedding_dimensions.py --embeddings corpus.npy --queries queries.npy
+"""
+
+import argparse
+import statistics
+import time
+import numpy as np
+
+# Byte di una lista Python di float (SimpleVectorStore): puntatore + oggetto float per componente
+PYTHON_FLOAT_BYTES = 32
+PYTHON_LIST_OVERHEAD = 56
+
+def truncate(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Primi `dim` componenti rinormalizzati (come il parametro `dimensions` dell'API)"""
+    truncated = np.ascontiguousarray(vectors[:, :dim])
+    return truncated / np.linalg.norm(truncated, axis=1, keepdims=True)
+
+def make_corpus(count: int, queries: int, dim: int, topics: int, seed: int):
+    """Embeddings sintetici per argomento con varianza decrescente lungo i componenti"""
+    rng = np.random.default_rng(seed)
+    decay = (1.0 / np.sqrt(1 + np.arange(dim) / 64)).astype(np.float32)
+    centers = rng.normal(size=(topics, dim)).astype(np.float32) * decay
+    
+    def sample(n: int) -> np.ndarray:
+        block = centers[rng.integers(topics, size=n)]
+        return block + 0.6 * rng.normal(size=(n, dim)).astype(np.float32) * decay
+        
+    return sample(count), sample(queries)
+
+def top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    """Indici dei k vettori più simili (ricerca esatta)"""
+    scores = vectors @ query
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+def run(corpus: np.ndarray, queries: np.ndarray, dims: list, k: int) -> list:
+    """Misura recall, latenza e memoria per ogni dimensione"""
+    full_dim = corpus.shape[1]
+    full_corpus = truncate(corpus, full_dim)
+    full_queries = truncate(queries, full_dim)
+    expected = [set(top_k(full_corpus, query, k).tolist()) for query in full_queries]
+    
+    rows = []
+    for dim in dims:
+        if dim > full_dim:
+            print(f"⚠️  {dim} dimensioni oltre la dimensione piena ({full_dim}), saltata")
+            continue
+        vectors = truncate(corpus, dim)
+        dim_queries = truncate(queries, dim)
+        latencies, recalls = [], []
+        for query, relevant in zip(dim_queries, expected):
+            start = time.perf_counter()
+            found = top_k(vectors, query, k)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len(set(found.tolist()) & relevant) / k)
+        rows.append({
+            "dim": dim,
+            "latency_ms": statistics.median(latencies) * 1000,
+            "recall": statistics.mean(recalls),
+            "float32_bytes": dim * 4,
+            "python_bytes": dim * PYTHON_FLOAT_BYTES + PYTHON_LIST_OVERHEAD,
+            "corpus_mb": vectors.nbytes / (1024 * 1024)
+        })
+    return rows
+
+def print_report(rows: list, count: int, k: int) -> None:
+    """Stampa il confronto tra le dimensioni"""
+    header = (
+        f"{'dim':>6}{f'recall@{k}':>11}{'lat. mediana':>14}{'B/vettore f32':>15}"
+        f"{'B/vettore py':>14}{f'MB ({count} vett.)':>18}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['dim']:>6}{r['recall']:>11.1%}{r['latency_ms']:>12.2f}ms{r['float32_bytes']:>15}"
+            f"{r['python_bytes']:>14}{r['corpus_mb']:>18.1f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confronta le dimensioni ridotte degli embeddings")
+    parser.add_argument("--dims", nargs="+", type=int, default=[256, 512, 1536])
+    parser.add_argument("--size", type=int, default=100000, help="Vettori del corpus sintetico")
+    parser.add_argument("--queries", default="200", help="Numero di query sintetiche o file .npy di query reali")
+    parser.add_argument("--embeddings", help="File .npy con gli embeddings reali del corpus a dimensione piena")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimensione piena degli embeddings sintetici")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    
+    if args.embeddings:
+        corpus = np.load(args.embeddings).astype(np.float32)
+        queries = np.load(args.queries).astype(np.float32)
+    else:
+        corpus, queries = make_corpus(args.size, int(args.queries), args.dim, topics=max(args.size // 500, 20), seed=0)
+        
+    print(f"⏱️  {len(corpus)} vettori, {len(queries)} query, dimensione piena {corpus.shape[1]}...")
+    results = run(corpus, queries, sorted(args.dims), args.top_k)
+    print()
+    print_report(results, len(corpus), args.top_k)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark del caricamento dell'indice: JSON di llama-index contro formato binario
+
+Costruisce un indice sintetico (frammenti di testo con metadati ed embeddings casuali,
+nessuna chiamata a OpenAI), lo salva in entrambi i formati e, in un processo separato
+per ogni misura, riporta tempo di caricamento, RSS di picco e latenza della prima
+ricerca (vettori e testo dei 5 nodi migliori).
+
+Uso:
+    python benchmarks/benchmark_index_load.py --sizes 10000 50000 --dim 1536
+
+Nota: nel formato binario vettori e testi sono mappati in memoria; l'RSS cresce solo
+con le pagine effettivamente lette e quelle pagine sono condivise tra i worker.
+La memoria si legge da /proc/self/status (Linux): ru_maxrss verrebbe ereditato dal
+processo che ha costruito gli indici e riporterebbe il suo picco.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+# Aggiungi il percorso dell'app al Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+WORDS = (
+    "squat panca stacco trazioni serie ripetizioni recupero carico progressione ipertrofia forza "
+    "resistenza mobilità riscaldamento defaticamento proteine carboidrati idratazione tecnica "
+    "glutei femorali quadricipiti dorsali pettorali spalle core volume intensità frequenza"
+).split()
+
+def build_indexes(count: int, dim: int, directory: Path) -> None:
+    """Salva lo stesso corpus sintetico come indice JSON e come generazione binaria"""
+    from llama_index.core import VectorStoreIndex
+    from llama_index.core.embeddings import MockEmbedding
+    from llama_index.core.schema import TextNode
+    from app.db.ann_index import IVFIndex
+    from app.db.shared_index import SharedIndexStore
+    
+    rng = np.random.default_rng(count)
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    nodes = []
+    for i in range(count):
+        source = f"documento_{i % 40}"
+        nodes.append(TextNode(
+            text=" ".join(rng.choice(WORDS, size=150)),
+            metadata={
+                "source": source,
+                "filename": f"{source}.pdf",
+                "file_type": "pdf",
+                "page_label": str(i % 300 + 1)
+            },
+            embedding=vectors[i].tolist()
+        ))
+        
+    # Embeddings già presenti nei nodi: il modello finto non viene chiamato
+    index = VectorStoreIndex(nodes, embed_model=MockEmbedding(embed_dim=dim))
+    index.storage_context.persist(persist_dir=str(directory / "json"))
+    
+    ann_index = IVFIndex.build([node.node_id for node in nodes], vectors, n_lists=1)
+    SharedIndexStore(directory / "shared").publish(ann_index, nodes)
+
+def memory_kb() -> dict:
+    """RSS corrente (VmRSS) e di picco (VmHWM) di questo processo in kB"""
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                values[key] = int(value.split()[0])
+    return values
+
+def measure(format_name: str, directory: Path, dim: int) -> dict:
+    """Carica l'indice in questo processo e misura tempo, RSS e prima ricerca"""
+    # Stessi moduli importati per entrambi i formati prima della misura di partenza
+    from llama_index.core import Settings, StorageContext, load_index_from_storage
+    from llama_index.core.embeddings import MockEmbedding
+    from llama_index.core.vector_stores.types import VectorStoreQuery
+    from app.db.shared_index import SharedIndexStore
+    
+    query = np.random.default_rng(0).normal(size=dim).astype(np.float32)
+    baseline = memory_kb()
+    
+    if format_name == "json":
+        Settings.embed_model = MockEmbedding(embed_dim=dim)
+        
+        start = time.perf_counter()
+        index = load_index_from_storage(StorageContext.from_defaults(persist_dir=str(directory / "json")))
+        load_time = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        result = index.vector_store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=5))
+        texts = [index.docstore.get_node(node_id).get_content() for node_id in result.ids]
+        query_time = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        generation = SharedIndexStore(directory / "shared").open_current(load_sparse=False)
+        load_time = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        results = generation.ann_index.search(query, top_k=5, n_probe=1)
+        texts = [generation.get_node(node_id).get_content() for node_id, _ in results]
+        query_time = time.perf_counter() - start
+        
+    memory = memory_kb()
+    return {
+        "load_s": load_time,
+        "query_ms": query_time * 1000,
+        "peak_rss_mb": memory["VmHWM"] / 1024,
+        "index_rss_mb": (memory["VmRSS"] - baseline["VmRSS"]) / 1024,
+        "results": len(texts)
+    }
+
+def run_size(count: int, dim: int) -> list:
+    """Costruisce il corpus e misura ogni formato in un processo nuovo"""
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        start = time.perf_counter()
+        build_indexes(count, dim, directory)
+        print(f"   indici costruiti in {time.perf_counter() - start:.1f}s")
+        
+        for format_name, subdirectory in (("json", "json"), ("binary", "shared")):
+            size_mb = sum(f.stat().st_size for f in (directory / subdirectory).rglob("*") if f.is_file()) / (1024 * 1024)
+            output = subprocess.run(
+                [sys.executable, __file__, "--measure", format_name, "--directory", tmp, "--dim", str(dim)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            rows.append({"size": count, "format": format_name, "disk_mb": size_mb, **json.loads(output.splitlines()[-1])})
+    return rows
+
+def print_report(rows: list) -> None:
+    """Stampa il confronto tra i due formati"""
+    header = f"{'nodi':>8}  {'formato':<8}{'disco':>10}{'caricamento':>13}{'RSS picco':>12}{'RSS indice':>12}{'1a ricerca':>12}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['size']:>8}  {r['format']:<8}{r['disk_mb']:>8.0f}MB{r['load_s']:>12.3f}s"
+            f"{r['peak_rss_mb']:>10.0f}MB{r['index_rss_mb']:>10.0f}MB{r['query_ms']:>10.1f}ms"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confronta il caricamento dell'indice JSON e binario")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10000, 50000])
+    parser.add_argument("--dim", type=int, default=1536, help="Dimensione degli embeddings")
+    parser.add_argument("--measure", choices=["json", "binary"], help=argparse.SUPPRESS)
+    parser.add_argument("--directory", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.measure:
+        print(json.dumps(measure(args.measure, Path(args.directory), args.dim)))
+        sys.exit(0)
+        
+    results = []
+    for size in args.sizes:
+        print(f"⏱️  {size} nodi da {args.dim} dimensioni...")
+        results.extend(run_size(size, args.dim))
+        
+    print()
+    print_report(results)
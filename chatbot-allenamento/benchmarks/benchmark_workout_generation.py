@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark delle modalità di generazione schede (multi_stage vs single_shot)
+
+Esegue le stesse richieste con entrambe le modalità usando OpenAI e il
+motore RAG reali, e confronta latenza, chiamate, token e parsing riuscito.
+
+Uso:
+    python benchmarks/benchmark_workout_generation.py --runs 3
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Aggiungi il percorso dell'app al Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.llm_manager import LLMManager
+from app.core.rag_engine import RAGEngine
+from app.core.workout_generator import WorkoutGenerator, GENERATION_MODES
+from app.models.workout import UserProfile, ExperienceLevel, WorkoutGoal
+
+SAMPLE_REQUESTS = [
+    (
+        UserProfile(experience_level=ExperienceLevel.BEGINNER, goals=[WorkoutGoal.GENERAL_FITNESS], available_days=3),
+        "Sono principiante, voglio allenarmi 3 volte a settimana per rimettermi in forma"
+    ),
+    (
+        UserProfile(experience_level=ExperienceLevel.INTERMEDIATE, goals=[WorkoutGoal.HYPERTROPHY], available_days=4),
+        "Mi alleno da un anno, vorrei una scheda per la massa su 4 giorni"
+    ),
+    (
+        UserProfile(
+            experience_level=ExperienceLevel.ADVANCED,
+            goals=[WorkoutGoal.STRENGTH],
+            available_days=5,
+            injuries=["spalla"]
+        ),
+        "Scheda forza 5 giorni, ho un vecchio infortunio alla spalla"
+    )
+]
+
+async def run_mode(generator: WorkoutGenerator, llm_manager: LLMManager, mode: str, runs: int) -> dict:
+    """Esegue tutte le richieste di esempio con una modalità"""
+    latencies = []
+    usage_before = llm_manager.get_usage_stats()
+    failures_before = sum(stats["failures"] for stats in generator.get_parse_stats().values())
+    calls_before = sum(stats["calls"] for stats in generator.get_parse_stats().values())
+    errors = 0
+    
+    for _ in range(runs):
+        for user_profile, user_input in SAMPLE_REQUESTS:
+            start = time.perf_counter()
+            try:
+                await generator.generate_complete_workout(user_profile, user_input, mode=mode)
+            except Exception as e:
+                errors += 1
+                print(f"❌ {mode}: {e}")
+            latencies.append(time.perf_counter() - start)
+            
+    usage_after = llm_manager.get_usage_stats()
+    parse_stats = generator.get_parse_stats()
+    parsed = sum(stats["calls"] for stats in parse_stats.values()) - calls_before
+    failed = sum(stats["failures"] for stats in parse_stats.values()) - failures_before
+    plans = len(latencies)
+    
+    return {
+        "mode": mode,
+        "plans": plans,
+        "errors": errors,
+        "latency_mean": statistics.mean(latencies),
+        "latency_max": max(latencies),
+        "llm_calls": (usage_after["calls"] - usage_before["calls"]) / plans,
+        "prompt_tokens": (usage_after["prompt_tokens"] - usage_before["prompt_tokens"]) / plans,
+        "completion_tokens": (usage_after["completion_tokens"] - usage_before["completion_tokens"]) / plans,
+        "parse_success": (parsed - failed) / parsed if parsed else 0.0
+    }
+
+def print_report(results: list) -> None:
+    """Stampa il confronto tra le modalità"""
+    header = f"{'modalità':<13}{'schede':>7}{'errori':>7}{'lat. media':>12}{'lat. max':>10}{'chiamate':>10}{'tok. prompt':>13}{'tok. compl.':>13}{'parsing ok':>12}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['mode']:<13}{r['plans']:>7}{r['errors']:>7}"
+            f"{r['latency_mean']:>11.1f}s{r['latency_max']:>9.1f}s{r['llm_calls']:>10.1f}"
+            f"{r['prompt_tokens']:>13.0f}{r['completion_tokens']:>13.0f}{r['parse_success']:>11.0%}"
+        )
+
+async def main(runs: int, modes: list) -> None:
+    """Esegue il benchmark per le modalità richieste"""
+    llm_manager = LLMManager()
+    rag_engine = RAGEngine()
+    await rag_engine.initialize()
+    
+    results = []
+    for mode in modes:
+        # Generatore separato per avere contatori di parsing indipendenti
+        generator = WorkoutGenerator(llm_manager, rag_engine)
+        print(f"⏱️  Modalità {mode}: {runs * len(SAMPLE_REQUESTS)} schede...")
+        results.append(await run_mode(generator, llm_manager, mode, runs))
+        
+    print()
+    print_report(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confronta le modalità di generazione delle schede")
+    parser.add_argument("--runs", type=int, default=1, help="Ripetizioni di ogni richiesta di esempio")
+    parser.add_argument("--modes", nargs="+", choices=GENERATION_MODES, default=list(GENERATION_MODES))
+    args = parser.parse_args()
+    
+    asyncio.run(main(args.runs, args.modes))
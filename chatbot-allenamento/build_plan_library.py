@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Pregenera la libreria di schede per le firme di profilo più richieste
+
+Le firme sono ordinate per frequenza nelle schede già salvate e completate
+con lo spazio dei profili comuni; ogni scheda è generata con WorkoutGenerator
+usando OpenAI e il motore RAG reali.
+
+Uso:
+    python build_plan_library.py --limit 50 --mode multi_stage
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Aggiungi il percorso dell'app al Python path
+sys.path.append(str(Path(__file__).parent))
+
+from app.core.llm_manager import LLMManager
+from app.core.rag_engine import RAGEngine
+from app.core.workout_generator import WorkoutGenerator, GENERATION_MODES
+from app.db.file_storage import FileStorage
+from app.db.plan_library import PlanLibrary, top_signatures, profile_from_signature
+
+def describe_profile(signature: str) -> str:
+    """Richiesta in linguaggio naturale equivalente alla firma"""
+    level, goals, days, duration, equipment = signature.split("|")
+    return (
+        f"Livello {level}, obiettivi: {goals.replace('+', ', ')}. "
+        f"Mi alleno {days} giorni a settimana, sessioni {duration}, attrezzatura: {equipment.replace('_', ' ')}"
+    )
+
+async def main(limit: int, mode: str, overwrite: bool) -> None:
+    """Genera le schede mancanti della libreria"""
+    storage = FileStorage()
+    library = PlanLibrary()
+    llm_manager = LLMManager()
+    rag_engine = RAGEngine()
+    await rag_engine.initialize()
+    generator = WorkoutGenerator(llm_manager, rag_engine)
+    
+    saved_profiles = [
+        workout.get("user_profile") or {}
+        for workout in (storage.load_workout(w["id"]) for w in storage.list_workouts())
+        if workout
+    ]
+    signatures = top_signatures(saved_profiles, limit)
+    existing = set(library.signatures())
+    
+    print(f"📚 Firme selezionate: {len(signatures)} (già in libreria: {len(existing & set(signatures))})")
+    
+    generated = 0
+    for signature in signatures:
+        if signature in existing and not overwrite:
+            continue
+            
+        start = time.perf_counter()
+        try:
+            plan = await generator.generate_complete_workout(
+                profile_from_signature(signature), describe_profile(signature), mode=mode
+            )
+            library.add(plan, signature)
+            generated += 1
+            print(f"✅ {signature} ({time.perf_counter() - start:.1f}s)")
+        except Exception as e:
+            print(f"❌ {signature}: {e}")
+            
+    print(f"✨ Schede generate: {generated}, totale in libreria: {len(library.signatures())}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pregenera la libreria di schede per firma del profilo")
+    parser.add_argument("--limit", type=int, default=50, help="Numero di firme da coprire")
+    parser.add_argument("--mode", choices=GENERATION_MODES, default=GENERATION_MODES[0])
+    parser.add_argument("--overwrite", action="store_true", help="Rigenera anche le firme già presenti")
+    args = parser.parse_args()
+    
+    asyncio.run(main(args.limit, args.mode, args.overwrite))
@@ -15,6 +15,7 @@ directories = [
     base_dir / "app" / "data" / "chats",
     base_dir / "app" / "data" / "workouts", 
     base_dir / "app" / "data" / "indexes",
+    base_dir / "app" / "data" / "plan_library",
 ]
 
 def create_directories():
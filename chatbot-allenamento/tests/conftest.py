@@ -13,13 +13,16 @@ from fastapi.testclient import TestClient
 from app.main import app
 from app.dependencies import (
     get_rag_engine, get_llm_manager, get_file_storage,
-    get_chat_service, get_workout_service
+    get_chat_service, get_workout_service, get_batch_service,
+    get_workout_job_service
 )
 from app.core.rag_engine import RAGEngine
 from app.core.llm_manager import LLMManager
 from app.db.file_storage import FileStorage
 from app.services.chat_service import ChatService
 from app.services.workout_service import WorkoutService
+from app.services.batch_service import BatchWorkoutService
+from app.services.workout_job_service import WorkoutJobService
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -74,6 +77,13 @@ def mock_rag_engine():
         "Contesto di test dal RAG",
         ["fonte1.pdf", "fonte2.pdf"]
     ))
+    mock.retrieve_chunks = AsyncMock(return_value=[
+        {
+            "text": "Contesto di test dal RAG",
+            "metadata": {"source": "fonte1.pdf"},
+            "score": 0.9
+        }
+    ])
     mock.search_documents = AsyncMock(return_value=[
         {
             "text": "Testo di test",
@@ -108,6 +118,11 @@ def mock_file_storage(temp_dir):
     mock.list_workouts = Mock(return_value=[])
     mock.delete_workout = Mock(return_value=True)
     
+    mock.save_workout_variation = Mock()
+    mock.load_workout_variation = Mock(return_value=None)
+    mock.list_workout_variations = Mock(return_value=[])
+    mock.delete_workout_variation = Mock(return_value=False)
+    
     return mock
 
 @pytest.fixture
@@ -120,9 +135,20 @@ def mock_workout_service(mock_file_storage, mock_llm_manager, mock_rag_engine):
     """Mock per WorkoutService"""
     return WorkoutService(mock_file_storage, mock_llm_manager, mock_rag_engine)
 
+@pytest.fixture
+def mock_batch_service(mock_workout_service):
+    """Servizio batch con il servizio workout mockato"""
+    return BatchWorkoutService(mock_workout_service, concurrency=2)
+
+@pytest.fixture
+def mock_workout_job_service(mock_workout_service):
+    """Servizio dei job di generazione con il servizio workout mockato"""
+    return WorkoutJobService(mock_workout_service, concurrency=2)
+
 @pytest.fixture
 def client(mock_rag_engine, mock_llm_manager, mock_file_storage, 
-           mock_chat_service, mock_workout_service):
+           mock_chat_service, mock_workout_service, mock_batch_service,
+           mock_workout_job_service):
     """Client di test FastAPI con dipendenze mockate"""
     
     # Override delle dipendenze
@@ -131,6 +157,8 @@ def client(mock_rag_engine, mock_llm_manager, mock_file_storage,
     app.dependency_overrides[get_file_storage] = lambda: mock_file_storage
     app.dependency_overrides[get_chat_service] = lambda: mock_chat_service
     app.dependency_overrides[get_workout_service] = lambda: mock_workout_service
+    app.dependency_overrides[get_batch_service] = lambda: mock_batch_service
+    app.dependency_overrides[get_workout_job_service] = lambda: mock_workout_job_service
     
     with TestClient(app) as test_client:
         yield test_client
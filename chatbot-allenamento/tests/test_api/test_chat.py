@@ -4,7 +4,7 @@ Test per le API chat
 
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import AsyncMock, Mock
+from unittest.mock import AsyncMock, Mock, patch
 
 class TestChatAPI:
     """Test per gli endpoint chat"""
@@ -66,6 +66,7 @@ class TestChatAPI:
         
         mock_chat_service.is_workout_request = Mock(return_value=True)
         mock_chat_service.send_message = AsyncMock(return_value=(test_chat, user_msg, assistant_msg))
+        mock_chat_service.send_workout_message = AsyncMock(return_value=(test_chat, user_msg, assistant_msg))
         mock_workout_service.generate_workout_plan = AsyncMock(return_value=mock_workout)
         mock_workout_service.format_workout_for_display = Mock(return_value="Scheda formattata")
         
@@ -79,6 +80,63 @@ class TestChatAPI:
         
         assert data["assistant_message"]["type"] == "workout"
         mock_workout_service.generate_workout_plan.assert_called_once()
+        mock_chat_service.send_message.assert_not_called()
+        mock_chat_service.send_workout_message.assert_called_once_with(
+            message_content="Voglio una scheda di allenamento",
+            workout_content="Scheda formattata",
+            chat_id=None,
+            sources=[],
+            workout_id="test-workout"
+        )
+    
+    def test_workout_request_single_generation(self, client: TestClient, mock_chat_service,
+                                               mock_llm_manager, mock_rag_engine, mock_file_storage):
+        """Test una richiesta di scheda esegue una sola generazione e una sola scrittura della chat"""
+        # Il profilo simulato è standard: senza motore a template passa dal modello
+        with patch("app.services.workout_service.settings.TEMPLATE_ENGINE_ENABLED", False):
+            response = client.post("/api/v1/chat/message", json={
+                "message": "Voglio una scheda di allenamento per la forza",
+                "chat_id": None
+            })
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["assistant_message"]["type"] == "workout"
+        
+        # Una sola pipeline di generazione: nessuna risposta chat da scartare
+        mock_llm_manager.extract_user_profile.assert_called_once()
+        mock_llm_manager.generate_workout_response.assert_called_once()
+        mock_llm_manager.generate_chat_response.assert_not_called()
+        mock_rag_engine.retrieve_context.assert_called_once()
+        
+        # Una sola scrittura della chat e una della scheda
+        mock_chat_service.chat_cache.flush()
+        mock_file_storage.save_chat.assert_called_once()
+        mock_file_storage.save_workout.assert_called_once()
+        
+        saved_chat = mock_file_storage.save_chat.call_args[0][0]
+        assert len(saved_chat["messages"]) == 2
+        assert saved_chat["messages"][1]["type"] == "workout"
+    
+    def test_workout_request_template_engine(self, client: TestClient, mock_chat_service,
+                                             mock_llm_manager, mock_rag_engine, mock_file_storage):
+        """Test una richiesta di scheda per un profilo standard non genera testo con il modello"""
+        with patch("app.services.workout_service.settings.TEMPLATE_ENGINE_ENABLED", True):
+            response = client.post("/api/v1/chat/message", json={
+                "message": "Voglio una scheda di allenamento per la forza",
+                "chat_id": None
+            })
+            
+        assert response.status_code == 200
+        assert response.json()["assistant_message"]["type"] == "workout"
+        
+        mock_llm_manager.extract_user_profile.assert_called_once()
+        mock_llm_manager.generate_workout_response.assert_not_called()
+        mock_rag_engine.retrieve_context.assert_not_called()
+        mock_file_storage.save_workout.assert_called_once()
+        
+        saved_workout = mock_file_storage.save_workout.call_args[0][0]
+        assert saved_workout["metadata"]["generated_by"] == "template_engine"
     
     def test_send_message_invalid_input(self, client: TestClient):
         """Test invio messaggio con input non valido"""
@@ -47,6 +47,190 @@ class TestWorkoutAPI:
         
         mock_workout_service.generate_workout_plan.assert_called_once()
     
+    def test_generate_workout_generation_mode(self, client: TestClient, mock_workout_service):
+        """Test la modalità di generazione viene passata al servizio"""
+        mock_workout_service.generate_workout_plan = AsyncMock(side_effect=Exception("stop"))
+        
+        client.post("/api/v1/workout/generate", json={
+            "user_input": "Voglio una scheda per la massa",
+            "generation_mode": "single_shot"
+        })
+        
+        call_kwargs = mock_workout_service.generate_workout_plan.call_args.kwargs
+        assert call_kwargs["generation_mode"] == "single_shot"
+        
+        response = client.post("/api/v1/workout/generate", json={
+            "user_input": "Voglio una scheda per la massa",
+            "generation_mode": "tre_chiamate"
+        })
+        assert response.status_code == 422
+    
+    def test_batch_generation_deduplicates_and_completes(self, client: TestClient, mock_llm_manager):
+        """Test batch con richieste identiche generate una sola volta e stato interrogabile"""
+        import time
+        
+        response = client.post("/api/v1/workout/batch", json={"items": [
+            {"user_input": "Principiante, 3 giorni a settimana", "member_id": "m-1"},
+            {"user_input": "  principiante, 3 giorni a SETTIMANA ", "member_id": "m-2"},
+            {"user_input": "Intermedio, vorrei fare massa", "member_id": "m-3"}
+        ]})
+        
+        assert response.status_code == 202
+        job = response.json()
+        assert job["unique_requests"] == 2
+        assert job["items"][1]["duplicate_of"] == 0
+        
+        for _ in range(50):
+            job = client.get(f"/api/v1/workout/batch/{job['job_id']}").json()
+            if job["status"] == "completed":
+                break
+            time.sleep(0.02)
+            
+        assert job["status"] == "completed"
+        assert job["progress"]["completed"] == 3
+        assert job["items"][0]["workout_id"] == job["items"][1]["workout_id"]
+        assert job["items"][2]["workout_id"] != job["items"][0]["workout_id"]
+        assert mock_llm_manager.extract_user_profile.call_count == 2
+    
+    def test_batch_generation_failures_and_unknown_job(self, client: TestClient, mock_workout_service):
+        """Test errori per singolo elemento e job inesistente"""
+        import time
+        
+        mock_workout_service.generate_workout_plan = AsyncMock(side_effect=Exception("Errore del servizio"))
+        
+        job = client.post("/api/v1/workout/batch", json={"items": [
+            {"user_input": "Principiante, 3 giorni a settimana"}
+        ]}).json()
+        
+        for _ in range(50):
+            job = client.get(f"/api/v1/workout/batch/{job['job_id']}").json()
+            if job["status"] == "failed":
+                break
+            time.sleep(0.02)
+            
+        assert job["status"] == "failed"
+        assert job["items"][0]["error"] == "Errore del servizio"
+        
+        assert client.get("/api/v1/workout/batch/inesistente").status_code == 404
+        assert client.post("/api/v1/workout/batch", json={"items": []}).status_code == 422
+    
+    def test_generate_workout_background_job(self, client: TestClient):
+        """Test generazione in background con avanzamento interrogabile"""
+        import time
+        
+        response = client.post("/api/v1/workout/generate?background=true", json={
+            "user_input": "Principiante, 3 giorni a settimana",
+            "chat_id": "chat-42"
+        })
+        
+        assert response.status_code == 202
+        data = response.json()
+        assert data["success"] is True
+        assert data["workout_plan"] is None
+        assert data["job_id"]
+        
+        for _ in range(50):
+            job = client.get(f"/api/v1/workout/jobs/{data['job_id']}").json()
+            if job["status"] == "completed":
+                break
+            time.sleep(0.02)
+            
+        assert job["status"] == "completed"
+        assert job["chat_id"] == "chat-42"
+        assert job["workout_plan"]["id"]
+        stages = [event["stage"] for event in job["events"]]
+        assert stages[0] == "profile"
+        assert stages[-1] == "completed"
+        assert "saving" in stages
+        
+        assert client.get("/api/v1/workout/jobs/inesistente").status_code == 404
+    
+    def test_workout_job_event_stream(self, client: TestClient):
+        """Test stream SSE degli eventi fino al completamento"""
+        import json
+        
+        job_id = client.post("/api/v1/workout/generate?background=true", json={
+            "user_input": "Intermedio, vorrei fare massa"
+        }).json()["job_id"]
+        
+        with client.stream("GET", f"/api/v1/workout/jobs/{job_id}/events") as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            body = "".join(response.iter_text())
+            
+        events = [block for block in body.split("\n\n") if block.strip()]
+        assert events[0].startswith("event: profile")
+        last_stage, last_data = events[-1].split("\n")
+        assert last_stage == "event: completed"
+        payload = json.loads(last_data[len("data: "):])
+        assert payload["workout_plan"]["id"] == payload["details"]["workout_id"]
+        
+        assert client.get("/api/v1/workout/jobs/inesistente/events").status_code == 404
+    
+    def _read_stream(self, client: TestClient, payload: dict) -> list:
+        """Invia una richiesta di generazione in streaming e restituisce gli eventi"""
+        import json
+        
+        with client.stream("POST", "/api/v1/workout/generate/stream", json=payload) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            body = "".join(response.iter_text())
+            
+        events = []
+        for block in body.split("\n\n"):
+            if not block.strip():
+                continue
+            name_line, data_line = block.split("\n")
+            events.append((name_line[len("event: "):], json.loads(data_line[len("data: "):])))
+        return events
+    
+    def test_stream_generation_sends_days_progressively(self, client: TestClient):
+        """Test in multi_stage i giorni arrivano uno alla volta prima della chiusura"""
+        events = self._read_stream(client, {
+            "user_input": "Principiante, 3 giorni a settimana",
+            "generation_mode": "multi_stage"
+        })
+        names = [name for name, _ in events]
+        
+        assert names[0] == "progress"
+        assert names.count("outline") == 1
+        assert names.count("day") == 3
+        assert names[-1] == "completed"
+        # Ogni giorno è inviato prima della fase di nutrizione, non alla fine
+        first_day = names.index("day")
+        nutrition = next(i for i, (name, data) in enumerate(events) if data.get("stage") == "nutrition")
+        assert names.index("outline") < first_day < nutrition
+        
+        outline = events[names.index("outline")][1]
+        assert outline["html"].startswith('<div class="workout-card">')
+        assert len(outline["days"]) == 3
+        day = events[first_day][1]
+        assert (day["index"], day["total"]) == (1, 3)
+        assert day["html"].startswith('<div class="workout-day">')
+        completed = events[-1][1]
+        assert len(completed["workout_plan"]["workout_days"]) == 3
+        assert completed["html"].endswith("</div>")
+    
+    def test_stream_generation_single_pass_plan(self, client: TestClient):
+        """Test una scheda generata in un solo passaggio viene inviata per intero al termine"""
+        events = self._read_stream(client, {
+            "user_input": "Principiante, 3 giorni a settimana",
+            "generation_mode": "template"
+        })
+        names = [name for name, _ in events]
+        
+        assert names[-5:] == ["outline", "day", "day", "day", "completed"]
+        assert [data["index"] for name, data in events if name == "day"] == [1, 2, 3]
+    
+    def test_stream_generation_error(self, client: TestClient, mock_workout_service):
+        """Test errore di generazione inviato come evento"""
+        mock_workout_service.llm_manager.extract_user_profile = AsyncMock(side_effect=Exception("Errore del servizio"))
+        
+        events = self._read_stream(client, {"user_input": "Voglio una scheda"})
+        
+        assert events[-1][0] == "error"
+        assert "generazione" in events[-1][1]["message"]
+    
     def test_generate_workout_invalid_input(self, client: TestClient):
         """Test generazione scheda con input non valido"""
         response = client.post("/api/v1/workout/generate", json={
@@ -233,6 +417,13 @@ class TestWorkoutAPI:
                 "name": "Scheda Full Body",
                 "description": "Perfetta per principianti",
                 "days": 3,
+                "focus": "Corpo completo",
+                "benefits": "Sviluppo equilibrato"
+            },
+            {
+                "name": "Scheda Upper/Lower",
+                "description": "Ideale per intermedi",
+                "days": 4,
                 "focus": "Divisione corpo",
                 "benefits": "Maggiore volume"
             }
@@ -310,11 +501,4 @@ class TestWorkoutAPI:
         assert response.status_code == 200
         data = response.json()
         assert data["success"] is False
-        assert "Errore nella generazione della scheda" in data["message"]Corpo completo",
-                "benefits": "Sviluppo equilibrato"
-            },
-            {
-                "name": "Scheda Upper/Lower",
-                "description": "Ideale per intermedi",
-                "days": 4,
-                "focus": "
+        assert "Errore nella generazione della scheda" in data["message"]
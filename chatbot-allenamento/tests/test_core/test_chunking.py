@@ -0,0 +1,121 @@
+"""
+Test per la suddivisione dei documenti in frammenti
+"""
+
+from llama_index.core import Document
+from app.core.chunking import (
+    ChunkingPipeline, NearDuplicateFilter, StructureAwareSplitter, simhash, strip_page_furniture
+)
+
+PAGES = [
+    "Il riscaldamento dura dieci minuti e comprende mobilità articolare e serie leggere.",
+    "La panca piana si esegue con le scapole addotte e i piedi ben saldi a terra.",
+    "Lo stacco da terra parte con il bilanciere sopra la metà del piede.",
+    "Il recupero tra le serie pesanti è di almeno tre minuti."
+]
+
+PARAGRAPH = (
+    "Lo squat con bilanciere allena quadricipiti, glutei e adduttori. Durante la discesa "
+    "le ginocchia seguono la direzione delle punte dei piedi e la schiena resta neutra. "
+    "Il carico viene aumentato solo quando tutte le ripetizioni sono eseguite con tecnica corretta."
+)
+
+def _pages():
+    return [
+        Document(
+            text=f"Manuale di allenamento - Capitolo 2\n{content}\nPag. {page} di {len(PAGES)}",
+            metadata={"file_path": "/docs/manuale.pdf", "page_label": str(page)}
+        )
+        for page, content in enumerate(PAGES, start=1)
+    ]
+
+class TestChunking:
+    """Test per pulizia delle pagine, suddivisione per struttura e deduplicazione"""
+    
+    def test_strip_page_furniture(self):
+        """Test intestazioni e numeri di pagina ripetuti rimossi, contenuto invariato"""
+        documents = _pages()
+        cleaned, removed = strip_page_furniture(documents, 0.5)
+        
+        assert len(removed) == 8
+        for page, document in enumerate(cleaned, start=1):
+            assert document.get_content() == PAGES[page - 1]
+            assert document.metadata["page_label"] == str(page)
+        # I documenti originali non vengono modificati
+        assert documents[0].get_content().startswith("Manuale di allenamento")
+        # Con meno di tre pagine nessuna riga è considerata ripetuta
+        assert strip_page_furniture(documents[:2], 0.5)[1] == []
+    
+    def test_strip_page_furniture_keeps_repeated_numeric_content(self):
+        """Test righe con numeri diversi tra le pagine mantenute, numeri di pagina rimossi"""
+        documents = [
+            Document(
+                text=f"{page + 10}\nSquat al {60 + page}% del massimale\nSerie: 4 x {page + 6}\n8",
+                metadata={"file_path": "/docs/scheda.pdf"}
+            )
+            for page in range(1, 6)
+        ]
+        cleaned, removed = strip_page_furniture(documents, 0.5)
+        
+        # Solo il numero di pagina in testa, che avanza con le pagine
+        assert removed == ["11", "12", "13", "14", "15"]
+        for page, document in enumerate(cleaned, start=1):
+            assert document.get_content() == f"Squat al {60 + page}% del massimale\nSerie: 4 x {page + 6}\n8"
+    
+    def test_structure_splitter_keeps_headings_and_tables(self):
+        """Test sezioni divise ai titoli e tabelle lunghe divise ripetendo l'intestazione"""
+        splitter = StructureAwareSplitter(chunk_size=200, chunk_overlap=0)
+        header = "| Settimana | Serie | Ripetizioni | Carico |"
+        rows = [f"| Settimana {week:02d} | 4 serie | 8 ripetizioni | {60 + week}% |" for week in range(1, 41)]
+        text = f"# Riscaldamento\n{PARAGRAPH}\n\n# Progressione\n{header}\n" + "\n".join(rows)
+        
+        chunks = splitter.split_text(text)
+        
+        assert chunks[0].startswith("# Riscaldamento")
+        assert "Settimana" not in chunks[0]
+        table_chunks = chunks[1:]
+        assert len(table_chunks) > 1
+        for chunk in table_chunks:
+            # Ogni parte della tabella mantiene titolo e intestazione delle colonne
+            assert chunk.startswith(f"# Progressione\n{header}\n")
+        assert sum(chunk.count("| Settimana ") for chunk in table_chunks) == len(rows) + len(table_chunks)
+    
+    def test_structure_splitter_respects_chunk_size(self):
+        """Test le parti di una sezione lunga restano entro chunk_size con il titolo ripetuto"""
+        from llama_index.core.utils import get_tokenizer
+        tokenizer = get_tokenizer()
+        splitter = StructureAwareSplitter(chunk_size=128, chunk_overlap=20)
+        text = "# Tecnica di esecuzione dello squat con bilanciere\n" + " ".join([PARAGRAPH] * 20)
+        
+        chunks = splitter.split_text(text)
+        
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert chunk.startswith("# Tecnica di esecuzione")
+            assert len(tokenizer(chunk)) <= 128
+    
+    def test_near_duplicates(self):
+        """Test frammenti quasi uguali scartati, frammenti diversi mantenuti"""
+        near = PARAGRAPH.replace("adduttori", "femorali")
+        assert bin(simhash(PARAGRAPH) ^ simhash(near)).count("1") <= 16
+        assert simhash("Testo breve") is None
+        
+        seen = NearDuplicateFilter(max_distance=3)
+        assert seen.is_duplicate(PARAGRAPH) is False
+        assert seen.is_duplicate(PARAGRAPH.upper()) is True
+        assert seen.is_duplicate("La panca piana si esegue con le scapole addotte e i piedi ben saldi a terra.") is False
+    
+    def test_pipeline_stats(self):
+        """Test pagine ripetute indicizzate una volta sola e token risparmiati"""
+        documents = _pages() + [Document(text=PAGES[1], metadata={"file_path": "/docs/appunti.txt"})]
+        pipeline = ChunkingPipeline(splitter=StructureAwareSplitter(chunk_size=512, chunk_overlap=0))
+        
+        nodes = pipeline(documents)
+        stats = pipeline.get_stats()
+        
+        assert stats["documents"] == 5
+        assert stats["furniture_lines_removed"] == 8
+        assert stats["chunks"] == len(nodes) == stats["chunks_before_dedup"] - stats["duplicate_chunks_removed"]
+        assert stats["duplicate_chunks_removed"] >= 1
+        assert stats["tokens_saved"] > 0
+        assert sum(node.get_content() == PAGES[1] for node in nodes) == 1
@@ -0,0 +1,120 @@
+"""
+Test per il riassunto progressivo delle chat
+"""
+
+import asyncio
+import pytest
+from app.core.conversation_summarizer import ConversationSummarizer, SUMMARY_METADATA_KEY
+from app.services.chat_service import ChatService
+from tests.conftest import create_mock_chat, create_mock_message
+
+def make_long_chat(message_count):
+    """Crea una chat con messaggi utente/assistente alternati"""
+    chat = create_mock_chat()
+    for i in range(message_count):
+        role = "user" if i % 2 == 0 else "assistant"
+        chat.add_message(create_mock_message(role, f"Messaggio {i}"))
+    return chat
+
+class TestConversationSummarizer:
+    """Test per ConversationSummarizer"""
+    
+    @pytest.fixture
+    def summarizer(self, mock_llm_manager):
+        """Summarizer con soglie piccole"""
+        mock_llm_manager.generate_response.return_value = "- Utente principiante, 3 giorni"
+        return ConversationSummarizer(mock_llm_manager, threshold=6, keep_recent=4)
+    
+    def test_short_chat_not_summarized(self, summarizer):
+        """Test le chat sotto soglia non vengono riassunte"""
+        assert summarizer.needs_update(make_long_chat(6)) is False
+        assert summarizer.needs_update(make_long_chat(8)) is True
+    
+    @pytest.mark.asyncio
+    async def test_summarize_older_turns(self, summarizer, mock_llm_manager):
+        """Test il riassunto copre solo i messaggi più vecchi"""
+        chat = make_long_chat(8)
+        
+        state = await summarizer.summarize(chat)
+        
+        assert state["text"] == "- Utente principiante, 3 giorni"
+        assert state["summarized_messages"] == 4
+        request = mock_llm_manager.generate_response.call_args.kwargs["messages"][0]["content"]
+        assert "Messaggio 3" in request
+        assert "Messaggio 4" not in request
+        
+        # summarize non modifica la chat
+        assert chat.metadata is None
+        
+        summarizer.apply(chat, state)
+        assert summarizer.get_summary(chat) == "- Utente principiante, 3 giorni"
+        assert summarizer.get_summarized_count(chat) == 4
+    
+    @pytest.mark.asyncio
+    async def test_incremental_update(self, summarizer, mock_llm_manager):
+        """Test gli aggiornamenti successivi partono dal riassunto precedente"""
+        chat = make_long_chat(8)
+        summarizer.apply(chat, await summarizer.summarize(chat))
+        
+        # Nessun aggiornamento finché non si accumula un nuovo blocco
+        chat.add_message(create_mock_message("user", "Messaggio 8"))
+        assert summarizer.needs_update(chat) is False
+        
+        for i in range(9, 12):
+            chat.add_message(create_mock_message("assistant" if i % 2 else "user", f"Messaggio {i}"))
+            
+        state = await summarizer.summarize(chat)
+        
+        request = mock_llm_manager.generate_response.call_args.kwargs["messages"][0]["content"]
+        assert "- Utente principiante, 3 giorni" in request
+        assert "Messaggio 2" not in request
+        assert "Messaggio 7" in request
+        assert state["summarized_messages"] == 8
+    
+    def test_disabled(self, mock_llm_manager):
+        """Test soglia 0 disattiva il riassunto"""
+        summarizer = ConversationSummarizer(mock_llm_manager, threshold=0, keep_recent=4)
+        
+        assert summarizer.needs_update(make_long_chat(50)) is False
+
+class TestChatServiceSummary:
+    """Test integrazione tra ChatService e riassunto"""
+    
+    @pytest.fixture
+    def service(self, mock_file_storage, mock_llm_manager, mock_rag_engine):
+        """ChatService con soglie di riassunto piccole"""
+        mock_llm_manager.generate_response.return_value = "Riassunto di test"
+        service = ChatService(mock_file_storage, mock_llm_manager, mock_rag_engine)
+        service.summarizer = ConversationSummarizer(mock_llm_manager, threshold=4, keep_recent=2)
+        return service
+    
+    @pytest.mark.asyncio
+    async def test_summary_updated_in_background(self, service, mock_llm_manager):
+        """Test il riassunto viene salvato nei metadati dopo la risposta"""
+        chat, _, _ = await service.send_message("Primo")
+        await service.send_message("Secondo", chat_id=chat.id)
+        
+        mock_llm_manager.generate_response.assert_not_called()
+        
+        await service.send_message("Terzo", chat_id=chat.id)
+        await asyncio.gather(*service._summary_tasks.values())
+        
+        assert chat.metadata[SUMMARY_METADATA_KEY]["text"] == "Riassunto di test"
+        assert chat.metadata[SUMMARY_METADATA_KEY]["summarized_messages"] == 4
+    
+    @pytest.mark.asyncio
+    async def test_prompt_uses_summary_and_recent_messages(self, service, mock_llm_manager):
+        """Test il prompt contiene il riassunto e solo i messaggi non riassunti"""
+        chat = make_long_chat(8)
+        service.summarizer.apply(chat, {"text": "Riassunto di test", "summarized_messages": 6})
+        service.chat_cache.put(chat)
+        
+        await service.send_message("Nuova domanda", chat_id=chat.id)
+        
+        call_kwargs = mock_llm_manager.generate_chat_response.call_args.kwargs
+        assert call_kwargs["summary"] == "Riassunto di test"
+        assert [msg["content"] for msg in call_kwargs["conversation_history"]] == [
+            "Messaggio 6", "Messaggio 7", "Nuova domanda"
+        ]
+        
+        await service.shutdown()
@@ -0,0 +1,61 @@
+"""
+Test per EmbeddingManager
+"""
+
+from unittest.mock import patch
+from llama_index.core import VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import TextNode
+from app.core.embeddings import EmbeddingManager, EMBEDDING_META_FILENAME
+
+def test_index_with_different_dimensions_is_rebuilt(temp_dir):
+    """Test un indice salvato con un'altra dimensione degli embeddings non viene caricato"""
+    manager = EmbeddingManager()
+    index = VectorStoreIndex(
+        [TextNode(text="Lo squat allena le gambe."), TextNode(text="La panca allena il petto.")],
+        embed_model=MockEmbedding(embed_dim=8)
+    )
+    
+    with patch("app.core.embeddings.settings.EMBEDDING_DIMENSIONS", 8), \
+         patch("app.core.embeddings.settings.HYBRID_RETRIEVAL_ENABLED", False):
+        manager.save_index(index, temp_dir)
+        assert (temp_dir / EMBEDDING_META_FILENAME).exists()
+        assert manager.load_index(temp_dir) is not None
+        
+        with patch("app.core.embeddings.settings.EMBEDDING_DIMENSIONS", 4):
+            assert manager.load_index(temp_dir) is None
+
+def test_insert_documents_chunks_pages_together():
+    """Test pagine di un file suddivise insieme e deduplicate rispetto all'indice esistente"""
+    from llama_index.core import Document
+    
+    manager = EmbeddingManager()
+    indexed = "La panca piana si esegue con le scapole addotte e i piedi ben saldi a terra."
+    index = VectorStoreIndex([TextNode(text=indexed)], embed_model=MockEmbedding(embed_dim=8))
+    pages = [
+        "Lo squat si esegue con la schiena neutra e le ginocchia in linea con i piedi.",
+        indexed,
+        "Lo stacco da terra parte con il bilanciere sopra la metà del piede."
+    ]
+    documents = [
+        Document(
+            text=f"Manuale di allenamento\n{content}\nPag. {page} di 3",
+            metadata={"file_path": "/docs/manuale.pdf"}
+        )
+        for page, content in enumerate(pages, start=1)
+    ]
+    
+    nodes = manager.insert_documents(index, documents)
+    
+    assert [node.get_content() for node in nodes] == [pages[0], pages[2]]
+    assert len(index.docstore.docs) == 3
+    stats = manager.chunking.get_stats()
+    assert stats["furniture_lines_removed"] == 6
+    assert stats["duplicate_chunks_removed"] == 1
+    
+    # Le statistiche si sommano tra i caricamenti
+    manager.insert_documents(index, [Document(text=pages[0], metadata={"file_path": "/docs/appunti.txt"})])
+    stats = manager.chunking.get_stats()
+    assert stats["batches"] == 2
+    assert stats["documents"] == 4
+    assert stats["duplicate_chunks_removed"] == 2
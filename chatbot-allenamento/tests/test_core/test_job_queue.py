@@ -0,0 +1,89 @@
+"""
+Test per JobQueue
+"""
+
+import asyncio
+import pytest
+from app.core.job_queue import JobQueue
+
+class TestJobQueue:
+    """Test per la coda di lavori con concorrenza limitata"""
+    
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self):
+        """Test non più di `concurrency` lavori in esecuzione insieme"""
+        queue = JobQueue(concurrency=2)
+        running = 0
+        peak = 0
+        
+        async def job(value):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return value * 2
+            
+        futures = [queue.submit(lambda v=v: job(v)) for v in range(6)]
+        results = await asyncio.gather(*futures)
+        
+        assert results == [0, 2, 4, 6, 8, 10]
+        assert peak == 2
+        assert queue.get_stats()["processed"] == 6
+        await queue.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_failure_does_not_stop_workers(self):
+        """Test un lavoro fallito non blocca quelli successivi"""
+        queue = JobQueue(concurrency=1)
+        
+        async def failing():
+            raise ValueError("errore")
+        
+        async def ok():
+            return "ok"
+            
+        failed = queue.submit(failing)
+        succeeded = queue.submit(ok)
+        
+        with pytest.raises(ValueError):
+            await failed
+        assert await succeeded == "ok"
+        assert queue.get_stats()["failed"] == 1
+        await queue.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_shutdown_cancels_pending(self):
+        """Test i lavori non avviati vengono annullati all'arresto"""
+        queue = JobQueue(concurrency=1)
+        started = asyncio.Event()
+        
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+            
+        running = queue.submit(slow)
+        pending = queue.submit(slow)
+        await started.wait()
+        
+        await queue.shutdown()
+        
+        assert running.cancelled()
+        assert pending.cancelled()
+    
+    @pytest.mark.asyncio
+    async def test_shutdown_workers_skips_unused_services(self, monkeypatch):
+        """Test all'arresto dell'app non vengono creati servizi batch o job mai usati"""
+        from unittest.mock import AsyncMock, Mock
+        from app import dependencies
+        
+        get_workout_service = Mock(side_effect=AssertionError("servizio creato all'arresto"))
+        job_service = Mock(shutdown=AsyncMock())
+        monkeypatch.setattr(dependencies, "get_workout_service", get_workout_service)
+        monkeypatch.setattr(dependencies, "_batch_service", None)
+        monkeypatch.setattr(dependencies, "_workout_job_service", job_service)
+        
+        await dependencies.shutdown_workers()
+        
+        job_service.shutdown.assert_awaited_once()
+        assert dependencies._batch_service is None
@@ -0,0 +1,62 @@
+"""
+Test per il backend locale degli embeddings
+"""
+
+import sys
+import numpy as np
+import pytest
+from unittest.mock import Mock, patch
+from app.core.error_handler import RAGException
+
+class FakeSentenceTransformer:
+    """Modello finto: un vettore per testo, registra i blocchi ricevuti"""
+    
+    def __init__(self, model_path, **kwargs):
+        self.kwargs = kwargs
+        self.calls = []
+    
+    def encode(self, texts, batch_size, **kwargs):
+        self.calls.append((list(texts), batch_size))
+        return np.array([[float(len(text)), 1.0, 0.0, 0.0] for text in texts], dtype=np.float32)
+    
+    def get_sentence_embedding_dimension(self):
+        return 4
+
+@pytest.fixture
+def fake_sentence_transformers():
+    """Modulo sentence_transformers sostituito dal modello finto"""
+    module = Mock(SentenceTransformer=FakeSentenceTransformer)
+    with patch.dict(sys.modules, {"sentence_transformers": module}):
+        yield module
+
+def test_local_backend_batches_texts_and_prefixes_queries(fake_sentence_transformers):
+    """Test indicizzazione a blocchi e prefisso delle query con il modello locale"""
+    from app.core.embeddings import create_embed_model, embedding_model_name
+    from app.core.local_embeddings import LocalEmbedding
+    
+    with patch("app.core.embeddings.settings.EMBEDDING_BACKEND", "local"), \
+         patch("app.core.embeddings.settings.LOCAL_EMBEDDING_MODEL_PATH", "/modelli/multilingual-e5-small/"), \
+         patch("app.core.embeddings.settings.LOCAL_EMBEDDING_RUNTIME", "onnx"), \
+         patch("app.core.embeddings.settings.LOCAL_EMBEDDING_QUERY_PREFIX", "query: "), \
+         patch("app.core.embeddings.settings.EMBEDDING_BATCH_SIZE", 2):
+        model = create_embed_model()
+        assert embedding_model_name() == "local:multilingual-e5-small"
+        
+    assert isinstance(model, LocalEmbedding)
+    assert model._model.kwargs["backend"] == "onnx"
+    assert model._model.kwargs["local_files_only"] is True
+    assert model.dimension == 4
+    
+    vectors = model.get_text_embedding_batch(["a", "bb", "ccc"])
+    assert [vector[0] for vector in vectors] == [1.0, 2.0, 3.0]
+    assert all(batch_size == 2 for _, batch_size in model._model.calls)
+    
+    model.get_query_embedding("squat")
+    assert model._model.calls[-1][0] == ["query: squat"]
+
+def test_invalid_runtime(fake_sentence_transformers):
+    """Test runtime locale non valido"""
+    from app.core.local_embeddings import LocalEmbedding
+    
+    with pytest.raises(RAGException):
+        LocalEmbedding(model_path="/modelli/e5", runtime="tensorrt")
@@ -0,0 +1,58 @@
+"""
+Test per l'indice dei metadati e l'assegnazione degli argomenti
+"""
+
+import pytest
+from app.core.error_handler import RAGException
+from app.core.metadata_index import MetadataIndex, assign_topics
+
+RECORDS = [
+    ("n1", {"source": "nutrizione", "file_type": "pdf", "topics": "nutrizione"}, "d1", 900),
+    ("n2", {"source": "nutrizione", "file_type": "pdf", "topics": "nutrizione,recupero"}, "d1", 1600),
+    ("n3", {"source": "manuale", "file_type": "docx", "topics": "esercizi"}, "d2", 700),
+    ("n4", {"source": "manuale", "file_type": "docx", "topics": ""}, "d3", 300)
+]
+
+class TestMetadataIndex:
+    """Test per i filtri sui metadati e la tabella delle fonti"""
+    
+    def test_assign_topics(self):
+        """Test argomenti assegnati dalle parole chiave, non da una menzione isolata"""
+        assert assign_topics("Le proteine e i carboidrati vanno distribuiti nei pasti.") == ["nutrizione"]
+        assert assign_topics("Lo stacco rumeno: tecnica di esecuzione con il bilanciere.") == ["esercizi"]
+        assert assign_topics("Bevi acqua prima di iniziare.") == []
+    
+    def test_match_filters(self):
+        """Test valori dello stesso campo in OR, campi diversi in AND"""
+        index = MetadataIndex.from_records(RECORDS)
+        
+        assert index.match(None) is None
+        assert index.match({"topic": "nutrizione"}) == {"n1", "n2"}
+        assert index.match({"topic": ["esercizi", "recupero"]}) == {"n2", "n3"}
+        assert index.match({"file_type": "docx", "topic": "esercizi"}) == {"n3"}
+        assert index.match({"source": "assente"}) == frozenset()
+        # Stesso filtro, stesso insieme: la conversione in righe dell'indice compatto resta in cache
+        assert index.match({"topic": "nutrizione"}) is index.match({"topic": "nutrizione"})
+        with pytest.raises(RAGException):
+            index.match({"autore": "x"})
+    
+    def test_sources_table_and_persistence(self, temp_dir):
+        """Test tabella delle fonti calcolata una volta e salvata con l'indice"""
+        index = MetadataIndex.from_records(RECORDS)
+        path = temp_dir / "metadata_index.json"
+        index.save(path)
+        
+        loaded = MetadataIndex.load(path)
+        
+        assert loaded.sources["nutrizione"] == {
+            "document_count": 1,
+            "chunk_count": 2,
+            "total_characters": 1600,
+            "file_types": ["pdf"],
+            "topics": {"nutrizione": 2, "recupero": 1}
+        }
+        assert loaded.sources["manuale"]["document_count"] == 2
+        assert loaded.sources["manuale"]["total_characters"] == 1000
+        assert loaded.match({"topic": "recupero"}) == {"n2"}
+        assert loaded.field_values("file_type") == {"docx": 2, "pdf": 2}
+        assert MetadataIndex.load(temp_dir / "assente.json") is None
@@ -0,0 +1,89 @@
+"""
+Test per la composizione dei prompt chat
+"""
+
+import pytest
+from unittest.mock import AsyncMock
+from app.core.prompt_builder import PromptBuilder
+from app.core.llm_manager import LLMManager
+from app.core.token_budget import TokenCounter, MESSAGE_OVERHEAD_TOKENS
+
+class TestPromptBuilder:
+    """Test per PromptBuilder"""
+    
+    @pytest.fixture
+    def builder(self):
+        """Builder con stima sui caratteri (4 caratteri = 1 token)"""
+        counter = TokenCounter()
+        counter.encoding = None
+        return PromptBuilder(token_counter=counter)
+    
+    def test_context_added_to_last_user_message(self, builder):
+        """Test il contesto viene anteposto all'ultima domanda"""
+        history = [
+            {"role": "user", "content": "Prima domanda"},
+            {"role": "assistant", "content": "Risposta"},
+            {"role": "user", "content": "Seconda domanda"}
+        ]
+        
+        prompt = builder.build_chat_messages("Sistema", history, context="Contesto RAG")
+        
+        assert prompt.messages[0] == {"role": "system", "content": "Sistema"}
+        assert prompt.messages[1]["content"] == "Prima domanda"
+        assert "Contesto RAG" in prompt.messages[-1]["content"]
+        assert "Seconda domanda" in prompt.messages[-1]["content"]
+    
+    def test_history_not_mutated(self, builder):
+        """Test la cronologia ricevuta non viene modificata"""
+        history = [{"role": "user", "content": "Domanda"}]
+        
+        builder.build_chat_messages("Sistema", history, context="Contesto RAG")
+        builder.build_chat_messages("Sistema", history, context="Contesto RAG")
+        
+        assert history == [{"role": "user", "content": "Domanda"}]
+    
+    def test_summary_in_system_message(self, builder):
+        """Test il riassunto viene aggiunto al prompt di sistema"""
+        prompt = builder.build_chat_messages(
+            "Sistema", [{"role": "user", "content": "Domanda"}], summary="Utente principiante"
+        )
+        
+        assert prompt.messages[0]["content"].startswith("Sistema")
+        assert "Utente principiante" in prompt.messages[0]["content"]
+        assert prompt.token_counts["summary"] > 0
+    
+    def test_token_counts(self, builder):
+        """Test il conteggio dei token per sezione"""
+        history = [{"role": "user", "content": "abcd" * 2}]
+        
+        prompt = builder.build_chat_messages("abcd" * 5, history)
+        
+        assert prompt.token_counts["system"] == 5 + MESSAGE_OVERHEAD_TOKENS
+        assert prompt.token_counts["history"] == 2 + MESSAGE_OVERHEAD_TOKENS
+        assert prompt.token_counts["context"] == 0
+        assert prompt.token_counts["total"] == 7 + 2 * MESSAGE_OVERHEAD_TOKENS
+    
+    def test_static_segment_counted_once(self, builder):
+        """Test il prompt di sistema statico viene contato una sola volta"""
+        builder.build_chat_messages("Sistema statico", [])
+        builder.token_counter.encoding = "non usato"
+        
+        # Un nuovo conteggio fallirebbe con l'encoding non valido
+        prompt = builder.build_chat_messages("Sistema statico", [])
+        
+        assert prompt.token_counts["system"] == 4 + MESSAGE_OVERHEAD_TOKENS
+
+@pytest.mark.asyncio
+async def test_generate_chat_response_uses_builder():
+    """Test LLMManager invia i messaggi composti senza modificare la cronologia"""
+    manager = LLMManager()
+    manager.generate_response = AsyncMock(return_value="Risposta")
+    history = [{"role": "user", "content": "Domanda"}]
+    
+    result = await manager.generate_chat_response(history, "Contesto RAG", "Sistema")
+    
+    assert result == "Risposta"
+    messages = manager.generate_response.call_args.kwargs["messages"]
+    assert messages[0]["role"] == "system"
+    assert "Contesto RAG" in messages[-1]["content"]
+    assert history == [{"role": "user", "content": "Domanda"}]
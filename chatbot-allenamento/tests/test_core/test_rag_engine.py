@@ -117,15 +117,16 @@ class TestRAGEngine:
         test_file = temp_dir / "test.txt"
         test_file.write_text("Contenuto di test")
         
-        rag_engine.embedding_manager._load_single_document = Mock(
-            return_value=[Mock(text="Contenuto di test")]
-        )
+        documents = [Mock(text="Pagina 1"), Mock(text="Pagina 2")]
+        rag_engine.embedding_manager._load_single_document = Mock(return_value=documents)
+        rag_engine.embedding_manager.insert_documents = Mock()
         rag_engine.embedding_manager.update_documents = Mock()
         rag_engine.embedding_manager.save_index = Mock()
         
         await rag_engine.add_documents([test_file])
         
-        rag_engine.index.insert.assert_called()
+        # Tutte le pagine in un'unica suddivisione
+        rag_engine.embedding_manager.insert_documents.assert_called_once_with(rag_engine.index, documents)
         rag_engine.embedding_manager.update_documents.assert_called()
         rag_engine.embedding_manager.save_index.assert_called()
     
@@ -206,7 +207,7 @@ class TestRAGEngine:
         """Test gestione errori nell'aggiunta documenti"""
         rag_engine._initialized = True
         rag_engine.index = Mock()
-        rag_engine.index.insert = Mock(side_effect=Exception("Insert error"))
+        rag_engine.embedding_manager.insert_documents = Mock(side_effect=Exception("Insert error"))
         
         test_file = temp_dir / "test.txt"
         test_file.write_text("Test content")
@@ -219,3 +220,94 @@ class TestRAGEngine:
             await rag_engine.add_documents([test_file])
         
         assert "Errore nell'aggiunta documenti" in str(exc_info.value)
+    
+    @pytest.mark.asyncio
+    async def test_hybrid_retrieval_finds_exact_terms(self, rag_engine):
+        """Test recupero ibrido: l'indice lessicale porta in cima il frammento con i termini esatti"""
+        from llama_index.core import VectorStoreIndex
+        from llama_index.core.embeddings import MockEmbedding
+        from llama_index.core.schema import TextNode
+        
+        texts = [
+            "Il recupero tra le serie dipende dall'obiettivo.",
+            "Lo squat è un esercizio fondamentale per le gambe.",
+            "Lo stacco rumeno allena femorali e glutei."
+        ]
+        # Embedding costanti: la classifica vettoriale non distingue i frammenti
+        index = VectorStoreIndex([TextNode(text=text) for text in texts], embed_model=MockEmbedding(embed_dim=8))
+        rag_engine.index = index
+        rag_engine.query_engine = Mock()
+        rag_engine._initialized = True
+        rag_engine.embedding_manager.build_sparse_index(index)
+        
+        with patch('app.core.rag_engine.settings.TOP_K_DOCUMENTS', 2):
+            chunks = await rag_engine.retrieve_chunks("stacco rumeno")
+            
+        rag_engine.query_engine.query.assert_not_called()
+        assert len(chunks) == 2
+        assert chunks[0]["text"] == texts[2]
+        assert chunks[0]["score"] > chunks[1]["score"]
+        assert rag_engine.get_index_stats()["hybrid_retrieval"] is True
+    
+    @pytest.mark.asyncio
+    async def test_two_stage_retrieval_reranks_candidates(self, rag_engine):
+        """Test recupero in due fasi: candidati senza soglia, riclassificati e ridotti, latenze per fase"""
+        from llama_index.core import VectorStoreIndex
+        from llama_index.core.embeddings import MockEmbedding
+        from llama_index.core.schema import TextNode
+        
+        texts = [
+            "Il recupero tra le serie dipende dall'obiettivo.",
+            "Lo squat è un esercizio fondamentale per le gambe.",
+            "Lo stacco rumeno allena femorali e glutei."
+        ]
+        index = VectorStoreIndex([TextNode(text=text) for text in texts], embed_model=MockEmbedding(embed_dim=8))
+        rag_engine.index = index
+        rag_engine.query_engine = Mock()
+        rag_engine._initialized = True
+        
+        with patch('app.core.rag_engine.settings.RERANK_ENABLED', True), \
+             patch('app.core.rag_engine.settings.HYBRID_RETRIEVAL_ENABLED', False), \
+             patch('app.core.rag_engine.settings.RERANK_TOP_K', 1):
+            chunks = await rag_engine.retrieve_chunks("stacco rumeno")
+            
+        rag_engine.query_engine.query.assert_not_called()
+        assert [chunk["text"] for chunk in chunks] == [texts[2]]
+        assert "retrieval_score" in chunks[0]
+        timings = rag_engine.get_index_stats()["retrieval_timings"]
+        assert set(timings) == {"first_stage", "rerank", "total"}
+        assert timings["rerank"]["calls"] == 1
+        
+        # I candidati senza pertinenza non vengono restituiti anche se RERANK_TOP_K ne ammette di più
+        with patch('app.core.rag_engine.settings.RERANK_ENABLED', True), \
+             patch('app.core.rag_engine.settings.HYBRID_RETRIEVAL_ENABLED', False), \
+             patch('app.core.rag_engine.settings.RERANK_TOP_K', 3), \
+             patch('app.core.rag_engine.settings.RERANK_MIN_SCORE', 0.1):
+            chunks = await rag_engine.retrieve_chunks("stacco rumeno")
+            
+        assert [chunk["text"] for chunk in chunks] == [texts[2]]
+    
+    @pytest.mark.asyncio
+    async def test_filtered_search_by_topic(self, rag_engine):
+        """Test ricerca filtrata: solo i frammenti dell'argomento, tabella delle fonti precalcolata"""
+        from llama_index.core import VectorStoreIndex
+        from llama_index.core.embeddings import MockEmbedding
+        from llama_index.core.schema import TextNode
+        
+        nodes = [
+            TextNode(text="Proteine e carboidrati nei pasti dopo l'allenamento.", metadata={"source": "nutrizione", "file_type": "pdf"}),
+            TextNode(text="Lo squat con bilanciere: tecnica di esecuzione.", metadata={"source": "manuale", "file_type": "pdf"})
+        ]
+        index = VectorStoreIndex(nodes, embed_model=MockEmbedding(embed_dim=8))
+        rag_engine.index = index
+        rag_engine._initialized = True
+        rag_engine.embedding_manager.build_metadata_index(index)
+        
+        with patch('app.core.rag_engine.settings.HYBRID_RETRIEVAL_ENABLED', False):
+            results = await rag_engine.search_documents("cosa mangiare", filters={"topic": "nutrizione"})
+            
+        assert [result["metadata"]["source"] for result in results] == ["nutrizione"]
+        summary = await rag_engine.get_sources_summary()
+        assert {row["source"]: row["chunk_count"] for row in summary} == {"manuale": 1, "nutrizione": 1}
+        assert rag_engine.get_index_stats()["topics"] == {"esercizi": 1, "nutrizione": 1}
+
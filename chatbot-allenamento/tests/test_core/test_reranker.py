@@ -0,0 +1,88 @@
+"""
+Test per la riclassificazione dei frammenti recuperati
+"""
+
+import sys
+import types
+import numpy as np
+import pytest
+from app.core.error_handler import RAGException
+from app.core.reranker import CrossEncoderReranker, LexicalReranker, Reranker, create_reranker
+from app.core.sparse_index import BM25Index
+
+TEXTS = [
+    "Il recupero tra le serie dipende dall'obiettivo dell'allenamento.",
+    "Il rumeno è una lingua; lo stacco da terra allena la catena posteriore.",
+    "Lo stacco rumeno allena femorali e glutei mantenendo le gambe quasi tese."
+]
+
+class TestReranker:
+    """Test per i riclassificatori lessicale e cross-encoder"""
+    
+    def test_lexical_prefers_query_phrase(self):
+        """Test i termini consecutivi della query contano più dei termini sparsi"""
+        scores = LexicalReranker().score("come si esegue lo stacco rumeno", TEXTS)
+        
+        assert scores[2] > scores[1] > scores[0]
+        assert all(0.0 <= score <= 1.0 for score in scores)
+    
+    def test_lexical_idf_weights(self):
+        """Test con l'indice BM25 i termini rari pesano più di quelli comuni"""
+        sparse_index = BM25Index.from_texts(
+            [(str(i), text) for i, text in enumerate(TEXTS)] + [("extra", "Lo stacco da terra con bilanciere.")]
+        )
+        texts = ["Esercizi di stacco con bilanciere.", "Varianti rumeno e sumo."]
+        
+        uniform = LexicalReranker().score("stacco rumeno", texts)
+        weighted = LexicalReranker(sparse_index).score("stacco rumeno", texts)
+        
+        assert uniform[0] == uniform[1]
+        assert weighted[1] > weighted[0]
+    
+    def test_lexical_irrelevant_candidate_scores_zero(self):
+        """Test un candidato senza termini della query ha pertinenza nulla anche se primo in prima fase"""
+        scores = LexicalReranker().score("stacco rumeno", TEXTS)
+        
+        assert scores[0] == 0.0
+        assert scores[2] == 1.0
+    
+    def test_lexical_empty_query(self):
+        """Test query senza termini utili: punteggi nulli"""
+        assert LexicalReranker().score("e la", TEXTS) == [0.0, 0.0, 0.0]
+        assert LexicalReranker().score("stacco", []) == []
+    
+    def test_cross_encoder(self, monkeypatch):
+        """Test cross-encoder: logit convertiti in probabilità, modello letto in locale su CPU"""
+        calls = {}
+        
+        class FakeCrossEncoder:
+            def __init__(self, model_path, **kwargs):
+                calls["init"] = (model_path, kwargs)
+            
+            def predict(self, pairs, **kwargs):
+                calls["pairs"] = pairs
+                return np.array([-2.0, 0.0, 3.0])
+                
+        monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(CrossEncoder=FakeCrossEncoder))
+        
+        reranker = create_reranker("cross_encoder", "/modelli/reranker")
+        scores = reranker.score("stacco rumeno", TEXTS)
+        
+        assert isinstance(reranker, CrossEncoderReranker)
+        assert calls["init"] == ("/modelli/reranker", {"device": "cpu", "local_files_only": True})
+        assert calls["pairs"][2] == ("stacco rumeno", TEXTS[2])
+        assert scores[1] == pytest.approx(0.5)
+        assert scores[0] < scores[1] < scores[2]
+    
+    def test_invalid_reranker(self):
+        """Test riclassificatore non previsto"""
+        with pytest.raises(RAGException):
+            create_reranker("bm25")
+    
+    def test_reranker_without_score_is_rejected(self):
+        """Test un riclassificatore senza score non può essere creato"""
+        class Unscored(Reranker):
+            name = "unscored"
+            
+        with pytest.raises(TypeError):
+            Unscored()
@@ -0,0 +1,64 @@
+"""
+Test per RetrievalCache
+"""
+
+import pytest
+from unittest.mock import AsyncMock
+from app.core.retrieval_cache import RetrievalCache
+
+def make_chunk(text, source, score):
+    """Crea un frammento come restituito da RAGEngine.retrieve_chunks"""
+    return {"text": text, "metadata": {"source": source}, "score": score}
+
+class TestRetrievalCache:
+    """Test per il recupero mirato con cache per richiesta"""
+    
+    @pytest.fixture
+    def retrieval(self, mock_rag_engine):
+        """Cache con al massimo due frammenti per fase"""
+        return RetrievalCache(mock_rag_engine, max_chunks=2)
+    
+    @pytest.mark.asyncio
+    async def test_repeated_query_served_from_cache(self, retrieval, mock_rag_engine):
+        """Test una query ripetuta non interroga di nuovo il RAG"""
+        await retrieval.get_chunks("esercizi petto")
+        await retrieval.get_chunks("  Esercizi   PETTO ")
+        
+        mock_rag_engine.retrieve_chunks.assert_called_once()
+        assert retrieval.get_stats()["cache_hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_context_deduplicated_and_limited(self, retrieval, mock_rag_engine):
+        """Test frammenti duplicati tra query inclusi una sola volta"""
+        mock_rag_engine.retrieve_chunks = AsyncMock(side_effect=[
+            [make_chunk("Panca piana", "petto.pdf", 0.9), make_chunk("Croci", "petto.pdf", 0.5)],
+            [make_chunk("Panca piana", "petto.pdf", 0.9), make_chunk("Dip", "tricipiti.pdf", 0.8)]
+        ])
+        
+        context, sources = await retrieval.get_context("esercizi petto", "esercizi tricipiti")
+        
+        assert context == "Panca piana\n\nDip"
+        assert sources == ["petto.pdf", "tricipiti.pdf"]
+        assert retrieval.get_stats()["unique_chunks"] == 3
+    
+    @pytest.mark.asyncio
+    async def test_retrieval_error_gives_empty_context(self, retrieval, mock_rag_engine):
+        """Test un errore di recupero non blocca la fase"""
+        mock_rag_engine.retrieve_chunks = AsyncMock(side_effect=Exception("indice non pronto"))
+        
+        context, sources = await retrieval.get_context("nutrizione")
+        
+        assert context == ""
+        assert sources == []
+    
+    @pytest.mark.asyncio
+    async def test_filtered_query_falls_back_to_whole_index(self, retrieval, mock_rag_engine):
+        """Test senza frammenti per i filtri la fase cerca nell'intero indice"""
+        mock_rag_engine.retrieve_chunks = AsyncMock(side_effect=[[], [make_chunk("Proteine", "manuale.pdf", 0.8)]])
+        
+        context, _ = await retrieval.get_context("proteine", filters={"topic": "nutrizione"})
+        
+        assert context == "Proteine"
+        first, second = mock_rag_engine.retrieve_chunks.call_args_list
+        assert first.kwargs == {"filters": {"topic": "nutrizione"}}
+        assert second.kwargs == {}
@@ -0,0 +1,161 @@
+"""
+Test per SingleFlight e la deduplicazione delle richieste identiche
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock
+from app.core.single_flight import SingleFlight, request_key, normalize_text
+from app.core.llm_manager import LLMManager
+
+class TestSingleFlight:
+    """Test per l'esecuzione unica delle richieste contemporanee"""
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_requests_run_once(self):
+        """Test richieste con la stessa chiave condividono un solo calcolo"""
+        single_flight = SingleFlight()
+        calls = []
+        
+        async def compute(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value * 2
+            
+        results = await asyncio.gather(
+            single_flight.do("a", lambda: compute(1)),
+            single_flight.do("a", lambda: compute(1)),
+            single_flight.do("b", lambda: compute(5))
+        )
+        
+        assert results == [2, 2, 10]
+        assert calls == [1, 5]
+        assert single_flight.get_stats() == {"calls": 3, "executions": 2, "coalesced": 1, "in_flight": 0}
+        
+        # A calcolo concluso la chiave viene liberata: nessuna cache
+        assert await single_flight.do("a", lambda: compute(1)) == 2
+        assert calls == [1, 5, 1]
+    
+    @pytest.mark.asyncio
+    async def test_exception_shared_by_waiters(self):
+        """Test l'errore del calcolo raggiunge tutte le richieste accodate"""
+        single_flight = SingleFlight()
+        
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("errore")
+            
+        results = await asyncio.gather(
+            single_flight.do("k", failing),
+            single_flight.do("k", failing),
+            return_exceptions=True
+        )
+        
+        assert all(isinstance(result, ValueError) for result in results)
+        assert single_flight.get_stats()["executions"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_cancellation_only_when_all_waiters_cancel(self):
+        """Test il calcolo prosegue finché almeno una richiesta lo attende"""
+        single_flight = SingleFlight()
+        started = asyncio.Event()
+        release = asyncio.Event()
+        
+        async def compute():
+            started.set()
+            await release.wait()
+            return "ok"
+            
+        first = asyncio.create_task(single_flight.do("k", compute))
+        second = asyncio.create_task(single_flight.do("k", compute))
+        await started.wait()
+        
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await second == "ok"
+        
+        release.clear()
+        lone = asyncio.create_task(single_flight.do("k", compute))
+        await asyncio.sleep(0.01)
+        lone.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await lone
+        await asyncio.sleep(0)
+        assert single_flight.get_stats()["in_flight"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_notifications_reach_all_listeners(self):
+        """Test le notifiche del calcolo arrivano a tutte le richieste accodate"""
+        single_flight = SingleFlight()
+        first_events, second_events = [], []
+        
+        async def compute():
+            await asyncio.sleep(0.01)
+            single_flight.notify("k", "fase", {})
+            return "ok"
+        
+        def broken_listener(stage, details):
+            raise RuntimeError("listener rotto")
+            
+        await asyncio.gather(
+            single_flight.do("k", compute, listener=lambda *args: first_events.append(args)),
+            single_flight.do("k", compute, listener=broken_listener),
+            single_flight.do("k", compute, listener=lambda *args: second_events.append(args))
+        )
+        
+        assert first_events == second_events == [("fase", {})]
+    
+    def test_request_key_normalization(self):
+        """Test chiavi uguali per richieste che differiscono solo per spazi e maiuscole"""
+        assert normalize_text("  Scheda   per la MASSA ") == "scheda per la massa"
+        assert request_key(normalize_text("Scheda  massa"), None) == request_key(normalize_text("scheda massa"), None)
+        assert request_key("scheda massa", None) != request_key("scheda massa", "single_shot")
+
+@pytest.mark.asyncio
+async def test_llm_manager_coalesces_identical_calls():
+    """Test chiamate identiche contemporanee al modello eseguite una sola volta"""
+    manager = LLMManager()
+    
+    async def create(**kwargs):
+        await asyncio.sleep(0.01)
+        return Mock(choices=[Mock(message=Mock(content="Risposta"))], usage=None)
+        
+    manager.client = Mock()
+    manager.client.chat.completions.create = AsyncMock(side_effect=create)
+    messages = [{"role": "user", "content": "Come si esegue lo squat?"}]
+    
+    results = await asyncio.gather(
+        manager.generate_response(messages=messages),
+        manager.generate_response(messages=[{"role": "user", "content": "Come si esegue  lo squat? "}]),
+        manager.generate_response(messages=messages, temperature=0.1)
+    )
+    
+    assert results == ["Risposta"] * 3
+    assert manager.client.chat.completions.create.call_count == 2
+    assert manager.get_coalescing_stats()["coalesced"] == 1
+    assert manager.get_usage_stats()["calls"] == 2
+
+@pytest.mark.asyncio
+async def test_workout_service_coalesces_identical_generations(mock_workout_service, mock_llm_manager):
+    """Test generazioni identiche contemporanee condividono la stessa scheda"""
+    async def slow_profile(user_input):
+        await asyncio.sleep(0.01)
+        return {"experience_level": "principiante", "goals": ["fitness_generale"], "available_days": 3}
+        
+    mock_llm_manager.extract_user_profile = AsyncMock(side_effect=slow_profile)
+    events = []
+    
+    plans = await asyncio.gather(
+        mock_workout_service.generate_workout_plan("Principiante, 3 giorni"),
+        mock_workout_service.generate_workout_plan(
+            "  principiante,  3 GIORNI", progress=lambda stage, details: events.append(stage)
+        ),
+        mock_workout_service.generate_workout_plan("Principiante, 3 giorni", generation_mode="template")
+    )
+    
+    assert plans[0] is plans[1]
+    assert plans[2] is not plans[0]
+    assert mock_llm_manager.extract_user_profile.call_count == 2
+    assert events[-1] == "saving"
+    assert mock_workout_service.get_coalescing_stats()["coalesced"] == 1
@@ -0,0 +1,59 @@
+"""
+Test per l'indice lessicale BM25 e la fusione delle classifiche
+"""
+
+import pytest
+from app.core.sparse_index import BM25Index, analyze, stem_italian, reciprocal_rank_fusion
+
+CHUNKS = [
+    ("n1", "Lo stacco rumeno allena femorali e glutei mantenendo le gambe quasi tese."),
+    ("n2", "La panca inclinata enfatizza la parte alta del petto."),
+    ("n3", "Il recupero tra le serie dipende dall'obiettivo dell'allenamento."),
+    ("n4", "Lo squat è un esercizio fondamentale per le gambe.")
+]
+
+class TestSparseIndex:
+    """Test per l'analisi del testo e la ricerca BM25"""
+    
+    def test_analyze_italian(self):
+        """Test stopword rimosse, accenti normalizzati e forme flesse unificate"""
+        assert analyze("Le panche inclinate") == analyze("la panca inclinata")
+        assert analyze("stacchi rumeni") == analyze("Stacco rumeno")
+        assert analyze("dell'allenamento") == [stem_italian("allenamento")]
+        assert stem_italian("esercizio") == stem_italian("esercizi")
+        assert "perche" not in analyze("Perché")
+    
+    def test_search_ranks_exact_terms(self):
+        """Test i frammenti con i termini esatti vengono prima"""
+        index = BM25Index.from_texts(CHUNKS)
+        
+        results = index.search("Come si esegue lo stacco rumeno?", top_k=3)
+        
+        assert results[0][0] == "n1"
+        assert [node_id for node_id, _ in index.search("panche inclinate", top_k=3)] == ["n2"]
+        assert index.search("ciao come stai", top_k=3) == []
+        # Filtro sui metadati: solo i frammenti ammessi
+        assert [node_id for node_id, _ in index.search("gambe", top_k=3, node_ids={"n4"})] == ["n4"]
+        assert index.search("stacco rumeno", top_k=3, node_ids=set()) == []
+    
+    def test_save_load_and_remove(self, temp_dir):
+        """Test persistenza e rimozione dei frammenti"""
+        index = BM25Index.from_texts(CHUNKS)
+        index.remove("n1")
+        path = temp_dir / "sparse_index.json"
+        index.save(path)
+        
+        loaded = BM25Index.load(path)
+        
+        assert len(loaded) == 3
+        assert loaded.search("stacco rumeno", top_k=3) == []
+        assert loaded.search("squat gambe", top_k=3) == index.search("squat gambe", top_k=3)
+        assert BM25Index.load(temp_dir / "assente.json") is None
+    
+    def test_reciprocal_rank_fusion(self):
+        """Test la fusione premia gli elementi presenti in entrambe le classifiche"""
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=60)
+        
+        assert fused[0][0] == "c"
+        assert {item_id for item_id, _ in fused} == {"a", "b", "c", "d"}
+        assert fused[0][1] == pytest.approx(1 / 63 + 1 / 61)
@@ -0,0 +1,122 @@
+"""
+Test per TemplateWorkoutEngine
+"""
+
+import pytest
+from app.core.template_engine import TemplateWorkoutEngine
+from app.core.exercise_catalog import EXERCISE_CATALOG, resolve_equipment, resolve_injuries
+from app.models.workout import UserProfile, ExperienceLevel, WorkoutGoal
+
+def make_profile(**overrides):
+    """Crea un profilo standard con eventuali modifiche"""
+    data = {
+        "experience_level": ExperienceLevel.INTERMEDIATE,
+        "goals": [WorkoutGoal.HYPERTROPHY],
+        "available_days": 4,
+        "session_duration": 60
+    }
+    data.update(overrides)
+    return UserProfile(**data)
+
+def exercise_names(workout_plan):
+    """Nomi di tutti gli esercizi della scheda"""
+    return [exercise.name for day in workout_plan.workout_days for exercise in day.exercises]
+
+class TestTemplateWorkoutEngine:
+    """Test per il motore di schede a template"""
+    
+    @pytest.fixture
+    def engine(self):
+        return TemplateWorkoutEngine()
+    
+    @pytest.mark.parametrize("days", [2, 3, 4, 5])
+    def test_generate_days_match_profile(self, engine, days):
+        """Test la scheda ha un giorno per ogni allenamento settimanale"""
+        workout_plan = engine.generate(make_profile(available_days=days))
+        
+        assert len(workout_plan.workout_days) == days
+        assert all(day.exercises for day in workout_plan.workout_days)
+        assert workout_plan.metadata["generated_by"] == "template_engine"
+    
+    def test_generate_is_deterministic(self, engine):
+        """Test lo stesso profilo produce la stessa scheda"""
+        profile = make_profile()
+        
+        first = engine.generate(profile)
+        second = engine.generate(profile)
+        
+        assert exercise_names(first) == exercise_names(second)
+        assert first.id != second.id
+    
+    def test_repeated_days_rotate_variants(self, engine):
+        """Test le giornate ripetute usano esercizi diversi"""
+        workout_plan = engine.generate(make_profile(available_days=4))
+        first_upper, _, second_upper, _ = workout_plan.workout_days
+        
+        assert first_upper.focus == second_upper.focus
+        assert [e.name for e in first_upper.exercises] != [e.name for e in second_upper.exercises]
+    
+    def test_injuries_exclude_contraindicated_exercises(self, engine):
+        """Test gli esercizi controindicati per l'infortunio non compaiono"""
+        workout_plan = engine.generate(make_profile(injuries=["dolore al ginocchio"]))
+        
+        contraindicated = {e.name for e in EXERCISE_CATALOG if "ginocchio" in e.contraindications}
+        assert not contraindicated.intersection(exercise_names(workout_plan))
+        assert any("ginocchio" in note for note in workout_plan.general_notes)
+    
+    def test_equipment_limits_exercises(self, engine):
+        """Test con soli manubri vengono scelti esercizi eseguibili con manubri o a corpo libero"""
+        workout_plan = engine.generate(make_profile(equipment=["manubri"]))
+        
+        catalog = {e.name: e for e in EXERCISE_CATALOG}
+        for name in exercise_names(workout_plan):
+            assert {"manubri", "corpo_libero"}.intersection(catalog[name].equipment)
+    
+    def test_beginner_prescription(self, engine):
+        """Test i principianti non ricevono esercizi avanzati e hanno meno serie"""
+        beginner = engine.generate(make_profile(experience_level=ExperienceLevel.BEGINNER))
+        intermediate = engine.generate(make_profile())
+        
+        catalog = {e.name: e for e in EXERCISE_CATALOG}
+        for name in exercise_names(beginner):
+            assert ExperienceLevel.BEGINNER in catalog[name].levels
+        assert beginner.get_weekly_volume() < intermediate.get_weekly_volume()
+    
+    def test_nutrition_only_for_body_composition_goals(self, engine):
+        """Test le linee guida nutrizionali solo per dimagrimento e ipertrofia"""
+        assert engine.generate(make_profile(goals=[WorkoutGoal.WEIGHT_LOSS])).nutrition is not None
+        assert engine.generate(make_profile(goals=[WorkoutGoal.GENERAL_FITNESS])).nutrition is None
+    
+    @pytest.mark.parametrize("overrides", [
+        {"experience_level": ExperienceLevel.ADVANCED},
+        {"available_days": 1},
+        {"available_days": 6},
+        {"goals": [WorkoutGoal.REHABILITATION]},
+        {"preferences": ["solo esercizi in acqua"]},
+        {"injuries": ["fascite plantare"]}
+    ])
+    def test_supports_rejects_unusual_profiles(self, engine, overrides):
+        """Test i profili fuori dalle regole sono lasciati al modello"""
+        assert not engine.supports(make_profile(**overrides))
+    
+    def test_supports_standard_profile(self, engine):
+        """Test un profilo standard con infortunio riconosciuto è supportato"""
+        assert engine.supports(make_profile(injuries=["lombalgia"], equipment=["manubri", "elastici"]))
+
+class TestCatalogResolution:
+    """Test per l'interpretazione di attrezzatura e infortuni"""
+    
+    def test_resolve_equipment_defaults_to_full_gym(self):
+        """Test senza indicazioni si assume una palestra attrezzata"""
+        assert resolve_equipment([]) == resolve_equipment(["palestra completa"])
+        assert "bilanciere" in resolve_equipment([])
+    
+    def test_resolve_equipment_home(self):
+        """Test attrezzatura domestica"""
+        assert resolve_equipment(["un paio di manubri", "elastici"]) == {"manubri", "elastici", "corpo_libero"}
+    
+    def test_resolve_injuries(self):
+        """Test infortuni riconosciuti e non riconosciuti"""
+        assert resolve_injuries(["ernia lombare", "tendinite alla spalla"]) == {"schiena", "spalla"}
+        assert resolve_injuries([]) == set()
+        assert resolve_injuries(["fascite plantare"]) is None
@@ -0,0 +1,128 @@
+"""
+Test per il budget di token dei prompt
+"""
+
+import pytest
+from app.core.token_budget import TokenCounter, ContextBudgeter, MESSAGE_OVERHEAD_TOKENS
+
+class TestContextBudgeter:
+    """Test per ContextBudgeter"""
+    
+    @pytest.fixture
+    def token_counter(self):
+        """Contatore con stima sui caratteri (4 caratteri = 1 token)"""
+        counter = TokenCounter()
+        counter.encoding = None
+        return counter
+    
+    def make_budgeter(self, token_counter, prompt_budget=1000, context_budget=400, message_max_tokens=200):
+        """Crea un budgeter con limiti espliciti"""
+        return ContextBudgeter(
+            token_counter=token_counter,
+            prompt_budget=prompt_budget,
+            context_budget=context_budget,
+            message_max_tokens=message_max_tokens
+        )
+    
+    def test_everything_fits(self, token_counter):
+        """Test prompt piccolo incluso per intero"""
+        budgeter = self.make_budgeter(token_counter)
+        history = [
+            {"role": "user", "content": "Ciao"},
+            {"role": "assistant", "content": "Ciao! Come posso aiutarti?"},
+            {"role": "user", "content": "Quante serie per lo squat?"}
+        ]
+        chunks = [{"text": "Lo squat si allena con 3-5 serie.", "metadata": {"source": "manuale"}, "score": 0.8}]
+        
+        prompt = budgeter.fit("Sei un coach.", chunks, history)
+        
+        assert prompt.history == history
+        assert prompt.context == chunks[0]["text"]
+        assert prompt.sources == ["manuale"]
+        assert prompt.dropped_messages == 0
+        assert prompt.dropped_chunks == 0
+        assert prompt.token_counts["total"] <= 1000
+    
+    def test_zero_budgets_not_replaced_by_settings(self, token_counter):
+        """Test un budget esplicito a zero esclude contesto e cronologia"""
+        budgeter = self.make_budgeter(token_counter, context_budget=0, message_max_tokens=0)
+        history = [
+            {"role": "user", "content": "Ciao"},
+            {"role": "assistant", "content": "Ciao! Come posso aiutarti?"},
+            {"role": "user", "content": "Quante serie per lo squat?"}
+        ]
+        chunks = [{"text": "Lo squat si allena con 3-5 serie.", "metadata": {"source": "manuale"}, "score": 0.8}]
+        
+        prompt = budgeter.fit("Sei un coach.", chunks, history)
+        
+        assert (budgeter.context_budget, budgeter.message_max_tokens) == (0, 0)
+        assert prompt.context == ""
+        assert prompt.history == history[-1:]
+        assert prompt.dropped_chunks == 1
+        assert prompt.dropped_messages == 2
+    
+    def test_lowest_score_chunks_trimmed(self, token_counter):
+        """Test i frammenti con punteggio più basso sono esclusi per primi"""
+        budgeter = self.make_budgeter(token_counter, context_budget=60)
+        chunks = [
+            {"text": "b" * 160, "metadata": {"source": "basso"}, "score": 0.2},
+            {"text": "a" * 160, "metadata": {"source": "alto"}, "score": 0.9}
+        ]
+        
+        prompt = budgeter.fit("Sistema", chunks, [{"role": "user", "content": "Domanda"}])
+        
+        assert prompt.context == "a" * 160
+        assert prompt.sources == ["alto"]
+        assert prompt.dropped_chunks == 1
+        assert prompt.token_counts["context"] == 40
+    
+    def test_oldest_messages_dropped(self, token_counter):
+        """Test i messaggi più vecchi sono esclusi quando il budget finisce"""
+        budgeter = self.make_budgeter(token_counter, prompt_budget=120, context_budget=10)
+        history = [
+            {"role": "user", "content": "x" * 200},
+            {"role": "assistant", "content": "y" * 200},
+            {"role": "user", "content": "z" * 40}
+        ]
+        
+        prompt = budgeter.fit("", [], history)
+        
+        assert prompt.dropped_messages == 1
+        assert [msg["content"][0] for msg in prompt.history] == ["y", "z"]
+        assert prompt.token_counts["total"] <= 120
+    
+    def test_long_messages_truncated(self, token_counter):
+        """Test i messaggi lunghi (es. schede) vengono troncati"""
+        budgeter = self.make_budgeter(token_counter, message_max_tokens=10)
+        history = [
+            {"role": "assistant", "content": "scheda " * 100},
+            {"role": "user", "content": "Grazie"}
+        ]
+        
+        prompt = budgeter.fit("", [], history)
+        
+        assert len(prompt.history) == 2
+        assert token_counter.count(prompt.history[0]["content"]) < 20
+        assert prompt.history[-1]["content"] == "Grazie"
+    
+    def test_inputs_not_mutated(self, token_counter):
+        """Test la cronologia originale non viene modificata"""
+        budgeter = self.make_budgeter(token_counter, message_max_tokens=5)
+        history = [
+            {"role": "assistant", "content": "w" * 100},
+            {"role": "user", "content": "Ok"}
+        ]
+        
+        budgeter.fit("", [], history)
+        
+        assert history[0]["content"] == "w" * 100
+    
+    def test_token_counts_reported(self, token_counter):
+        """Test il conteggio per sezione"""
+        budgeter = self.make_budgeter(token_counter)
+        
+        prompt = budgeter.fit("abcd" * 5, [], [{"role": "user", "content": "abcd" * 2}])
+        
+        assert prompt.token_counts["system"] == 5 + MESSAGE_OVERHEAD_TOKENS
+        assert prompt.token_counts["user_message"] == 2 + MESSAGE_OVERHEAD_TOKENS
+        assert prompt.token_counts["budget"] == 1000
@@ -0,0 +1,150 @@
+"""
+Test per VariationEngine
+"""
+
+import json
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from app.core.variation_engine import VariationEngine, resolve_variation_type, parse_rest_seconds
+from app.core.template_engine import TemplateWorkoutEngine
+from app.core.workout_generator import WorkoutGenerator
+from app.core.llm_manager import LLMManager
+from app.core.rag_engine import RAGEngine
+from app.models.workout import Exercise, UserProfile, ExperienceLevel, WorkoutGoal
+
+def make_base_plan(days=4):
+    """Scheda base generata dal motore a template"""
+    return TemplateWorkoutEngine().generate(UserProfile(
+        experience_level=ExperienceLevel.INTERMEDIATE,
+        goals=[WorkoutGoal.HYPERTROPHY],
+        available_days=days,
+        session_duration=60
+    ))
+
+class TestVariationEngine:
+    """Test per il motore di variazioni incrementali"""
+    
+    @pytest.fixture
+    def llm_manager(self):
+        mock = Mock(spec=LLMManager)
+        mock.generate_response = AsyncMock(return_value=json.dumps({
+            "warm_up": ["Mobilità 5 min"],
+            "exercises": [{"name": "Esercizio rielaborato", "sets": 3, "reps": "10", "rest": "60 sec"}],
+            "cool_down": ["Stretching"]
+        }))
+        return mock
+    
+    @pytest.fixture
+    def engine(self, llm_manager):
+        return VariationEngine(WorkoutGenerator(llm_manager, Mock(spec=RAGEngine)))
+    
+    def test_resolve_variation_type(self):
+        """Test riconoscimento dei tipi e delle descrizioni in italiano"""
+        assert resolve_variation_type("più intenso") == "harder"
+        assert resolve_variation_type("  Meno   giorni ") == "fewer_days"
+        assert resolve_variation_type("different_exercises") == "different_exercises"
+        assert resolve_variation_type("different_focus") is None
+    
+    def test_parse_rest_seconds(self):
+        """Test interpretazione dei recuperi"""
+        assert parse_rest_seconds("90 sec") == 90
+        assert parse_rest_seconds("2 min") == 120
+        assert parse_rest_seconds("1:30") == 90
+        assert parse_rest_seconds("60-90 sec") == 75
+        assert parse_rest_seconds("a piacere") is None
+    
+    @pytest.mark.asyncio
+    async def test_harder_is_deterministic(self, engine, llm_manager):
+        """Test più intensa: serie in più e recuperi ridotti senza chiamate al modello"""
+        base = make_base_plan()
+        
+        variation = await engine.create_variation(base, "più intenso")
+        workout_plan = variation.apply(base)
+        
+        llm_manager.generate_response.assert_not_called()
+        assert variation.variation_type == "harder"
+        for base_day, day in zip(base.workout_days, workout_plan.workout_days):
+            for base_exercise, exercise in zip(base_day.exercises, day.exercises):
+                assert exercise.sets == min(base_exercise.sets + 1, 6)
+                assert parse_rest_seconds(exercise.rest) < parse_rest_seconds(base_exercise.rest)
+        assert workout_plan.id == variation.id
+        assert workout_plan.general_notes[-1] == variation.general_notes[0]
+        # La scheda base non viene modificata
+        assert base.workout_days[0].exercises[0].sets != workout_plan.workout_days[0].exercises[0].sets
+    
+    @pytest.mark.asyncio
+    async def test_fewer_days_refines_only_merged_day(self, engine, llm_manager):
+        """Test meno giorni: unione di due giorni e modello chiamato solo per quello"""
+        base = make_base_plan(days=4)
+        
+        variation = await engine.create_variation(base, "meno giorni")
+        
+        assert len(variation.days) == 3
+        assert variation.get_changed_days() == variation.metadata["llm_days"]
+        assert len(variation.get_changed_days()) == 1
+        assert sum(isinstance(day, int) for day in variation.days) == 2
+        llm_manager.generate_response.assert_called_once()
+        merged = variation.days[variation.get_changed_days()[0]]
+        assert "+" in merged.focus
+        assert merged.exercises[0].name == "Esercizio rielaborato"
+    
+    @pytest.mark.asyncio
+    async def test_fewer_days_keeps_draft_without_llm(self, engine, llm_manager):
+        """Test senza modello (o con risposta non valida) resta la bozza deterministica"""
+        base = make_base_plan(days=3)
+        llm_manager.generate_response = AsyncMock(return_value="Non disponibile")
+        
+        variation = await engine.create_variation(base, "fewer_days")
+        merged = variation.days[variation.get_changed_days()[0]]
+        
+        assert variation.metadata["llm_days"] == []
+        names = [exercise.name.lower() for exercise in merged.exercises]
+        assert len(names) == len(set(names))
+        assert len(variation.apply(base).workout_days) == 2
+    
+    @pytest.mark.asyncio
+    async def test_different_exercises_uses_catalog(self, engine, llm_manager):
+        """Test esercizi alternativi dal catalogo, modello solo per esercizi sconosciuti"""
+        base = make_base_plan(days=3)
+        base.workout_days[2].exercises.append(
+            Exercise(name="Esercizio inventato", sets=3, reps="12", rest="60 sec")
+        )
+        
+        variation = await engine.create_variation(base, "esercizi diversi")
+        workout_plan = variation.apply(base)
+        
+        base_names = {exercise.name for day in base.workout_days for exercise in day.exercises}
+        first_day_names = {exercise.name for exercise in workout_plan.workout_days[0].exercises}
+        assert first_day_names - base_names
+        assert variation.metadata["llm_days"] == [2]
+        llm_manager.generate_response.assert_called_once()
+        assert "Esercizio inventato" in llm_manager.generate_response.call_args.kwargs["messages"][0]["content"]
+    
+    @pytest.mark.asyncio
+    async def test_variation_stored_as_delta(self, temp_dir, mock_llm_manager, mock_rag_engine):
+        """Test salvataggio della variazione come differenza e ricostruzione dalla scheda base"""
+        from app.db.file_storage import FileStorage
+        from app.services.workout_service import WorkoutService
+        
+        with patch("app.db.file_storage.settings.WORKOUTS_PATH", temp_dir / "workouts"), \
+             patch("app.db.file_storage.settings.CHATS_PATH", temp_dir / "chats"):
+            storage = FileStorage()
+            service = WorkoutService(storage, mock_llm_manager, mock_rag_engine)
+            base = make_base_plan(days=4)
+            await service.save_workout_plan(base)
+            
+            created = await service.generate_workout_variations(base.id, "meno giorni")
+            stored = storage.load_workout_variation(created.id)
+            loaded = await service.get_workout_plan(created.id)
+            listed = {info["id"]: info for info in storage.list_workouts()}
+            
+            assert storage.load_workout(created.id) is None
+            assert sum(isinstance(day, int) for day in stored["days"]) == 2
+            assert loaded.model_dump() == created.model_dump()
+            assert listed[created.id]["total_days"] == 3
+            assert listed[created.id]["total_exercises"] == loaded.get_total_exercises()
+            
+            # Eliminando la base la variazione viene salvata per intero
+            assert await service.delete_workout_plan(base.id) is True
+            assert storage.load_workout_variation(created.id) is None
+            assert (await service.get_workout_plan(created.id)).model_dump() == created.model_dump()
@@ -4,7 +4,7 @@ Test per WorkoutGenerator
 
 import pytest
 import json
-from unittest.mock import Mock, AsyncMock
+from unittest.mock import Mock, AsyncMock, patch
 from app.core.workout_generator import WorkoutGenerator
 from app.models.workout import UserProfile, ExperienceLevel, WorkoutGoal
 from app.core.error_handler import ChatbotException
@@ -190,6 +190,172 @@ class TestWorkoutGenerator:
         assert "days_structure" in result
         assert len(result["days_structure"]) <= sample_user_profile.available_days
     
+    @pytest.mark.asyncio
+    async def test_generate_workout_structure_uses_json_schema(self, workout_generator, sample_user_profile):
+        """Test la struttura viene richiesta con lo schema JSON del modello"""
+        workout_generator.llm_manager.generate_response = AsyncMock(return_value="{}")
+        
+        with patch("app.core.llm_manager.settings.STRUCTURED_OUTPUT_MODE", "json_schema"):
+            await workout_generator._generate_workout_structure(
+                sample_user_profile, "test input", "test context"
+            )
+            
+        response_format = workout_generator.llm_manager.generate_response.call_args.kwargs["response_format"]
+        assert response_format["type"] == "json_schema"
+        assert response_format["json_schema"]["name"] == "WorkoutStructure"
+        assert "days_structure" in response_format["json_schema"]["schema"]["properties"]
+        # Modalità strict: tutte le proprietà richieste e nessuna proprietà aggiuntiva
+        schema = response_format["json_schema"]["schema"]
+        assert response_format["json_schema"]["strict"] is True
+        assert schema["required"] == list(schema["properties"])
+        assert schema["additionalProperties"] is False
+        assert "default" not in json.dumps(schema)
+    
+    @pytest.mark.asyncio
+    async def test_truncated_exercises_repaired(self, workout_generator, sample_user_profile):
+        """Test una risposta troncata mantiene gli esercizi completi"""
+        structure = {
+            "days_structure": [
+                {"day": "Lunedì", "focus": "Corpo completo", "muscle_groups": ["gambe"], "workout_type": "mixed"}
+            ]
+        }
+        truncated = (
+            '```json\n{"warm_up": ["Cyclette"], "exercises": ['
+            '{"name": "Squat", "sets": 3, "reps": "10", "rest": "90 sec"}, {"name": "Affondi", "se'
+        )
+        workout_generator.llm_manager.generate_response = AsyncMock(return_value=truncated)
+        
+        workout_days = await workout_generator._generate_detailed_exercises(
+            structure, sample_user_profile, "test context"
+        )
+        
+        # L'esercizio interrotto mantiene il nome ricevuto e i valori di default per il resto
+        assert [ex.name for ex in workout_days[0].exercises] == ["Squat", "Affondi"]
+        assert (workout_days[0].exercises[1].sets, workout_days[0].exercises[1].rest) == (3, "60 sec")
+        assert workout_generator.get_parse_stats()["exercises"] == {"calls": 1, "repaired": 1, "failures": 0}
+    
+    @pytest.mark.asyncio
+    async def test_missing_exercise_fields_use_defaults(self, workout_generator, sample_user_profile):
+        """Test un esercizio senza recupero non fa scartare il giorno generato"""
+        structure = {
+            "days_structure": [
+                {"day": "Lunedì", "focus": "Corpo completo", "muscle_groups": ["gambe"], "workout_type": "mixed"}
+            ]
+        }
+        day = {
+            "warm_up": ["Cyclette"],
+            "exercises": [
+                {"name": "Squat", "sets": 4, "reps": "6", "rest": "3 min"},
+                {"name": "Affondi", "sets": 3, "reps": "10"}
+            ]
+        }
+        workout_generator.llm_manager.generate_response = AsyncMock(return_value=json.dumps(day))
+        
+        workout_days = await workout_generator._generate_detailed_exercises(
+            structure, sample_user_profile, "test context"
+        )
+        
+        assert [ex.name for ex in workout_days[0].exercises] == ["Squat", "Affondi"]
+        assert workout_days[0].exercises[1].rest == "60 sec"
+        assert workout_days[0].warm_up == ["Cyclette"]
+        assert workout_generator.get_parse_stats()["exercises"] == {"calls": 1, "repaired": 0, "failures": 0}
+    
+    @pytest.mark.asyncio
+    async def test_parse_failures_counted_per_stage(self, workout_generator, sample_user_profile):
+        """Test i fallimenti di parsing sono contati per fase"""
+        workout_generator.llm_manager.generate_response = AsyncMock(return_value="Invalid JSON response")
+        
+        await workout_generator._generate_workout_structure(sample_user_profile, "test input", "test context")
+        await workout_generator._generate_progression_plan(sample_user_profile, "test context")
+        
+        stats = workout_generator.get_parse_stats()
+        assert stats["structure"]["failures"] == 1
+        assert stats["progression"]["failures"] == 1
+        assert stats["exercises"]["calls"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_single_shot_uses_one_call(self, workout_generator, sample_user_profile):
+        """Test la modalità single_shot genera la scheda con una sola chiamata"""
+        workout_generator.rag_engine.retrieve_context = AsyncMock(
+            return_value=("Contesto test", ["source1.pdf"])
+        )
+        plan_response = {
+            "title": "Scheda completa",
+            "workout_days": [
+                {
+                    "day": day,
+                    "focus": "Corpo completo",
+                    "exercises": [{"name": "Squat", "sets": 3, "reps": "12", "rest": "90 sec"}]
+                }
+                for day in ["Lunedì", "Mercoledì", "Venerdì"]
+            ],
+            "nutrition": {"calories_estimate": "2000 kcal"},
+            "progression": {"week_1_2": "Tecnica", "week_3_4": "Volume"},
+            "general_notes": ["Aumenta i carichi solo con tecnica corretta"]
+        }
+        workout_generator.llm_manager.generate_response = AsyncMock(return_value=json.dumps(plan_response))
+        
+        workout_plan = await workout_generator.generate_complete_workout(
+            sample_user_profile, "Voglio iniziare ad allenarmi", mode="single_shot"
+        )
+        
+        workout_generator.llm_manager.generate_response.assert_called_once()
+        response_format = workout_generator.llm_manager.generate_response.call_args.kwargs["response_format"]
+        assert response_format is None or response_format["type"] in ("json_schema", "json_object")
+        assert len(workout_plan.workout_days) == 3
+        assert workout_plan.workout_days[0].exercises[0].name == "Squat"
+        assert workout_plan.progression.week_1_2 == "Tecnica"
+        # Titolo e note generati dal modello, senza rigenerarli dal profilo
+        assert workout_plan.title == "Scheda completa"
+        assert workout_plan.general_notes == ["Aumenta i carichi solo con tecnica corretta"]
+        # Nutrizione non prevista per fitness generale
+        assert workout_plan.nutrition is None
+        assert workout_plan.metadata == {"generation_mode": "single_shot"}
+        assert workout_generator.get_parse_stats()["plan"]["calls"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_single_shot_invalid_response_uses_defaults(self, workout_generator, sample_user_profile):
+        """Test la modalità single_shot ripiega sulla scheda di default"""
+        workout_generator.rag_engine.retrieve_context = AsyncMock(return_value=("Contesto", []))
+        workout_generator.llm_manager.generate_response = AsyncMock(return_value="Non disponibile")
+        
+        workout_plan = await workout_generator.generate_complete_workout(
+            sample_user_profile, "Voglio iniziare ad allenarmi", mode="single_shot"
+        )
+        
+        assert len(workout_plan.workout_days) == sample_user_profile.available_days
+        assert workout_plan.progression is not None
+        assert workout_generator.get_parse_stats()["plan"]["failures"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_progress_callback_reports_stages(self, workout_generator, sample_user_profile):
+        """Test l'avanzamento viene riportato fase per fase e gli errori del callback ignorati"""
+        workout_generator.rag_engine.retrieve_context = AsyncMock(return_value=("Contesto", []))
+        workout_generator.llm_manager.generate_response = AsyncMock(return_value="Non disponibile")
+        events = []
+        
+        def progress(stage, details):
+            events.append((stage, details))
+            raise RuntimeError("callback rotto")
+            
+        await workout_generator.generate_complete_workout(
+            sample_user_profile, "Voglio iniziare ad allenarmi", progress=progress
+        )
+        
+        stages = [stage for stage, _ in events]
+        assert stages[:2] == ["context", "structure"]
+        assert stages[-1] == "progression"
+        day_events = [details for stage, details in events if stage == "days"]
+        assert day_events[-1]["index"] == day_events[-1]["total"] == sample_user_profile.available_days
+    
+    @pytest.mark.asyncio
+    async def test_unknown_generation_mode(self, workout_generator, sample_user_profile):
+        """Test modalità di generazione non supportata"""
+        with pytest.raises(ChatbotException):
+            await workout_generator.generate_complete_workout(
+                sample_user_profile, "test input", mode="sconosciuta"
+            )
+    
     @pytest.mark.asyncio
     async def test_generate_detailed_exercises_success(self, workout_generator, sample_user_profile):
         """Test generazione esercizi dettagliati"""
@@ -237,6 +403,41 @@ class TestWorkoutGenerator:
         assert "Camminata 5 min" in workout_days[0].warm_up
         assert "Stretching petto" in workout_days[0].cool_down
     
+    @pytest.mark.asyncio
+    async def test_generate_detailed_exercises_targeted_context(self, workout_generator, sample_user_profile):
+        """Test ogni giorno riceve il contesto dei propri gruppi muscolari"""
+        from app.core.retrieval_cache import RetrievalCache
+        
+        structure = {
+            "days_structure": [
+                {"day": "Lunedì", "focus": "Petto", "muscle_groups": ["petto"], "workout_type": "mixed"},
+                {"day": "Mercoledì", "focus": "Gambe", "muscle_groups": ["gambe"], "workout_type": "mixed"},
+                {"day": "Venerdì", "focus": "Petto", "muscle_groups": ["petto"], "workout_type": "mixed"}
+            ]
+        }
+        
+        async def retrieve_chunks(query):
+            topic = "petto" if "petto" in query else "gambe"
+            return [{"text": f"Contesto {topic}", "metadata": {"source": f"{topic}.pdf"}, "score": 0.9}]
+            
+        workout_generator.rag_engine.retrieve_chunks = AsyncMock(side_effect=retrieve_chunks)
+        workout_generator.llm_manager.generate_response = AsyncMock(return_value='{"exercises": []}')
+        retrieval = RetrievalCache(workout_generator.rag_engine)
+        
+        await workout_generator._generate_detailed_exercises(
+            structure, sample_user_profile, "Contesto generale", retrieval=retrieval
+        )
+        
+        prompts = [
+            call.kwargs["messages"][0]["content"]
+            for call in workout_generator.llm_manager.generate_response.call_args_list
+        ]
+        assert "Contesto petto" in prompts[0] and "Contesto gambe" not in prompts[0]
+        assert "Contesto gambe" in prompts[1]
+        assert all("Contesto generale" not in prompt for prompt in prompts)
+        # Il terzo giorno riusa il recupero del primo
+        assert workout_generator.rag_engine.retrieve_chunks.call_count == 2
+    
     @pytest.mark.asyncio
     async def test_generate_nutrition_guidelines_weight_loss(self, workout_generator):
         """Test generazione linee guida nutrizionali per dimagrimento"""
@@ -0,0 +1,3 @@
+"""
+Test per il layer di persistenza
+"""
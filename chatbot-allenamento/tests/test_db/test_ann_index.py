@@ -0,0 +1,98 @@
+"""
+Test per l'indice approssimato IVF e VectorStoreManager
+"""
+
+import numpy as np
+import pytest
+from unittest.mock import Mock, patch
+from app.db.ann_index import IVFIndex
+from app.core.error_handler import RAGException
+
+def make_vectors(count=3000, dim=32, clusters=30, seed=1):
+    """Vettori raggruppati attorno a centri casuali, come embeddings di argomenti diversi"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=count)] + 0.3 * rng.normal(size=(count, dim))
+    return [f"n{i}" for i in range(count)], vectors.astype(np.float32)
+
+def brute_force(vectors, query, top_k):
+    """Classifica esatta per similarità coseno"""
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    return [f"n{i}" for i in np.argsort(-scores)[:top_k]]
+
+class TestIVFIndex:
+    """Test per la costruzione e la ricerca dell'indice IVF"""
+    
+    def test_recall_against_brute_force(self):
+        """Test recall@10 elevato rispetto alla ricerca esatta"""
+        node_ids, vectors = make_vectors()
+        index = IVFIndex.build(node_ids, vectors)
+        rng = np.random.default_rng(2)
+        
+        recalls = []
+        for query in vectors[rng.choice(len(vectors), 20)] + 0.1 * rng.normal(size=(20, 32)):
+            found = {node_id for node_id, _ in index.search(query, top_k=10, n_probe=16)}
+            recalls.append(len(found & set(brute_force(vectors, query, 10))) / 10)
+            
+        assert np.mean(recalls) >= 0.9
+        # Esplorando tutte le liste la ricerca è esatta
+        results = index.search(vectors[0], top_k=5, n_probe=index.n_lists)
+        assert [node_id for node_id, _ in results] == brute_force(vectors, vectors[0], 5)
+        assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+    
+    def test_add_and_persistence(self, temp_dir):
+        """Test aggiunta incrementale, salvataggio e caricamento"""
+        node_ids, vectors = make_vectors(count=500)
+        index = IVFIndex.build(node_ids[:400], vectors[:400])
+        index.add(node_ids[400:], vectors[400:])
+        path = temp_dir / "ann_index.npz"
+        index.save(path)
+        
+        loaded = IVFIndex.load(path)
+        
+        assert len(loaded) == 500
+        assert loaded.search(vectors[450], top_k=1, n_probe=4)[0][0] == "n450"
+        assert IVFIndex.load(temp_dir / "assente.npz") is None
+        with pytest.raises(RAGException):
+            loaded.add(["x"], np.ones((1, 8)))
+        # Query con una dimensione diversa (EMBEDDING_DIMENSIONS cambiato senza ricostruire)
+        with pytest.raises(RAGException):
+            loaded.search(np.ones(8), top_k=1, n_probe=1)
+    
+    def test_search_restricted_to_rows(self):
+        """Test prefiltro sui metadati: solo le righe ammesse, anche fuori dalle liste esplorate"""
+        node_ids, vectors = make_vectors()
+        index = IVFIndex.build(node_ids, vectors)
+        allowed = node_ids[1::7]
+        # Classifica esatta sul solo sottoinsieme ammesso (gli id del sottoinsieme sono n0, n1, ...)
+        expected = [allowed[int(node_id[1:])] for node_id in brute_force(vectors[1::7], vectors[0], 5)]
+        
+        results = index.search(vectors[0], top_k=5, n_probe=1, rows=index.rows_for(allowed))
+        
+        assert [node_id for node_id, _ in results] == expected
+        assert index.search(vectors[0], top_k=5, n_probe=1, rows=index.rows_for([])) == []
+
+def test_vector_store_manager_reuses_saved_ann_index(temp_dir):
+    """Test l'indice approssimato salvato viene riusato se contiene gli stessi nodi"""
+    from app.db.vectorstore import VectorStoreManager
+    
+    node_ids, vectors = make_vectors(count=200)
+    index = Mock()
+    index.vector_store.data.embedding_dict = {node_id: vector.tolist() for node_id, vector in zip(node_ids, vectors)}
+    
+    with patch("app.db.vectorstore.settings.VECTOR_STORE_PATH", temp_dir), \
+         patch("app.db.vectorstore.settings.ANN_INDEX_ENABLED", True), \
+         patch("app.db.vectorstore.settings.ANN_MIN_VECTORS", 100):
+        manager = VectorStoreManager()
+        assert manager.prepare_ann_index(index) is not None
+        
+        with patch("app.db.vectorstore.IVFIndex.build") as mock_build:
+            reloaded = VectorStoreManager().prepare_ann_index(index)
+            mock_build.assert_not_called()
+        assert len(reloaded) == 200
+        
+        index.vector_store.data.embedding_dict["nuovo"] = vectors[0].tolist()
+        manager.sync_ann_index(index)
+        assert manager.ann_search(vectors[0], top_k=2)[0][1] == pytest.approx(1.0, abs=1e-5)
+        assert manager.get_index_info()["ann_index"]["vectors"] == 201
@@ -0,0 +1,149 @@
+"""
+Test per ChatCache
+"""
+
+import asyncio
+import pytest
+from unittest.mock import Mock
+from app.db.chat_cache import ChatCache
+from app.services.chat_service import ChatService
+from tests.conftest import create_mock_chat, create_mock_message
+
+class TestChatCache:
+    """Test per la cache write-back delle chat"""
+    
+    @pytest.fixture
+    def writer(self):
+        """Writer mock che registra le chat scritte"""
+        return Mock()
+    
+    @pytest.fixture
+    def cache(self, writer):
+        """Fixture per ChatCache"""
+        return ChatCache(writer=writer, max_size=2, flush_interval=0.01)
+    
+    def test_get_miss_and_hit(self, cache):
+        """Test lettura da cache"""
+        chat = create_mock_chat()
+        
+        assert cache.get(chat.id) is None
+        
+        cache.put(chat)
+        
+        assert cache.get(chat.id) is chat
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+    
+    def test_multiple_saves_coalesced(self, cache, writer):
+        """Test più salvataggi della stessa chat producono una sola scrittura"""
+        chat = create_mock_chat()
+        
+        cache.put(chat, dirty=True)
+        chat.add_message(create_mock_message("user", "Ciao"))
+        cache.put(chat, dirty=True)
+        
+        writer.assert_not_called()
+        
+        assert cache.flush() == 1
+        writer.assert_called_once_with(chat)
+        assert cache.get_stats()["coalesced_writes"] == 1
+        
+        # Nessuna modifica pendente dopo il flush
+        assert cache.flush() == 0
+    
+    def test_eviction_writes_dirty_chat(self, cache, writer):
+        """Test una chat modificata espulsa dalla cache viene scritta"""
+        first, second, third = create_mock_chat(), create_mock_chat(), create_mock_chat()
+        
+        cache.put(first, dirty=True)
+        cache.put(second)
+        cache.put(third)
+        
+        writer.assert_called_once_with(first)
+        assert cache.get(first.id) is None
+        assert cache.get_stats()["size"] == 2
+    
+    def test_lru_order_updated_on_get(self, cache, writer):
+        """Test la lettura protegge la chat dall'espulsione"""
+        first, second, third = create_mock_chat(), create_mock_chat(), create_mock_chat()
+        
+        cache.put(first)
+        cache.put(second)
+        cache.get(first.id)
+        cache.put(third)
+        
+        assert cache.get(first.id) is first
+        assert cache.get(second.id) is None
+    
+    def test_failed_write_retried(self, cache, writer):
+        """Test una scrittura fallita resta pendente"""
+        chat = create_mock_chat()
+        writer.side_effect = [IOError("disco pieno"), None]
+        
+        cache.put(chat, dirty=True)
+        
+        assert cache.flush() == 0
+        assert cache.get_stats()["dirty"] == 1
+        assert cache.flush() == 1
+    
+    def test_disabled_cache_writes_through(self, writer):
+        """Test con dimensione 0 la cache scrive subito"""
+        cache = ChatCache(writer=writer, max_size=0)
+        chat = create_mock_chat()
+        
+        cache.put(chat, dirty=True)
+        
+        writer.assert_called_once_with(chat)
+        assert cache.get(chat.id) is None
+    
+    @pytest.mark.asyncio
+    async def test_background_flush_and_stop(self, cache, writer):
+        """Test flush periodico e flush finale allo stop"""
+        chat = create_mock_chat()
+        cache.start()
+        
+        cache.put(chat, dirty=True)
+        await asyncio.sleep(0.05)
+        writer.assert_called_once_with(chat)
+        
+        chat.add_message(create_mock_message("user", "Altro messaggio"))
+        cache.put(chat, dirty=True)
+        await cache.stop()
+        
+        assert writer.call_count == 2
+        assert cache.get_stats()["dirty"] == 0
+
+class TestChatServiceCache:
+    """Test integrazione tra ChatService e cache"""
+    
+    @pytest.mark.asyncio
+    async def test_send_message_does_not_touch_disk(self, mock_file_storage, mock_llm_manager, mock_rag_engine):
+        """Test i messaggi di una chat attiva non leggono né scrivono su disco"""
+        service = ChatService(mock_file_storage, mock_llm_manager, mock_rag_engine)
+        
+        chat, _, _ = await service.send_message("Ciao")
+        await service.send_message("Come stai?", chat_id=chat.id)
+        
+        mock_file_storage.load_chat.assert_not_called()
+        mock_file_storage.save_chat.assert_not_called()
+        
+        await service.shutdown()
+        
+        mock_file_storage.save_chat.assert_called_once()
+        saved = mock_file_storage.save_chat.call_args[0][0]
+        assert len(saved["messages"]) == 4
+    
+    @pytest.mark.asyncio
+    async def test_delete_pending_chat(self, mock_file_storage, mock_llm_manager, mock_rag_engine):
+        """Test eliminazione di una chat non ancora scritta su disco"""
+        mock_file_storage.delete_chat.return_value = False
+        service = ChatService(mock_file_storage, mock_llm_manager, mock_rag_engine)
+        
+        chat, _, _ = await service.send_message("Ciao")
+        
+        assert await service.delete_chat(chat.id) is True
+        assert await service.get_chat(chat.id) is None
+        
+        await service.shutdown()
+        mock_file_storage.save_chat.assert_not_called()
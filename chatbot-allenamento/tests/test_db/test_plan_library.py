@@ -0,0 +1,135 @@
+"""
+Test per PlanLibrary
+"""
+
+import pytest
+from app.db.plan_library import (
+    PlanLibrary, profile_signature, profile_from_signature, top_signatures
+)
+from app.core.template_engine import TemplateWorkoutEngine
+from app.services.workout_service import WorkoutService
+from app.models.workout import UserProfile, ExperienceLevel, WorkoutGoal
+
+def make_profile(**overrides):
+    """Crea un profilo con eventuali modifiche"""
+    data = {
+        "experience_level": ExperienceLevel.ADVANCED,
+        "goals": [WorkoutGoal.STRENGTH],
+        "available_days": 4,
+        "session_duration": 60,
+        "equipment": ["bilanciere", "manubri"]
+    }
+    data.update(overrides)
+    return UserProfile(**data)
+
+def make_plan(user_profile):
+    """Scheda di esempio per la libreria"""
+    return TemplateWorkoutEngine().generate(user_profile)
+
+class TestProfileSignature:
+    """Test per la firma del profilo"""
+    
+    def test_signature_fields(self):
+        """Test la firma include livello, obiettivi, giorni, durata e attrezzatura"""
+        assert profile_signature(make_profile()) == "avanzato|forza|4|standard|palestra"
+    
+    def test_signature_ignores_order_and_close_values(self):
+        """Test profili equivalenti hanno la stessa firma"""
+        first = make_profile(goals=[WorkoutGoal.STRENGTH, WorkoutGoal.HYPERTROPHY], session_duration=55)
+        second = make_profile(goals=[WorkoutGoal.HYPERTROPHY, WorkoutGoal.STRENGTH], session_duration=70)
+        
+        assert profile_signature(first) == profile_signature(second)
+    
+    def test_signature_none_for_tailored_profiles(self):
+        """Test infortuni e preferenze escludono la libreria"""
+        assert profile_signature(make_profile(injuries=["spalla"])) is None
+        assert profile_signature(make_profile(preferences=["niente corsa"])) is None
+    
+    def test_profile_from_signature_roundtrip(self):
+        """Test il profilo rappresentativo ha la stessa firma"""
+        signature = "principiante|dimagrimento|3|breve|pesi_liberi"
+        
+        assert profile_signature(profile_from_signature(signature)) == signature
+    
+    def test_top_signatures_prefers_history(self):
+        """Test le firme dello storico precedono lo spazio comune, senza duplicati"""
+        history = [make_profile().model_dump()] * 2 + [{"invalid": True}]
+        
+        signatures = top_signatures(history, limit=5)
+        
+        assert signatures[0] == "avanzato|forza|4|standard|palestra"
+        assert len(signatures) == len(set(signatures)) == 5
+
+class TestPlanLibrary:
+    """Test per la libreria di schede pregenerate"""
+    
+    @pytest.fixture
+    def library(self, tmp_path):
+        return PlanLibrary(path=tmp_path)
+    
+    def test_lookup_miss_on_empty_library(self, library):
+        """Test libreria non ancora generata"""
+        assert library.lookup(make_profile()) is None
+        assert library.get_stats() == {"plans": 0, "hits": 0, "misses": 1}
+    
+    def test_add_and_lookup_personalizes(self, library, tmp_path):
+        """Test la scheda servita è una copia con profilo e ID dell'utente"""
+        original = make_plan(make_profile())
+        signature = library.add(original)
+        
+        user_profile = make_profile(age=35, session_duration=70)
+        served = PlanLibrary(path=tmp_path).lookup(user_profile)
+        
+        assert served is not None
+        assert served.id != original.id
+        assert served.user_profile.age == 35
+        assert served.metadata["library_signature"] == signature
+        assert all(day.duration_minutes == 70 for day in served.workout_days)
+        assert [d.focus for d in served.workout_days] == [d.focus for d in original.workout_days]
+        assert original.user_profile.age is None
+    
+    def test_library_built_after_start_is_served(self, library, tmp_path):
+        """Test una libreria generata o rigenerata dopo l'avvio viene servita senza riavvio"""
+        assert library.lookup(make_profile()) is None
+        
+        # Generazione offline da un altro processo
+        builder = PlanLibrary(path=tmp_path)
+        builder.add(make_plan(make_profile()))
+        assert library.lookup(make_profile()) is not None
+        
+        beginner = make_profile(experience_level=ExperienceLevel.BEGINNER)
+        assert library.lookup(beginner) is None
+        builder.add(make_plan(beginner))
+        assert library.lookup(beginner) is not None
+        assert library.get_stats()["plans"] == 2
+    
+    def test_add_rejects_tailored_profile(self, library):
+        """Test schede con infortuni non finiscono in libreria"""
+        from app.core.error_handler import StorageException
+        
+        with pytest.raises(StorageException):
+            library.add(make_plan(make_profile(injuries=["ginocchio"])))
+
+class TestWorkoutServiceLibrary:
+    """Test per la ricerca in libreria nel servizio workout"""
+    
+    @pytest.mark.asyncio
+    async def test_library_hit_skips_generation(self, mock_file_storage, mock_llm_manager,
+                                                mock_rag_engine, tmp_path):
+        """Test una firma in libreria evita la pipeline di generazione"""
+        service = WorkoutService(mock_file_storage, mock_llm_manager, mock_rag_engine)
+        service.plan_library = PlanLibrary(path=tmp_path)
+        
+        # Profilo restituito da extract_user_profile nel mock
+        profile = UserProfile(
+            experience_level=ExperienceLevel.BEGINNER,
+            goals=[WorkoutGoal.GENERAL_FITNESS],
+            available_days=3
+        )
+        service.plan_library.add(make_plan(profile))
+        
+        workout_plan = await service.generate_workout_plan("Voglio una scheda per rimettermi in forma")
+        
+        assert workout_plan.metadata["served_from_library"] is True
+        mock_llm_manager.generate_workout_response.assert_not_called()
+        mock_file_storage.save_workout.assert_called_once()
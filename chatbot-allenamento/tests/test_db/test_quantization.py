@@ -0,0 +1,113 @@
+"""
+Test per la quantizzazione dei vettori e l'indice compatto
+"""
+
+import numpy as np
+import pytest
+from unittest.mock import Mock, patch
+from app.db.ann_index import IVFIndex
+from app.db.quantization import create_quantizer, kmeans, Int8Quantizer, VectorQuantizer
+from app.core.error_handler import RAGException
+
+def make_embeddings(count=2000, dim=64, rank=8, seed=0):
+    """Vettori a bassa dimensione intrinseca, come gli embeddings reali"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, rank)) @ rng.normal(size=(rank, dim)) + 0.3 * rng.normal(size=(count, dim))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    return [f"n{i}" for i in range(count)], vectors
+
+def recall_at_10(index, vectors, rerank):
+    """Recall@10 media rispetto alla ricerca esatta"""
+    recalls = []
+    for query in vectors[:20]:
+        expected = {f"n{i}" for i in np.argsort(-(vectors @ query))[:10]}
+        found = {node_id for node_id, _ in index.search(query, 10, n_probe=1, rerank=rerank)}
+        recalls.append(len(found & expected) / 10)
+    return np.mean(recalls)
+
+class TestQuantization:
+    """Test per le codifiche int8 e product quantization"""
+    
+    @pytest.mark.parametrize("mode", ["int8", "pq"])
+    def test_rerank_restores_recall(self, mode, temp_dir):
+        """Test codici compatti in memoria e recall recuperata dalla riclassificazione"""
+        node_ids, vectors = make_embeddings()
+        index = IVFIndex.build(node_ids, vectors, n_lists=1, quantizer=create_quantizer(mode, pq_subvectors=16))
+        path = temp_dir / "ann_index.npz"
+        index.save(path)
+        loaded = IVFIndex.load(path)
+        
+        assert loaded.quantization == mode
+        assert isinstance(loaded.float_vectors, np.memmap)
+        assert loaded.vectors.nbytes <= vectors.nbytes / 4
+        assert loaded.memory_usage()["mapped_bytes"] == vectors.nbytes
+        assert recall_at_10(loaded, vectors, rerank=10) >= 0.95
+        assert recall_at_10(loaded, vectors, rerank=10) >= recall_at_10(loaded, vectors, rerank=0)
+        # I punteggi riclassificati sono similarità coseno esatte
+        node_id, score = loaded.search(vectors[3], 1, n_probe=1)[0]
+        assert node_id == "n3"
+        assert score == pytest.approx(1.0, abs=1e-5)
+    
+    def test_add_after_load(self, temp_dir):
+        """Test aggiunta di vettori a un indice quantizzato con vettori mappati"""
+        node_ids, vectors = make_embeddings(count=300)
+        index = IVFIndex.build(node_ids[:200], vectors[:200], n_lists=1, quantizer=Int8Quantizer())
+        path = temp_dir / "ann_index.npz"
+        index.save(path)
+        
+        loaded = IVFIndex.load(path)
+        loaded.add(node_ids[200:], vectors[200:])
+        loaded.save(path)
+        
+        assert len(IVFIndex.load(path)) == 300
+        assert loaded.search(vectors[250], 1, n_probe=1)[0][0] == "n250"
+    
+    @pytest.mark.parametrize("spherical", [True, False])
+    def test_kmeans_in_batches(self, spherical):
+        """Test il k-means a blocchi dà gli stessi centroidi del calcolo in un'unica matrice"""
+        data = np.random.default_rng(0).normal(size=(500, 8)).astype(np.float32)
+        
+        whole = kmeans(data, 16, 5, np.random.default_rng(1), spherical=spherical)
+        with patch("app.db.quantization._KMEANS_BATCH_SIZE", 64):
+            batched = kmeans(data, 16, 5, np.random.default_rng(1), spherical=spherical)
+            
+        np.testing.assert_allclose(batched, whole, rtol=1e-5, atol=1e-6)
+    
+    def test_invalid_mode(self):
+        """Test modalità di quantizzazione non valida"""
+        assert create_quantizer("none") is None
+        with pytest.raises(RAGException):
+            create_quantizer("int4")
+    
+    def test_incomplete_quantizer_is_rejected(self):
+        """Test una codifica senza tutti i metodi non può essere creata"""
+        class ScaleOnly(VectorQuantizer):
+            def encode(self, vectors):
+                return vectors
+                
+        with pytest.raises(TypeError):
+            ScaleOnly()
+
+def test_embeddings_released_and_restored(temp_dir):
+    """Test embeddings Python liberati con l'indice compatto e ripristinati prima del salvataggio"""
+    from app.db.vectorstore import VectorStoreManager
+    
+    node_ids, vectors = make_embeddings(count=100)
+    index = Mock()
+    index.vector_store.data.embedding_dict = {node_id: vector.tolist() for node_id, vector in zip(node_ids, vectors)}
+    
+    with patch("app.db.vectorstore.settings.VECTOR_STORE_PATH", temp_dir), \
+         patch("app.db.vectorstore.settings.VECTOR_QUANTIZATION", "int8"):
+        manager = VectorStoreManager()
+        ann_index = manager.prepare_ann_index(index)
+        manager.release_embeddings(index)
+        
+        assert ann_index.n_lists == 1
+        assert index.vector_store.data.embedding_dict == {}
+        assert manager.ann_search(vectors[5], top_k=1)[0][0] == "n5"
+        assert manager.get_index_info()["ann_index"]["quantization"] == "int8"
+        
+        manager.restore_embeddings(index)
+        restored = index.vector_store.data.embedding_dict
+        assert set(restored) == set(node_ids)
+        assert np.allclose(restored["n7"], vectors[7], atol=1e-6)
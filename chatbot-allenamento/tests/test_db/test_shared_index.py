@@ -0,0 +1,121 @@
+"""
+Test per l'indice condiviso tra i processi worker
+"""
+
+import numpy as np
+import pytest
+from unittest.mock import Mock, patch
+from llama_index.core.schema import TextNode
+from app.core.metadata_index import MetadataIndex
+from app.core.sparse_index import BM25Index
+from app.db.shared_index import SharedIndexStore
+
+# Dimensione dei vettori di test, configurata come EMBEDDING_DIMENSIONS per superare il controllo all'apertura
+DIM = 16
+
+def make_index(count=50, dim=DIM, seed=0):
+    """Indice vettoriale finto con docstore ed embeddings"""
+    rng = np.random.default_rng(seed)
+    nodes = [
+        TextNode(id_=f"n{i:03d}", text=f"Frammento {i} sullo squat", metadata={"source": f"doc{i % 3}"})
+        for i in range(count)
+    ]
+    nodes[1].metadata["page_label"] = "12"
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    index = Mock()
+    index.docstore.docs = {node.node_id: node for node in nodes}
+    index.vector_store.data.embedding_dict = {node.node_id: vector.tolist() for node, vector in zip(nodes, vectors)}
+    return index, vectors
+
+def test_publish_and_open_generation(temp_dir):
+    """Test generazione mappata in memoria con nodi, vettori e indice lessicale"""
+    from app.db.vectorstore import VectorStoreManager
+    
+    index, vectors = make_index()
+    sparse_index = BM25Index.from_texts((node_id, node.text) for node_id, node in index.docstore.docs.items())
+    metadata_index = MetadataIndex.from_records(
+        (node_id, node.metadata, None, len(node.text)) for node_id, node in index.docstore.docs.items()
+    )
+    
+    with patch("app.db.vectorstore.settings.VECTOR_STORE_PATH", temp_dir), \
+         patch("app.db.vectorstore.settings.EMBEDDING_DIMENSIONS", DIM):
+        manager = VectorStoreManager()
+        manager.publish_shared_index(index, sparse_index, metadata_index)
+        generation = VectorStoreManager().open_shared_index()
+        
+    assert len(generation) == 50
+    assert isinstance(generation.ann_index.vectors, np.memmap)
+    assert generation.ann_index.memory_usage()["mapped_bytes"] >= vectors.nbytes
+    node_id, score = generation.ann_index.search(vectors[7], top_k=1, n_probe=1)[0]
+    assert node_id == "n007"
+    assert score == pytest.approx(1.0, abs=1e-5)
+    
+    node = generation.get_node("n007")
+    assert node.text == "Frammento 7 sullo squat"
+    assert node.metadata == {"source": "doc1"}
+    assert generation.get_node("assente") is None
+    assert len(generation.sparse_index) == 50
+    assert generation.metadata_index.sources["doc1"]["chunk_count"] == 17
+    # Ricerca filtrata sull'indice mappato: solo le righe della fonte richiesta
+    allowed = generation.metadata_index.match({"source": "doc2"})
+    rows = generation.ann_index.rows_for(allowed)
+    assert {node_id for node_id, _ in generation.ann_index.search(vectors[7], top_k=5, n_probe=1, rows=rows)} <= allowed
+    # Metadati per colonne: valori distinti salvati una volta, chiavi assenti non ricostruite
+    assert generation.metadata_columns["source"] == ["doc0", "doc1", "doc2"]
+    assert generation.get_node("n001").metadata == {"source": "doc1", "page_label": "12"}
+
+def test_stale_generation_is_not_opened(temp_dir):
+    """Test una generazione più vecchia dell'indice JSON non viene usata"""
+    from app.db.vectorstore import VectorStoreManager
+    
+    index, _ = make_index(count=10)
+    with patch("app.db.vectorstore.settings.VECTOR_STORE_PATH", temp_dir), \
+         patch("app.db.vectorstore.settings.EMBEDDING_DIMENSIONS", DIM):
+        manager = VectorStoreManager()
+        manager.publish_shared_index(index)
+        (temp_dir / "docstore.json").write_text("{}")
+        
+        assert manager.open_shared_index() is None
+        manager.publish_shared_index(index)
+        assert manager.open_shared_index() is not None
+
+def test_generation_with_other_dimension_is_not_opened(temp_dir):
+    """Test una generazione con dimensione diversa da quella configurata non viene usata"""
+    from app.db.vectorstore import VectorStoreManager
+    
+    index, _ = make_index(count=10)
+    with patch("app.db.vectorstore.settings.VECTOR_STORE_PATH", temp_dir):
+        manager = VectorStoreManager()
+        manager.publish_shared_index(index)
+        
+        with patch("app.db.vectorstore.settings.EMBEDDING_DIMENSIONS", 2 * DIM):
+            assert manager.open_shared_index() is None
+        with patch("app.db.vectorstore.settings.EMBEDDING_DIMENSIONS", DIM):
+            assert manager.open_shared_index() is not None
+
+def test_workers_switch_to_new_generation(temp_dir):
+    """Test un worker passa alla generazione pubblicata da un altro processo"""
+    from app.db.vectorstore import VectorStoreManager
+    
+    index, _ = make_index(count=20)
+    with patch("app.db.vectorstore.settings.VECTOR_STORE_PATH", temp_dir), \
+         patch("app.db.vectorstore.settings.EMBEDDING_DIMENSIONS", DIM), \
+         patch("app.db.vectorstore.settings.SHARED_INDEX_CHECK_INTERVAL", 0):
+        publisher = VectorStoreManager()
+        first = publisher.publish_shared_index(index)
+        worker = VectorStoreManager()
+        old_generation = worker.open_shared_index()
+        assert worker.refresh_shared_index() is False
+        
+        updated, _ = make_index(count=30, seed=1)
+        second = publisher.publish_shared_index(updated)
+        third = publisher.publish_shared_index(updated)
+        
+        assert worker.refresh_shared_index() is True
+        assert worker.shared_generation.name == third
+        assert len(worker.ann_index) == 30
+        # Restano la generazione corrente e la precedente; quella già mappata resta leggibile
+        store = SharedIndexStore(temp_dir / "shared")
+        assert sorted(path.name for path in store.root.glob("gen-*")) == [second, third]
+        assert old_generation.name == first
+        assert old_generation.get_node("n003").text == "Frammento 3 sullo squat"
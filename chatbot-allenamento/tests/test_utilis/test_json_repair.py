@@ -0,0 +1,74 @@
+"""
+Test per il parsing tollerante delle risposte JSON
+"""
+
+import json
+import pytest
+from pydantic import ValidationError
+from app.models.workout import DayExercises
+from app.utils.json_repair import loads_lenient
+
+class TestLoadsLenient:
+    """Test per loads_lenient"""
+    
+    def test_valid_json_not_repaired(self):
+        """Test JSON valido interpretato senza riparazione"""
+        data, repaired = loads_lenient('{"title": "Scheda"}')
+        
+        assert data == {"title": "Scheda"}
+        assert repaired is False
+    
+    def test_markdown_and_prose_removed(self):
+        """Test blocchi markdown e testo introduttivo"""
+        response = 'Ecco la scheda:\n```json\n{"days": ["Lunedì", "Giovedì",],}\n```\nBuon allenamento!'
+        
+        data, repaired = loads_lenient(response)
+        
+        assert data == {"days": ["Lunedì", "Giovedì"]}
+        assert repaired is True
+    
+    def test_truncated_output_closed(self):
+        """Test output troncato con strutture non chiuse"""
+        data, _ = loads_lenient('{"warm_up": ["Cyclette", "Mobilità')
+        
+        assert data == {"warm_up": ["Cyclette", "Mobilità"]}
+    
+    def test_dangling_key_dropped(self):
+        """Test chiave senza valore scartata"""
+        data, _ = loads_lenient('{"week_1_2": "Tecnica", "week_3_4":')
+        
+        assert data == {"week_1_2": "Tecnica"}
+    
+    def test_incomplete_item_dropped_until_valid(self):
+        """Test con validazione l'ultimo elemento incompleto viene scartato"""
+        response = (
+            '{"exercises": [{"name": "Squat", "sets": 3, "reps": "10", "rest": "90 sec"}, '
+            '{"name": "Panca", "sets": 3, "re'
+        )
+        
+        data, repaired = loads_lenient(response, validate=DayExercises.model_validate)
+        
+        assert [ex["name"] for ex in data["exercises"]] == ["Squat"]
+        assert repaired is True
+    
+    def test_valid_json_repaired_until_valid(self):
+        """Test con JSON valido ma non conforme l'ultimo elemento non valido viene scartato"""
+        response = (
+            '{"exercises": [{"name": "Squat", "sets": 3, "reps": "10", "rest": "90 sec"}, '
+            '{"name": "Panca", "sets": 3}]}'
+        )
+        
+        data, repaired = loads_lenient(response, validate=DayExercises.model_validate)
+        
+        assert [ex["name"] for ex in data["exercises"]] == ["Squat"]
+        assert repaired is True
+    
+    def test_validation_error_raised(self):
+        """Test JSON valido ma non conforme allo schema"""
+        with pytest.raises(ValidationError):
+            loads_lenient('{"exercises": [{"name": "Squat"}]}', validate=DayExercises.model_validate)
+    
+    def test_unrecoverable_response(self):
+        """Test risposta senza JSON"""
+        with pytest.raises(json.JSONDecodeError):
+            loads_lenient("Non posso generare la scheda")
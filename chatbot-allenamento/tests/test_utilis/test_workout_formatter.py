@@ -28,6 +28,17 @@ class TestWorkoutFormatter:
         assert "Squat" in formatted
         assert "Push-up" in formatted
     
+    def test_format_fragments_compose_chat_output(self, sample_workout_plan):
+        """Test apertura, giorni e chiusura ricompongono la scheda completa"""
+        header = WorkoutFormatter.format_plan_header(sample_workout_plan.title, sample_workout_plan.user_profile)
+        days = [WorkoutFormatter.format_day(day) for day in sample_workout_plan.workout_days]
+        footer = WorkoutFormatter.format_plan_footer(sample_workout_plan)
+        
+        assert header + "".join(days) + footer == WorkoutFormatter.format_for_chat(sample_workout_plan)
+        assert header.startswith('<div class="workout-card">')
+        assert days[0].startswith('<div class="workout-day">') and days[0].endswith("</div>")
+        assert footer.endswith("</div>")
+    
     def test_format_for_chat_with_profile(self, sample_workout_plan):
         """Test formattazione sezione profilo"""
         formatted = WorkoutFormatter.format_for_chat(sample_workout_plan)